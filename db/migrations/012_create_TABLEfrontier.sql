@@ -0,0 +1,16 @@
+-- RAN:
+    -- Mon Oct 19 2026
+
+-- add table to hold the crawl frontier: frontier
+-- reason for change:
+    -- the discovery scripts (alx2pnd, pnd_ad_infinitum, dmtry_ad_infinitum, dmtry2pnd, etc.) all rebuild
+    -- their own workspace table with a DISTINCT UNNEST over a whole table at the start of every run
+    -- instead, the batch pullers push the outbound IDs of each parsed record (see engineer/frontier.py)
+    -- into one persistent frontier, so crawls can keep going without rescanning
+
+CREATE TABLE IF NOT EXISTS frontier (
+    item_id TEXT,
+    item_type TEXT CONSTRAINT one_of_the_three CHECK (item_type in ('book', 'author', 'user')),
+    discovered_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (item_id, item_type)
+);
@@ -0,0 +1,15 @@
+-- RAN:
+    -- Mon Oct 19 2026
+
+-- add priority columns to frontier: in_degree, priority
+-- reason for change:
+    -- the frontier (and every workspace table before it) had no order, so LIMIT returned IDs arbitrarily
+    -- and obscure zero-rating sitemap authors were pulled just as often as well connected ones
+    -- now, every edge pointing to an item adds 1 + ln(1 + popularity of the referencing item) to its priority,
+    -- and the frontier is popped highest priority first (see engineer/frontier.py)
+
+ALTER TABLE frontier
+    ADD COLUMN in_degree INT DEFAULT 0,
+    ADD COLUMN priority REAL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS frontier_priority_idx ON frontier (item_type, priority DESC);
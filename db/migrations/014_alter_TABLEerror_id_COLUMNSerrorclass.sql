@@ -0,0 +1,33 @@
+-- RAN:
+    -- Mon Oct 19 2026
+
+-- add failure class and retry policy columns to error_id: error_class, attempts, last_failed_at, retry_after
+-- reason for change:
+    -- every non-timeout failure was blacklisted forever, including network errors, throttling and parser errors
+    -- now, failures are classified (see engineer/failures.py), and each class has its own retry policy;
+    -- IDs past their retry_after time are no longer excluded, and are fed back into the frontier
+    -- past rows have no class; they're backfilled as not_found (the slowest policy to retry), with retry_after
+    -- spread over that policy's base interval (90 days), so they come back a trickle at a time, not all at once;
+    -- they get reclassified on their next failure. the column defaults are only set after the backfill
+
+ALTER TABLE error_id
+    ADD COLUMN error_class TEXT,
+    ADD COLUMN attempts INT,
+    ADD COLUMN last_failed_at TIMESTAMPTZ,
+    ADD COLUMN retry_after TIMESTAMPTZ;
+
+UPDATE error_id
+SET
+    error_class = 'not_found',
+    attempts = 1,
+    last_failed_at = NOW(),
+    retry_after = NOW() + INTERVAL '90 days' * random();
+
+ALTER TABLE error_id
+    ALTER COLUMN error_class SET DEFAULT 'not_found',
+    ALTER COLUMN attempts SET DEFAULT 1,
+    ALTER COLUMN last_failed_at SET DEFAULT NOW(),
+    ALTER COLUMN retry_after SET DEFAULT NOW() + INTERVAL '90 days',
+    ALTER COLUMN retry_after SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS error_id_retry_after_idx ON error_id (retry_after);
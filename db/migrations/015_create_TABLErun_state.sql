@@ -0,0 +1,18 @@
+-- RAN:
+    -- Mon Oct 19 2026
+
+-- add table to checkpoint batch script runs: run_state
+-- reason for change:
+    -- if a script like top_shelved, most_recent or sitemap2pnd crashed partway, it had to start from scratch
+    -- (or I had to flip "pull_the_ids" by hand), and the semaphore/delay controller had to warm up all over again
+    -- now, the completed batches, controller state and in-flight IDs are saved after each batch (see engineer/runstate.py)
+
+CREATE TABLE IF NOT EXISTS run_state (
+    run_id TEXT PRIMARY KEY,
+    completed_batches TEXT[] DEFAULT '{}',
+    controller JSONB,
+    in_flight TEXT[] DEFAULT '{}',
+    started_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    finished_at TIMESTAMPTZ
+);
@@ -0,0 +1,21 @@
+-- RAN:
+    -- Mon Oct 19 2026
+
+-- add table to hold precomputed similarity graph metrics: graph_metrics
+-- reason for change:
+    -- every Sigma export (visuals #04/#05/#06) recomputed louvain communities and degree in the browser, per graph,
+    -- and the crawl frontier had no notion of how central an uncrawled item is in the sim graphs
+    -- now, in-degree, pagerank and louvain community are computed once over the full sim_books/sim_authors graphs
+    -- (see curator/graphmetrics.py); item_id includes IDs only seen in sim arrays, i.e., not pulled yet
+
+CREATE TABLE IF NOT EXISTS graph_metrics (
+    item_id TEXT,
+    item_type TEXT CONSTRAINT book_or_author CHECK (item_type in ('book', 'author')),
+    in_degree INT,
+    pagerank DOUBLE PRECISION,
+    community INT,
+    computed_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (item_id, item_type)
+);
+
+CREATE INDEX IF NOT EXISTS graph_metrics_community_idx ON graph_metrics (item_type, community);
@@ -0,0 +1,17 @@
+-- RAN:
+    -- Mon Oct 19 2026
+
+-- add table to hold the raw genre -> broad genre mapping: genre_taxonomy
+-- reason for change:
+    -- visuals #07 ran up to 28 regexes (broad_genre) on every genre string of every row, on every run
+    -- now, each distinct genre is classified once (see engineer/genres.py), and new genres are classified
+    -- by the batch pullers at insert time; taxonomy_version changes when the patterns do, so stale rows get reclassified
+
+CREATE TABLE IF NOT EXISTS genre_taxonomy (
+    genre TEXT PRIMARY KEY,
+    broad_genre TEXT NOT NULL,
+    taxonomy_version TEXT NOT NULL,
+    classified_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS genre_taxonomy_broad_idx ON genre_taxonomy (broad_genre);
@@ -0,0 +1,75 @@
+-- RAN:
+    -- Mon Oct 19 2026
+
+-- add genre dictionary table: genre_dict
+-- add dictionary-encoded genre columns: alexandria.top_genre_ids, pound.top_genre_ids, false_dmitry.favorite_genre_ids
+-- reason for change:
+    -- top_genres/favorite_genres repeat the same few thousand strings over millions of rows, and every
+    -- genre filter/group-by unnests them and runs lower()/replace()/regex on each element
+    -- now, each distinct genre gets a smallint ID (with its normalized forms precomputed), the batch pullers
+    -- fill the *_ids columns on insert (see engineer/genres.py), and filters run on the IDs, through a GIN index
+    -- the text[] columns stay as they are; the *_ids columns are derived from them
+    -- NOTE: this does NOT reduce storage; the *_ids columns and their indexes are added on top of the
+    -- text[] columns. the win is in query time only. the text[] columns are still read by the Parquet
+    -- export, the local (duckdb) analytics, the visuals SQL, geotiles and cooccurrence, so they can't
+    -- be dropped until those decode through genre_dict
+    -- the backfill below runs with the updated_at triggers disabled (the rows' content doesn't change),
+    -- so rerun the Parquet export with --full to pick up the new columns for existing rows
+
+CREATE TABLE IF NOT EXISTS genre_dict (
+    genre_id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    genre TEXT UNIQUE NOT NULL,
+    -- normalized forms the analyses group by; see curator/analytics.py
+    genre_norm TEXT GENERATED ALWAYS AS (replace(lower(genre), ' and ', ' & ')) STORED,
+    genre_slug TEXT GENERATED ALWAYS AS (replace(lower(genre), ' ', '-')) STORED
+);
+
+ALTER TABLE alexandria ADD COLUMN IF NOT EXISTS top_genre_ids SMALLINT[];
+ALTER TABLE pound ADD COLUMN IF NOT EXISTS top_genre_ids SMALLINT[];
+ALTER TABLE false_dmitry ADD COLUMN IF NOT EXISTS favorite_genre_ids SMALLINT[];
+
+-- backfill the dictionary
+INSERT INTO genre_dict (genre)
+    SELECT unnest(top_genres) FROM alexandria
+    UNION
+    SELECT unnest(top_genres) FROM pound
+    UNION
+    SELECT unnest(favorite_genres) FROM false_dmitry
+ON CONFLICT (genre) DO NOTHING;
+
+-- backfill the ID columns; order of the genres is kept
+ALTER TABLE alexandria DISABLE TRIGGER update_time_alx;
+UPDATE alexandria SET top_genre_ids = (
+    SELECT array_agg(d.genre_id ORDER BY g.ord)
+    FROM unnest(alexandria.top_genres) WITH ORDINALITY AS g(genre, ord)
+    INNER JOIN genre_dict d ON d.genre = g.genre
+)
+WHERE top_genres IS NOT NULL;
+ALTER TABLE alexandria ENABLE TRIGGER update_time_alx;
+
+ALTER TABLE pound DISABLE TRIGGER update_time_pnd;
+UPDATE pound SET top_genre_ids = (
+    SELECT array_agg(d.genre_id ORDER BY g.ord)
+    FROM unnest(pound.top_genres) WITH ORDINALITY AS g(genre, ord)
+    INNER JOIN genre_dict d ON d.genre = g.genre
+)
+WHERE top_genres IS NOT NULL;
+ALTER TABLE pound ENABLE TRIGGER update_time_pnd;
+
+ALTER TABLE false_dmitry DISABLE TRIGGER update_time_dmtry;
+UPDATE false_dmitry SET favorite_genre_ids = (
+    SELECT array_agg(d.genre_id ORDER BY g.ord)
+    FROM unnest(false_dmitry.favorite_genres) WITH ORDINALITY AS g(genre, ord)
+    INNER JOIN genre_dict d ON d.genre = g.genre
+)
+WHERE favorite_genres IS NOT NULL;
+ALTER TABLE false_dmitry ENABLE TRIGGER update_time_dmtry;
+
+-- any-genre filters (&&, @>)
+CREATE INDEX IF NOT EXISTS alexandria_top_genre_ids_gin ON alexandria USING GIN (top_genre_ids);
+CREATE INDEX IF NOT EXISTS pound_top_genre_ids_gin ON pound USING GIN (top_genre_ids);
+CREATE INDEX IF NOT EXISTS false_dmitry_favorite_genre_ids_gin ON false_dmitry USING GIN (favorite_genre_ids);
+
+-- top genre filters (visuals #04/#05)
+CREATE INDEX IF NOT EXISTS alexandria_first_genre_id_idx ON alexandria ((top_genre_ids[1]));
+CREATE INDEX IF NOT EXISTS pound_first_genre_id_idx ON pound ((top_genre_ids[1]));
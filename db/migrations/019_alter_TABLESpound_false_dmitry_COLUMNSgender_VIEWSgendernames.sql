@@ -0,0 +1,96 @@
+-- RAN:
+    -- Mon Oct 19 2026
+
+-- add gender prediction inputs to pound (pronoun_count_male, pronoun_count_female, first_name) and false_dmitry (first_name)
+-- replace the g_pound/g_dmitry materialized views (see 008) with plain views over those columns
+-- reason for change:
+    -- every REFRESH of g_pound ran two regexp_replace/regexp_split_to_array passes over every author description,
+    -- and both views joined name_x_gender on a regex over every name; new rows weren't predicted until the next full refresh
+    -- now, Dante/FalseBardiya compute the counts and first name when the page is parsed (see engineer/gender.py),
+    -- the batch pullers insert them with the row, and the views are a CASE plus an indexed join, so they're never stale
+    -- the backfill below is the same computation as 008, run once; triggers are disabled since content doesn't change
+    -- column names of both views are unchanged
+
+ALTER TABLE pound
+    ADD COLUMN IF NOT EXISTS pronoun_count_male INT,
+    ADD COLUMN IF NOT EXISTS pronoun_count_female INT,
+    ADD COLUMN IF NOT EXISTS first_name TEXT;
+
+ALTER TABLE false_dmitry
+    ADD COLUMN IF NOT EXISTS first_name TEXT;
+
+-- backfill
+ALTER TABLE pound DISABLE TRIGGER update_time_pnd;
+UPDATE pound SET
+    pronoun_count_male = array_length(
+        regexp_split_to_array(
+            regexp_replace(lower(descr), '\.? h(e|is)( |\.|;|,)', '992849', 'g'), '992849'
+        ), 1
+    ) - 1,
+    pronoun_count_female = array_length(
+        regexp_split_to_array(
+            regexp_replace(lower(descr), '\.? (she|her)( |\.|;|,)', '992849', 'g'), '992849'
+        ), 1
+    ) - 1,
+    first_name = regexp_replace(lower(author_name), '\s.*$', '');
+ALTER TABLE pound ENABLE TRIGGER update_time_pnd;
+
+ALTER TABLE false_dmitry DISABLE TRIGGER update_time_dmtry;
+UPDATE false_dmitry SET
+    first_name = regexp_replace(lower(user_name), '\s.*$', '');
+ALTER TABLE false_dmitry ENABLE TRIGGER update_time_dmtry;
+
+CREATE INDEX IF NOT EXISTS pound_first_name_idx ON pound (first_name);
+CREATE INDEX IF NOT EXISTS false_dmitry_first_name_idx ON false_dmitry (first_name);
+
+-- author genders; same logic as 008
+DROP MATERIALIZED VIEW IF EXISTS g_pound;
+CREATE VIEW g_pound AS
+    SELECT
+        author_id,
+        author_name,
+        pronoun_count_male,
+        pronoun_count_female,
+        CASE
+            -- good when same prediction
+            WHEN (pronoun_count_male > pronoun_count_female) AND (g_gender = 'M') THEN 'M'
+            WHEN (pronoun_count_male < pronoun_count_female) AND (g_gender = 'F') THEN 'F'
+            -- equal
+            WHEN (pronoun_count_male = pronoun_count_female) AND (g_gender IS NOT NULL) THEN g_gender
+            WHEN (pronoun_count_male = pronoun_count_female) AND (g_gender IS NULL) THEN 'EQ'
+            -- pronoun count prioritized over name joins
+            WHEN (pronoun_count_male > pronoun_count_female) AND (g_gender = 'F') THEN 'M'
+            WHEN (pronoun_count_male < pronoun_count_female) AND (g_gender = 'M') THEN 'F'
+            -- no other choice
+            WHEN (pronoun_count_male > pronoun_count_female) AND (g_gender IS NULL) THEN 'M'
+            WHEN (pronoun_count_male < pronoun_count_female) AND (g_gender IS NULL) THEN 'F'
+            -- no other choice
+            WHEN (pronoun_count_female IS NULL) AND (g_gender IS NOT NULL) THEN g_gender
+            -- both null
+            ELSE NULL
+        END AS g_comp,
+        CASE
+            WHEN pronoun_count_female IS NULL THEN NULL -- means that description is null
+            WHEN pronoun_count_male > pronoun_count_female THEN 'M'
+            WHEN pronoun_count_male < pronoun_count_female THEN 'F'
+            ELSE 'EQ' -- 'EQ' for when equal
+        END AS g_pronoun_count,
+        g_gender AS g_nxg
+    FROM
+        pound
+    LEFT JOIN
+        name_x_gender
+        ON pound.first_name = name_x_gender.g_name;
+
+-- user genders; name only, same as 008
+DROP MATERIALIZED VIEW IF EXISTS g_dmitry;
+CREATE VIEW g_dmitry AS
+    SELECT
+        user_id,
+        user_name,
+        g_gender AS g_nxg
+    FROM
+        false_dmitry
+    LEFT JOIN
+        name_x_gender
+        ON false_dmitry.first_name = name_x_gender.g_name;
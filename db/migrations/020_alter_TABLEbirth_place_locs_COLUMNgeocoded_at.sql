@@ -0,0 +1,18 @@
+-- RAN:
+    -- Mon Oct 19 2026
+
+-- add a geocoded_at timestamp to birth_place_locs
+-- reason for change:
+    -- the map tiles (see guide2kulchur/curator/geotiles.py) are updated incrementally: only authors updated
+    -- since the last build, or whose birth place was geocoded since then, are re-read and re-binned
+    -- pound has updated_at; birth_place_locs had no way to tell which locations are new
+    -- rows from before this migration stay NULL (they're covered by the first, full, tile build);
+    -- only rows inserted from now on get a timestamp
+
+ALTER TABLE birth_place_locs
+    ADD COLUMN IF NOT EXISTS geocoded_at TIMESTAMPTZ;
+
+ALTER TABLE birth_place_locs
+    ALTER COLUMN geocoded_at SET DEFAULT NOW();
+
+CREATE INDEX IF NOT EXISTS birth_place_locs_geocoded_at_idx ON birth_place_locs (geocoded_at);
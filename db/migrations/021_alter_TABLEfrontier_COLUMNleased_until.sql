@@ -0,0 +1,13 @@
+-- RAN:
+    -- Mon Oct 19 2026
+
+-- add a lease to frontier rows: leased_until
+-- reason for change:
+    -- Frontier.pop deleted IDs before they were pulled; IDs that then timed out (or whose whole batch failed,
+    -- or whose script crashed) were never pushed back, and were lost until another record pointed to them
+    -- now, pop only leases IDs (leased_until = NOW() + lease); once the batch is inserted, the IDs are settled:
+    -- pulled/failed IDs are deleted (failures come back through error_id, see Frontier.push_retry_due),
+    -- timed-out IDs are released at a lower priority; leases of crashed runs just expire
+
+ALTER TABLE frontier
+    ADD COLUMN IF NOT EXISTS leased_until TIMESTAMPTZ;
@@ -0,0 +1,679 @@
+'''
+the queries behind the visuals scripts, runnable against either the live Postgres db or the
+local Parquet export (see export.py) through an in-process duckdb.
+
+both backends expose the same methods and return plain lists of tuples, so a script only has
+to pick one with "open_analytics":
+
+    with open_analytics('local', parquet_dir='data/parquet') as an:
+        edges = an.author_genre_edges(40000, '[Yy]oung Adult')
+'''
+
+import os
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import (List,
+                    Optional,
+                    Tuple,
+                    Iterator,
+                    Any,
+                    Union)
+
+import duckdb
+import psycopg
+
+from guide2kulchur.curator.export import EXPORT_TABLES, partitions, latest_rows_sql
+
+
+SOURCES = ('postgres', 'local')
+
+# item type -> (table, id column, genre column)
+GENRE_COLS = {
+    'book': ('alexandria', 'book_id', 'top_genres'),
+    'author': ('pound', 'author_id', 'top_genres'),
+    'user': ('false_dmitry', 'user_id', 'favorite_genres'),
+}
+
+# item type -> genre_dict ID column (see db/migrations/018); the postgres queries filter and group on these
+GENRE_ID_COLS = {
+    'book': 'top_genre_ids',
+    'author': 'top_genre_ids',
+    'user': 'favorite_genre_ids',
+}
+
+
+# each query has a postgres and a duckdb version; they return the same columns.
+# postgres uses "~" and %s params, duckdb uses regexp_matches (also a partial match) and ? params.
+# the postgres versions run on the genre_dict IDs: genre patterns are matched against the (small)
+# dictionary once, and filters/group-bys compare smallints instead of unnesting and lowercasing strings
+QUERIES = {
+    # 04_graph_pound_genres; params: (min rating count, top genre pattern)
+    'author_genre_edges': {
+        'postgres': '''
+                    SELECT
+                        author_id,
+                        unnest(sim_authors)
+                    FROM
+                        pound
+                    WHERE
+                        rating_count >= %s
+                    AND
+                        top_genre_ids[1] = ANY(ARRAY(SELECT genre_id FROM genre_dict WHERE genre ~ %s))
+                    ''',
+        'duckdb': '''
+                    SELECT
+                        author_id,
+                        unnest(sim_authors)
+                    FROM
+                        pound
+                    WHERE
+                        rating_count >= ?
+                    AND
+                        regexp_matches(top_genres[1], ?)
+                    '''
+    },
+    'author_genre_nodes': {
+        'postgres': '''
+                    WITH edges_q(a_id, s_id) AS (
+                        SELECT
+                            author_id,
+                            unnest(sim_authors)
+                        FROM
+                            pound
+                        WHERE
+                            rating_count >= %s
+                        AND
+                            top_genre_ids[1] = ANY(ARRAY(SELECT genre_id FROM genre_dict WHERE genre ~ %s))
+                    ),
+                    all_nodes(a_id) AS (
+                        (SELECT DISTINCT a_id FROM edges_q)
+                        UNION
+                        (SELECT  DISTINCT s_id FROM edges_q)
+                    )
+
+                    SELECT
+                        author_id,
+                        author_name
+                    FROM
+                        pound
+                    INNER JOIN
+                        all_nodes ON pound.author_id = all_nodes.a_id
+                    ''',
+        'duckdb': '''
+                    WITH edges_q(a_id, s_id) AS (
+                        SELECT
+                            author_id,
+                            unnest(sim_authors)
+                        FROM
+                            pound
+                        WHERE
+                            rating_count >= ?
+                        AND
+                            regexp_matches(top_genres[1], ?)
+                    ),
+                    all_nodes(a_id) AS (
+                        SELECT a_id FROM edges_q
+                        UNION
+                        SELECT s_id FROM edges_q
+                    )
+
+                    SELECT
+                        author_id,
+                        author_name
+                    FROM
+                        pound
+                    INNER JOIN
+                        all_nodes ON pound.author_id = all_nodes.a_id
+                    '''
+    },
+    # 05_graph_alexandria_genres; params: (min rating count, top genre pattern, min rating count of similar book)
+    'book_genre_edges': {
+        'postgres': '''
+                    WITH edges_q(b_id, b_rc, s_id) AS (
+                        SELECT
+                            book_id,
+                            rating_count,
+                            unnest(sim_books)
+                        FROM
+                            alexandria
+                        WHERE
+                            rating_count >= %s
+                        AND
+                            top_genre_ids[1] = ANY(ARRAY(SELECT genre_id FROM genre_dict WHERE lower(genre) ~ %s))
+                        AND
+                            lang = 'English'
+                    )
+                    SELECT
+                        b_id,
+                        s_id
+                    FROM
+                        edges_q
+                    INNER JOIN
+                        alexandria ON edges_q.s_id = alexandria.book_id
+                    WHERE
+                        alexandria.rating_count >= %s
+                    ''',
+        'duckdb': '''
+                    WITH edges_q(b_id, s_id) AS (
+                        SELECT
+                            book_id,
+                            unnest(sim_books)
+                        FROM
+                            alexandria
+                        WHERE
+                            rating_count >= ?
+                        AND
+                            regexp_matches(lower(top_genres[1]), ?)
+                        AND
+                            lang = 'English'
+                    )
+                    SELECT
+                        b_id,
+                        s_id
+                    FROM
+                        edges_q
+                    INNER JOIN
+                        alexandria ON edges_q.s_id = alexandria.book_id
+                    WHERE
+                        alexandria.rating_count >= ?
+                    '''
+    },
+    'book_genre_nodes': {
+        'postgres': '''
+                    WITH edges_q(b_id, b_rc, s_id) AS (
+                        SELECT
+                            book_id,
+                            rating_count,
+                            unnest(sim_books)
+                        FROM
+                            alexandria
+                        WHERE
+                            rating_count >= %s
+                        AND
+                            top_genre_ids[1] = ANY(ARRAY(SELECT genre_id FROM genre_dict WHERE lower(genre) ~ %s))
+                        AND
+                            lang = 'English'
+                    ),
+                    edges_q_filtered(b_id, s_id) AS (
+                        SELECT
+                            b_id,
+                            s_id
+                        FROM
+                            edges_q
+                        INNER JOIN
+                            alexandria ON edges_q.s_id = alexandria.book_id
+                        WHERE
+                            alexandria.rating_count >= %s
+                    ),
+                    all_nodes(b_id) AS (
+                        (SELECT DISTINCT b_id FROM edges_q_filtered)
+                        UNION
+                        (SELECT  DISTINCT s_id FROM edges_q_filtered)
+                    )
+
+                    SELECT
+                        book_id,
+                        title
+                    FROM
+                        alexandria
+                    INNER JOIN
+                        all_nodes ON alexandria.book_id = all_nodes.b_id
+                    ''',
+        'duckdb': '''
+                    WITH edges_q(b_id, s_id) AS (
+                        SELECT
+                            book_id,
+                            unnest(sim_books)
+                        FROM
+                            alexandria
+                        WHERE
+                            rating_count >= ?
+                        AND
+                            regexp_matches(lower(top_genres[1]), ?)
+                        AND
+                            lang = 'English'
+                    ),
+                    edges_q_filtered(b_id, s_id) AS (
+                        SELECT
+                            b_id,
+                            s_id
+                        FROM
+                            edges_q
+                        INNER JOIN
+                            alexandria ON edges_q.s_id = alexandria.book_id
+                        WHERE
+                            alexandria.rating_count >= ?
+                    ),
+                    all_nodes(b_id) AS (
+                        SELECT b_id FROM edges_q_filtered
+                        UNION
+                        SELECT s_id FROM edges_q_filtered
+                    )
+
+                    SELECT
+                        book_id,
+                        title
+                    FROM
+                        alexandria
+                    INNER JOIN
+                        all_nodes ON alexandria.book_id = all_nodes.b_id
+                    '''
+    },
+    # 07_genre_analysis; each author needs at least 100 user ratings, and each genre needs at least 100 authors
+    'author_genre_gender_split': {
+        'postgres': '''
+                    WITH unnested_authors(genre_id, g_comp) AS (
+                        SELECT
+                            unnest(top_genre_ids),
+                            g_comp
+                        FROM
+                            pound
+                        INNER JOIN
+                            g_pound ON pound.author_id = g_pound.author_id
+                        WHERE
+                            (g_comp = 'M' OR g_comp = 'F')
+                        AND
+                            top_genre_ids[1] IS NOT NULL
+                        AND
+                            rating_count >= 100
+                        AND
+                            descr IS NOT NULL
+                    )
+                    SELECT
+                        genre_norm,
+                        SUM(CASE WHEN g_comp = 'M' THEN 1 ELSE 0 END) * 1.0,
+                        SUM(CASE WHEN g_comp = 'F' THEN 1 ELSE 0 END) * 1.0
+                    FROM
+                        unnested_authors
+                    INNER JOIN
+                        genre_dict ON unnested_authors.genre_id = genre_dict.genre_id
+                    GROUP BY
+                        genre_norm
+                    HAVING
+                        SUM(CASE WHEN g_comp = 'M' OR g_comp = 'F' THEN 1 ELSE 0 END) >= 100
+                    ''',
+        'duckdb': '''
+                    WITH unnested_authors(genre, g_comp) AS (
+                        SELECT
+                            unnest(top_genres),
+                            g_comp
+                        FROM
+                            pound
+                        INNER JOIN
+                            g_pound ON pound.author_id = g_pound.author_id
+                        WHERE
+                            g_comp IN ('M', 'F')
+                        AND
+                            top_genres[1] IS NOT NULL
+                        AND
+                            rating_count >= 100
+                        AND
+                            descr IS NOT NULL
+                    )
+                    SELECT
+                        replace(lower(genre), ' and ', ' & ') AS genre_norm,
+                        count(*) FILTER (WHERE g_comp = 'M') * 1.0,
+                        count(*) FILTER (WHERE g_comp = 'F') * 1.0
+                    FROM
+                        unnested_authors
+                    GROUP BY
+                        genre_norm
+                    HAVING
+                        count(*) >= 100
+                    '''
+    },
+    # for users, the cutoff is at least 1000 users in a genre
+    'user_genre_gender_split': {
+        'postgres': '''
+                    WITH unnested_users(genre_id, g_nxg) AS (
+                        SELECT
+                            unnest(favorite_genre_ids),
+                            g_nxg
+                        FROM
+                            false_dmitry
+                        INNER JOIN
+                            g_dmitry ON false_dmitry.user_id = g_dmitry.user_id
+                        WHERE
+                            (g_nxg = 'M' OR g_nxg = 'F')
+                        AND
+                            favorite_genre_ids[1] IS NOT NULL
+                    )
+                    SELECT
+                        genre_slug,
+                        SUM(CASE WHEN g_nxg = 'M' THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN g_nxg = 'F' THEN 1 ELSE 0 END)
+                    FROM
+                        unnested_users
+                    INNER JOIN
+                        genre_dict ON unnested_users.genre_id = genre_dict.genre_id
+                    GROUP BY
+                        genre_slug
+                    HAVING
+                        SUM(CASE WHEN g_nxg = 'M' OR g_nxg = 'F' THEN 1 ELSE 0 END) >= 1000
+                    ''',
+        'duckdb': '''
+                    WITH unnested_users(genre, g_nxg) AS (
+                        SELECT
+                            unnest(favorite_genres),
+                            g_nxg
+                        FROM
+                            false_dmitry
+                        INNER JOIN
+                            g_dmitry ON false_dmitry.user_id = g_dmitry.user_id
+                        WHERE
+                            g_nxg IN ('M', 'F')
+                        AND
+                            favorite_genres[1] IS NOT NULL
+                    )
+                    SELECT
+                        replace(lower(genre), ' ', '-') AS genre_norm,
+                        count(*) FILTER (WHERE g_nxg = 'M'),
+                        count(*) FILTER (WHERE g_nxg = 'F')
+                    FROM
+                        unnested_users
+                    GROUP BY
+                        genre_norm
+                    HAVING
+                        count(*) >= 1000
+                    '''
+    },
+    # baselines to compare the genre splits to
+    'author_gender_baseline': {
+        'postgres': '''
+                    SELECT
+                        SUM(CASE WHEN g_comp = 'M' THEN 1 ELSE 0 END) * 1.0,
+                        SUM(CASE WHEN g_comp = 'F' THEN 1 ELSE 0 END) * 1.0
+                    FROM
+                        pound
+                    INNER JOIN
+                        g_pound ON pound.author_id = g_pound.author_id
+                    WHERE
+                        descr IS NOT NULL
+                    AND
+                        rating_count >= 100
+                    AND
+                        top_genre_ids[1] IS NOT NULL
+                    ''',
+        'duckdb': '''
+                    SELECT
+                        SUM(CASE WHEN g_comp = 'M' THEN 1 ELSE 0 END) * 1.0,
+                        SUM(CASE WHEN g_comp = 'F' THEN 1 ELSE 0 END) * 1.0
+                    FROM
+                        pound
+                    INNER JOIN
+                        g_pound ON pound.author_id = g_pound.author_id
+                    WHERE
+                        descr IS NOT NULL
+                    AND
+                        rating_count >= 100
+                    AND
+                        top_genres[1] IS NOT NULL
+                    '''
+    },
+    'user_gender_baseline': {
+        'postgres': '''
+                    SELECT
+                        SUM(CASE WHEN g_nxg = 'M' THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN g_nxg = 'F' THEN 1 ELSE 0 END)
+                    FROM
+                        false_dmitry
+                    INNER JOIN
+                        g_dmitry ON false_dmitry.user_id = g_dmitry.user_id
+                    WHERE
+                        favorite_genre_ids[1] IS NOT NULL
+                    ''',
+        'duckdb': '''
+                    SELECT
+                        SUM(CASE WHEN g_nxg = 'M' THEN 1 ELSE 0 END),
+                        SUM(CASE WHEN g_nxg = 'F' THEN 1 ELSE 0 END)
+                    FROM
+                        false_dmitry
+                    INNER JOIN
+                        g_dmitry ON false_dmitry.user_id = g_dmitry.user_id
+                    WHERE
+                        favorite_genres[1] IS NOT NULL
+                    '''
+    },
+    # pairs of genres listed on the same item; table/columns are filled in from GENRE_COLS/GENRE_ID_COLS
+    # params: (min number of items with both genres,)
+    'genre_cooccurrence': {
+        'postgres': '''
+                    WITH unnested(item_id, genre_id) AS (
+                        SELECT
+                            {id_col},
+                            unnest({genre_id_col})
+                        FROM
+                            {table}
+                        WHERE
+                            {genre_id_col}[1] IS NOT NULL
+                    ),
+                    pairs(a_id, b_id, n) AS (
+                        SELECT
+                            a.genre_id,
+                            b.genre_id,
+                            COUNT(*)
+                        FROM
+                            unnested a
+                        INNER JOIN
+                            unnested b ON a.item_id = b.item_id AND a.genre_id < b.genre_id
+                        GROUP BY
+                            a.genre_id, b.genre_id
+                        HAVING
+                            COUNT(*) >= %s
+                    )
+                    SELECT
+                        LEAST(da.genre, db.genre),
+                        GREATEST(da.genre, db.genre),
+                        n
+                    FROM
+                        pairs
+                    INNER JOIN
+                        genre_dict da ON pairs.a_id = da.genre_id
+                    INNER JOIN
+                        genre_dict db ON pairs.b_id = db.genre_id
+                    ''',
+        'duckdb': '''
+                    WITH unnested(item_id, genre) AS (
+                        SELECT
+                            {id_col},
+                            unnest({genre_col})
+                        FROM
+                            {table}
+                        WHERE
+                            {genre_col}[1] IS NOT NULL
+                    )
+                    SELECT
+                        a.genre,
+                        b.genre,
+                        COUNT(*)
+                    FROM
+                        unnested a
+                    INNER JOIN
+                        unnested b ON a.item_id = b.item_id AND a.genre < b.genre
+                    GROUP BY
+                        a.genre, b.genre
+                    HAVING
+                        COUNT(*) >= ?
+                    '''
+    },
+}
+
+
+class _Analytics(ABC):
+    '''query methods shared by both backends; subclasses implement "_fetch"'''
+    dialect: str = ''
+
+    @abstractmethod
+    def _fetch(self,
+               query: str,
+               params: Tuple = ()) -> List[Tuple]:
+        '''run a query in this backend; returns every row'''
+        pass
+
+    def _run(self,
+             name: str,
+             params: Tuple = (),
+             **fmt) -> List[Tuple]:
+        '''run a named query from QUERIES in this backend's dialect'''
+        versions = QUERIES[name]
+        query = versions.get(self.dialect, versions['postgres'])
+        if fmt:
+            query = query.format(**fmt)
+        return self._fetch(query, params)
+
+    def author_genre_edges(self,
+                           min_rating_count: int,
+                           genre_pat: str) -> List[Tuple[str, str]]:
+        '''
+        returns (author_id, similar author_id) edges, for authors whose top genre matches genre_pat
+
+        :param min_rating_count: min rating count of the source author
+        :param genre_pat: regex pattern matched (anywhere) against the author's first top genre
+        '''
+        return self._run('author_genre_edges', (min_rating_count, genre_pat))
+
+    def author_genre_nodes(self,
+                           min_rating_count: int,
+                           genre_pat: str) -> List[Tuple[str, str]]:
+        '''
+        returns (author_id, author_name) for every author in the author_genre_edges graph
+
+        :param min_rating_count: min rating count of the source author
+        :param genre_pat: regex pattern matched (anywhere) against the author's first top genre
+        '''
+        return self._run('author_genre_nodes', (min_rating_count, genre_pat))
+
+    def book_genre_edges(self,
+                         min_rating_count: int,
+                         genre_pat: str,
+                         min_sim_rating_count: int) -> List[Tuple[str, str]]:
+        '''
+        returns (book_id, similar book_id) edges, for English books whose top genre matches genre_pat
+
+        :param min_rating_count: min rating count of the source book
+        :param genre_pat: regex pattern matched (anywhere) against the book's lowercased first top genre
+        :param min_sim_rating_count: min rating count of the similar book
+        '''
+        return self._run('book_genre_edges', (min_rating_count, genre_pat, min_sim_rating_count))
+
+    def book_genre_nodes(self,
+                         min_rating_count: int,
+                         genre_pat: str,
+                         min_sim_rating_count: int) -> List[Tuple[str, str]]:
+        '''
+        returns (book_id, title) for every book in the book_genre_edges graph
+
+        :param min_rating_count: min rating count of the source book
+        :param genre_pat: regex pattern matched (anywhere) against the book's lowercased first top genre
+        :param min_sim_rating_count: min rating count of the similar book
+        '''
+        return self._run('book_genre_nodes', (min_rating_count, genre_pat, min_sim_rating_count))
+
+    def genre_gender_split(self,
+                           grp: str) -> List[Tuple[str, Any, Any]]:
+        '''
+        returns (genre, male count, female count) per genre
+
+        :param grp: 'author' or 'user'
+        '''
+        return self._run(f'{grp}_genre_gender_split')
+
+    def gender_baseline(self,
+                        grp: str) -> Tuple[Any, Any]:
+        '''
+        returns (male count, female count) over the whole author/user sample
+
+        :param grp: 'author' or 'user'
+        '''
+        return self._run(f'{grp}_gender_baseline')[0]
+
+    def genre_cooccurrence(self,
+                           item_type: str = 'book',
+                           min_count: int = 100) -> List[Tuple[str, str, int]]:
+        '''
+        returns (genre a, genre b, count) for genre pairs listed together on at least min_count items
+
+        :param item_type: 'book', 'author' or 'user'
+        :param min_count: min number of items listing both genres
+        '''
+        table, id_col, genre_col = GENRE_COLS[item_type]
+        return self._run('genre_cooccurrence', (min_count,),
+                         table=table, id_col=id_col, genre_col=genre_col, genre_id_col=GENRE_ID_COLS[item_type])
+
+
+class PostgresAnalytics(_Analytics):
+    dialect = 'postgres'
+
+    def __init__(self,
+                 conn: psycopg.Connection):
+        '''
+        run the analytics queries against the live db
+
+        :param conn: a psycopg connection
+        '''
+        self.conn = conn
+
+    def _fetch(self,
+               query: str,
+               params: Tuple = ()) -> List[Tuple]:
+        with self.conn.cursor() as cur:
+            cur.execute(query, params or None)
+            return cur.fetchall()
+
+
+class DuckDBAnalytics(_Analytics):
+    dialect = 'duckdb'
+
+    def __init__(self,
+                 parquet_dir: str,
+                 threads: Optional[int] = None):
+        '''
+        run the analytics queries in-process against the Parquet export
+
+        :param parquet_dir: export directory written by curator.export
+        :param threads: duckdb threads; defaults to duckdb's own default (all cores)
+
+        each exported table is registered as a view of the same name (latest version of each row),
+        so the queries read like the Postgres ones.
+        '''
+        self.parquet_dir = parquet_dir
+        self.conn = duckdb.connect()
+        if threads:
+            self.conn.execute(f'SET threads = {int(threads)}')
+        self.tables = []
+        for table in EXPORT_TABLES:
+            if partitions(parquet_dir, table):
+                self.conn.execute(f'CREATE VIEW {table} AS {latest_rows_sql(parquet_dir, table)}')
+                self.tables.append(table)
+
+    def _fetch(self,
+               query: str,
+               params: Tuple = ()) -> List[Tuple]:
+        return self.conn.execute(query, list(params)).fetchall()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+@contextmanager
+def open_analytics(source: str,
+                   parquet_dir: Optional[str] = None,
+                   pg_string: Optional[str] = None) -> Iterator[Union[PostgresAnalytics, DuckDBAnalytics]]:
+    '''
+    open an analytics backend; the one switch the visuals scripts need
+
+    :param source: 'postgres' (live db) or 'local' (Parquet export through duckdb)
+    :param parquet_dir: export directory; defaults to data/parquet
+    :param pg_string: Postgres connection string; defaults to the PG_STRING env variable
+    '''
+    if source not in SOURCES:
+        raise ValueError(f'source must be one of: {SOURCES}')
+    if source == 'local':
+        an = DuckDBAnalytics(parquet_dir or os.path.join('data', 'parquet'))
+        try:
+            yield an
+        finally:
+            an.close()
+    else:
+        with psycopg.connect(pg_string or os.getenv('PG_STRING'), autocommit=True) as conn:
+            yield PostgresAnalytics(conn)
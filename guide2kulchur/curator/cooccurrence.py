@@ -0,0 +1,467 @@
+'''
+dictionary-encoded item x genre matrices, and the genre x genre co-occurrence / lift built from them.
+
+each item type (book: alexandria.top_genres, author: pound.top_genres, user: false_dmitry.favorite_genres)
+gets a sparse binary matrix X, with one row per item and one column per distinct genre string. the
+co-occurrence counts are then C = X^T X (the diagonal being the number of items per genre), and
+
+    lift(a, b) = C[a, b] * N / (C[a, a] * C[b, b])
+
+with N the number of items with at least one genre. alongside X, each item's first genre, rating count
+and language are kept as code arrays, so "items whose first genre matches <regex>" is a regex over the
+(small) genre vocabulary plus one np.isin, instead of a regex per row in Postgres.
+
+everything is cached under one directory per item type, and updated incrementally: rows updated since
+the last build replace their old rows, and C is adjusted by the difference, without a full rebuild. the
+incremental reads go back a few minutes (LOOKBACK) behind the watermark, like the Parquet export does, so
+rows committed late with an earlier updated_at aren't skipped; rows read twice just replace themselves.
+
+    matrix = GenreMatrix.load_or_build(conn, 'book', 'data/genre_matrix/book')
+    matrix.top_pairs(by='lift', min_count=500)
+'''
+
+import os
+import re
+import json
+import datetime
+from array import array
+from typing import (Dict,
+                    Iterable,
+                    List,
+                    Optional,
+                    Tuple,
+                    Any)
+
+import numpy as np
+import scipy.sparse as sp
+import psycopg
+import duckdb
+
+from guide2kulchur.curator.export import latest_rows_sql
+from guide2kulchur.curator.simgraph import SimGraph
+
+
+# item type -> (table, id column, genre column, lang column)
+MATRIX_CFG = {
+    'book': ('alexandria', 'book_id', 'top_genres', 'lang'),
+    'author': ('pound', 'author_id', 'top_genres', None),
+    'user': ('false_dmitry', 'user_id', 'favorite_genres', None),
+}
+
+_ARRAYS = ('item_ids', 'first_genre', 'rating_count', 'lang')
+
+# how far behind the watermark the incremental reads start; see export.export_table
+LOOKBACK = datetime.timedelta(minutes=5)
+
+_NO_CODE = -1
+
+
+def _rows_query(item_type: str,
+                watermark: Optional[datetime.datetime],
+                lookback: datetime.timedelta = LOOKBACK,
+                source: Optional[str] = None,
+                placeholder: str = '%s') -> Tuple[str, List[Any]]:
+    '''
+    returns the (ID, rating count, genres, lang, updated_at) query for an item type, and its parameters
+
+    :param item_type: 'book', 'author' or 'user'
+    :param watermark: only rows updated after watermark - lookback; all rows, if None
+    :param lookback: re-read rows this far behind the watermark, to catch rows committed late
+    :param source: what to select from, if not the table itself (e.g., a subquery over the Parquet export)
+    :param placeholder: parameter placeholder ('%s' for psycopg, '?' for duckdb)
+    '''
+    table, id_col, genre_col, lang_col = MATRIX_CFG[item_type]
+    where = f'WHERE updated_at > {placeholder}' if watermark is not None else ''
+    query = f'''
+            SELECT
+                {id_col}, rating_count, {genre_col}, {lang_col or 'NULL'}, updated_at
+            FROM
+                {source or table}
+            {where}
+            '''
+    return query, [watermark - lookback] if watermark is not None else []
+
+
+class GenreMatrix:
+    def __init__(self,
+                 item_type: str,
+                 vocab: List[str],
+                 langs: List[str],
+                 item_ids: np.ndarray,
+                 first_genre: np.ndarray,
+                 rating_count: np.ndarray,
+                 lang: np.ndarray,
+                 X: sp.csr_matrix,
+                 C: sp.csr_matrix,
+                 watermark: Optional[datetime.datetime] = None):
+        '''
+        item x genre matrix plus genre x genre co-occurrence; use "build", "load" or "load_or_build"
+
+        :param item_type: 'book', 'author' or 'user'
+        :param vocab: genre strings; column j of X is vocab[j]
+        :param langs: language strings; lang codes index into this
+        :param item_ids: Goodreads ID (int64) per row of X
+        :param first_genre: code of each item's first (top) genre; -1 if none
+        :param rating_count: rating count per item
+        :param lang: language code per item; -1 if none
+        :param X: items x genres, binary
+        :param C: genres x genres co-occurrence counts (X^T X)
+        :param watermark: max updated_at of the rows in the matrix
+        '''
+        self.item_type = item_type
+        self.vocab = vocab
+        self.langs = langs
+        self.item_ids = item_ids
+        self.first_genre = first_genre
+        self.rating_count = rating_count
+        self.lang = lang
+        self.X = X
+        self.C = C
+        self.watermark = watermark
+        self._codes = {g: i for i, g in enumerate(vocab)}
+        self._lang_codes = {l: i for i, l in enumerate(langs)}
+
+    @property
+    def num_items(self) -> int:
+        return self.X.shape[0]
+
+    @property
+    def num_genres(self) -> int:
+        return len(self.vocab)
+
+    @classmethod
+    def empty(cls,
+              item_type: str) -> 'GenreMatrix':
+        '''returns a matrix with no rows'''
+        return cls(item_type=item_type, vocab=[], langs=[],
+                   item_ids=np.array([], dtype=np.int64),
+                   first_genre=np.array([], dtype=np.int32),
+                   rating_count=np.array([], dtype=np.int64),
+                   lang=np.array([], dtype=np.int16),
+                   X=sp.csr_matrix((0, 0), dtype=np.int32),
+                   C=sp.csr_matrix((0, 0), dtype=np.int64))
+
+    def _encode(self,
+                rows: Iterable[Tuple[str, Optional[int], Optional[List[str]], Optional[str], Any]]) -> Dict[str, Any]:
+        '''dictionary-encode rows, growing the vocab as new genres show up'''
+        ids, rcs, firsts, langs = array('q'), array('q'), array('i'), array('h')
+        indptr, indices = array('q', [0]), array('i')
+        watermark = self.watermark
+        for item_id, rc, genres, lang, updated_at in rows:
+            try:
+                id_int = int(item_id)
+            except (TypeError, ValueError):
+                continue
+            codes = []
+            for g in genres or ():
+                if not g:
+                    continue
+                code = self._codes.get(g)
+                if code is None:
+                    code = self._codes[g] = len(self.vocab)
+                    self.vocab.append(g)
+                codes.append(code)
+            lang_code = _NO_CODE
+            if lang:
+                lang_code = self._lang_codes.get(lang)
+                if lang_code is None:
+                    lang_code = self._lang_codes[lang] = len(self.langs)
+                    self.langs.append(lang)
+            ids.append(id_int)
+            rcs.append(rc if rc is not None else 0)
+            firsts.append(codes[0] if codes else _NO_CODE)
+            langs.append(lang_code)
+            codes = sorted(set(codes))
+            indices.extend(codes)
+            indptr.append(indptr[-1] + len(codes))
+            if updated_at is not None and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+        return {
+            'item_ids': np.frombuffer(ids, dtype=np.int64),
+            'rating_count': np.frombuffer(rcs, dtype=np.int64),
+            'first_genre': np.frombuffer(firsts, dtype=np.int32),
+            'lang': np.frombuffer(langs, dtype=np.int16),
+            'indptr': np.frombuffer(indptr, dtype=np.int64),
+            'indices': np.frombuffer(indices, dtype=np.int32),
+            'watermark': watermark
+        }
+
+    def update(self,
+               rows: Iterable[Tuple[str, Optional[int], Optional[List[str]], Optional[str], Any]]) -> int:
+        '''
+        add (or replace) items from (ID, rating count, genres, lang, updated_at) rows; returns number of rows applied
+
+        items already in the matrix have their old row dropped and their old contribution
+        subtracted from C, so the co-occurrence counts stay exact without a rebuild; this is also
+        what makes the lookback of the incremental reads safe, since rows read again replace themselves.
+
+        :param rows: iterable of rows; consumed once, so a server-side cursor works
+        '''
+        enc = self._encode(rows)
+        n_new = len(enc['item_ids'])
+        self.watermark = enc['watermark']
+        if not n_new:
+            return 0
+        # an ID listed twice in the same update keeps its last row
+        _, last = np.unique(enc['item_ids'][::-1], return_index=True)
+        keep_new = np.sort(n_new - 1 - last)
+
+        g = self.num_genres
+        X_new = sp.csr_matrix((np.ones(len(enc['indices']), dtype=np.int32), enc['indices'], enc['indptr']),
+                              shape=(n_new, g))[keep_new]
+        X_old = self.X
+        X_old.resize((X_old.shape[0], g))
+        C = self.C
+        C.resize((g, g))
+
+        replaced = np.isin(self.item_ids, enc['item_ids'][keep_new])
+        if replaced.any():
+            X_rep = X_old[np.flatnonzero(replaced)]
+            C = C - (X_rep.T @ X_rep)
+        C = (C + (X_new.T @ X_new)).tocsr()
+        C.eliminate_zeros()
+
+        keep_old = np.flatnonzero(~replaced)
+        self.X = sp.vstack([X_old[keep_old], X_new], format='csr')
+        self.C = C
+        self.item_ids = np.concatenate([np.asarray(self.item_ids)[keep_old], enc['item_ids'][keep_new]])
+        self.first_genre = np.concatenate([np.asarray(self.first_genre)[keep_old], enc['first_genre'][keep_new]])
+        self.rating_count = np.concatenate([np.asarray(self.rating_count)[keep_old], enc['rating_count'][keep_new]])
+        self.lang = np.concatenate([np.asarray(self.lang)[keep_old], enc['lang'][keep_new]])
+        return len(keep_new)
+
+    @classmethod
+    def build(cls,
+              item_type: str,
+              rows: Iterable[Tuple[str, Optional[int], Optional[List[str]], Optional[str], Any]]) -> 'GenreMatrix':
+        '''
+        build a matrix from (ID, rating count, genres, lang, updated_at) rows
+
+        :param item_type: 'book', 'author' or 'user'
+        :param rows: iterable of rows
+        '''
+        matrix = cls.empty(item_type)
+        matrix.update(rows)
+        return matrix
+
+    def update_from_db(self,
+                       conn: psycopg.Connection,
+                       lookback: datetime.timedelta = LOOKBACK,
+                       batch_rows: int = 50_000) -> int:
+        '''
+        apply rows updated since the watermark (all rows, if there's none); returns number of rows applied
+
+        :param conn: a psycopg connection (NOT autocommit; server-side cursors need a transaction)
+        :param lookback: re-read rows this far behind the watermark, to catch rows committed late
+        :param batch_rows: rows fetched per round trip
+        '''
+        query, params = _rows_query(self.item_type, self.watermark, lookback)
+        with conn.transaction():
+            with conn.cursor(name=f'g2k_genre_matrix_{self.item_type}') as cur:
+                cur.itersize = batch_rows
+                cur.execute(query, params or None)
+                return self.update(cur)
+
+    def update_from_parquet(self,
+                            parquet_dir: str,
+                            lookback: datetime.timedelta = LOOKBACK) -> int:
+        '''
+        apply rows from the Parquet export (see export.py) updated since the watermark; returns number of rows applied
+
+        :param parquet_dir: export directory
+        :param lookback: re-read rows this far behind the watermark
+        '''
+        table = MATRIX_CFG[self.item_type][0]
+        query, params = _rows_query(self.item_type, self.watermark, lookback,
+                                    source=f'({latest_rows_sql(parquet_dir, table)})',
+                                    placeholder='?')
+        con = duckdb.connect()
+        try:
+            res = con.execute(query, params)
+            rows = (r for batch in iter(lambda: res.fetchmany(50_000), []) for r in batch)
+            return self.update(rows)
+        finally:
+            con.close()
+
+    def save(self,
+             path: str) -> None:
+        '''
+        save the matrix under path
+
+        :param path: directory to save to
+        '''
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), np.asarray(getattr(self, name)))
+        sp.save_npz(os.path.join(path, 'X.npz'), self.X)
+        sp.save_npz(os.path.join(path, 'C.npz'), self.C)
+        with open(os.path.join(path, 'vocab.json'), 'w') as f:
+            json.dump({'item_type': self.item_type,
+                       'watermark': self.watermark.isoformat() if self.watermark else None,
+                       'genres': self.vocab,
+                       'langs': self.langs}, f)
+
+    @classmethod
+    def load(cls,
+             path: str) -> 'GenreMatrix':
+        '''
+        load a saved matrix
+
+        :param path: directory the matrix was saved to
+        '''
+        with open(os.path.join(path, 'vocab.json'), 'r') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy')) for name in _ARRAYS}
+        return cls(item_type=meta['item_type'],
+                   vocab=meta['genres'],
+                   langs=meta['langs'],
+                   X=sp.load_npz(os.path.join(path, 'X.npz')).tocsr(),
+                   C=sp.load_npz(os.path.join(path, 'C.npz')).tocsr(),
+                   watermark=datetime.datetime.fromisoformat(meta['watermark']) if meta['watermark'] else None,
+                   **arrays)
+
+    @classmethod
+    def load_or_build(cls,
+                      conn: psycopg.Connection,
+                      item_type: str,
+                      path: str,
+                      update: bool = True,
+                      lookback: datetime.timedelta = LOOKBACK) -> 'GenreMatrix':
+        '''
+        load the cached matrix (building it from the db if there's none), apply new rows, and save it back
+
+        :param conn: a psycopg connection (NOT autocommit)
+        :param item_type: 'book', 'author' or 'user'
+        :param path: cache directory
+        :param update: pull rows updated since the cached watermark
+        :param lookback: re-read rows this far behind the watermark
+        '''
+        if os.path.exists(os.path.join(path, 'vocab.json')):
+            matrix = cls.load(path)
+            if not update:
+                return matrix
+        else:
+            matrix = cls.empty(item_type)
+        if matrix.update_from_db(conn, lookback=lookback):
+            matrix.save(path)
+        return matrix
+
+    def genre_codes(self,
+                    genre_pat: str,
+                    lowercase: bool = False) -> np.ndarray:
+        '''
+        returns the codes of genres matching a regex (anywhere in the string, like Postgres "~")
+
+        :param genre_pat: regex pattern
+        :param lowercase: match against the lowercased genre
+        '''
+        pat = re.compile(genre_pat)
+        return np.array([i for i, g in enumerate(self.vocab) if pat.search(g.lower() if lowercase else g)],
+                        dtype=np.int32)
+
+    def select_items(self,
+                     genre_pat: str,
+                     min_rating_count: int = 0,
+                     lowercase: bool = False,
+                     lang: Optional[str] = None,
+                     first_only: bool = True) -> np.ndarray:
+        '''
+        returns the IDs (int64) of items whose genres match a regex
+
+        :param genre_pat: regex pattern
+        :param min_rating_count: min rating count of the item
+        :param lowercase: match against the lowercased genre
+        :param lang: only items in this language (books only)
+        :param first_only: only match the item's first genre (like top_genres[1] ~ pattern); otherwise any genre
+        '''
+        codes = self.genre_codes(genre_pat, lowercase=lowercase)
+        if first_only:
+            mask = np.isin(self.first_genre, codes)
+        else:
+            mask = np.asarray(self.X[:, codes].sum(axis=1)).ravel() > 0
+        if min_rating_count > 0:
+            mask &= np.asarray(self.rating_count) >= min_rating_count
+        if lang is not None:
+            mask &= np.asarray(self.lang) == self._lang_codes.get(lang, -2)
+        return np.asarray(self.item_ids)[mask]
+
+    def genre_counts(self,
+                     item_mask: Optional[np.ndarray] = None) -> np.ndarray:
+        '''
+        returns the number of items per genre
+
+        :param item_mask: boolean mask over the rows; e.g., only items of some group
+        '''
+        X = self.X if item_mask is None else self.X[np.flatnonzero(item_mask)]
+        return np.asarray(X.sum(axis=0)).ravel()
+
+    def lift(self) -> sp.csr_matrix:
+        '''returns lift(a, b) = C[a, b] * N / (C[a, a] * C[b, b]) over the nonzero co-occurrences'''
+        C = self.C.tocoo()
+        n_g = self.C.diagonal().astype(np.float64)
+        N = float(np.count_nonzero(np.diff(self.X.indptr)))
+        data = C.data * N / (n_g[C.row] * n_g[C.col])
+        return sp.csr_matrix((data, (C.row, C.col)), shape=C.shape)
+
+    def top_pairs(self,
+                  by: str = 'lift',
+                  min_count: int = 100,
+                  n: Optional[int] = 50) -> List[Tuple[str, str, int, float]]:
+        '''
+        returns (genre a, genre b, co-occurrence count, lift) for distinct genre pairs, best first
+
+        :param by: 'lift' or 'count'
+        :param min_count: min number of items listing both genres
+        :param n: max number of pairs; None for all
+        '''
+        C = sp.triu(self.C, k=1).tocoo()
+        keep = C.data >= min_count
+        rows, cols, counts = C.row[keep], C.col[keep], C.data[keep]
+        n_g = self.C.diagonal().astype(np.float64)
+        N = float(np.count_nonzero(np.diff(self.X.indptr)))
+        lifts = counts * N / (n_g[rows] * n_g[cols])
+        order = np.argsort(-(lifts if by == 'lift' else counts), kind='stable')[:n]
+        return [(self.vocab[rows[i]], self.vocab[cols[i]], int(counts[i]), float(lifts[i])) for i in order]
+
+
+def genre_graph(matrix: GenreMatrix,
+                sim_graph: SimGraph,
+                genre_pat: str,
+                min_rating_count: int = 0,
+                min_sim_rating_count: Optional[int] = None,
+                lowercase: bool = False,
+                lang: Optional[str] = None) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    '''
+    returns ([(ID, label), ...], [(ID, similar ID), ...]) for the sim edges of items whose first genre matches a regex;
+    the cached equivalent of the GET_NODES/GET_EDGES queries of visuals #04/#05
+
+    :param matrix: GenreMatrix of the item type
+    :param sim_graph: SimGraph of the same item type
+    :param genre_pat: regex pattern matched against each item's first genre
+    :param min_rating_count: min rating count of the source item
+    :param min_sim_rating_count: min rating count of the similar item; None for no filter
+    :param lowercase: match against the lowercased genre
+    :param lang: only source items in this language (books only)
+    '''
+    src_ids = matrix.select_items(genre_pat, min_rating_count=min_rating_count, lowercase=lowercase, lang=lang)
+    ids = np.asarray(sim_graph.ids)
+    pos = np.searchsorted(ids, src_ids)
+    pos[pos == len(ids)] = 0
+    src_idx = pos[ids[pos] == src_ids]
+
+    indptr, indices = np.asarray(sim_graph.indptr), np.asarray(sim_graph.indices)
+    counts = indptr[src_idx + 1] - indptr[src_idx]
+    src = np.repeat(src_idx, counts)
+    dst = (np.concatenate([indices[indptr[i]:indptr[i + 1]] for i in src_idx]).astype(np.int64)
+           if len(src_idx) else np.array([], dtype=np.int64))
+    if min_sim_rating_count is not None:
+        keep = np.asarray(sim_graph.rating_count)[dst] >= min_sim_rating_count
+        src, dst = src[keep], dst[keep]
+
+    edges = [(str(ids[s]), str(ids[d])) for s, d in zip(src, dst)]
+    nodes = []
+    for i in np.union1d(src, dst):
+        label = sim_graph.label(int(i))
+        if label:   # only items in the table (i.e., with a title/name), as in the GET_NODES queries
+            nodes.append((str(ids[i]), label))
+    return nodes, edges
@@ -0,0 +1,377 @@
+'''
+snapshot the crawled tables to Parquet, so analysis doesn't have to hit the live db.
+
+layout, under some export directory:
+
+    <out_dir>/<table>/export_ts=<YYYYMMDDTHHMMSSffffff>-<suffix>/part-00000.parquet
+    <out_dir>/<table>/_watermark.json
+    <out_dir>/<table>/_live_keys.parquet
+
+tables with an updated_at column (alexandria, pound, false_dmitry) are exported incrementally:
+each export writes only rows updated since the last one, into a new export_ts partition, so
+a key can show up in more than one partition; the latest export_ts wins (see "latest_rows_sql").
+updated_at doesn't catch deletes, so every export of these tables also snapshots the table's keys
+(just the key column) to _live_keys.parquet; rows whose key isn't in there anymore are dropped
+by "latest_rows_sql".
+derived tables (matviews, lookup tables) don't track updates, so they're re-snapshotted in full,
+and older partitions are dropped.
+
+text[] columns become native list<string> columns; jsonb becomes a JSON string. numeric columns
+with a declared precision become decimal128; unconstrained numeric (e.g., AVG() in the matviews)
+becomes float64.
+'''
+
+import os
+import json
+import uuid
+import shutil
+import datetime
+import decimal
+from typing import (Dict,
+                    List,
+                    Optional,
+                    Any,
+                    Tuple)
+
+import psycopg
+from psycopg import sql
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# key: the table's primary key (used to pick the latest version of a row across partitions)
+# watermark: column for incremental exports; None means a full snapshot every time
+EXPORT_TABLES = {
+    'alexandria': {'key': 'book_id', 'watermark': 'updated_at'},
+    'pound': {'key': 'author_id', 'watermark': 'updated_at'},
+    'false_dmitry': {'key': 'user_id', 'watermark': 'updated_at'},
+    'g_pound': {'key': 'author_id', 'watermark': None},
+    'g_dmitry': {'key': 'user_id', 'watermark': None},
+    'birth_place_locs': {'key': 'og_loc', 'watermark': None},
+    'wikidata_lb': {'key': 'author_code', 'watermark': None},
+    'gr_awards': {'key': None, 'watermark': None},
+}
+
+# postgres type OID -> arrow type; domains (pos_int, object_rating) come over as their base type
+_PG_TO_ARROW = {
+    16: pa.bool_(),                     # bool
+    21: pa.int16(),                     # int2
+    23: pa.int32(),                     # int4
+    20: pa.int64(),                     # int8
+    700: pa.float32(),                  # float4
+    701: pa.float64(),                  # float8
+    1700: pa.float64(),                 # numeric, unconstrained; see _arrow_type
+    25: pa.string(),                    # text
+    1043: pa.string(),                  # varchar
+    1042: pa.string(),                  # bpchar
+    114: pa.string(),                   # json
+    3802: pa.string(),                  # jsonb
+    1082: pa.date32(),                  # date
+    1114: pa.timestamp('us'),           # timestamp
+    1184: pa.timestamp('us', tz='UTC'), # timestamptz
+    1009: pa.list_(pa.string()),        # text[]
+    1015: pa.list_(pa.string()),        # varchar[]
+    1005: pa.list_(pa.int16()),         # int2[]
+    1007: pa.list_(pa.int32()),         # int4[]
+    1016: pa.list_(pa.int64()),         # int8[]
+}
+
+_JSON_OIDS = {114, 3802}
+
+# no use for these outside of postgres
+_SKIP_OIDS = {3614}     # tsvector
+
+_PARTITION_PREFIX = 'export_ts='
+
+WATERMARK_FILE = '_watermark.json'
+
+LIVE_KEYS_FILE = '_live_keys.parquet'
+
+_NUMERIC_OID = 1700
+_MAX_DECIMAL_PRECISION = 38     # decimal128
+
+
+def _arrow_type(col: psycopg.Column) -> pa.DataType:
+    '''returns the arrow type of a result column; numeric(p, s) keeps its precision if decimal128 can hold it'''
+    if col.type_code == _NUMERIC_OID and col.precision and col.precision <= _MAX_DECIMAL_PRECISION:
+        return pa.decimal128(col.precision, col.scale or 0)
+    return _PG_TO_ARROW.get(col.type_code, pa.string())
+
+
+def _arrow_schema(cursor: psycopg.Cursor,
+                  table: str) -> Tuple[List[str], pa.Schema, List[bool]]:
+    '''
+    returns (column names, arrow schema, is-json flags) for a table, skipping tsvector columns
+
+    :param cursor: a psycopg cursor
+    :param table: table (or matview) name
+    '''
+    cursor.execute(sql.SQL('SELECT * FROM {} LIMIT 0').format(sql.Identifier(table)))
+    cols, fields, is_json = [], [], []
+    for col in cursor.description:
+        if col.type_code in _SKIP_OIDS:
+            continue
+        cols.append(col.name)
+        fields.append(pa.field(col.name, _arrow_type(col)))
+        is_json.append(col.type_code in _JSON_OIDS)
+    return cols, pa.schema(fields), is_json
+
+
+def _rows_to_batch(rows: List[Tuple],
+                   schema: pa.Schema,
+                   is_json: List[bool]) -> pa.RecordBatch:
+    '''
+    returns a record batch from fetched rows
+
+    :param rows: rows from the cursor, in schema order
+    :param schema: arrow schema from _arrow_schema
+    :param is_json: per-column flag; jsonb values (already loaded by psycopg) are dumped back to a string
+    '''
+    arrays = []
+    for i, field in enumerate(schema):
+        vals = [r[i] for r in rows]
+        if is_json[i]:
+            vals = [json.dumps(v) if v is not None else None for v in vals]
+        elif pa.types.is_string(field.type):
+            # unknown types fall back to string
+            vals = [v if v is None or isinstance(v, str) else str(v) for v in vals]
+        elif pa.types.is_floating(field.type):
+            # unconstrained numeric comes back from psycopg as Decimal, which arrow won't cast to a float
+            vals = [float(v) if isinstance(v, decimal.Decimal) else v for v in vals]
+        arrays.append(pa.array(vals, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def read_watermark(out_dir: str,
+                   table: str) -> Optional[datetime.datetime]:
+    '''
+    returns the watermark of the last export of a table, or None if there wasn't one
+
+    :param out_dir: export directory
+    :param table: table name
+    '''
+    path = os.path.join(out_dir, table, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        wm = json.load(f).get('watermark')
+    return datetime.datetime.fromisoformat(wm) if wm else None
+
+
+def _write_watermark(out_dir: str,
+                     table: str,
+                     watermark: Optional[datetime.datetime],
+                     partition: str,
+                     rows: int) -> None:
+    '''persist the watermark (and some info on the last export) for a table'''
+    path = os.path.join(out_dir, table, WATERMARK_FILE)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'watermark': watermark.isoformat() if watermark else None,
+            'last_partition': partition,
+            'last_rows': rows,
+            'exported_at': datetime.datetime.now(datetime.timezone.utc).isoformat()
+        }, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def _new_partition() -> str:
+    '''returns a new partition name; microsecond timestamp (so names sort by export time), plus a random
+    suffix, so two exports started at the same moment don't write into the same partition'''
+    ts = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    return f'{_PARTITION_PREFIX}{ts}-{uuid.uuid4().hex[:8]}'
+
+
+def _write_live_keys(conn: psycopg.Connection,
+                     out_dir: str,
+                     table: str,
+                     batch_rows: int,
+                     compression: str) -> int:
+    '''snapshot the keys currently in a table to LIVE_KEYS_FILE; returns the number of keys'''
+    key = EXPORT_TABLES[table]['key']
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL('SELECT {} FROM {} LIMIT 0').format(sql.Identifier(key), sql.Identifier(table)))
+        schema = pa.schema([pa.field(key, _arrow_type(cur.description[0]))])
+
+    path = os.path.join(out_dir, table, LIVE_KEYS_FILE)
+    tmp_path = f'{path}.tmp'
+    num_keys = 0
+    with pq.ParquetWriter(tmp_path, schema=schema, compression=compression) as writer:
+        with conn.transaction():
+            with conn.cursor(name=f'g2k_export_keys_{table}') as cur:
+                cur.itersize = batch_rows
+                cur.execute(sql.SQL('SELECT {} FROM {}').format(sql.Identifier(key), sql.Identifier(table)))
+                while rows := cur.fetchmany(batch_rows):
+                    writer.write_batch(_rows_to_batch(rows, schema, [False]))
+                    num_keys += len(rows)
+    os.replace(tmp_path, path)
+    return num_keys
+
+
+def partitions(out_dir: str,
+               table: str) -> List[str]:
+    '''
+    returns the export_ts partitions of a table, oldest first
+
+    :param out_dir: export directory
+    :param table: table name
+    '''
+    table_dir = os.path.join(out_dir, table)
+    if not os.path.isdir(table_dir):
+        return []
+    return sorted(d for d in os.listdir(table_dir) if d.startswith(_PARTITION_PREFIX))
+
+
+def dataset_glob(out_dir: str,
+                 table: str) -> str:
+    '''
+    returns a glob over every Parquet file of a table (e.g. for duckdb's read_parquet)
+
+    :param out_dir: export directory
+    :param table: table name
+    '''
+    return os.path.join(out_dir, table, f'{_PARTITION_PREFIX}*', '*.parquet')
+
+
+def latest_rows_sql(out_dir: str,
+                    table: str) -> str:
+    '''
+    returns a duckdb SELECT with the latest version of each row of an exported table
+
+    :param out_dir: export directory
+    :param table: table name; must be in EXPORT_TABLES
+    '''
+    key = EXPORT_TABLES[table]['key']
+    src = f"read_parquet('{dataset_glob(out_dir, table)}', hive_partitioning = true)"
+    if not key or not EXPORT_TABLES[table]['watermark']:
+        return f'SELECT * EXCLUDE (export_ts) FROM {src}'
+    live_keys = os.path.join(out_dir, table, LIVE_KEYS_FILE)
+    # exports from before the keys were snapshotted don't have the file; nothing to drop then
+    live_filter = f"WHERE {key} IN (SELECT {key} FROM read_parquet('{live_keys}'))" if os.path.exists(live_keys) else ''
+    return f'''
+            SELECT * EXCLUDE (export_ts) FROM {src}
+            {live_filter}
+            QUALIFY row_number() OVER (PARTITION BY {key} ORDER BY export_ts DESC) = 1
+            '''
+
+
+def export_table(conn: psycopg.Connection,
+                 out_dir: str,
+                 table: str,
+                 full: bool = False,
+                 batch_rows: int = 50_000,
+                 rows_per_file: int = 1_000_000,
+                 lookback: datetime.timedelta = datetime.timedelta(minutes=5),
+                 compression: str = 'zstd') -> Dict[str, Any]:
+    '''
+    export one table to a new export_ts partition, streaming through a server-side cursor
+
+    :param conn: a psycopg connection (NOT autocommit; server-side cursors need a transaction)
+    :param out_dir: export directory
+    :param table: table name; must be in EXPORT_TABLES
+    :param full: ignore the watermark and export every row (older partitions are dropped)
+    :param batch_rows: rows fetched per round trip (and written per row group)
+    :param rows_per_file: max rows per Parquet file in the partition
+    :param lookback: re-read rows this far behind the watermark, to catch rows committed late
+    :param compression: Parquet compression codec
+
+    returns info on the export: partition, rows written, the new watermark, and the number of live keys
+    (None for tables without a watermark)
+    '''
+    if table not in EXPORT_TABLES:
+        raise ValueError(f'table must be one of: {list(EXPORT_TABLES)}')
+    wm_col = EXPORT_TABLES[table]['watermark']
+    incremental = bool(wm_col) and not full
+    prev_wm = read_watermark(out_dir, table) if incremental else None
+
+    with conn.cursor() as cur:
+        cols, schema, is_json = _arrow_schema(cur, table)
+
+    query = sql.SQL('SELECT {} FROM {}').format(sql.SQL(', ').join(map(sql.Identifier, cols)),
+                                                sql.Identifier(table))
+    params = None
+    if prev_wm is not None:
+        query = query + sql.SQL(' WHERE {} > %s').format(sql.Identifier(wm_col))
+        params = (prev_wm - lookback,)
+
+    partition = _new_partition()
+    table_dir = os.path.join(out_dir, table)
+    tmp_dir = os.path.join(table_dir, f'.tmp-{partition}')
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    wm_idx = cols.index(wm_col) if wm_col else None
+    new_wm = prev_wm
+    total_rows, file_rows, file_num = 0, 0, 0
+    writer = None
+    try:
+        with conn.transaction():
+            with conn.cursor(name=f'g2k_export_{table}') as cur:
+                cur.itersize = batch_rows
+                cur.execute(query, params)
+                while True:
+                    rows = cur.fetchmany(batch_rows)
+                    if not rows:
+                        break
+                    if wm_idx is not None:
+                        batch_max = max((r[wm_idx] for r in rows if r[wm_idx] is not None), default=None)
+                        if batch_max is not None and (new_wm is None or batch_max > new_wm):
+                            new_wm = batch_max
+
+                    if writer is None or file_rows >= rows_per_file:
+                        if writer:
+                            writer.close()
+                        writer = pq.ParquetWriter(os.path.join(tmp_dir, f'part-{file_num:05d}.parquet'),
+                                                  schema=schema,
+                                                  compression=compression)
+                        file_num += 1
+                        file_rows = 0
+                    writer.write_batch(_rows_to_batch(rows, schema, is_json))
+                    file_rows += len(rows)
+                    total_rows += len(rows)
+        if writer:
+            writer.close()
+            writer = None
+    except BaseException:
+        if writer:
+            writer.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if total_rows:
+        os.replace(tmp_dir, os.path.join(table_dir, partition))
+    else:
+        # nothing new; don't leave an empty partition behind
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        partition = None
+
+    if partition and not incremental:
+        # full snapshot replaces everything before it
+        for old in partitions(out_dir, table):
+            if old != partition:
+                shutil.rmtree(os.path.join(table_dir, old), ignore_errors=True)
+
+    live_keys = None
+    if wm_col and EXPORT_TABLES[table]['key']:
+        # after the rows, so a row deleted mid-export is still dropped; one inserted mid-export
+        # just shows up on the next export (it's past the watermark)
+        live_keys = _write_live_keys(conn, out_dir, table, batch_rows, compression)
+
+    _write_watermark(out_dir, table, new_wm, partition, total_rows)
+    return {'table': table, 'partition': partition, 'rows': total_rows, 'watermark': new_wm, 'live_keys': live_keys}
+
+
+def export_all(conn: psycopg.Connection,
+               out_dir: str,
+               tables: Optional[List[str]] = None,
+               full: bool = False,
+               **kwargs) -> List[Dict[str, Any]]:
+    '''
+    export several tables; see export_table for kwargs
+
+    :param conn: a psycopg connection (NOT autocommit)
+    :param out_dir: export directory
+    :param tables: tables to export; defaults to all of EXPORT_TABLES
+    :param full: ignore watermarks and export every row
+    '''
+    return [export_table(conn, out_dir, t, full=full, **kwargs) for t in (tables or list(EXPORT_TABLES))]
@@ -0,0 +1,407 @@
+'''
+offline geocoding of author birth places, against a GeoNames gazetteer.
+
+geocoding every distinct pound.birth_place through Nominatim (1 request/sec) takes days. most of those
+strings are "city, region, country" for well-known places, which a local gazetteer resolves in memory:
+
+    - the gazetteer file (GeoNames format, e.g. cities500.txt from https://download.geonames.org/export/dump/)
+      is loaded into a dict of normalized name (incl. alternate names) -> candidate places
+    - a location string is cleaned the same way the Nominatim script always did (see "clean_location"),
+      which also pins down a country code where it can (COUNTRY_CFG, then the ISO country names);
+      raw strings that clean to the same query are grouped (see "group_locations"), and geocoded once
+    - candidates are filtered by country code and, if the string has one, by region (admin1) name;
+      the most populous remaining candidate wins
+
+only strings the gazetteer can't resolve need to go to Nominatim; see scripts/supplements/get_author_locs.py.
+
+    gaz = Gazetteer.from_geonames('data/geonames/cities500.txt', 'data/geonames/admin1CodesASCII.txt')
+    gaz.resolve('springfield, illinois, the united states')
+'''
+
+import os
+import re
+import csv
+import json
+import unicodedata
+from collections import defaultdict
+from typing import (Dict,
+                    Iterable,
+                    List,
+                    NamedTuple,
+                    Optional,
+                    Tuple)
+
+
+# iso 3166-1 alpha-2 codes
+# read more on it here: https://en.wikipedia.org/wiki/ISO_3166-1_alpha-2
+# json file taken from here: https://github.com/fannarsh/country-list
+ISO_PATH = os.path.join('data', 'iso', 'iso_codes.json')
+
+
+# for some of the larger countries (in share of GR authors), it's worth manually parsing
+# them. The ISO country names are used as last resort.
+COUNTRY_CFG = {
+    'us': {
+        'match_pat': r'(,? the)? united states( of america)?',
+        'country_code': 'us',
+        'replace_with': ''
+    },
+    'de': {
+        'match_pat': r', .*german.*$',
+        'country_code': 'de',
+        'replace_with': ', germany'
+    },
+    'gb': {
+        'match_pat': r'(,? the)? united kingdom| england',
+        'country_code': 'gb',
+        'replace_with': ''
+    },
+    'ru': {
+        'match_pat': r', (ussr|russian?).*$',
+        'country_code': 'ru',
+        'replace_with': ''
+    },
+    'ir': {
+        'match_pat': r',.*(iran|persia).*$',
+        'country_code': 'ir',
+        'replace_with': ''
+    },
+    'ps': {
+        'match_pat': r'palestinian territory, occupied',
+        'country_code': 'ps',
+        'replace_with': 'palestine'
+    },
+    'tr': {
+        'match_pat': r'(, ottoman empire,) turkey',
+        'country_code': 'tr',
+        'replace_with': ''
+    },
+    'dprk': {
+        'match_pat': r'^.*korea.*democratic people.s republic of.*$',
+        'country_code': 'kp',
+        'replace_with': 'pyongyang' # gotta pick something for this to work
+    },
+    'kr': {
+        'match_pat': r'(, )?(south|republic of) korea.*$',
+        'country_code': 'kr',
+        'replace_with': ''
+    },
+    'va': {
+        'match_pat': r'^.*holy see.*vatican.*$',
+        'country_code': 'va',
+        'replace_with': 'vatican city'
+    },
+    'in': {
+        'match_pat': r'(, )?(british )?india.*$',
+        'country_code': 'in',
+        'replace_with': ', india'
+    }
+}
+
+# short forms the ISO names don't cover; as substrings of the ISO names, "us" is austria and "uk" is ukraine
+COUNTRY_ALIASES = {
+    'us': 'us',
+    'usa': 'us',
+    'u.s.': 'us',
+    'u.s.a.': 'us',
+    'uk': 'gb',
+    'u.k.': 'gb',
+    'britain': 'gb',
+    'great britain': 'gb',
+    'scotland': 'gb',
+    'wales': 'gb',
+    'northern ireland': 'gb'
+}
+
+_PARENS_PAT = re.compile(r'\([\w\s]+\)')
+_REP_OF_PAT = re.compile(r'(.*,) (.*,) (.*republic of ?t?h?e?)$')
+_DATE_PAT = re.compile(r'\d{2,4}[\/-]\d{2}[\/-]\d{2,4}|\d{4}')
+_COMMA_PAT = re.compile(r'^(.*, )?(.*), (.*)$')
+_TOKEN_PAT = re.compile(r'\w+')
+
+# GeoNames dump columns; see https://download.geonames.org/export/dump/readme.txt
+_GN_ID, _GN_NAME, _GN_ASCII, _GN_ALT, _GN_LAT, _GN_LON = 0, 1, 2, 3, 4, 5
+_GN_CC, _GN_ADMIN1, _GN_POP = 8, 10, 14
+
+
+def load_iso_country_codes(path: str = ISO_PATH) -> Dict[str, str]:
+    '''
+    returns {lowercased country name: lowercased ISO alpha-2 code}
+
+    :param path: the iso_codes.json file
+    '''
+    with open(path, 'r') as ip:
+        return {ic['name'].lower(): ic['code'].lower() for ic in json.load(ip)}
+
+
+class CountryIndex:
+    def __init__(self,
+                 iso_country_codes: Dict[str, str],
+                 aliases: Optional[Dict[str, str]] = None):
+        '''
+        substring index over the ISO country names, for the "..., <country>" fallback in "clean_location"
+
+        :param iso_country_codes: see "load_iso_country_codes"
+        :param aliases: {suffix: country code}, checked before the names; default COUNTRY_ALIASES
+
+        the fallback scans the country names for the first one containing the suffix ("suffix in name"),
+        partial words included (e.g., "fran" -> france). the results are the same as that scan, aliases aside;
+        every substring of every word of the names is indexed up front, so only names with a word containing
+        each of the suffix's words are checked, and results are memoized
+        '''
+        self.iso_country_codes = iso_country_codes
+        self.aliases = COUNTRY_ALIASES if aliases is None else aliases
+        self._names = list(iso_country_codes.items())
+        self._grams = defaultdict(set)
+        for i, (name, _) in enumerate(self._names):
+            for tok in set(_TOKEN_PAT.findall(name)):
+                for start in range(len(tok)):
+                    for end in range(start + 1, len(tok) + 1):
+                        self._grams[tok[start:end]].add(i)
+        self._memo: Dict[str, Optional[str]] = {}
+
+    def _names_with(self,
+                    tok: str) -> set:
+        '''returns indices of the names with a word containing tok'''
+        return self._grams.get(tok, set())
+
+    def match(self,
+              suffix: str) -> Optional[str]:
+        '''
+        returns the code of suffix's alias, else of the first country name containing suffix, or None
+
+        :param suffix: the last comma-separated part of a location string, e.g. "france"
+        '''
+        if suffix in self.aliases:
+            return self.aliases[suffix]
+        if suffix in self._memo:
+            return self._memo[suffix]
+        # each word of a substring of a name lies within a word of that name
+        toks = _TOKEN_PAT.findall(suffix)
+        cands = set.intersection(*(self._names_with(t) for t in toks)) if toks else range(len(self._names))
+        code = next((self._names[i][1] for i in sorted(cands) if suffix in self._names[i][0]), None)
+        self._memo[suffix] = code
+        return code
+
+
+def _tidy(loc_str: str) -> str:
+    # collapse whitespace, drop empty comma-separated parts
+    parts = (' '.join(p.split()) for p in loc_str.split(','))
+    return ', '.join(p for p in parts if p)
+
+
+def clean_location(loc_str: str,
+                   country_index: CountryIndex) -> Dict[str, Optional[str]]:
+    '''
+    clean a birth_place string; returns {'submitted_string', 'country_code'}
+
+    :param loc_str: a birth_place (lowercased here)
+    :param country_index: see "CountryIndex"
+
+    drops parentheses and dates, flips "X, Y, republic of" strings, then sets a country code from
+    COUNTRY_CFG, or else from the ISO country names (in which case only the 2nd to last part is kept).
+    the string is tidied (whitespace collapsed, empty parts dropped) after the parentheses and the dates
+    are dropped, so strings that only differ in those respects clean to the same query; e.g., "tokyo, japan 1990"
+    matches japan, where the untidied "japan " suffix didn't
+    '''
+    submitted = _tidy(_PARENS_PAT.sub('', loc_str.lower()))
+    country_code = None
+
+    # some strings have XXXX, XXXX, republic of
+    # this messes up searches; let's fix it
+    if (rep_match := _REP_OF_PAT.match(submitted)):
+        # flip group 2 and 3
+        submitted = f'{rep_match.group(1).replace(',', '')}, {rep_match.group(3)} {rep_match.group(2).replace(',', '')}'
+
+    # some strings have dates in them, due to parsing errors earlier on
+    if _DATE_PAT.search(submitted):
+        submitted = _tidy(_DATE_PAT.sub('', submitted))
+
+    # check manual configuration first
+    for cfg in COUNTRY_CFG.values():
+        if re.search(cfg['match_pat'], submitted):
+            submitted = re.sub(cfg['match_pat'], cfg['replace_with'], submitted)
+            country_code = cfg['country_code']
+            break
+
+    # now use the iso dictionary as last resort
+    if not country_code:
+        if comma_pat_match := _COMMA_PAT.match(submitted):
+            if (code := country_index.match(comma_pat_match.group(3))):
+                # select 2nd group, assuming its broader, e.g., more likely to get a match
+                submitted = comma_pat_match.group(2)
+                country_code = code
+
+    return {'submitted_string': _tidy(submitted), 'country_code': country_code}
+
+
+def group_locations(loc_strs: Iterable[str],
+                    country_index: CountryIndex) -> Dict[Tuple[str, Optional[str]], List[str]]:
+    '''
+    returns {(cleaned query, country code): [raw strings cleaning to it]}; geocode each key once
+
+    :param loc_strs: raw birth_place strings
+    :param country_index: see "CountryIndex"
+    '''
+    groups = defaultdict(list)
+    for loc_str in loc_strs:
+        cleaned = clean_location(loc_str, country_index)
+        groups[(cleaned['submitted_string'], cleaned['country_code'])].append(loc_str)
+    return dict(groups)
+
+
+def normalize_place(name: str) -> str:
+    '''returns a place name lowercased, without accents/punctuation, whitespace collapsed'''
+    name = unicodedata.normalize('NFKD', name.lower())
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r"[^\w\s]", ' ', name)
+    return ' '.join(name.split())
+
+
+class GeoMatch(NamedTuple):
+    addr: str
+    lat: float
+    lon: float
+    country_code: str
+    geoname_id: int
+
+
+class Gazetteer:
+    def __init__(self,
+                 places: List[Dict],
+                 admin1_names: Optional[Dict[str, str]] = None,
+                 iso_country_codes: Optional[Dict[str, str]] = None):
+        '''
+        in-memory place index; use "from_geonames" to build from GeoNames dump files
+
+        :param places: dicts with geoname_id, name, names (alternate names), lat, lon, country_code, admin1, population
+        :param admin1_names: "CC.ADMIN1" code -> region name, e.g., "US.IL" -> "Illinois"
+        :param iso_country_codes: lowercased country name -> lowercased ISO code; defaults to data/iso/iso_codes.json
+        '''
+        self.places = places
+        self.admin1_names = admin1_names or {}
+        self.iso_country_codes = iso_country_codes if iso_country_codes is not None else load_iso_country_codes()
+        self.countries = CountryIndex(self.iso_country_codes)
+        self._country_names = {code: name for name, code in self.iso_country_codes.items()}
+
+        # normalized name -> place indices, most populous first
+        index = defaultdict(set)
+        for i, place in enumerate(places):
+            for name in (place['name'], *place['names']):
+                if (key := normalize_place(name)):
+                    index[key].add(i)
+        self.index = {k: sorted(v, key=lambda i: -places[i]['population']) for k, v in index.items()}
+
+        # normalized region name -> "CC.ADMIN1" codes; normalized country name -> code
+        self.admin1_index = defaultdict(set)
+        for code, name in self.admin1_names.items():
+            self.admin1_index[normalize_place(name)].add(code)
+        self.country_index = {normalize_place(name): code for name, code in self.iso_country_codes.items()}
+
+    @classmethod
+    def from_geonames(cls,
+                      path: str,
+                      admin1_path: Optional[str] = None,
+                      min_population: int = 0,
+                      iso_country_codes: Optional[Dict[str, str]] = None) -> 'Gazetteer':
+        '''
+        load a GeoNames dump (e.g., cities500.txt, or allCountries.txt) and, optionally, admin1CodesASCII.txt
+
+        :param path: GeoNames tab-separated place file
+        :param admin1_path: GeoNames admin1 codes file, for "city, region" disambiguation
+        :param min_population: skip places with fewer people
+        :param iso_country_codes: lowercased country name -> lowercased ISO code; defaults to data/iso/iso_codes.json
+        '''
+        places = []
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                if len(row) <= _GN_POP:
+                    continue
+                population = int(row[_GN_POP] or 0)
+                if population < min_population:
+                    continue
+                places.append({
+                    'geoname_id': int(row[_GN_ID]),
+                    'name': row[_GN_NAME],
+                    'names': [row[_GN_ASCII], *(n for n in row[_GN_ALT].split(',') if n)],
+                    'lat': float(row[_GN_LAT]),
+                    'lon': float(row[_GN_LON]),
+                    'country_code': row[_GN_CC].lower(),
+                    'admin1': f'{row[_GN_CC]}.{row[_GN_ADMIN1]}',
+                    'population': population
+                })
+
+        admin1_names = {}
+        if admin1_path:
+            with open(admin1_path, 'r', encoding='utf-8', newline='') as f:
+                for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                    if len(row) >= 2:
+                        admin1_names[row[0]] = row[1]
+        return cls(places, admin1_names=admin1_names, iso_country_codes=iso_country_codes)
+
+    def _match(self,
+               place: Dict) -> GeoMatch:
+        region = self.admin1_names.get(place['admin1'])
+        # e.g., "united states of america (the)" -> "United States Of America"
+        country = _PARENS_PAT.sub('', self._country_names.get(place['country_code'], place['country_code'])).strip()
+        addr = ', '.join(p for p in (place['name'], region, country.title()) if p)
+        return GeoMatch(addr=addr, lat=place['lat'], lon=place['lon'],
+                        country_code=place['country_code'], geoname_id=place['geoname_id'])
+
+    def lookup(self,
+               name: str,
+               country_code: Optional[str] = None,
+               context: Optional[List[str]] = None) -> Optional[GeoMatch]:
+        '''
+        returns the most populous place called name, or None
+
+        :param name: place name
+        :param country_code: only places in this country (ISO alpha-2, lowercase)
+        :param context: broader parts of the location string (region and/or country names), used to narrow down
+        '''
+        cands = self.index.get(normalize_place(name))
+        if not cands:
+            return None
+        if country_code:
+            cands = [i for i in cands if self.places[i]['country_code'] == country_code]
+        for part in context or []:
+            key = normalize_place(part)
+            if not key:
+                continue
+            if key in self.country_index:
+                narrowed = [i for i in cands if self.places[i]['country_code'] == self.country_index[key]]
+            elif key in self.admin1_index:
+                narrowed = [i for i in cands if self.places[i]['admin1'] in self.admin1_index[key]]
+            else:
+                continue
+            # a context part that rules out every candidate is more likely noise than a real mismatch
+            cands = narrowed or cands
+        return self._match(self.places[cands[0]]) if cands else None
+
+    def resolve(self,
+                loc_str: str) -> Optional[GeoMatch]:
+        '''
+        returns the best match for a birth_place string, or None if the gazetteer can't resolve it
+
+        :param loc_str: a birth_place, e.g. "chicago, illinois, the united states"
+        '''
+        cleaned = clean_location(loc_str, self.countries)
+        return self.resolve_cleaned(cleaned['submitted_string'], cleaned['country_code'])
+
+    def resolve_cleaned(self,
+                        query: str,
+                        country_code: Optional[str] = None) -> Optional[GeoMatch]:
+        '''
+        returns the best match for an already cleaned query (see "clean_location", "group_locations"), or None
+
+        :param query: cleaned location string
+        :param country_code: ISO alpha-2 code from the cleaning, if any
+
+        tries each comma-separated part, most specific first, with the parts after it as context
+        '''
+        parts = [p.strip() for p in query.split(',') if p.strip()]
+        for i, part in enumerate(parts):
+            match = self.lookup(part, country_code=country_code, context=parts[i + 1:])
+            if match:
+                return match
+        return None
@@ -0,0 +1,305 @@
+'''
+pre-aggregated map tiles of author birth places, for the site's author map.
+
+authors (pound, joined to birth_place_locs) are binned into Web Mercator quad tiles (the usual slippy-map
+z/x/y grid) at several zoom levels; per cell: author count, mean lat/lon (for the marker), summed rating
+count, broad genre mix (of each author's top genre; see engineer/genres.py) and gender split (g_pound.g_comp).
+the front end loads only the zoom level it needs.
+
+layout, under some output directory:
+
+    <out_dir>/meta.json              zooms, genre/gender labels, watermarks
+    <out_dir>/z<z>.json(.gz)         one file per zoom level, columnar:
+                                     {"z", "x": [...], "y": [...], "n": [...], "lat": [...], "lon": [...],
+                                      "rc": [...], "genre": [[count per genre label], ...], "gender": [[M, F, EQ, NA], ...]}
+    <out_dir>/state/                 one row per located author (ID, max-zoom tile, lat/lon, genre, gender)
+
+updates are incremental: only authors updated since the last build, or whose birth place was geocoded since
+then (birth_place_locs.geocoded_at; see db/migrations/020), are read, and replace their old state row;
+the cells are re-aggregated from the state (fast; it's a few arrays), and only zoom files whose content
+changed are rewritten.
+
+    tiles = GeoTiles.load_or_empty('data/geo_tiles')
+    with psycopg.connect(PG_STRING) as conn:
+        tiles.update_from_db(conn, taxonomy)
+    tiles.save('data/geo_tiles')
+'''
+
+import os
+import gzip
+import json
+import hashlib
+import datetime
+from typing import (Any,
+                    Dict,
+                    Iterable,
+                    List,
+                    Optional,
+                    Tuple)
+
+import numpy as np
+import psycopg
+
+from guide2kulchur.engineer.genres import (BROAD_GENRE_PATTERNS,
+                                           OTHER_GENRE,
+                                           GenreTaxonomy)
+
+
+ZOOMS = (2, 4, 6, 8, 10)
+
+# broad genre labels, in pattern order; genre codes index into this
+GENRE_LABELS = list(dict.fromkeys([lab for _, lab in BROAD_GENRE_PATTERNS] + [OTHER_GENRE]))
+GENDER_LABELS = ['M', 'F', 'EQ', 'NA']
+
+_MAX_LAT = 85.05112878   # Web Mercator cutoff
+
+_STATE_ARRAYS = ('author_id', 'tx', 'ty', 'lat', 'lon', 'rating_count', 'genre', 'gender')
+
+_ROWS_QUERY = '''
+              SELECT
+                  pound.author_id,
+                  birth_place_locs.lat,
+                  birth_place_locs.lon,
+                  pound.rating_count,
+                  pound.top_genres[1],
+                  g_pound.g_comp,
+                  pound.updated_at,
+                  birth_place_locs.geocoded_at
+              FROM
+                  pound
+              LEFT JOIN
+                  birth_place_locs ON lower(pound.birth_place) = birth_place_locs.og_loc
+              LEFT JOIN
+                  g_pound ON pound.author_id = g_pound.author_id
+              {where}
+              '''
+
+
+def tile_xy(lat: np.ndarray,
+            lon: np.ndarray,
+            z: int) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    returns the (x, y) Web Mercator tile coordinates of points at zoom level z
+
+    :param lat: latitudes (degrees)
+    :param lon: longitudes (degrees)
+    :param z: zoom level
+    '''
+    n = 2 ** z
+    lat_r = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -_MAX_LAT, _MAX_LAT))
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * n
+    y = (1.0 - np.log(np.tan(lat_r) + 1.0 / np.cos(lat_r)) / np.pi) / 2.0 * n
+    return (np.clip(x, 0, n - 1).astype(np.uint32),
+            np.clip(y, 0, n - 1).astype(np.uint32))
+
+
+class GeoTiles:
+    def __init__(self,
+                 state: Optional[Dict[str, np.ndarray]] = None,
+                 zooms: Iterable[int] = ZOOMS,
+                 watermarks: Optional[Dict[str, Optional[datetime.datetime]]] = None,
+                 digests: Optional[Dict[str, str]] = None):
+        '''
+        per-author tile state plus the aggregation into cells; use "load_or_empty", then "update"/"update_from_db"
+
+        :param state: per-author arrays (see _STATE_ARRAYS); tx/ty are tile coordinates at the max zoom
+        :param zooms: zoom levels to aggregate to
+        :param watermarks: max pound.updated_at ('updated_at') and birth_place_locs.geocoded_at ('geocoded_at') read so far
+        :param digests: sha1 of each zoom file's content, as last written
+        '''
+        self.zooms = sorted(zooms)
+        self.max_zoom = self.zooms[-1]
+        self.state = state if state is not None else self._empty_state()
+        self.watermarks = watermarks or {'updated_at': None, 'geocoded_at': None}
+        self.digests = digests or {}
+
+    @staticmethod
+    def _empty_state() -> Dict[str, np.ndarray]:
+        return {
+            'author_id': np.zeros(0, dtype=np.int64),
+            'tx': np.zeros(0, dtype=np.uint32),
+            'ty': np.zeros(0, dtype=np.uint32),
+            'lat': np.zeros(0, dtype=np.float32),
+            'lon': np.zeros(0, dtype=np.float32),
+            'rating_count': np.zeros(0, dtype=np.int64),
+            'genre': np.zeros(0, dtype=np.int16),
+            'gender': np.zeros(0, dtype=np.int8)
+        }
+
+    @property
+    def num_authors(self) -> int:
+        return len(self.state['author_id'])
+
+    def update(self,
+               rows: Iterable[Tuple[Any, ...]],
+               taxonomy: GenreTaxonomy) -> int:
+        '''
+        apply (author ID, lat, lon, rating count, top genre, g_comp, updated_at, geocoded_at) rows; returns number applied
+
+        :param rows: iterable of rows; authors without lat/lon are dropped from the state
+        :param taxonomy: to classify top genres into broad genres
+        '''
+        genre_codes = {lab: i for i, lab in enumerate(GENRE_LABELS)}
+        gender_codes = {lab: i for i, lab in enumerate(GENDER_LABELS)}
+        ids, lat, lon, rc, genre, gender = [], [], [], [], [], []
+        dropped = []
+        num_rows = 0
+        for author_id, r_lat, r_lon, r_rc, top_genre, g_comp, updated_at, geocoded_at in rows:
+            num_rows += 1
+            for key, ts in (('updated_at', updated_at), ('geocoded_at', geocoded_at)):
+                if ts is not None and (self.watermarks[key] is None or ts > self.watermarks[key]):
+                    self.watermarks[key] = ts
+            if r_lat is None or r_lon is None:
+                dropped.append(int(author_id))
+                continue
+            ids.append(int(author_id))
+            lat.append(r_lat)
+            lon.append(r_lon)
+            rc.append(r_rc or 0)
+            genre.append(genre_codes[taxonomy.classify(top_genre)] if top_genre else -1)
+            gender.append(gender_codes.get(g_comp, gender_codes['NA']))
+        if not num_rows:
+            return 0
+
+        # replace: drop the old rows of every author in the batch (located or not), then append
+        new_ids = np.asarray(ids, dtype=np.int64)
+        touched = np.concatenate([new_ids, np.asarray(dropped, dtype=np.int64)])
+        keep = ~np.isin(self.state['author_id'], touched)
+        tx, ty = tile_xy(np.asarray(lat), np.asarray(lon), self.max_zoom)
+        new = {
+            'author_id': new_ids,
+            'tx': tx,
+            'ty': ty,
+            'lat': np.asarray(lat, dtype=np.float32),
+            'lon': np.asarray(lon, dtype=np.float32),
+            'rating_count': np.asarray(rc, dtype=np.int64),
+            'genre': np.asarray(genre, dtype=np.int16),
+            'gender': np.asarray(gender, dtype=np.int8)
+        }
+        # the same author can show up twice in a batch; last one wins
+        _, last = np.unique(new_ids[::-1], return_index=True)
+        last = len(new_ids) - 1 - last
+        self.state = {k: np.concatenate([self.state[k][keep], new[k][last]]) for k in _STATE_ARRAYS}
+        return num_rows
+
+    def update_from_db(self,
+                       conn: psycopg.Connection,
+                       taxonomy: GenreTaxonomy,
+                       lookback: datetime.timedelta = datetime.timedelta(minutes=5),
+                       batch_rows: int = 50_000) -> int:
+        '''
+        apply authors updated, or geocoded, since the watermarks (all located authors, if there are none); returns number of rows applied
+
+        :param conn: a psycopg connection (NOT autocommit; server-side cursors need a transaction)
+        :param taxonomy: to classify top genres into broad genres
+        :param lookback: re-read rows this far behind the watermarks, to catch rows committed late
+        :param batch_rows: rows fetched per round trip
+        '''
+        conds, params = [], []
+        for col, key in (('pound.updated_at', 'updated_at'), ('birth_place_locs.geocoded_at', 'geocoded_at')):
+            if self.watermarks[key] is not None:
+                conds.append(f'{col} > %s')
+                params.append(self.watermarks[key] - lookback)
+            else:
+                # e.g., no location had a geocoded_at yet at the last build (they were all from before 020)
+                conds.append(f'{col} IS NOT NULL')
+        if self.num_authors:
+            where = 'WHERE ' + ' OR '.join(conds)
+        else:
+            # first build: located authors only
+            where = 'WHERE birth_place_locs.lat IS NOT NULL'
+            params = []
+        with conn.transaction():
+            with conn.cursor(name='g2k_geo_tiles') as cur:
+                cur.itersize = batch_rows
+                cur.execute(_ROWS_QUERY.format(where=where), params or None)
+                return self.update(cur, taxonomy)
+
+    def aggregate(self,
+                  z: int) -> Dict[str, Any]:
+        '''
+        returns the cells at zoom level z, as a columnar dict (see the module docstring)
+
+        :param z: one of the zoom levels
+        '''
+        s = self.state
+        shift = self.max_zoom - z
+        cx, cy = s['tx'] >> shift, s['ty'] >> shift
+        keys = (cx.astype(np.uint64) << np.uint64(32)) | cy.astype(np.uint64)
+        cells, inv, n = np.unique(keys, return_inverse=True, return_counts=True)
+        num_cells = len(cells)
+
+        genre_mix = np.zeros((num_cells, len(GENRE_LABELS)), dtype=np.int64)
+        has_genre = s['genre'] >= 0
+        np.add.at(genre_mix, (inv[has_genre], s['genre'][has_genre]), 1)
+        gender_split = np.zeros((num_cells, len(GENDER_LABELS)), dtype=np.int64)
+        np.add.at(gender_split, (inv, s['gender']), 1)
+
+        return {
+            'z': z,
+            'x': (cells >> np.uint64(32)).astype(np.int64).tolist(),
+            'y': (cells & np.uint64(0xFFFFFFFF)).astype(np.int64).tolist(),
+            'n': n.tolist(),
+            'lat': np.round(np.bincount(inv, weights=s['lat'], minlength=num_cells) / np.maximum(n, 1), 4).tolist(),
+            'lon': np.round(np.bincount(inv, weights=s['lon'], minlength=num_cells) / np.maximum(n, 1), 4).tolist(),
+            'rc': np.bincount(inv, weights=s['rating_count'], minlength=num_cells).astype(np.int64).tolist(),
+            'genre': genre_mix.tolist(),
+            'gender': gender_split.tolist()
+        }
+
+    def save(self,
+             path: str) -> List[int]:
+        '''
+        write the state, meta.json, and every zoom file whose content changed; returns the zoom levels written
+
+        :param path: output directory
+        '''
+        state_dir = os.path.join(path, 'state')
+        os.makedirs(state_dir, exist_ok=True)
+        for name in _STATE_ARRAYS:
+            np.save(os.path.join(state_dir, f'{name}.npy'), self.state[name])
+
+        written = []
+        for z in self.zooms:
+            # compact separators; the per-cell arrays compress well
+            payload = json.dumps(self.aggregate(z), separators=(',', ':')).encode()
+            digest = hashlib.sha1(payload).hexdigest()
+            f_name = os.path.join(path, f'z{z}.json')
+            if self.digests.get(str(z)) == digest and os.path.exists(f_name):
+                continue
+            with open(f_name, 'wb') as f:
+                f.write(payload)
+            with gzip.open(f'{f_name}.gz', 'wb', compresslevel=9) as f:
+                f.write(payload)
+            self.digests[str(z)] = digest
+            written.append(z)
+
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'zooms': self.zooms,
+                       'genres': GENRE_LABELS,
+                       'genders': GENDER_LABELS,
+                       'num_authors': self.num_authors,
+                       'watermarks': {k: v.isoformat() if v else None for k, v in self.watermarks.items()},
+                       'digests': self.digests}, f, indent=4)
+        return written
+
+    @classmethod
+    def load_or_empty(cls,
+                      path: str,
+                      zooms: Iterable[int] = ZOOMS) -> 'GeoTiles':
+        '''
+        load the saved state from path, or start empty; changing the zooms (or the genre labels) starts over
+
+        :param path: output directory
+        :param zooms: zoom levels to aggregate to
+        '''
+        meta_f = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_f):
+            return cls(zooms=zooms)
+        with open(meta_f, 'r') as f:
+            meta = json.load(f)
+        if meta['zooms'] != sorted(zooms) or meta['genres'] != GENRE_LABELS:
+            return cls(zooms=zooms)
+        state = {name: np.load(os.path.join(path, 'state', f'{name}.npy')) for name in _STATE_ARRAYS}
+        watermarks = {k: datetime.datetime.fromisoformat(v) if v else None for k, v in meta['watermarks'].items()}
+        return cls(state=state, zooms=zooms, watermarks=watermarks, digests=meta['digests'])
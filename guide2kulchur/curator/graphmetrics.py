@@ -0,0 +1,315 @@
+'''
+precomputed metrics over the full sim_books / sim_authors graphs: in-degree, PageRank and Louvain community.
+
+computed once per graph build (see simgraph.py), then stored two ways:
+    - .npy arrays in <graph dir>/metrics/, aligned with the graph's node order and memory-mapped on load;
+      used by the visuals (node colors/sizes) and the crawl frontier (see "RankBoost").
+      SimGraph.save deletes them, and "load_for" skips metrics computed on a different graph
+    - the graph_metrics table, for anything that would rather join in SQL
+
+    graph = SimGraph.load('data/simgraph/author')
+    metrics = compute_metrics(graph)
+    metrics.save('data/simgraph/author')
+    write_metrics_table(conn, graph, metrics)
+'''
+
+import os
+import json
+import math
+import datetime
+from typing import (Dict,
+                    List,
+                    Optional,
+                    Iterable,
+                    Any)
+
+import numpy as np
+import networkx as nx
+import psycopg
+
+from guide2kulchur.curator.simgraph import SimGraph, METRICS_SUBDIR
+
+
+_METRIC_ARRAYS = ('in_degree', 'pagerank', 'community')
+
+
+def in_degree(graph: SimGraph) -> np.ndarray:
+    '''returns the number of items listing each node as similar'''
+    return np.diff(np.asarray(graph.rindptr)).astype(np.int32)
+
+
+def pagerank(graph: SimGraph,
+             damping: float = 0.85,
+             tol: float = 1e-10,
+             max_iter: int = 100) -> np.ndarray:
+    '''
+    returns PageRank over the sim edges, by power iteration on the CSR arrays
+
+    :param graph: a SimGraph
+    :param damping: probability of following an edge (vs. jumping to a random node)
+    :param tol: stop once the L1 change between iterations drops below this
+    :param max_iter: max number of iterations
+
+    nodes with no out-edges (e.g., items not pulled yet) spread their rank uniformly; ranks sum to 1
+    '''
+    n = graph.num_nodes
+    if not n:
+        return np.array([], dtype=np.float64)
+    indptr, indices = np.asarray(graph.indptr), np.asarray(graph.indices)
+    out_deg = np.diff(indptr)
+    dangling = out_deg == 0
+    inv_deg = np.zeros(n, dtype=np.float64)
+    inv_deg[~dangling] = 1.0 / out_deg[~dangling]
+
+    x = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        # every node hands x/out-degree to each of its similar items
+        contrib = np.repeat(x * inv_deg, out_deg)
+        x_new = np.bincount(indices, weights=contrib, minlength=n) * damping
+        x_new += (damping * x[dangling].sum() + (1 - damping)) / n
+        err = np.abs(x_new - x).sum()
+        x = x_new
+        if err < tol:
+            break
+    return x
+
+
+def louvain(graph: SimGraph,
+            resolution: float = 1.0,
+            seed: Optional[int] = 0) -> np.ndarray:
+    '''
+    returns a Louvain community ID per node (sim edges taken as undirected); -1 for isolated nodes
+
+    :param graph: a SimGraph
+    :param resolution: higher values favor smaller communities
+    :param seed: random seed, so community IDs are stable across reruns of the same graph
+
+    communities are numbered by size, largest first
+    '''
+    n = graph.num_nodes
+    indptr, indices = np.asarray(graph.indptr), np.asarray(graph.indices)
+    src = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+    gr = nx.Graph()
+    gr.add_edges_from(zip(src.tolist(), indices.tolist()))
+    comms = nx.community.louvain_communities(gr, resolution=resolution, seed=seed)
+
+    community = np.full(n, -1, dtype=np.int32)
+    for comm_id, members in enumerate(sorted(comms, key=len, reverse=True)):
+        community[list(members)] = comm_id
+    return community
+
+
+class GraphMetrics:
+    def __init__(self,
+                 in_degree: np.ndarray,
+                 pagerank: np.ndarray,
+                 community: np.ndarray,
+                 meta: Optional[Dict[str, Any]] = None):
+        '''
+        per-node metrics, aligned with a SimGraph's node order
+
+        :param in_degree: number of items listing the node as similar
+        :param pagerank: PageRank (sums to 1)
+        :param community: Louvain community ID; -1 for isolated nodes
+        :param meta: info on the computation (item type, params, time)
+        '''
+        self.in_degree = in_degree
+        self.pagerank = pagerank
+        self.community = community
+        self.meta = meta or {}
+
+    def save(self,
+             graph_path: str) -> None:
+        '''
+        save the arrays under <graph_path>/metrics/
+
+        :param graph_path: directory the graph was saved to
+        '''
+        path = os.path.join(graph_path, METRICS_SUBDIR)
+        os.makedirs(path, exist_ok=True)
+        for name in _METRIC_ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=4)
+
+    def matches(self,
+                graph: SimGraph) -> bool:
+        '''
+        returns whether the metrics were computed on this graph (same node count, edge count and, if
+        both were saved with one, the same fingerprint); metrics of any other graph are misaligned
+
+        :param graph: a SimGraph
+        '''
+        if any(len(getattr(self, name)) != graph.num_nodes for name in _METRIC_ARRAYS):
+            return False
+        if (self.meta.get('num_nodes'), self.meta.get('num_edges')) != (graph.num_nodes, graph.num_edges):
+            return False
+        fingerprint = self.meta.get('fingerprint')
+        return fingerprint is None or fingerprint == graph.fingerprint()
+
+    @classmethod
+    def load(cls,
+             graph_path: str,
+             mmap: bool = True,
+             graph: Optional[SimGraph] = None) -> 'GraphMetrics':
+        '''
+        load saved metrics
+
+        :param graph_path: directory the graph (and its metrics) was saved to
+        :param mmap: memory-map the arrays (read-only) instead of reading them into memory
+        :param graph: the graph the metrics are for; raises ValueError if they were computed on another one
+        '''
+        path = os.path.join(graph_path, METRICS_SUBDIR)
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                  for name in _METRIC_ARRAYS}
+        metrics = cls(meta=meta, **arrays)
+        if graph is not None and not metrics.matches(graph):
+            raise ValueError(f'metrics in {path} were computed on a different graph; '
+                             'rerun scripts/supplements/compute_graph_metrics.py')
+        return metrics
+
+    @classmethod
+    def load_for(cls,
+                 graph_path: str,
+                 graph: SimGraph,
+                 mmap: bool = True) -> Optional['GraphMetrics']:
+        '''
+        returns the saved metrics of a graph, or None if there are none, or they're stale
+
+        :param graph_path: directory the graph (and its metrics) was saved to
+        :param graph: the graph loaded from graph_path
+        :param mmap: memory-map the arrays (read-only) instead of reading them into memory
+        '''
+        if not cls.exists(graph_path):
+            return None
+        metrics = cls.load(graph_path, mmap=mmap)
+        return metrics if metrics.matches(graph) else None
+
+    @staticmethod
+    def exists(graph_path: str) -> bool:
+        '''returns whether metrics were saved for the graph at graph_path'''
+        return os.path.exists(os.path.join(graph_path, METRICS_SUBDIR, 'meta.json'))
+
+
+def compute_metrics(graph: SimGraph,
+                    damping: float = 0.85,
+                    resolution: float = 1.0,
+                    seed: Optional[int] = 0) -> GraphMetrics:
+    '''
+    compute in-degree, PageRank and Louvain communities for a graph
+
+    :param graph: a SimGraph
+    :param damping: PageRank damping factor
+    :param resolution: Louvain resolution
+    :param seed: Louvain random seed
+    '''
+    return GraphMetrics(in_degree=in_degree(graph),
+                        pagerank=pagerank(graph, damping=damping),
+                        community=louvain(graph, resolution=resolution, seed=seed),
+                        meta={'item_type': graph.item_type,
+                              'num_nodes': graph.num_nodes,
+                              'num_edges': graph.num_edges,
+                              'fingerprint': graph.fingerprint(),
+                              'damping': damping,
+                              'resolution': resolution,
+                              'seed': seed,
+                              'computed_at': datetime.datetime.now(datetime.timezone.utc).isoformat()})
+
+
+def write_metrics_table(conn: psycopg.Connection,
+                        graph: SimGraph,
+                        metrics: GraphMetrics) -> int:
+    '''
+    replace a graph's rows in the graph_metrics table (see db/migrations/016); returns number of rows written
+
+    :param conn: a psycopg connection
+    :param graph: the SimGraph the metrics were computed on
+    :param metrics: its GraphMetrics
+    '''
+    ids = np.asarray(graph.ids)
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute('DELETE FROM graph_metrics WHERE item_type = %s', (graph.item_type,))
+            with cur.copy('COPY graph_metrics (item_id, item_type, in_degree, pagerank, community) FROM STDIN') as cp:
+                for i in range(len(ids)):
+                    cp.write_row((str(ids[i]),
+                                  graph.item_type,
+                                  int(metrics.in_degree[i]),
+                                  float(metrics.pagerank[i]),
+                                  int(metrics.community[i]) if metrics.community[i] >= 0 else None))
+    return len(ids)
+
+
+def node_metrics(graph: SimGraph,
+                 metrics: GraphMetrics,
+                 item_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    '''
+    returns {ID: {'community', 'pagerank', 'in_degree'}} for the IDs found in the graph
+
+    :param graph: a SimGraph
+    :param metrics: its GraphMetrics
+    :param item_ids: Goodreads IDs to look up
+    '''
+    out = {}
+    for id_ in item_ids:
+        idx = graph.index_of(id_)
+        if idx is None:
+            continue
+        out[id_] = {'community': int(metrics.community[idx]),
+                    'pagerank': float(metrics.pagerank[idx]),
+                    'in_degree': int(metrics.in_degree[idx])}
+    return out
+
+
+class RankBoost:
+    '''scales frontier priorities by a graph's PageRank; pass to Frontier(rank_boost=...)'''
+    def __init__(self,
+                 graphs: Dict[str, SimGraph],
+                 metrics: Dict[str, GraphMetrics]):
+        '''
+        :param graphs: item type -> SimGraph
+        :param metrics: item type -> GraphMetrics of that graph
+        '''
+        self.graphs = graphs
+        self.metrics = metrics
+
+    @classmethod
+    def load(cls,
+             graph_dir: str) -> 'RankBoost':
+        '''
+        load every graph (with up-to-date saved metrics) under graph_dir, e.g. data/simgraph/{book,author};
+        graphs whose metrics are stale are skipped, so their IDs get a factor of 1
+
+        :param graph_dir: parent directory of the saved graphs
+        '''
+        graphs, metrics = {}, {}
+        if os.path.isdir(graph_dir):
+            for item_type in os.listdir(graph_dir):
+                path = os.path.join(graph_dir, item_type)
+                if GraphMetrics.exists(path):
+                    graph = SimGraph.load(path)
+                    if (graph_metrics := GraphMetrics.load_for(path, graph)) is not None:
+                        graphs[item_type], metrics[item_type] = graph, graph_metrics
+        return cls(graphs, metrics)
+
+    def factors(self,
+                item_type: str,
+                ids: List[str]) -> List[float]:
+        '''
+        returns a priority multiplier per ID: 1 + ln(1 + n * PageRank), so an average node gets ~1.7,
+        and IDs not in the graph (or item types without one) get 1
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param ids: Goodreads item IDs
+        '''
+        graph, metrics = self.graphs.get(item_type), self.metrics.get(item_type)
+        if graph is None:
+            return [1.0] * len(ids)
+        n = graph.num_nodes
+        out = []
+        for id_ in ids:
+            idx = graph.index_of(id_)
+            out.append(1 + math.log1p(n * float(metrics.pagerank[idx])) if idx is not None else 1.0)
+        return out
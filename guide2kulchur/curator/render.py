@@ -0,0 +1,232 @@
+'''
+rendering the per-item similarity networks (ipysigma HTML pages) in bulk.
+
+the graph is built/saved once (see simgraph.py); each worker process memory-maps the same
+saved arrays, so the OS shares the pages between them, and the ego-graph extraction plus
+Sigma HTML export for each item runs in whichever worker picks it up. styling is injected
+before the file is written, so each page is written exactly once.
+
+if the graph's metrics have been computed (see graphmetrics.py), nodes are colored by their
+precomputed Louvain community, instead of having Louvain rerun in the browser for every page.
+'''
+
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import (Any,
+                    Dict,
+                    Iterable,
+                    List,
+                    Optional)
+
+import networkx as nx
+from ipysigma import Sigma
+from ipywidgets.embed import embed_minimal_html
+
+from guide2kulchur.curator.simgraph import SimGraph
+from guide2kulchur.curator.graphmetrics import GraphMetrics, node_metrics
+
+
+# same look as the pages 06_graph_1item.py has always written
+DEFAULT_SIGMA_KWARGS = {
+    'start_layout': 30,
+    'node_metrics': {"similarity": "louvain"},
+    'node_color': "similarity",
+    'node_color_palette': 'Pastel1',
+    'node_size_range': (5, 25),
+    'max_categorical_colors': 30,
+    'default_edge_type': 'curve',
+    'label_font': "cursive",
+    'default_edge_color': "#E8E6E6FF",
+    'node_border_color_from': 'node',
+    'node_label_size_range': (15, 35),
+    'default_node_label_color': "#000000",
+    'hide_edges_on_move': True,
+    'hide_info_panel': True
+}
+
+
+def sigma_html(gr: nx.Graph,
+               title: str,
+               styling: str = '',
+               fullscreen: bool = True,
+               **sigma_kwargs) -> str:
+    '''
+    returns the Sigma HTML page for a graph, with the title and styling already in place
+
+    :param gr: a networkx graph
+    :param title: page title
+    :param styling: <style> block to put right after the title
+    :param fullscreen: size the widget to the window (as Sigma.write_html(fullscreen=True) does)
+    :param sigma_kwargs: passed to Sigma; node_size/node_label_size default to the node degree
+    '''
+    if fullscreen:
+        sigma_kwargs['height'] = None
+        sigma_kwargs['raw_height'] = 'calc(100vh - 16px)'
+    sigma_kwargs.setdefault('node_size', gr.degree)
+    sigma_kwargs.setdefault('node_label_size', gr.degree)
+    widget = Sigma(gr, **sigma_kwargs)
+    # snapshot data unnecessarily adds weight (same as Sigma.to_html)
+    widget.snapshot = None
+
+    buf = io.StringIO()
+    embed_minimal_html(buf, views=[widget], title=title)
+    html = buf.getvalue()
+    return html.replace('</title>', f'</title>\n{styling}\n', 1) if styling else html
+
+
+def write_sigma_html(gr: nx.Graph,
+                     path: str,
+                     title: str,
+                     styling: str = '',
+                     fullscreen: bool = True,
+                     **sigma_kwargs) -> None:
+    '''
+    write the Sigma HTML page for a graph in a single write (temp file + rename)
+
+    :param gr: a networkx graph
+    :param path: output file
+    :param title: page title
+    :param styling: <style> block to put right after the title
+    :param fullscreen: size the widget to the window
+    :param sigma_kwargs: passed to Sigma
+    '''
+    html = sigma_html(gr, title=title, styling=styling, fullscreen=fullscreen, **sigma_kwargs)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(html)
+    os.replace(tmp_path, path)
+
+
+def ego_nx_graph(sim_graph: SimGraph,
+                 item_id: str,
+                 hops: int = 1,
+                 min_rating_count: int = 0) -> nx.Graph:
+    '''
+    returns the networkx graph of an item's neighborhood, with labels on the nodes that have them
+
+    :param sim_graph: a SimGraph
+    :param item_id: Goodreads book/author ID of the center
+    :param hops: number of hops out
+    :param min_rating_count: drop neighbors with fewer ratings
+    '''
+    nodes, edges = sim_graph.ego_graph(item_id, hops=hops, min_rating_count=min_rating_count)
+    gr = nx.Graph()
+    gr.add_edges_from(edges)
+    for node_id, node_label in nodes:
+        if node_label:
+            gr.add_node(node_id, label=node_label)
+        else:
+            gr.add_node(node_id)
+    return gr
+
+
+def apply_node_metrics(gr: nx.Graph,
+                       sim_graph: SimGraph,
+                       metrics: GraphMetrics) -> Dict[str, Any]:
+    '''
+    set the precomputed community ("similarity") and pagerank attributes on a graph's nodes;
+    returns the Sigma kwargs to use them, in place of node_metrics={"similarity": "louvain"}
+
+    :param gr: a networkx graph, with Goodreads IDs as nodes
+    :param sim_graph: the SimGraph the metrics were computed on
+    :param metrics: its GraphMetrics
+    '''
+    for node_id, m in node_metrics(sim_graph, metrics, list(gr.nodes)).items():
+        if m['community'] >= 0:
+            gr.nodes[node_id]['similarity'] = f'community {m['community']}'
+        gr.nodes[node_id]['pagerank'] = m['pagerank']
+    return {'node_metrics': None}
+
+
+def item_file_name(file_prefix: str,
+                   item_name: str) -> str:
+    '''returns the page's file name, e.g. "pnd_1item_plato.html"'''
+    slug = item_name.replace(' ', '-').lower().replace(os.sep, '-')
+    return f'{file_prefix}_1item_{slug}.html'
+
+
+# per-worker state; set once by _init_worker
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(graph_path: str,
+                 cfg: Dict[str, Any]) -> None:
+    '''load the saved graph (memory-mapped) once per worker process'''
+    _WORKER['graph'] = SimGraph.load(graph_path, mmap=True)
+    _WORKER['metrics'] = GraphMetrics.load_for(graph_path, _WORKER['graph']) if cfg['use_metrics'] else None
+    _WORKER['cfg'] = cfg
+
+
+def _render_one(item_id: str) -> Dict[str, Any]:
+    '''render one item's page; errors are returned, not raised, so one bad item doesn't stop the rest'''
+    sim_graph, cfg = _WORKER['graph'], _WORKER['cfg']
+    res = {'item_id': item_id, 'out_file': None, 'nodes': 0, 'edges': 0, 'error': None}
+    try:
+        idx = sim_graph.index_of(item_id)
+        item_name = sim_graph.label(idx) if idx is not None else None
+        if not item_name:
+            res['error'] = 'not in database'
+            return res
+        gr = ego_nx_graph(sim_graph, item_id, hops=cfg['hops'], min_rating_count=cfg['min_rating_count'])
+        sigma_kwargs = dict(cfg['sigma_kwargs'])
+        if _WORKER['metrics'] is not None:
+            sigma_kwargs.update(apply_node_metrics(gr, sim_graph, _WORKER['metrics']))
+        out_file = os.path.join(cfg['out_dir'], item_file_name(cfg['file_prefix'], item_name))
+        write_sigma_html(gr,
+                         path=out_file,
+                         title=cfg['title_fmt'].format(name=item_name),
+                         styling=cfg['styling'],
+                         **sigma_kwargs)
+        res.update(out_file=out_file, nodes=gr.number_of_nodes(), edges=gr.number_of_edges())
+    except Exception as er:
+        res['error'] = f'{type(er).__name__}: {er}'
+    return res
+
+
+def render_ego_networks(graph_path: str,
+                        item_ids: Iterable[str],
+                        out_dir: str,
+                        file_prefix: str,
+                        styling: str = '',
+                        title_fmt: str = 'Network of {name}',
+                        hops: int = 1,
+                        min_rating_count: int = 0,
+                        sigma_kwargs: Optional[Dict[str, Any]] = None,
+                        max_workers: Optional[int] = None,
+                        chunksize: int = 8,
+                        use_metrics: bool = True) -> List[Dict[str, Any]]:
+    '''
+    render an ego-network page per item, fanned out over a process pool
+
+    :param graph_path: directory of a saved SimGraph
+    :param item_ids: Goodreads IDs to render
+    :param out_dir: directory to write the pages to
+    :param file_prefix: page name prefix ('pnd' for authors, 'alx' for books)
+    :param styling: <style> block injected after each page's title
+    :param title_fmt: page title, with {name} as the item's title/name
+    :param hops: number of hops out from each item
+    :param min_rating_count: drop neighbors with fewer ratings
+    :param sigma_kwargs: Sigma options; defaults to DEFAULT_SIGMA_KWARGS
+    :param max_workers: worker processes; defaults to os.cpu_count()
+    :param chunksize: items handed to a worker at a time
+    :param use_metrics: color nodes by the precomputed communities, if the graph has metrics saved
+
+    returns one dict per item: item_id, out_file, nodes, edges, error (None on success)
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    cfg = {
+        'out_dir': out_dir,
+        'file_prefix': file_prefix,
+        'styling': styling,
+        'title_fmt': title_fmt,
+        'hops': hops,
+        'min_rating_count': min_rating_count,
+        'use_metrics': use_metrics,
+        'sigma_kwargs': sigma_kwargs if sigma_kwargs is not None else DEFAULT_SIGMA_KWARGS
+    }
+    item_ids = list(dict.fromkeys(str(i) for i in item_ids))
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=_init_worker,
+                             initargs=(graph_path, cfg)) as pool:
+        return list(pool.map(_render_one, item_ids, chunksize=chunksize))
@@ -0,0 +1,344 @@
+'''
+the sim_books / sim_authors graph, held in integer-indexed CSR arrays.
+
+every book/author (plus any ID only seen inside a sim array) gets a node index; its similar
+items are indices[indptr[i]:indptr[i+1]], and the reverse edges ("who lists i as similar")
+live in rindptr/rindices. rating counts and labels are stored alongside, so an ego network
+("neighbors of X plus the edges among them, filtered by rating_count") is a few array slices,
+with no db round trips.
+
+the arrays are saved as .npy files in one directory per item type, and memory-mapped on load:
+
+    graph = SimGraph.from_db(conn, 'author')
+    graph.save('data/simgraph/author')
+    ...
+    graph = SimGraph.load('data/simgraph/author')
+    nodes, edges = graph.ego_graph('879', hops=1, min_rating_count=1000)
+'''
+
+import os
+import json
+import shutil
+import hashlib
+from array import array
+from typing import (Dict,
+                    Iterable,
+                    List,
+                    Optional,
+                    Tuple)
+
+import numpy as np
+import psycopg
+import duckdb
+
+from guide2kulchur.curator.export import latest_rows_sql
+
+
+# item type -> (table, id column, label column, sim column)
+GRAPH_CFG = {
+    'book': ('alexandria', 'book_id', 'title', 'sim_books'),
+    'author': ('pound', 'author_id', 'author_name', 'sim_authors'),
+}
+
+_ARRAYS = ('ids', 'indptr', 'indices', 'rindptr', 'rindices', 'rating_count', 'label_offsets', 'label_bytes')
+
+_NO_RATINGS = -1    # rating count for nodes only seen in sim arrays (not in the table)
+
+# precomputed metrics live in here (see graphmetrics.py); they're aligned with the node order of the
+# graph they were computed on, so saving a new graph over the directory drops them
+METRICS_SUBDIR = 'metrics'
+
+
+def _as_int(id_: Optional[str]) -> Optional[int]:
+    '''returns ID string as int, or None if it isn't a plain integer ID'''
+    try:
+        return int(id_)
+    except (TypeError, ValueError):
+        return None
+
+
+def _csr(src: np.ndarray,
+         dst: np.ndarray,
+         n: int) -> Tuple[np.ndarray, np.ndarray]:
+    '''returns (indptr, indices) for edges src -> dst over n nodes; neighbors are sorted'''
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32)
+
+
+class SimGraph:
+    def __init__(self,
+                 ids: np.ndarray,
+                 indptr: np.ndarray,
+                 indices: np.ndarray,
+                 rindptr: np.ndarray,
+                 rindices: np.ndarray,
+                 rating_count: np.ndarray,
+                 label_offsets: np.ndarray,
+                 label_bytes: np.ndarray,
+                 item_type: Optional[str] = None):
+        '''
+        similarity graph in CSR form; use "from_rows", "from_db", "from_parquet" or "load"
+
+        :param ids: sorted Goodreads IDs (int64); node i is ids[i]
+        :param indptr: out-edge offsets (n + 1)
+        :param indices: out-edge targets (node indices)
+        :param rindptr: in-edge offsets (n + 1)
+        :param rindices: in-edge sources (node indices)
+        :param rating_count: rating count per node; -1 for nodes not in the table
+        :param label_offsets: offsets into label_bytes (n + 1)
+        :param label_bytes: utf-8 labels (title / author name), concatenated
+        :param item_type: 'book' or 'author'
+        '''
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.rindptr = rindptr
+        self.rindices = rindices
+        self.rating_count = rating_count
+        self.label_offsets = label_offsets
+        self.label_bytes = label_bytes
+        self.item_type = item_type
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    def fingerprint(self) -> str:
+        '''returns a hash of the node IDs and out-edges; stored with the graph (and its metrics) on save'''
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            for arr in (self.ids, self.indptr, self.indices):
+                digest.update(np.ascontiguousarray(arr).data)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @classmethod
+    def from_rows(cls,
+                  rows: Iterable[Tuple[str, Optional[int], Optional[str], Optional[List[str]]]],
+                  item_type: Optional[str] = None) -> 'SimGraph':
+        '''
+        build the graph from (item ID, rating count, label, sim IDs) rows
+
+        :param rows: iterable of rows; consumed once, so a server-side cursor works
+        :param item_type: 'book' or 'author'
+        '''
+        row_ids, row_rc = array('q'), array('q')
+        labels: Dict[int, str] = {}
+        src, dst = array('q'), array('q')
+        for item_id, rc, label, sims in rows:
+            i = _as_int(item_id)
+            if i is None:
+                continue
+            row_ids.append(i)
+            row_rc.append(rc if rc is not None else _NO_RATINGS)
+            if label:
+                labels[i] = label
+            for s in sims or ():
+                s_int = _as_int(s)
+                if s_int is not None and s_int != i:
+                    src.append(i)
+                    dst.append(s_int)
+
+        row_ids = np.frombuffer(row_ids, dtype=np.int64)
+        src = np.frombuffer(src, dtype=np.int64)
+        dst = np.frombuffer(dst, dtype=np.int64)
+        ids = np.unique(np.concatenate([row_ids, dst]))
+        n = len(ids)
+
+        src_idx = np.searchsorted(ids, src)
+        dst_idx = np.searchsorted(ids, dst)
+        # duplicates in a sim array would otherwise show up as parallel edges
+        if len(src_idx):
+            pairs = np.unique(src_idx * n + dst_idx)
+            src_idx, dst_idx = pairs // n, pairs % n
+        indptr, indices = _csr(src_idx, dst_idx, n)
+        rindptr, rindices = _csr(dst_idx, src_idx, n)
+
+        rating_count = np.full(n, _NO_RATINGS, dtype=np.int64)
+        rating_count[np.searchsorted(ids, row_ids)] = np.frombuffer(row_rc, dtype=np.int64)
+
+        encoded = [labels.get(int(i), '').encode('utf-8') for i in ids]
+        label_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=label_offsets[1:])
+        label_bytes = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        return cls(ids=ids, indptr=indptr, indices=indices, rindptr=rindptr, rindices=rindices,
+                   rating_count=rating_count, label_offsets=label_offsets, label_bytes=label_bytes,
+                   item_type=item_type)
+
+    @classmethod
+    def from_db(cls,
+                conn: psycopg.Connection,
+                item_type: str,
+                batch_rows: int = 50_000) -> 'SimGraph':
+        '''
+        build the graph from the live db, streaming rows through a server-side cursor
+
+        :param conn: a psycopg connection (NOT autocommit; server-side cursors need a transaction)
+        :param item_type: 'book' or 'author'
+        :param batch_rows: rows fetched per round trip
+        '''
+        table, id_col, label_col, sim_col = GRAPH_CFG[item_type]
+        with conn.transaction():
+            with conn.cursor(name=f'g2k_simgraph_{item_type}') as cur:
+                cur.itersize = batch_rows
+                cur.execute(f'SELECT {id_col}, rating_count, {label_col}, {sim_col} FROM {table}')
+                return cls.from_rows(cur, item_type=item_type)
+
+    @classmethod
+    def from_parquet(cls,
+                     parquet_dir: str,
+                     item_type: str) -> 'SimGraph':
+        '''
+        build the graph from the Parquet export (see export.py)
+
+        :param parquet_dir: export directory
+        :param item_type: 'book' or 'author'
+        '''
+        table, id_col, label_col, sim_col = GRAPH_CFG[item_type]
+        con = duckdb.connect()
+        try:
+            res = con.execute(f'''
+                              SELECT {id_col}, rating_count, {label_col}, {sim_col}
+                              FROM ({latest_rows_sql(parquet_dir, table)})
+                              ''')
+            rows = (r for batch in iter(lambda: res.fetchmany(50_000), []) for r in batch)
+            return cls.from_rows(rows, item_type=item_type)
+        finally:
+            con.close()
+
+    def save(self,
+             path: str) -> None:
+        '''
+        save the arrays as .npy files under path; metrics saved there for a previous graph are deleted
+
+        :param path: directory to save to
+        '''
+        os.makedirs(path, exist_ok=True)
+        shutil.rmtree(os.path.join(path, METRICS_SUBDIR), ignore_errors=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'item_type': self.item_type,
+                       'num_nodes': self.num_nodes,
+                       'num_edges': self.num_edges,
+                       'fingerprint': self.fingerprint()}, f, indent=4)
+
+    @classmethod
+    def load(cls,
+             path: str,
+             mmap: bool = True) -> 'SimGraph':
+        '''
+        load a saved graph
+
+        :param path: directory the graph was saved to
+        :param mmap: memory-map the arrays (read-only) instead of reading them into memory
+        '''
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                  for name in _ARRAYS}
+        graph = cls(item_type=meta.get('item_type'), **arrays)
+        graph._fingerprint = meta.get('fingerprint')    # graphs saved before fingerprints get one computed, if asked
+        return graph
+
+    def index_of(self,
+                 item_id: str) -> Optional[int]:
+        '''
+        returns the node index of a Goodreads ID, or None if it isn't in the graph
+
+        :param item_id: Goodreads book/author ID
+        '''
+        i = _as_int(item_id)
+        if i is None:
+            return None
+        idx = int(np.searchsorted(self.ids, i))
+        return idx if idx < len(self.ids) and self.ids[idx] == i else None
+
+    def label(self,
+              idx: int) -> Optional[str]:
+        '''returns the label (title / author name) of a node, or None if it has none'''
+        b = bytes(self.label_bytes[self.label_offsets[idx]:self.label_offsets[idx + 1]])
+        return b.decode('utf-8') if b else None
+
+    def neighbors(self,
+                  idx: int,
+                  direction: str = 'both') -> np.ndarray:
+        '''
+        returns the node indices adjacent to a node
+
+        :param idx: node index
+        :param direction: 'out' (its similar items), 'in' (items listing it as similar), or 'both'
+        '''
+        nbrs = []
+        if direction in ('out', 'both'):
+            nbrs.append(self.indices[self.indptr[idx]:self.indptr[idx + 1]])
+        if direction in ('in', 'both'):
+            nbrs.append(self.rindices[self.rindptr[idx]:self.rindptr[idx + 1]])
+        return np.concatenate(nbrs) if len(nbrs) > 1 else np.asarray(nbrs[0])
+
+    def ego(self,
+            idx: int,
+            hops: int = 1,
+            min_rating_count: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        returns (nodes, edge sources, edge targets) of the k-hop neighborhood of a node
+
+        :param idx: node index of the center
+        :param hops: number of hops out (in either edge direction)
+        :param min_rating_count: drop neighbors with fewer ratings; the center is always kept
+
+        nodes is sorted; edges are every sim edge between two nodes in it
+        '''
+        nodes = np.array([idx], dtype=np.int64)
+        frontier = nodes
+        for _ in range(hops):
+            if not len(frontier):
+                break
+            nbrs = np.unique(np.concatenate([self.neighbors(int(i)) for i in frontier]))
+            if min_rating_count > 0:
+                nbrs = nbrs[self.rating_count[nbrs] >= min_rating_count]
+            frontier = np.setdiff1d(nbrs, nodes, assume_unique=True)
+            nodes = np.union1d(nodes, frontier)
+
+        # out-edges of every node, kept if the target is in the neighborhood too
+        starts, ends = self.indptr[nodes], self.indptr[nodes + 1]
+        counts = (ends - starts).astype(np.int64)
+        if not counts.sum():
+            empty = np.array([], dtype=np.int64)
+            return nodes, empty, empty
+        src = np.repeat(nodes, counts)
+        dst = np.concatenate([self.indices[s:e] for s, e in zip(starts, ends)]).astype(np.int64)
+        pos = np.searchsorted(nodes, dst)
+        pos[pos == len(nodes)] = 0
+        in_ego = nodes[pos] == dst
+        return nodes, src[in_ego], dst[in_ego]
+
+    def ego_graph(self,
+                  item_id: str,
+                  hops: int = 1,
+                  min_rating_count: int = 0) -> Tuple[List[Tuple[str, Optional[str]]], List[Tuple[str, str]]]:
+        '''
+        returns ([(ID, label), ...], [(ID, similar ID), ...]) for the neighborhood of an item
+
+        :param item_id: Goodreads book/author ID of the center
+        :param hops: number of hops out (in either edge direction)
+        :param min_rating_count: drop neighbors with fewer ratings; the center is always kept
+
+        raises KeyError if item_id isn't in the graph
+        '''
+        idx = self.index_of(item_id)
+        if idx is None:
+            raise KeyError(f'{item_id} not in graph')
+        nodes, src, dst = self.ego(idx, hops=hops, min_rating_count=min_rating_count)
+        ids = self.ids
+        node_list = [(str(ids[i]), self.label(int(i))) for i in nodes]
+        edge_list = [(str(ids[s]), str(ids[d])) for s, d in zip(src, dst)]
+        return node_list, edge_list
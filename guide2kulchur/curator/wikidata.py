@@ -0,0 +1,415 @@
+'''
+author birth/death dates and birth places from the Wikidata SPARQL endpoint, into wikidata_lb.
+
+the target authors are grouped into VALUES blocks (by English label, or by Wikidata ID), one query per block;
+blocks are sent concurrently, under a limit on in-flight requests and a minimum interval between request starts.
+responses are split up by target author and cached on disk per author, so re-runs (or runs against a directory
+of recorded responses, with cache_only=True) only send the authors not seen before, however the blocks fall.
+the parsed rows are COPY'd into wikidata_lb.
+
+    rows = asyncio.run(run_author_queries(['Plato', 'Sappho'], chunk_size=50, cache_dir='data/wikidata_cache'))
+    copy_into_wikidata_lb(cur, rows)
+
+untargeted queries (e.g., "date_range_queries") go through "run_queries", and are cached per query.
+'''
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import (Any,
+                    Awaitable,
+                    Callable,
+                    Dict,
+                    Iterable,
+                    List,
+                    Optional,
+                    Tuple)
+
+import aiohttp
+import psycopg
+
+
+ENDPOINT = 'https://query.wikidata.org/sparql'
+
+HEADERS = {
+    'User-Agent': 'ancient-authors-puller',
+    'Accept': 'application/sparql-results+json'
+}
+
+# first slot: the VALUES block of target authors (can be empty); second slot: extra FILTERs (can be empty)
+# ?targetLabel (only bound in by-label queries) tells which target label a result row matched
+SPARQL_QUERY = '''
+                SELECT ?targetLabel ?author ?authorLabel ?nativeName
+                        ?occupation ?occupationLabel
+                        ?dob ?dod
+                        ?pob ?pobLabel
+                WHERE {
+                    %s
+
+                    VALUES ?occupation {
+                        wd:Q482980 # author
+                        wd:Q36180 # writer
+                        wd:Q4964182 # philosopher
+                        wd:Q1234713 # theologian
+                        wd:Q49757 # poet
+                        wd:Q201788 # historian
+                        wd:Q333634 # translator
+                        wd:Q214917 # playwright
+                        wd:Q361809 # rhetorician
+                        wd:Q6625963 # novelist
+                        wd:Q901 # scientist
+                        wd:Q170790 # mathematician
+                        wd:Q16314501 # encyclopedist
+                        wd:Q12859263 # orator
+                        wd:Q82955 # politician
+                        wd:Q864380 # biographer
+                        wd:Q15980158 # nonfiction writer
+                    }
+                    ?author wdt:P106 ?occupation. # must be one of the occupations listed above
+
+                    OPTIONAL { ?author wdt:P569 ?dob. }
+                    OPTIONAL { ?author wdt:P570 ?dod. }
+                    OPTIONAL { ?author wdt:P19 ?pob. }
+                    OPTIONAL { ?author wdt:P1559 ?nativeName. }
+
+                    %s
+
+                    SERVICE wikibase:label { bd:serviceParam wikibase:language "[AUTO_LANGUAGE],mul,en". }
+                }
+                '''
+
+WIKIDATA_LB_COLS = ('author_code', 'author_lab', 'native_name', 'occupation_lab', 'dob', 'dod', 'pob', 'pob_lab')
+
+
+def _sparql_literal(s: str) -> str:
+    return '"' + s.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _qid(id_or_uri: str) -> str:
+    # e.g., "http://www.wikidata.org/entity/Q859" -> "Q859"
+    return id_or_uri.rsplit('/', 1)[-1]
+
+
+def values_block(targets: Iterable[str],
+                 by: str = 'label') -> str:
+    '''
+    returns a SPARQL VALUES block (plus the label triple, if by label) restricting ?author to targets
+
+    :param targets: English author labels (e.g. "Plato"), or Wikidata IDs (e.g. "Q859")
+    :param by: 'label' or 'id'
+    '''
+    if by == 'label':
+        vals = ' '.join(f'{_sparql_literal(t)}@en' for t in targets)
+        return f'VALUES ?targetLabel {{ {vals} }}\n?author rdfs:label ?targetLabel.'
+    if by == 'id':
+        vals = ' '.join(f'wd:{_qid(t)}' for t in targets)
+        return f'VALUES ?author {{ {vals} }}'
+    raise ValueError(f"by must be 'label' or 'id', not {by!r}")
+
+
+def author_queries(targets: Iterable[str],
+                   chunk_size: int = 50,
+                   by: str = 'label') -> List[str]:
+    '''
+    returns one SPARQL query per chunk of chunk_size target authors
+
+    :param targets: English author labels, or Wikidata IDs
+    :param chunk_size: number of authors per VALUES block
+    :param by: 'label' or 'id'
+    '''
+    targets = sorted(set(targets))
+    return [SPARQL_QUERY % (values_block(targets[i:i + chunk_size], by=by), '')
+            for i in range(0, len(targets), chunk_size)]
+
+
+def date_range_queries() -> List[str]:
+    '''returns the original by-century queries: authors born/died before 1000, then one per century until 2000'''
+    filter_grps = [
+        # born/died before 1000
+        'FILTER(?dob <= "1000-01-01"^^xsd:dateTime || ?dod <= "1000-01-01"^^xsd:dateTime).'
+    ]
+    # get the remaining groups
+    for c in range(9):
+        fg = f'FILTER((?dob >= "1{c}01-01-01"^^xsd:dateTime || ?dod >= "1{c}01-01-01"^^xsd:dateTime) && ' \
+             f'(?dob <= "1{c+1}00-01-01"^^xsd:dateTime || ?dod <= "1{c+1}00-01-01"^^xsd:dateTime)).'
+        filter_grps.append(fg)
+    return [SPARQL_QUERY % ('', fg) for fg in filter_grps]
+
+
+def _fix_date(d: Optional[str]) -> Optional[str]:
+    # BC dates, year 0 (postgres has no year 0), and links to broken pages
+    if not d or d.startswith('http'):
+        return None
+    if d.startswith('-'):
+        d = d[1:] + ' BC'
+    return '0001' + d[4:] if d.startswith('0000') else d
+
+
+def split_bindings(res: Dict[str, Any],
+                   targets: List[str],
+                   by: str = 'label') -> Dict[str, Dict[str, Any]]:
+    '''
+    returns {target: response holding only that target's result rows} for the response to a VALUES block query;
+    targets without results get an empty response
+
+    :param res: the parsed JSON response
+    :param targets: the block's targets, as passed to "values_block"
+    :param by: 'label' or 'id'
+    '''
+    if by not in ('label', 'id'):
+        raise ValueError(f"by must be 'label' or 'id', not {by!r}")
+    by_key = {(t if by == 'label' else _qid(t)): [] for t in targets}
+    for binding in res['results']['bindings']:
+        if by == 'label':
+            key = binding.get('targetLabel', {}).get('value')
+        else:
+            key = _qid(binding['author']['value'])
+        if key in by_key:
+            by_key[key].append(binding)
+    return {t: {'results': {'bindings': by_key[t if by == 'label' else _qid(t)]}} for t in targets}
+
+
+def parse_bindings(res: Dict[str, Any]) -> List[Tuple[Optional[str], ...]]:
+    '''
+    returns wikidata_lb rows (see WIKIDATA_LB_COLS) from a SPARQL JSON response
+
+    :param res: the parsed JSON response
+    '''
+    rows = []
+    for author in res['results']['bindings']:
+        rows.append(
+            (
+                author['author']['value'],
+                author['authorLabel']['value'],
+                author.get('nativeName', {}).get('value', None),
+                author['occupationLabel']['value'],
+                _fix_date(author.get('dob', {}).get('value', None)),
+                _fix_date(author.get('dod', {}).get('value', None)),
+                author.get('pob', {}).get('value', None),
+                author.get('pobLabel', {}).get('value', None)
+            )
+        )
+    return rows
+
+
+class ResponseCache:
+    def __init__(self,
+                 cache_dir: Optional[str]):
+        '''
+        SPARQL responses on disk, one JSON file per key (named by the key's sha1); None disables caching.
+        keys are whole queries, or target authors (see "target_key")
+
+        :param cache_dir: directory for the cached responses
+        '''
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(query: str) -> str:
+        return hashlib.sha1(query.encode()).hexdigest()
+
+    @staticmethod
+    def target_key(target: str,
+                   by: str = 'label') -> str:
+        '''returns the cache key of one target author'''
+        return f'{by}:{target if by == "label" else _qid(target)}'
+
+    def _path(self,
+              query: str) -> str:
+        return os.path.join(self.cache_dir, f'{self.key(query)}.json')
+
+    def get(self,
+            query: str) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir or not os.path.exists(self._path(query)):
+            return None
+        with open(self._path(query), 'r') as f:
+            return json.load(f)
+
+    def put(self,
+            query: str,
+            res: Dict[str, Any]) -> None:
+        if not self.cache_dir:
+            return
+        # write then rename, so an interrupted run never leaves a truncated response behind
+        tmp = self._path(query) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(res, f)
+        os.replace(tmp, self._path(query))
+
+
+class _RateLimit:
+    def __init__(self,
+                 min_interval: float):
+        # at most one request start every min_interval seconds
+        self.min_interval = min_interval
+        self._lock = asyncio.Lock()
+        self._last = 0.0
+
+    async def wait(self) -> None:
+        async with self._lock:
+            delay = self._last + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last = time.monotonic()
+
+
+async def _fetch_endpoint(session: aiohttp.ClientSession,
+                          query: str,
+                          endpoint: str = ENDPOINT) -> Dict[str, Any]:
+    # POST, since VALUES blocks make for long queries
+    async with session.post(url=endpoint,
+                            data={'query': query, 'format': 'json'},
+                            headers=HEADERS) as resp:
+        resp.raise_for_status()
+        return await resp.json(content_type=None)
+
+
+async def _send_queries(queries: List[str],
+                        concurrency: int,
+                        min_interval: float,
+                        num_attempts: int,
+                        fetch: Optional[Callable[[str], Awaitable[Dict[str, Any]]]],
+                        logger: logging.Logger) -> List[Optional[Dict[str, Any]]]:
+    # send queries concurrently; returns the responses in query order, None for queries that failed every attempt
+    semaphore = asyncio.Semaphore(concurrency)
+    limit = _RateLimit(min_interval)
+
+    async def _send(session: Optional[aiohttp.ClientSession],
+                    query: str) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            for attempt in range(max(1, num_attempts)):
+                await limit.wait()
+                try:
+                    return await (fetch(query) if fetch else _fetch_endpoint(session, query))
+                except Exception as er:
+                    logger.error('QUERY %s ATTEMPT %s ERR: %s', ResponseCache.key(query)[:12], attempt + 1, er)
+                    if attempt + 1 < num_attempts:
+                        await asyncio.sleep((attempt + 1) ** 1.5)
+        return None
+
+    if not queries:
+        return []
+    if fetch:
+        return await asyncio.gather(*(_send(None, q) for q in queries))
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120)) as session:
+        return await asyncio.gather(*(_send(session, q) for q in queries))
+
+
+def _dedup_rows(responses: Iterable[Optional[Dict[str, Any]]]) -> List[Tuple[Optional[str], ...]]:
+    rows = {}
+    for res in responses:
+        for row in (parse_bindings(res) if res is not None else []):
+            rows.setdefault(row[0], row)   # same as ON CONFLICT DO NOTHING: first row per author wins
+    return list(rows.values())
+
+
+async def run_queries(queries: List[str],
+                      cache_dir: Optional[str] = None,
+                      concurrency: int = 2,
+                      min_interval: float = 1.0,
+                      num_attempts: int = 3,
+                      cache_only: bool = False,
+                      fetch: Optional[Callable[[str], Awaitable[Dict[str, Any]]]] = None,
+                      logger: Optional[logging.Logger] = None) -> List[Tuple[Optional[str], ...]]:
+    '''
+    run SPARQL queries concurrently, returns the parsed wikidata_lb rows (deduped on author_code)
+
+    :param queries: SPARQL queries, e.g. from "date_range_queries"; for target authors, see "run_author_queries"
+    :param cache_dir: directory of cached responses (one per query); cached queries aren't sent
+    :param concurrency: max number of in-flight requests
+    :param min_interval: min seconds between request starts
+    :param num_attempts: max attempts per query, in case of errors (e.g., 429s, timeouts)
+    :param cache_only: only use cached (or recorded) responses; uncached queries are skipped
+    :param fetch: async callable, query -> parsed JSON response; defaults to the Wikidata endpoint
+    :param logger: a logger object
+    '''
+    logger = logger or logging.getLogger(__name__)
+    cache = ResponseCache(cache_dir)
+    responses = [cache.get(q) for q in queries]
+    num_cached = sum(res is not None for res in responses)
+    todo = [i for i, res in enumerate(responses) if res is None] if not cache_only else []
+    sent = await _send_queries([queries[i] for i in todo], concurrency, min_interval, num_attempts, fetch, logger)
+    for i, res in zip(todo, sent):
+        if res is not None:
+            cache.put(queries[i], res)
+            responses[i] = res
+    logger.info('%s QUERIES: %s CACHED, %s SENT, %s FAILED',
+                len(queries), num_cached, len(sent), sum(res is None for res in sent))
+    return _dedup_rows(responses)
+
+
+async def run_author_queries(targets: Iterable[str],
+                             by: str = 'label',
+                             chunk_size: int = 50,
+                             cache_dir: Optional[str] = None,
+                             concurrency: int = 2,
+                             min_interval: float = 1.0,
+                             num_attempts: int = 3,
+                             cache_only: bool = False,
+                             fetch: Optional[Callable[[str], Awaitable[Dict[str, Any]]]] = None,
+                             logger: Optional[logging.Logger] = None) -> List[Tuple[Optional[str], ...]]:
+    '''
+    query the target authors in VALUES blocks, returns the parsed wikidata_lb rows (deduped on author_code)
+
+    :param targets: English author labels, or Wikidata IDs
+    :param by: 'label' or 'id'
+    :param chunk_size: number of (uncached) authors per VALUES block
+    :param cache_dir: directory of cached responses (one per author, empty if Wikidata had nothing); cached authors aren't sent
+    :param concurrency: max number of in-flight requests
+    :param min_interval: min seconds between request starts
+    :param num_attempts: max attempts per query, in case of errors (e.g., 429s, timeouts)
+    :param cache_only: only use cached (or recorded) responses; uncached authors are skipped
+    :param fetch: async callable, query -> parsed JSON response; defaults to the Wikidata endpoint
+    :param logger: a logger object
+    '''
+    logger = logger or logging.getLogger(__name__)
+    cache = ResponseCache(cache_dir)
+    targets = sorted(set(targets))
+    responses = {t: cache.get(cache.target_key(t, by)) for t in targets}
+    num_cached = sum(res is not None for res in responses.values())
+    todo = [t for t in targets if responses[t] is None] if not cache_only else []
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    queries = [SPARQL_QUERY % (values_block(chunk, by=by), '') for chunk in chunks]
+    sent = await _send_queries(queries, concurrency, min_interval, num_attempts, fetch, logger)
+    for chunk, res in zip(chunks, sent):
+        if res is None:
+            continue
+        for t, t_res in split_bindings(res, chunk, by=by).items():
+            cache.put(cache.target_key(t, by), t_res)
+            responses[t] = t_res
+    logger.info('%s AUTHORS: %s CACHED, %s SENT IN %s QUERIES, %s FAILED',
+                len(targets), num_cached, len(todo), len(queries), sum(res is None for res in sent))
+    return _dedup_rows(responses[t] for t in targets)
+
+
+def copy_into_wikidata_lb(cursor: psycopg.Cursor,
+                          rows: List[Tuple[Optional[str], ...]]) -> int:
+    '''
+    COPY rows into wikidata_lb, skipping authors already in it; returns number of rows inserted
+
+    :param cursor: a psycopg Cursor object
+    :param rows: wikidata_lb rows, e.g. from "run_queries"
+    '''
+    if not rows:
+        return 0
+    cols = ', '.join(WIKIDATA_LB_COLS)
+    # COPY can't skip conflicts, so stage into a temp table first; one transaction, even on autocommit connections.
+    # the stage table lives as long as the session (emptied on commit), and is emptied up front, since inside
+    # an outer transaction the last call's rows are still in it
+    with cursor.connection.transaction():
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS _wikidata_lb_stage (LIKE wikidata_lb) ON COMMIT DELETE ROWS')
+        cursor.execute('TRUNCATE _wikidata_lb_stage')
+        # dates as text; postgres parses the "... BC" suffix on the way in
+        with cursor.copy(f'COPY _wikidata_lb_stage ({cols}) FROM STDIN') as cp:
+            for row in rows:
+                cp.write_row(row)
+        cursor.execute(f'''
+                        INSERT INTO wikidata_lb ({cols})
+                        SELECT {cols} FROM _wikidata_lb_stage
+                        ON CONFLICT DO NOTHING
+                        ''')
+        return cursor.rowcount
@@ -0,0 +1,43 @@
+'''
+command line entry point for guide2kulchur.engineer
+
+    python -m guide2kulchur.engineer run path/to/config.json [--jobs name1 name2]
+    python -m guide2kulchur.engineer trace path/to/spans.jsonl [--last N]
+'''
+
+import argparse
+import asyncio
+
+from dotenv import load_dotenv
+
+from guide2kulchur.engineer.orchestrator import load_config, run_jobs
+from guide2kulchur.engineer.tracing import summarize
+
+
+def main() -> None:
+    '''parse args, run the given subcommand'''
+    parser = argparse.ArgumentParser(prog='guide2kulchur.engineer',
+                                     description='crawl Goodreads items into the database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='run the crawl jobs declared in a config file')
+    run_parser.add_argument('config', help='path to the JSON config file')
+    run_parser.add_argument('--jobs', nargs='+', default=None, help='names of the jobs to run; default is all jobs')
+
+    trace_parser = subparsers.add_parser('trace', help='print the critical path of each batch in a span file')
+    trace_parser.add_argument('spans', help='path to the span file (the "tracing" config path)')
+    trace_parser.add_argument('--last', type=int, default=None, help='only the last N batches')
+    trace_parser.add_argument('--root', default='batch', help='name of the root spans to summarize')
+
+    args = parser.parse_args()
+    load_dotenv()
+
+    if args.command == 'run':
+        cfg = load_config(args.config)
+        asyncio.run(run_jobs(cfg=cfg, only=args.jobs))
+    elif args.command == 'trace':
+        print(summarize(args.spans, root_name=args.root, last=args.last))
+
+
+if __name__ == '__main__':
+    main()
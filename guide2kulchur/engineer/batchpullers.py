@@ -14,7 +14,14 @@ import psycopg
 from guide2kulchur.engineer.recruits import (HouseOfWisdom, 
                                              Dante, 
                                              FalseBardiya,
+                                             ITEM_LOG,
                                              _jsonb_or_null)
+from guide2kulchur.engineer.ledger import IDLedger
+from guide2kulchur.engineer.frontier import Frontier
+from guide2kulchur.engineer.genres import GenreTaxonomy, GenreDictionary
+from guide2kulchur.engineer.simpullers import _fetch_sim_ids
+from guide2kulchur.engineer.failures import ERROR_POLICIES, classify_error
+from guide2kulchur.engineer import metrics, tracing
 
 
 class BatchItemPuller(ABC):
@@ -25,7 +32,12 @@ class BatchItemPuller(ABC):
                  item_type: str,
                  item_ids: Iterable[str],
                  semaphore_count: int,
-                 status_logger: logging.Logger):
+                 status_logger: logging.Logger,
+                 id_ledger: Optional[IDLedger] = None,
+                 frontier: Optional[Frontier] = None,
+                 chain_similar: bool = False,
+                 genre_taxonomy: Optional[GenreTaxonomy] = None,
+                 genre_dictionary: Optional[GenreDictionary] = None):
           '''pull Goodreads item data.
           
           :batch_id: batch identifier; used for logging
@@ -34,6 +46,11 @@ class BatchItemPuller(ABC):
           :param item_ids: an iterable of Goodreads item (book|author|user) IDs
           :param semaphore_counr: number of maximum concurrent coroutines
           :param status_logger: a Logger object to record progress/status/issues
+          :param id_ledger: an IDLedger object; if given, inserted/failed IDs are recorded in it
+          :param frontier: a Frontier object; if given, outbound IDs of each parsed item are staged in it
+          :param chain_similar: if True, pull each item's similar items page right after the item itself (book|author only)
+          :param genre_taxonomy: a GenreTaxonomy object; if given, new genres of inserted items are classified into genre_taxonomy
+          :param genre_dictionary: a GenreDictionary object, to encode genres as genre_dict IDs on insert; if None, a fresh one is used
           '''
           self.batch_id = batch_id
           self.cursor = cursor
@@ -42,26 +59,46 @@ class BatchItemPuller(ABC):
           self.semaphore_count = semaphore_count
           self.semaphore = asyncio.Semaphore(semaphore_count)
           self.stat_log = status_logger
+          self.id_ledger = id_ledger
+          self.frontier = frontier
+          self.chain_similar = chain_similar
+          self.genre_taxonomy = genre_taxonomy
+          self.genre_dictionary = genre_dictionary or GenreDictionary()
 
           self.successes = []
           self.fails = []
+          self.fail_classes = {}  # failed ID -> error class; see failures.py
           self.timeouts = []
           
           self.metadat = {
               'timeouts': 0,
+              'sim_timeouts': 0,  # similar items pages only; kept out of timeouts, which drive update_sem_and_delay
               'error_rate': 0,
               'succesful_pulls_per_sec': 0,
               'timeouts_per_batch_ratio': 0
           }
 
+          # sim_src_field: field holding the ID of the item's similar items page; sim_field: where the similar IDs go
           if item_type.lower() == 'book':
                self.item_puller = HouseOfWisdom
+               self.id_field = 'id'
+               self.genre_field = 'top_genres'
+               self.sim_src_field, self.sim_field = 'similar_books_id', 'sim_books'
           elif item_type.lower() == 'author':
                self.item_puller = Dante
+               self.id_field = 'author_id'
+               self.genre_field = 'top_genres'
+               self.sim_src_field, self.sim_field = 'author_id', 'sim_authors'
           elif item_type.lower() == 'user':
                self.item_puller = FalseBardiya
+               self.id_field = 'user_id'
+               self.genre_field = 'favorite_genres'
+               self.sim_src_field, self.sim_field = None, None
           else:
                raise ValueError("item_type must be in ['book', 'author', 'user']")
+          
+          if chain_similar and not self.sim_field:
+               raise ValueError("chain_similar only available for item_type in ['book', 'author']")
 
 
     async def _load_one_item(self,
@@ -81,41 +118,112 @@ class BatchItemPuller(ABC):
                 '''
                 res = {'data': identifier, 'status': 'error'}    # assume err
 
-                async with semaphore:
+                async with (tracing.span('item', item_type=self.item_type, item_id=identifier) as item_span,
+                            tracing.acquire(semaphore),
+                            metrics.IN_FLIGHT.track(item_type=self.item_type)):
                     num_attempts = max(num_attempts, 1)
                     t_start = time.time()
                     for attempt in range(num_attempts):
                         try:
-                            loaded_item = await self.item_puller().load_it_async(session=session,
-                                                                                 item_id=identifier,
-                                                                                 see_progress=see_progress)
+                            t_fetch = time.perf_counter()
+                            async with tracing.span('fetch', attempt=attempt + 1):
+                                loaded_item = await self.item_puller().load_it_async(session=session,
+                                                                                     item_id=identifier,
+                                                                                     see_progress=see_progress)
+                                tracing.span_since_body('soup')
                             
-                            item_dat = loaded_item.get_all_data()
+                            t_parse = time.perf_counter()
+                            with tracing.span('parse'):
+                                item_dat = loaded_item.get_all_data()
+                            metrics.STAGE_SECONDS.observe(t_parse - t_fetch, item_type=self.item_type, stage='fetch')
+                            metrics.STAGE_SECONDS.observe(time.perf_counter() - t_parse, item_type=self.item_type, stage='parse')
                             res = {'data': item_dat, 'status': 'success'}
                             break
                         
                         except asyncio.TimeoutError:
                             self.metadat['timeouts'] += 1
+                            metrics.ITEM_ERRORS.inc(item_type=self.item_type, error_class='timeout')
                             if (attempt + 1) == num_attempts:
                                 self.stat_log.error('batch %s OUT OF RETRIES %s', self.batch_id, identifier) 
                                 res = {'data': identifier, 'status': 'timeout'}  # will pull again in the future
                                 break
                             SLEEP_SCALAR = 1.5
                             sleep_time = (attempt + 1) ** SLEEP_SCALAR
-                            await asyncio.sleep(sleep_time)
-                            self.stat_log.info('batch %s RETRY %s %s', self.batch_id, self.item_type, identifier)  
+                            async with tracing.span('backoff', error_class='timeout'):
+                                await asyncio.sleep(sleep_time)
+                            self.stat_log.info('batch %s RETRY %s %s', self.batch_id, self.item_type, identifier, extra=ITEM_LOG)  
 
                         except Exception as er:
-                            self.stat_log.error('batch %s ERR. %s %s: %s', self.batch_id, self.item_type, identifier, er)
+                            err_class = classify_error(er)
+                            metrics.ITEM_ERRORS.inc(item_type=self.item_type, error_class=err_class)
+                            if ERROR_POLICIES[err_class]['retry_in_loop'] and (attempt + 1) < num_attempts:
+                                # transient (network|throttled); back off like a timeout, longer if throttled
+                                SLEEP_SCALAR = 1.5 if err_class == 'network' else 2.5
+                                sleep_time = (attempt + 1) ** SLEEP_SCALAR
+                                async with tracing.span('backoff', error_class=err_class):
+                                    await asyncio.sleep(sleep_time)
+                                self.stat_log.info('batch %s RETRY (%s) %s %s', self.batch_id, err_class.upper(), self.item_type, identifier, extra=ITEM_LOG)
+                                continue
+                            self.stat_log.error('batch %s ERR. (%s) %s %s: %s', self.batch_id, err_class.upper(), self.item_type, identifier, er)
+                            res = {'data': identifier, 'status': 'error', 'error_class': err_class}
                             break   
+                    
+                    if self.chain_similar and res['status'] == 'success':
+                        # second hop, still under the same semaphore; no later rescan for sim IDs needed
+                        with metrics.STAGE_SECONDS.time(item_type=self.item_type, stage='sim'), tracing.span('sim'):
+                            await self._load_sim_ids(session=session,
+                                                     item_dat=res['data'],
+                                                     num_attempts=num_attempts)
                 
+                    item_span.set(status=res['status'])
+
                 t_finished = time.time()
                 t_elapsed = round(t_finished - t_start,3)
-                self.stat_log.info('batch %s T.E. %s %s: %s sec.', self.batch_id, self.item_type, identifier, t_elapsed)
+                self.stat_log.info('batch %s T.E. %s %s: %s sec.', self.batch_id, self.item_type, identifier, t_elapsed, extra=ITEM_LOG)
 
                 return res     
     
 
+    async def _load_sim_ids(self,
+                            session: aiohttp.ClientSession,
+                            item_dat: Dict[str,Any],
+                            num_attempts: int = 1) -> None:
+                '''
+                pull the similar items page of a freshly loaded item, store the similar IDs in the item's data.
+                
+                if the page can't be pulled, the similar IDs are left as None, so the fill_sim scripts can get them later.
+
+                :session: an aiohttp.ClientSession
+                :item_dat: loaded item data; updated in place
+                :num_attempts: number of attempts (including initial attempt)
+                '''
+                item_dat[self.sim_field] = None
+                sim_id = item_dat.get(self.sim_src_field)
+                if not sim_id:
+                    return None
+                
+                for attempt in range(max(num_attempts, 1)):
+                    try:
+                        item_dat[self.sim_field] = await _fetch_sim_ids(session=session,
+                                                                        sim_item_type=self.item_type,
+                                                                        identifier=sim_id)
+                        break
+                    
+                    except asyncio.TimeoutError:
+                        self.metadat['sim_timeouts'] += 1
+                        if (attempt + 1) == num_attempts:
+                            self.stat_log.error('batch %s OUT OF RETRIES sim_id %s', self.batch_id, sim_id) 
+                            break
+                        SLEEP_SCALAR = 1.5
+                        sleep_time = (attempt + 1) ** SLEEP_SCALAR
+                        await asyncio.sleep(sleep_time)
+                        self.stat_log.info('batch %s RETRY sim_id %s %s', self.batch_id, self.item_type, sim_id, extra=ITEM_LOG)  
+
+                    except Exception as er:
+                        self.stat_log.error('batch %s ERR. sim_id %s %s: %s', self.batch_id, self.item_type, sim_id, er)
+                        break
+
+
     async def load_the_batch(self,
                              session: aiohttp.ClientSession,
                              num_attempts: int = 1,
@@ -131,24 +239,38 @@ class BatchItemPuller(ABC):
         
         completed = 0
         batch_start = time.time()
+        # other batches of the same item type may be running (e.g., orchestrator jobs), so only add this batch's share
+        metrics.QUEUE_DEPTH.inc(len(tasks), item_type=self.item_type)
+        metrics.CONCURRENCY_LIMIT.inc(self.semaphore_count, item_type=self.item_type)
 
-        async for task in asyncio.as_completed(tasks):
-            if batch_delay and batch_size:
-                if completed > 0 and completed % batch_size == 0:
-                        time.sleep(batch_delay)
-            
-            result = await task
-            
-            if result['status'] == 'success':
-                self.successes.append(result['data'])
-            
-            if result['status'] == 'timeout':
-                self.timeouts.append(result['data'])
-            
-            if result['status'] == 'error':
-                self.fails.append(result['data'])
-
-            completed += 1
+        try:
+            async for task in asyncio.as_completed(tasks):
+                if batch_delay and batch_size:
+                    if completed > 0 and completed % batch_size == 0:
+                            async with tracing.span('sub_batch_delay'):
+                                await asyncio.sleep(batch_delay)    # don't block the event loop; other jobs may share it
+                
+                result = await task
+                
+                if result['status'] == 'success':
+                    self.successes.append(result['data'])
+                    if self.frontier:
+                        self.frontier.stage_record(self.item_type, result['data'])
+                
+                if result['status'] == 'timeout':
+                    self.timeouts.append(result['data'])
+                
+                if result['status'] == 'error':
+                    self.fails.append(result['data'])
+                    self.fail_classes[result['data']] = result.get('error_class', 'parse_error')
+
+                completed += 1
+                metrics.ITEMS.inc(item_type=self.item_type, status=result['status'])
+                metrics.QUEUE_DEPTH.dec(item_type=self.item_type)
+        finally:
+            # take back whatever's left of this batch's share, even if the batch blew up
+            metrics.QUEUE_DEPTH.dec(len(tasks) - completed, item_type=self.item_type)
+            metrics.CONCURRENCY_LIMIT.dec(self.semaphore_count, item_type=self.item_type)
         
         batch_end = time.time()
         batch_elapsed = round(batch_end - batch_start,3)
@@ -167,8 +289,10 @@ class BatchItemPuller(ABC):
         self.stat_log.info('T.E. batch %s: %s sec.', self.batch_id, batch_elapsed) 
         self.stat_log.info('SUCCESS RATE batch %s: %s', self.batch_id, success_rate)
         self.stat_log.info('PULLS PER SEC batch %s: %s', self.batch_id, pulls_per_sec)
-        self.stat_log.info('batch %s FAILED %ss: %s', self.batch_id, self.item_type, self.fails)
+        self.stat_log.info('batch %s FAILED %ss: %s', self.batch_id, self.item_type, self.fail_classes)
         self.stat_log.info('batch %s TIMED-OUT %ss: %s', self.batch_id, self.item_type, self.timeouts)
+        if self.chain_similar:
+            self.stat_log.info('batch %s SIM PAGE TIMEOUTS: %s', self.batch_id, self.metadat['sim_timeouts'])
 
         err_rate = 1 - success_rate
         succ_pull_per_sec = round(len(self.successes) / batch_elapsed, 3)
@@ -179,18 +303,84 @@ class BatchItemPuller(ABC):
 
 
     def insert_failed_ids_into_db(self):
-        '''inserts failed item IDs into error_id table for future reference'''
+        '''inserts failed item IDs into error_id table, with their error class and when to retry them
+        
+        the wait before a retry starts at the class's base interval, and doubles with every further failed attempt (up to the class's cap).
+        '''
         if not self.fails:
             return None
         
         failed_ids_statement = '''
                                 INSERT INTO error_id 
-                                    (item_id, item_type)
-                                VALUES (%s, %s)
-                                ON CONFLICT DO NOTHING
+                                    (item_id, item_type, error_class, attempts, last_failed_at, retry_after)
+                                VALUES 
+                                    (%(item_id)s, %(item_type)s, %(error_class)s, 1, NOW(), NOW() + %(base)s::interval)
+                                ON CONFLICT (item_id, item_type) DO UPDATE
+                                SET
+                                    error_class = EXCLUDED.error_class,
+                                    attempts = error_id.attempts + 1,
+                                    last_failed_at = NOW(),
+                                    retry_after = NOW() + LEAST(%(base)s::interval * POWER(2, error_id.attempts), 
+                                                                %(cap)s::interval)
                                '''
-        fails_to_insert = [(fail_id, self.item_type) for fail_id in self.fails]
-        self.cursor.executemany(failed_ids_statement, fails_to_insert)
+        fails_to_insert = []
+        for fail_id in self.fails:
+            err_class = self.fail_classes.get(fail_id, 'parse_error')
+            fails_to_insert.append({'item_id': fail_id,
+                                    'item_type': self.item_type,
+                                    'error_class': err_class,
+                                    'base': ERROR_POLICIES[err_class]['base'],
+                                    'cap': ERROR_POLICIES[err_class]['cap']})
+        with tracing.span('db_write_failed', item_type=self.item_type, rows=len(fails_to_insert)):
+            self.cursor.executemany(failed_ids_statement, fails_to_insert)
+
+        if self.id_ledger:
+            self.id_ledger.add_failed(self.item_type, self.fails)
+
+
+    def push_frontier_into_db(self) -> None:
+        '''pushes the outbound IDs staged during the batch into the frontier table'''
+        if not self.frontier:
+            return None
+        
+        t_start = time.time()
+        with tracing.span('frontier_push', item_type=self.item_type):
+            pushed = self.frontier.flush()
+        t_end = time.time()
+        metrics.STAGE_SECONDS.observe(t_end - t_start, item_type=self.item_type, stage='frontier_push')
+        t_e = round(t_end - t_start, 3)
+        self.stat_log.info('batch %s FRONTIER PUSH %s: %s sec', self.batch_id, pushed, t_e)
+
+
+    def _record_inserted_ids(self) -> None:
+        '''marks successfully inserted item IDs as known in the ID ledger (if there is one); clears retried IDs from error_id'''
+        inserted_ids = [item[self.id_field] for item in self.successes]
+        if self.id_ledger:
+            self.id_ledger.add_known(self.item_type, inserted_ids)
+
+        if not inserted_ids:
+            return None
+
+        # some of these may be retries of past failures (see Frontier.push_retry_due)
+        clear_recovered_statement = '''
+                                     DELETE FROM 
+                                        error_id
+                                     WHERE 
+                                        item_type = %s
+                                     AND 
+                                        item_id = ANY(%s)
+                                    '''
+        self.cursor.execute(clear_recovered_statement, (self.item_type, inserted_ids))
+        
+
+    def _classify_new_genres(self) -> None:
+        '''classifies genres of inserted items not seen before, and writes them to genre_taxonomy (if there's a taxonomy)'''
+        if not self.genre_taxonomy:
+            return None
+        new_genres = self.genre_taxonomy.observe(g for item in self.successes for g in (item.get(self.genre_field) or []))
+        if new_genres:
+            self.genre_taxonomy.flush(self.cursor)
+            self.stat_log.info('batch %s NEW GENRES %s', self.batch_id, new_genres)
         
 
     @abstractmethod
@@ -207,7 +397,12 @@ class BatchBookPuller(BatchItemPuller):
                  cursor: psycopg.Cursor,
                  book_ids: Iterable[str],
                  semaphore_count: int,
-                 status_logger: logging.Logger):
+                 status_logger: logging.Logger,
+                 id_ledger: Optional[IDLedger] = None,
+                 frontier: Optional[Frontier] = None,
+                 chain_similar: bool = False,
+                 genre_taxonomy: Optional[GenreTaxonomy] = None,
+                 genre_dictionary: Optional[GenreDictionary] = None):
         '''pull Goodreads book data.
           
         :batch_id: batch identifier; used for logging
@@ -215,20 +410,32 @@ class BatchBookPuller(BatchItemPuller):
         :param book_ids: an iterable of Goodreads book IDs
         :param semaphore_count: number of maximum concurrent coroutines
         :param status_logger: a Logger object to record progress/status/issues
+        :param id_ledger: an IDLedger object; if given, inserted/failed IDs are recorded in it
+        :param frontier: a Frontier object; if given, outbound IDs of each parsed item are staged in it
+        :param chain_similar: if True, pull each book's similar_books page in the same batch, fill sim_books on insert
+        :param genre_taxonomy: a GenreTaxonomy object; if given, new genres are classified on insert
+        :param genre_dictionary: a GenreDictionary object, to encode genres as genre_dict IDs on insert
         '''
         super().__init__(batch_id=batch_id, 
                          cursor=cursor, 
                          item_type='book', 
                          item_ids=book_ids, 
                          semaphore_count=semaphore_count, 
-                         status_logger=status_logger)
+                         status_logger=status_logger,
+                         id_ledger=id_ledger,
+                         frontier=frontier,
+                         chain_similar=chain_similar,
+                         genre_taxonomy=genre_taxonomy,
+                         genre_dictionary=genre_dictionary)
     
     
     def insert_batch_into_db(self) -> None:
         '''insert results into DB'''
         dat_to_insert = []
+        # genres as genre_dict IDs; unknown genres get theirs first (see genres.py)
+        genre_ids = self.genre_dictionary.encode_batch(self.cursor, [bk[self.genre_field] for bk in self.successes])
 
-        for bk in self.successes:
+        for bk, bk_genre_ids in zip(self.successes, genre_ids):
             for field,val in bk.items():
                 # ensure ratings are between 1 and 5
                 if field == 'rating' and isinstance(val, (int,float)) and (val > 5 or val < 1):
@@ -250,11 +457,13 @@ class BatchBookPuller(BatchItemPuller):
                             bk['rating_count'],
                             bk['review_count'],
                             bk['top_genres'],
+                            bk_genre_ids,
                             bk['currently_reading'],
                             bk['want_to_read'],
                             bk['first_published'],
                             bk['page_length'],
-                            bk['similar_books_id'])
+                            bk['similar_books_id'],
+                            bk.get('sim_books'))   # only filled when chain_similar=True
             dat_to_insert.append(dat_as_tuple)
         
         insert_query =  '''
@@ -272,22 +481,28 @@ class BatchBookPuller(BatchItemPuller):
                                 rating_count,
                                 review_count,
                                 top_genres,
+                                top_genre_ids,
                                 currently_reading,
                                 want_to_read,
                                 first_published,
                                 page_length,
-                                sim_books_url_id)
+                                sim_books_url_id,
+                                sim_books)
                             VALUES 
                                 (%s, %s, %s, %s, %s, %s, 
                                  %s, %s, %s, %s, %s, %s,
-                                 %s, %s, %s, %s, %s, %s)
+                                 %s, %s, %s, %s, %s, %s, %s, %s)
                             ON CONFLICT DO NOTHING
                         '''
         t_start = time.time()
-        self.cursor.executemany(insert_query, dat_to_insert)
+        with tracing.span('db_write', item_type=self.item_type, rows=len(dat_to_insert)):
+            self.cursor.executemany(insert_query, dat_to_insert)
         t_end = time.time()
+        metrics.STAGE_SECONDS.observe(t_end - t_start, item_type=self.item_type, stage='db_write')
         t_e = round(t_end - t_start, 3)
         self.stat_log.info('batch %s DB INSERT %s tuples: %s sec', self.batch_id, len(dat_to_insert), t_e)
+        self._record_inserted_ids()
+        self._classify_new_genres()
         
 
 # BatchAuthorPuller
@@ -299,7 +514,12 @@ class BatchAuthorPuller(BatchItemPuller):
                  cursor: psycopg.Cursor,
                  author_ids: Iterable[str],
                  semaphore_count: int,
-                 status_logger: logging.Logger):
+                 status_logger: logging.Logger,
+                 id_ledger: Optional[IDLedger] = None,
+                 frontier: Optional[Frontier] = None,
+                 chain_similar: bool = False,
+                 genre_taxonomy: Optional[GenreTaxonomy] = None,
+                 genre_dictionary: Optional[GenreDictionary] = None):
         '''pull Goodreads author data.
           
         :batch_id: batch identifier; used for logging
@@ -307,20 +527,32 @@ class BatchAuthorPuller(BatchItemPuller):
         :param author_ids: an iterable of Goodreads author IDs
         :param semaphore_count: number of maximum concurrent coroutines
         :param status_logger: a Logger object to record progress/status/issues
+        :param id_ledger: an IDLedger object; if given, inserted/failed IDs are recorded in it
+        :param frontier: a Frontier object; if given, outbound IDs of each parsed item are staged in it
+        :param chain_similar: if True, pull each author's similar_authors page in the same batch, fill sim_authors on insert
+        :param genre_taxonomy: a GenreTaxonomy object; if given, new genres are classified on insert
+        :param genre_dictionary: a GenreDictionary object, to encode genres as genre_dict IDs on insert
         '''
         super().__init__(batch_id=batch_id, 
                          cursor=cursor, 
                          item_type='author', 
                          item_ids=author_ids, 
                          semaphore_count=semaphore_count, 
-                         status_logger=status_logger)
+                         status_logger=status_logger,
+                         id_ledger=id_ledger,
+                         frontier=frontier,
+                         chain_similar=chain_similar,
+                         genre_taxonomy=genre_taxonomy,
+                         genre_dictionary=genre_dictionary)
     
 
     def insert_batch_into_db(self) -> None:
         '''insert results into DB'''
         dat_to_insert = []
+        # genres as genre_dict IDs; unknown genres get theirs first (see genres.py)
+        genre_ids = self.genre_dictionary.encode_batch(self.cursor, [athr[self.genre_field] for athr in self.successes])
 
-        for athr in self.successes:
+        for athr, athr_genre_ids in zip(self.successes, genre_ids):
             for field,val in athr.items():
                 # ensure ratings are between 1 and 5
                 if field == 'rating' and isinstance(val, (int,float)) and (val > 5 or val < 1):
@@ -337,13 +569,18 @@ class BatchAuthorPuller(BatchItemPuller):
                             athr['birth'],
                             athr['death'],
                             athr['top_genres'],
+                            athr_genre_ids,
                             athr['influences'],
                             athr['book_sample'],
                             athr['quotes_sample'],
                             athr['rating'],
                             athr['rating_count'],
                             athr['review_count'],
-                            athr['follower_count'])
+                            athr['follower_count'],
+                            athr.get('sim_authors'),   # only filled when chain_similar=True
+                            athr.get('pronoun_count_male'),
+                            athr.get('pronoun_count_female'),
+                            athr.get('first_name'))
             dat_to_insert.append(dat_as_tuple)
         
         insert_query =  '''
@@ -356,24 +593,34 @@ class BatchAuthorPuller(BatchItemPuller):
                                 birth,
                                 death,
                                 top_genres,
+                                top_genre_ids,
                                 influences,
                                 book_sample,
                                 quotes_sample,
                                 rating,
                                 rating_count,
                                 review_count,
-                                follower_count)
+                                follower_count,
+                                sim_authors,
+                                pronoun_count_male,
+                                pronoun_count_female,
+                                first_name)
                             VALUES 
                                 (%s, %s, %s, %s, %s, 
                                  %s, %s, %s, %s, %s,
+                                 %s, %s, %s, %s, %s, 
                                  %s, %s, %s, %s, %s)
                             ON CONFLICT DO NOTHING
                         '''
         t_start = time.time()
-        self.cursor.executemany(insert_query, dat_to_insert)
+        with tracing.span('db_write', item_type=self.item_type, rows=len(dat_to_insert)):
+            self.cursor.executemany(insert_query, dat_to_insert)
         t_end = time.time()
+        metrics.STAGE_SECONDS.observe(t_end - t_start, item_type=self.item_type, stage='db_write')
         t_e = round(t_end - t_start, 3)
         self.stat_log.info('batch %s DB INSERT %s tuples: %s sec', self.batch_id, len(dat_to_insert), t_e)
+        self._record_inserted_ids()
+        self._classify_new_genres()
 
 
 # BatchUserPuller
@@ -385,7 +632,10 @@ class BatchUserPuller(BatchItemPuller):
                  cursor: psycopg.Cursor,
                  user_ids: Iterable[str],
                  semaphore_count: int,
-                 status_logger: logging.Logger):
+                 status_logger: logging.Logger,
+                 id_ledger: Optional[IDLedger] = None,
+                 frontier: Optional[Frontier] = None,
+                 genre_dictionary: Optional[GenreDictionary] = None):
         '''pull Goodreads user data.
           
         :batch_id: batch identifier; used for logging
@@ -393,20 +643,28 @@ class BatchUserPuller(BatchItemPuller):
         :param user_ids: an iterable of Goodreads user IDs
         :param semaphore_count: number of maximum concurrent coroutines
         :param status_logger: a Logger object to record progress/status/issues
+        :param id_ledger: an IDLedger object; if given, inserted/failed IDs are recorded in it
+        :param frontier: a Frontier object; if given, outbound IDs of each parsed item are staged in it
+        :param genre_dictionary: a GenreDictionary object, to encode genres as genre_dict IDs on insert
         '''
         super().__init__(batch_id=batch_id, 
                          cursor=cursor, 
                          item_type='user', 
                          item_ids=user_ids, 
                          semaphore_count=semaphore_count, 
-                         status_logger=status_logger)
+                         status_logger=status_logger,
+                         id_ledger=id_ledger,
+                         frontier=frontier,
+                         genre_dictionary=genre_dictionary)
     
 
     def insert_batch_into_db(self) -> None:
         '''insert results into DB'''
         dat_to_insert = []
+        # genres as genre_dict IDs; unknown genres get theirs first (see genres.py)
+        genre_ids = self.genre_dictionary.encode_batch(self.cursor, [athr[self.genre_field] for athr in self.successes])
 
-        for athr in self.successes:
+        for athr, athr_genre_ids in zip(self.successes, genre_ids):
             for field,val in athr.items():
                 # ensure ratings are between 1 and 5
                 if field == 'rating' and isinstance(val, (int,float)) and (val > 5 or val < 1):
@@ -422,6 +680,7 @@ class BatchUserPuller(BatchItemPuller):
                             athr['rating_count'],
                             athr['review_count'],
                             athr['favorite_genres'],
+                            athr_genre_ids,
                             athr['follower_count'],
                             athr['friend_count'],
                             athr['currently_reading_sample_books'],
@@ -433,7 +692,8 @@ class BatchUserPuller(BatchItemPuller):
                             athr['quotes_sample_strings'],
                             athr['quotes_sample_author_ids'],
                             athr['friends_sample'],
-                            athr['currently_reading_update_time'])
+                            athr['currently_reading_update_time'],
+                            athr.get('first_name'))
             dat_to_insert.append(dat_as_tuple)
         
         insert_query =  '''
@@ -445,6 +705,7 @@ class BatchUserPuller(BatchItemPuller):
                                 rating_count,
                                 review_count,
                                 favorite_genres,
+                                favorite_genre_ids,
                                 follower_count,
                                 friend_count,
                                 currently_reading_sample_books,
@@ -456,17 +717,21 @@ class BatchUserPuller(BatchItemPuller):
                                 quotes_sample_strings,
                                 quotes_sample_author_ids,
                                 friends_sample,
-                                cr_recent_update
+                                cr_recent_update,
+                                first_name
                                 )
                             VALUES 
                                 (%s, %s, %s, %s, %s, %s,
                                  %s, %s, %s, %s, %s, %s,
-                                 %s, %s, %s, %s, %s, %s, %s)
+                                 %s, %s, %s, %s, %s, %s, %s, %s, %s)
                             ON CONFLICT DO NOTHING
                         '''
         t_start = time.time()
-        self.cursor.executemany(insert_query, dat_to_insert)
+        with tracing.span('db_write', item_type=self.item_type, rows=len(dat_to_insert)):
+            self.cursor.executemany(insert_query, dat_to_insert)
         t_end = time.time()
+        metrics.STAGE_SECONDS.observe(t_end - t_start, item_type=self.item_type, stage='db_write')
         t_e = round(t_end - t_start, 3)
         self.stat_log.info('batch %s DB INSERT %s tuples: %s sec', self.batch_id, len(dat_to_insert), t_e)
+        self._record_inserted_ids()
         
\ No newline at end of file
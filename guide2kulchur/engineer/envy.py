@@ -16,6 +16,7 @@ from bs4 import BeautifulSoup
 import psycopg
 
 from guide2kulchur.privateer.recruits import _rand_headers, _parse_id
+from guide2kulchur.engineer.simpullers import _update_sim_col
 
 
 def _parse_sim_books_page(txt: str,
@@ -183,40 +184,5 @@ class Envy:
 
 
     def update_and_insert_db(self):
-        '''update sim_books column
-        
-        1. create table (if not exists) to insert the sim_id, and text array of similar book IDs
-        2. insert tuples. In case of NA values, an empty array is inserted
-        3. update main alexandria table and set sim_books column, join the newly created table and alexandria on sim_id
-        '''
-        create_table_query = '''
-                            CREATE TABLE IF NOT EXISTS sim_books
-                            (
-                                sim_id text PRIMARY KEY,
-                                sim_books text[]
-                            )
-                            '''
-        self.cursor.execute(create_table_query)
-
-        truncate_the_table_query = '''TRUNCATE TABLE sim_books'''
-        self.cursor.execute(truncate_the_table_query)
-
-        insert_into_sim_books_query = '''
-                                        INSERT INTO sim_books 
-                                            (sim_id,
-                                             sim_books)
-                                        VALUES
-                                            (%s,
-                                             %s)
-                                        ON CONFLICT DO NOTHING -- this shouldn't ever happen, but just in case
-                                      '''
-        self.cursor.executemany(insert_into_sim_books_query, self.tot_res)
-
-        update_and_set_query = '''
-                                UPDATE alexandria alx
-                                SET sim_books = sb.sim_books
-                                FROM sim_books sb
-                                WHERE alx.sim_books_url_id = sb.sim_id
-                               '''
-        self.cursor.execute(update_and_set_query)
-
+        '''update sim_books column of the alexandria rows matching this batch's sim_ids, in one statement'''
+        _update_sim_col(cursor=self.cursor, sim_item_type='book', sim_pairs=self.tot_res)
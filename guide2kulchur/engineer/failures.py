@@ -0,0 +1,65 @@
+'''
+failure taxonomy for item pulls; each error class has its own retry policy.
+
+the privateer loaders wrap every error in a generic Exception (e.g., "Unexpected Error for 123: Improper request
+respose: 404 recieved for book 123"), so the class is recovered from the exception chain and its messages.
+failed IDs are stored in error_id with their class, number of attempts and a retry_after timestamp; once it
+passes, the ID can be fed back into the frontier (see Frontier.push_retry_due).
+'''
+
+import re
+import asyncio
+from typing import (Dict,
+                    List,
+                    Any)
+
+import aiohttp
+
+
+# error class -> retry policy
+# - retry_in_loop: retried right away within the batch, like timeouts
+# - base: wait before the first retry of a failed ID; doubled for each further failed attempt
+# - cap: max wait before a retry
+ERROR_POLICIES: Dict[str,Dict[str,Any]] = {
+    'not_found': {'retry_in_loop': False, 'base': '90 days', 'cap': '365 days'},
+    'private': {'retry_in_loop': False, 'base': '30 days', 'cap': '180 days'},
+    'throttled': {'retry_in_loop': True, 'base': '1 hour', 'cap': '1 day'},
+    'network': {'retry_in_loop': True, 'base': '1 hour', 'cap': '1 day'},
+    'parse_error': {'retry_in_loop': False, 'base': '7 days', 'cap': '90 days'}
+}
+
+_STATUS_RE = re.compile(r'improper request respose: (\d{3})')
+
+
+def _exception_chain(er: BaseException) -> List[BaseException]:
+    '''returns the exception, followed by the exceptions it was raised from/during'''
+    chain = []
+    while er is not None and len(chain) < 10:    # cap, just in case of a cycle
+        chain.append(er)
+        er = er.__cause__ or er.__context__
+    return chain
+
+
+def classify_error(er: BaseException) -> str:
+    '''returns the error class (not_found|private|throttled|network|parse_error) of a failed item pull
+
+    :param er: the exception raised while pulling the item
+    '''
+    chain = _exception_chain(er)
+    msgs = ' '.join(str(e) for e in chain).lower()
+
+    if 'private profile' in msgs:
+        return 'private'
+
+    if status_match := _STATUS_RE.search(msgs):
+        status = int(status_match.group(1))
+        if status in (403, 429):
+            return 'throttled'
+        if status >= 500:
+            return 'network'
+        return 'not_found'
+
+    if any(isinstance(e, (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError)) for e in chain):
+        return 'network'
+
+    return 'parse_error'    # loaded fine, but the page didn't look like we expected
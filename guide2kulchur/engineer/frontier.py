@@ -0,0 +1,377 @@
+'''
+persistent crawl frontier of Goodreads IDs, fed directly from freshly parsed records.
+
+every successfully parsed book/author/user record points to other items (a book's author,
+an author's influences and sample books, a user's friends, followings, etc.). Instead of
+rediscovering those IDs with a DISTINCT UNNEST scan over a whole table at the start of each run,
+the batch pullers stage the outbound IDs as records come in, and push them into the frontier table
+once the batch is inserted. Crawls can then keep popping from the frontier indefinitely.
+
+the frontier is ordered by priority: every edge pointing to an item adds 1 + ln(1 + popularity) of the
+referencing item, so items that many (popular) items point to are pulled first. IDs with no referrer
+(e.g., from the sitemap) are pushed with a priority of zero, and only get pulled once nothing better is left.
+optionally, priorities are also scaled by the item's PageRank in the sim graphs (see curator/graphmetrics.py).
+
+popped IDs are only leased, not deleted; once their batch is inserted, "settle" deletes the pulled (or failed)
+IDs and releases the timed-out ones at a lower priority. if a batch (or the whole script) dies before that,
+the leases expire and the IDs get popped again.
+'''
+
+import math
+from typing import (Dict,
+                    Iterable,
+                    List,
+                    Optional,
+                    Tuple,
+                    Any)
+
+import psycopg
+
+from guide2kulchur.engineer.ledger import IDLedger, ITEM_TYPES
+
+
+# record field(s) -> type of the item the field points to; per record type
+OUTBOUND_FIELDS = {
+    'book': {
+        'author': ['author_id'],
+        'book': ['sim_books']   # only in the record when pulled with chain_similar=True
+    },
+    'author': {
+        'author': ['influences', 'sim_authors'],
+        'book': ['book_sample']
+    },
+    'user': {
+        'user': ['friends_sample', 'followings_sample_users'],
+        'author': ['followings_sample_authors', 'quotes_sample_author_ids', 'currently_reading_sample_authors'],
+        'book': ['currently_reading_sample_books', 'featured_shelf_sample_books']
+    }
+}
+
+# record field used as the popularity of a referencing item; per record type
+POPULARITY_FIELDS = {
+    'book': 'rating_count',
+    'author': 'rating_count',
+    'user': 'follower_count'
+}
+
+# table/column holding each item type; used when there's no ledger to dedup against
+_ITEM_TABLES = {
+    'book': ('alexandria', 'book_id'),
+    'author': ('pound', 'author_id'),
+    'user': ('false_dmitry', 'user_id')
+}
+
+
+def outbound_ids(item_type: str,
+                 record: Dict[str,Any]) -> Dict[str,List[str]]:
+    '''returns IDs a parsed record points to, keyed by the item type they belong to
+
+    :param item_type: Goodreads item type of the record (book|author|user)
+    :param record: a parsed record; e.g., the output of Dante().get_all_data()
+    '''
+    out = {}
+    for target_type, fields in OUTBOUND_FIELDS[item_type].items():
+        ids = []
+        for field in fields:
+            val = record.get(field)
+            if not val:
+                continue
+            if isinstance(val, str):
+                ids.append(val)
+            else:
+                ids.extend(v for v in val if v and isinstance(v, str))
+        if ids:
+            out[target_type] = ids
+    return out
+
+
+def referrer_weight(item_type: str,
+                    record: Dict[str,Any]) -> float:
+    '''returns the priority an edge from this record adds to the item it points to: 1 + ln(1 + popularity)
+
+    :param item_type: Goodreads item type of the record (book|author|user)
+    :param record: a parsed record; e.g., the output of Dante().get_all_data()
+    '''
+    popularity = record.get(POPULARITY_FIELDS[item_type])
+    if not isinstance(popularity, (int,float)) or popularity < 0:
+        popularity = 0
+    return 1 + math.log1p(popularity)
+
+
+class Frontier:
+    '''crawl frontier of Goodreads IDs yet to be pulled; staged in memory, persisted in the frontier table'''
+    def __init__(self,
+                 cursor: psycopg.Cursor,
+                 id_ledger: Optional[IDLedger] = None,
+                 rank_boost: Optional[Any] = None,
+                 lease: str = '1 hour',
+                 retry_penalty: float = .5):
+        '''stage, push and pop Goodreads item IDs to pull.
+
+        :param cursor: a psycopg Cursor object
+        :param id_ledger: an IDLedger object; if given, known/failed IDs are dropped in memory, instead of in the db
+        :param rank_boost: an object with a "factors(item_type, ids)" method, e.g. curator.graphmetrics.RankBoost;
+            if given, staged priorities are multiplied by the factor for each ID (its PageRank in the sim graph)
+        :param lease: how long popped IDs are held (a Postgres interval); if not settled by then, they're popped again
+        :param retry_penalty: priority multiplier for IDs released by "settle"; e.g., timed-out IDs
+        '''
+        self.cursor = cursor
+        self.id_ledger = id_ledger
+        self.rank_boost = rank_boost
+        self.lease = lease
+        self.retry_penalty = retry_penalty
+        self.staged: Dict[str,Dict[str,List[float]]] = {t: {} for t in ITEM_TYPES}    # ID -> [in-degree, priority]
+
+
+    def stage(self,
+              item_type: str,
+              ids: Iterable[str],
+              weight: float = 1.0,
+              edges: int = 1) -> None:
+        '''stage IDs to be pushed into the frontier on the next flush
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param ids: an iterable of Goodreads item IDs
+        :param weight: priority added to each ID; see "referrer_weight"
+        :param edges: in-degree added to each ID; 0 for IDs with no referrer (e.g., sitemap IDs)
+        '''
+        staged = self.staged[item_type]
+        for id_ in dict.fromkeys(ids):  # one edge per referrer, even if it lists an ID twice
+            score = staged.setdefault(id_, [0, 0.0])
+            score[0] += edges
+            score[1] += weight
+
+
+    def stage_scored(self,
+                     item_type: str,
+                     rows: Iterable[Tuple[str,int,float]]) -> None:
+        '''stage already aggregated (ID, in-degree, priority) rows; e.g., from a seed query
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param rows: an iterable of (Goodreads item ID, in-degree, priority) tuples
+        '''
+        staged = self.staged[item_type]
+        for id_, in_degree, priority in rows:
+            score = staged.setdefault(id_, [0, 0.0])
+            score[0] += in_degree
+            score[1] += priority
+
+
+    def stage_record(self,
+                     item_type: str,
+                     record: Dict[str,Any]) -> None:
+        '''stage the outbound IDs of a freshly parsed record
+
+        :param item_type: Goodreads item type of the record (book|author|user)
+        :param record: a parsed record; e.g., the output of Dante().get_all_data()
+        '''
+        weight = referrer_weight(item_type, record)
+        for target_type, ids in outbound_ids(item_type, record).items():
+            self.stage(target_type, ids, weight=weight)
+
+
+    def flush(self) -> Dict[str,int]:
+        '''push staged IDs into the frontier table, skipping known/failed IDs; returns number of IDs pushed per type
+
+        IDs already in the frontier get their in-degree and priority bumped, instead of being ignored.
+        '''
+        pushed = {}
+        for item_type in ITEM_TYPES:
+            staged = self.staged[item_type]
+            self.staged[item_type] = {}
+            ids = list(staged)
+            if self.id_ledger:
+                ids = self.id_ledger.filter_new(item_type, ids)
+            if not ids:
+                continue
+            in_degrees = [int(staged[id_][0]) for id_ in ids]
+            priorities = [staged[id_][1] for id_ in ids]
+            if self.rank_boost:
+                priorities = [p * f for p, f in zip(priorities, self.rank_boost.factors(item_type, ids))]
+
+            if self.id_ledger:
+                filter_clause = ''
+            else:
+                tbl, col = _ITEM_TABLES[item_type]
+                filter_clause = f'''
+                                    WHERE NOT EXISTS (SELECT 1 FROM {tbl} WHERE {col} = s.item_id)
+                                    AND NOT EXISTS (SELECT
+                                                        1
+                                                    FROM error_id
+                                                    WHERE
+                                                        error_id.item_id = s.item_id
+                                                    AND
+                                                        error_id.item_type = %(item_type)s
+                                                    AND
+                                                        error_id.retry_after > NOW())
+                                 '''
+            push_statement = f'''
+                                INSERT INTO frontier
+                                    (item_id, item_type, in_degree, priority)
+                                SELECT
+                                    s.item_id, %(item_type)s, s.in_degree, s.priority
+                                FROM
+                                    unnest(%(ids)s::text[], %(in_degrees)s::int[], %(priorities)s::real[]) 
+                                        AS s (item_id, in_degree, priority)
+                                {filter_clause}
+                                ON CONFLICT (item_id, item_type) DO UPDATE
+                                SET
+                                    in_degree = frontier.in_degree + EXCLUDED.in_degree,
+                                    priority = frontier.priority + EXCLUDED.priority
+                             '''
+            params = {
+                'item_type': item_type,
+                'ids': ids,
+                'in_degrees': in_degrees,
+                'priorities': priorities
+            }
+            self.cursor.execute(push_statement, params)
+            pushed[item_type] = self.cursor.rowcount
+        return pushed
+
+
+    def push_retry_due(self,
+                       item_type: Optional[str] = None,
+                       n: int = 10_000) -> int:
+        '''push failed IDs past their retry_after time (see failures.py) back into the frontier; returns number of IDs pushed
+
+        retried IDs have no referrer, so they go in with a priority of zero. If they fail again, error_id
+        pushes their retry_after further out; if they succeed, they're cleared from error_id.
+
+        :param item_type: Goodreads item type (book|author|user); if None, pushes all types
+        :param n: max number of IDs to push
+        '''
+        retry_due_statement = '''
+                                INSERT INTO frontier
+                                    (item_id, item_type, in_degree, priority)
+                                SELECT
+                                    item_id, item_type, 0, 0
+                                FROM 
+                                    error_id
+                                WHERE
+                                    retry_after <= NOW()
+                                AND
+                                    (%(item_type)s::text IS NULL OR item_type = %(item_type)s::text)
+                                ORDER BY retry_after
+                                LIMIT %(n)s
+                                ON CONFLICT DO NOTHING
+                              '''
+        self.cursor.execute(retry_due_statement, {'item_type': item_type, 'n': n})
+        return self.cursor.rowcount
+
+
+    def pop(self,
+            item_type: str,
+            n: int) -> List[str]:
+        '''lease and return up to n IDs from the frontier, highest priority first
+
+        leased IDs stay in the frontier, but aren't popped again until their lease expires; call "settle"
+        once the batch is inserted, or "release" if it failed.
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param n: max number of IDs to pop
+        '''
+        pop_statement = '''
+                            UPDATE
+                                frontier
+                            SET
+                                leased_until = NOW() + %s::interval
+                            WHERE
+                                item_type = %s
+                            AND
+                                item_id = ANY(array(SELECT
+                                                        item_id
+                                                    FROM frontier
+                                                    WHERE 
+                                                        item_type = %s
+                                                    AND
+                                                        (leased_until IS NULL OR leased_until < NOW())
+                                                    ORDER BY priority DESC
+                                                    LIMIT %s
+                                                    FOR UPDATE SKIP LOCKED))
+                            RETURNING item_id
+                        '''
+        self.cursor.execute(pop_statement, (self.lease, item_type, item_type, n))
+        return [r[0] for r in self.cursor.fetchall()]
+
+
+    def ack(self,
+            item_type: str,
+            ids: Iterable[str]) -> int:
+        '''delete popped IDs from the frontier, once they're pulled (or recorded as failed); returns number of IDs deleted
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param ids: popped Goodreads item IDs
+        '''
+        ids = list(ids)
+        if not ids:
+            return 0
+        ack_statement = '''
+                            DELETE FROM
+                                frontier
+                            WHERE
+                                item_type = %s
+                            AND
+                                item_id = ANY(%s::text[])
+                        '''
+        self.cursor.execute(ack_statement, (item_type, ids))
+        return self.cursor.rowcount
+
+
+    def release(self,
+                item_type: str,
+                ids: Iterable[str],
+                penalty: float = 1.0) -> int:
+        '''end the lease of popped IDs, so they can be popped again; returns number of IDs released
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param ids: popped Goodreads item IDs
+        :param penalty: priority multiplier; e.g., < 1 so IDs that just timed out don't come right back
+        '''
+        ids = list(ids)
+        if not ids:
+            return 0
+        release_statement = '''
+                                UPDATE
+                                    frontier
+                                SET
+                                    leased_until = NULL,
+                                    priority = priority * %s
+                                WHERE
+                                    item_type = %s
+                                AND
+                                    item_id = ANY(%s::text[])
+                            '''
+        self.cursor.execute(release_statement, (penalty, item_type, ids))
+        return self.cursor.rowcount
+
+
+    def settle(self,
+               item_type: str,
+               ids: Iterable[str],
+               retry_ids: Iterable[str] = ()) -> Tuple[int,int]:
+        '''settle a popped batch, once it's inserted: delete its IDs, except retry_ids, which are released at
+        a lower priority (see "retry_penalty"); returns (number of IDs deleted, number of IDs released)
+
+        failed IDs should not be in retry_ids; they're in error_id, and come back through "push_retry_due".
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param ids: the popped Goodreads item IDs of the batch
+        :param retry_ids: IDs of the batch to pull again; e.g., the batch puller's timeouts
+        '''
+        retry_ids = set(retry_ids)
+        done = [id_ for id_ in ids if id_ not in retry_ids]
+        return self.ack(item_type, done), self.release(item_type, retry_ids, penalty=self.retry_penalty)
+
+
+    def size(self,
+             item_type: Optional[str] = None) -> int:
+        '''returns number of IDs in the frontier table
+
+        :param item_type: Goodreads item type (book|author|user); if None, counts all types
+        '''
+        if item_type:
+            self.cursor.execute('SELECT COUNT(*) FROM frontier WHERE item_type = %s', (item_type,))
+        else:
+            self.cursor.execute('SELECT COUNT(*) FROM frontier')
+        return self.cursor.fetchone()[0]
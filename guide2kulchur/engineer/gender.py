@@ -0,0 +1,46 @@
+'''
+ingest-time inputs for the author/user gender predictions (the g_pound/g_dmitry views).
+
+the views used to run two regexp_replace/regexp_split_to_array passes over every author description,
+and a regex on every name, on each full REFRESH. now, Dante/FalseBardiya compute the same pronoun
+counts and normalized first name once, when the page is parsed; the batch pullers store them in
+pound/false_dmitry, and the views only join the indexed first_name against name_x_gender
+(see db/migrations/019).
+
+the regexes below are the ones from db/migrations/008, so the counts match what the views computed.
+'''
+
+import re
+from typing import (Optional,
+                    Tuple)
+
+
+# '\.? (she|her)( |\.|;|,)' and '\.? h(e|is)( |\.|;|,)', over the lowercased description
+_FEMALE_PRONOUN_RE = re.compile(r'\.? (she|her)( |\.|;|,)')
+_MALE_PRONOUN_RE = re.compile(r'\.? h(e|is)( |\.|;|,)')
+
+# regexp_replace(lower(name), '\s.*$', ''); "." matches newlines in Postgres regexes
+_AFTER_FIRST_NAME_RE = re.compile(r'\s.*$', re.DOTALL)
+
+
+def pronoun_counts(description: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    '''returns (male, female) pronoun counts of an author description; (None, None) if there's no description
+
+    :param description: an author description
+    '''
+    if description is None:
+        return None, None
+    descr = description.lower()
+    return (sum(1 for _ in _MALE_PRONOUN_RE.finditer(descr)),
+            sum(1 for _ in _FEMALE_PRONOUN_RE.finditer(descr)))
+
+
+def first_name(name: Optional[str]) -> Optional[str]:
+    '''returns the lowercased first name (everything before the first whitespace), as matched against name_x_gender
+
+    :param name: an author/user name
+    '''
+    if name is None:
+        return None
+    return _AFTER_FIRST_NAME_RE.sub('', name.lower(), count=1)
+
@@ -0,0 +1,313 @@
+'''
+raw Goodreads genre -> broad genre group (e.g., "Science Fiction" -> "Sci-Fi/Fantasy").
+
+the patterns are compiled once, and each distinct raw genre is classified exactly once: the mapping
+is kept in memory, and persisted to the genre_taxonomy table (see db/migrations/017). the batch
+pullers classify any genre they haven't seen before at insert time, so the table stays current
+with alexandria/pound; analyses map whole columns through the dict instead of regexing every row.
+
+    taxonomy = GenreTaxonomy.load_or_build(conn)
+    df['genre_broad'] = taxonomy.classify_series(df['genre'])
+
+also, raw Goodreads genre <-> smallint ID (the genre_dict table; see db/migrations/018). the batch pullers
+encode each item's genres on insert, into the top_genre_ids/favorite_genre_ids columns, which is what
+the genre filters and group-bys run on. the text[] columns are kept alongside (other readers still use
+them), so this speeds up queries; it doesn't save space. share one GenreDictionary across batches, so
+known genres aren't looked up again for every batch.
+
+    genre_dict = GenreDictionary.from_db(conn)
+    genre_dict.ids_matching('[Pp]oet')
+'''
+
+import re
+import hashlib
+from typing import (Dict,
+                    Iterable,
+                    List,
+                    Optional,
+                    Tuple,
+                    Any)
+
+import psycopg
+
+
+# order matters: the first matching pattern wins; patterns are matched against the lowercased genre
+BROAD_GENRE_PATTERNS: List[Tuple[str,str]] = [
+    (r'sci(ence)?[-\s]fi(ction)|fantasy', 'Sci-Fi/Fantasy'),
+    (r'philosop|poli(tic|cy)|econom', 'Philosophy/Politics/Economics'),
+    (r'non-?fiction', 'Nonfiction'),
+    (r'manga|comic|graphic[-\s]novel', 'Manga/Comics'),
+    (r'food|cook|kitchen|recipe', 'Cooking'),
+    (r'music', 'Music'),
+    (r'humor|comedy', 'Humor'),
+    (r'horror', 'Horror'),
+    (r'myster|crim(e|inal)|thriller', 'Mystery/Crime'),
+    (r'roman[tc]|erotic', 'Romance/Erotica'),
+    (r'^y\.?a\.?$|young[\s-]adult', 'Young Adult'),
+    (r'children', 'Children'),
+    (r'gay|queer|lgbt|lesbian', 'Queer'),
+    (r'poet', 'Poetry'),
+    (r'^(?!science)[\s-]?fiction', 'Fiction'),
+    (r'horror|suspense', 'Horror/Suspence'),
+    (r'classics', 'Classics'),
+    (r'history', 'History'),
+    (r'psych|sociol', 'Psychology/Sociology'),
+    (r'theology|christian|catholi|islam|judai|jewis|religio|spirit|pagan', 'Religion/Spirituality'),
+    (r'sports|athlet', 'Sports'),
+    (r'business|financ', 'Business'),
+    (r'computer|tech|^science$|math', 'STEM'),
+    (r'art|craft|photo|film', 'Art/Photography'),
+    (r'self[-\s]?help', 'Self Help'),
+    (r'biograph|memoir', 'Biography/Memoir'),
+    (r'contemporary|modern', 'Contemporary'),
+    (r'chick[\s-]lit', 'Chick-Lit')
+]
+
+OTHER_GENRE = 'Other'
+
+# rows classified under a different set of patterns are reclassified on load
+TAXONOMY_VERSION = hashlib.sha1(repr(BROAD_GENRE_PATTERNS).encode()).hexdigest()[:12]
+
+_COMPILED = [(re.compile(pat), lab) for pat, lab in BROAD_GENRE_PATTERNS]
+
+_DISTINCT_GENRES_QUERY = '''
+                         SELECT unnest(top_genres) FROM alexandria
+                         UNION
+                         SELECT unnest(top_genres) FROM pound
+                         UNION
+                         SELECT unnest(favorite_genres) FROM false_dmitry
+                         '''
+
+
+def classify_genre(genre: str) -> str:
+    '''returns the broad genre group of a raw genre string; "Other" if no pattern matches
+
+    :param genre: a raw Goodreads genre, e.g. "Science Fiction"; matched lowercased (book genres already are, author genres aren't)
+    '''
+    genre = genre.lower()
+    for pat, lab in _COMPILED:
+        if pat.search(genre):
+            return lab
+    return OTHER_GENRE
+
+
+class GenreTaxonomy:
+    '''memoized raw genre -> broad genre mapping, backed by the genre_taxonomy table'''
+    def __init__(self,
+                 mapping: Optional[Dict[str,str]] = None):
+        '''classify raw Goodreads genres into broad genre groups.
+
+        :param mapping: already classified genres (raw -> broad); e.g., loaded from the db
+        '''
+        self.mapping: Dict[str,str] = dict(mapping or {})
+        self.pending: Dict[str,str] = {}     # classified since the last flush
+
+
+    @classmethod
+    def from_db(cls,
+                conn: psycopg.Connection) -> 'GenreTaxonomy':
+        '''load the genres classified under the current patterns from the genre_taxonomy table.
+
+        :param conn: a psycopg Connection object
+        '''
+        with conn.cursor() as cur:
+            cur.execute('SELECT genre, broad_genre FROM genre_taxonomy WHERE taxonomy_version = %s',
+                        (TAXONOMY_VERSION,))
+            return cls(dict(cur.fetchall()))
+
+
+    @classmethod
+    def load_or_build(cls,
+                      conn: psycopg.Connection) -> 'GenreTaxonomy':
+        '''load the taxonomy from the db, then classify (and persist) any genre in the item tables it doesn't have yet.
+
+        :param conn: a psycopg Connection object
+        '''
+        taxonomy = cls.from_db(conn)
+        with conn.cursor() as cur:
+            cur.execute(_DISTINCT_GENRES_QUERY)
+            taxonomy.observe(r[0] for r in cur.fetchall())
+            taxonomy.flush(cur)
+        return taxonomy
+
+
+    def classify(self,
+                 genre: Optional[str]) -> Optional[str]:
+        '''returns the broad genre group of a raw genre; regexes only run the first time a genre is seen
+
+        :param genre: a raw Goodreads genre; None stays None
+        '''
+        if genre is None:
+            return None
+        broad = self.mapping.get(genre)
+        if broad is None:
+            broad = self.mapping[genre] = self.pending[genre] = classify_genre(genre)
+        return broad
+
+
+    def observe(self,
+                genres: Iterable[Optional[str]]) -> int:
+        '''classify any new genres among genres; returns the number of new genres
+
+        :param genres: raw Goodreads genres (e.g., a batch's top_genres, flattened)
+        '''
+        n_pending = len(self.pending)
+        for genre in genres:
+            if genre and genre not in self.mapping:
+                self.classify(genre)
+        return len(self.pending) - n_pending
+
+
+    def flush(self,
+              cursor: psycopg.Cursor) -> int:
+        '''write the genres classified since the last flush to the genre_taxonomy table; returns number written
+
+        :param cursor: a psycopg Cursor object
+        '''
+        if not self.pending:
+            return 0
+        rows = [(g, b, TAXONOMY_VERSION) for g, b in self.pending.items()]
+        cursor.executemany('''
+                           INSERT INTO genre_taxonomy
+                               (genre, broad_genre, taxonomy_version)
+                           VALUES
+                               (%s, %s, %s)
+                           ON CONFLICT (genre) DO UPDATE SET
+                               broad_genre = EXCLUDED.broad_genre,
+                               taxonomy_version = EXCLUDED.taxonomy_version,
+                               classified_at = NOW()
+                           ''', rows)
+        self.pending.clear()
+        return len(rows)
+
+
+    def classify_many(self,
+                      genres: Iterable[Optional[str]]) -> List[Optional[str]]:
+        '''returns the broad genre group of each raw genre
+
+        :param genres: raw Goodreads genres
+        '''
+        return [self.classify(g) for g in genres]
+
+
+    def classify_series(self,
+                        genres: Any) -> Any:
+        '''returns a pandas Series of broad genre groups; each distinct genre is classified once
+
+        :param genres: a pandas Series of raw Goodreads genres
+        '''
+        self.observe(g for g in genres.unique() if isinstance(g, str))
+        return genres.map(self.mapping)
+
+
+    def classify_arrow(self,
+                       genres: Any) -> Any:
+        '''returns a pyarrow string Array of broad genre groups; each distinct genre is classified once
+
+        :param genres: a pyarrow (Chunked)Array of raw Goodreads genres
+        '''
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        if isinstance(genres, pa.ChunkedArray):
+            genres = genres.combine_chunks()
+        encoded = pc.dictionary_encode(genres)
+        broad = pa.array(self.classify_many(encoded.dictionary.to_pylist()), type=pa.string())
+        return broad.take(encoded.indices)
+
+
+class GenreDictionary:
+    '''in-memory cache of the genre_dict table (raw genre <-> smallint ID); new genres get IDs on first sight'''
+    def __init__(self,
+                 ids: Optional[Dict[str,int]] = None):
+        '''encode raw Goodreads genres as genre_dict IDs.
+
+        :param ids: already known genres (raw -> ID); e.g., loaded from the db
+        '''
+        self.ids: Dict[str,int] = dict(ids or {})
+        self.genres: Dict[int,str] = {i: g for g, i in self.ids.items()}
+
+
+    @classmethod
+    def from_db(cls,
+                conn: psycopg.Connection) -> 'GenreDictionary':
+        '''load the whole genre_dict table.
+
+        :param conn: a psycopg Connection object
+        '''
+        with conn.cursor() as cur:
+            cur.execute('SELECT genre, genre_id FROM genre_dict')
+            return cls(dict(cur.fetchall()))
+
+
+    def register(self,
+                 cursor: psycopg.Cursor,
+                 genres: Iterable[Optional[str]]) -> int:
+        '''make sure every genre has an ID, inserting the unknown ones into genre_dict; returns number of genres fetched
+
+        :param cursor: a psycopg Cursor object
+        :param genres: raw Goodreads genres
+
+        one INSERT and one SELECT for all unknown genres, however many there are; nothing if there are none
+        '''
+        unknown = list({g for g in genres if g and g not in self.ids})
+        if not unknown:
+            return 0
+        cursor.execute('''
+                       INSERT INTO genre_dict (genre)
+                       SELECT unnest(%s::text[])
+                       ON CONFLICT (genre) DO NOTHING
+                       ''', (unknown,))
+        # another job may have inserted some of these first; select them all either way
+        cursor.execute('SELECT genre, genre_id FROM genre_dict WHERE genre = ANY(%s)', (unknown,))
+        rows = cursor.fetchall()
+        for genre, genre_id in rows:
+            self.ids[genre] = genre_id
+            self.genres[genre_id] = genre
+        return len(rows)
+
+
+    def encode(self,
+               genres: Optional[List[str]]) -> Optional[List[int]]:
+        '''returns the IDs of an item's genres, in order; None stays None (call "register" first for new genres)
+
+        :param genres: an item's raw Goodreads genres
+        '''
+        if genres is None:
+            return None
+        return [self.ids[g] for g in genres if g in self.ids]
+
+
+    def encode_batch(self,
+                     cursor: psycopg.Cursor,
+                     genre_lists: List[Optional[List[str]]]) -> List[Optional[List[int]]]:
+        '''returns the IDs of each item's genres, registering unknown genres first
+
+        :param cursor: a psycopg Cursor object
+        :param genre_lists: each item's raw Goodreads genres (or None)
+        '''
+        self.register(cursor, (g for gl in genre_lists for g in (gl or [])))
+        return [self.encode(gl) for gl in genre_lists]
+
+
+    def decode(self,
+               genre_ids: Optional[Iterable[int]]) -> Optional[List[str]]:
+        '''returns the raw genres of a list of IDs
+
+        :param genre_ids: genre_dict IDs
+        '''
+        if genre_ids is None:
+            return None
+        return [self.genres[i] for i in genre_ids if i in self.genres]
+
+
+    def ids_matching(self,
+                     genre_pat: str,
+                     lowercase: bool = False) -> List[int]:
+        '''returns the IDs of the genres matching a regex (anywhere in the string, like Postgres "~")
+
+        :param genre_pat: regex pattern
+        :param lowercase: match against the lowercased genre
+        '''
+        pat = re.compile(genre_pat)
+        return sorted(i for g, i in self.ids.items() if pat.search(g.lower() if lowercase else g))
@@ -0,0 +1,268 @@
+'''
+in-memory ledger of Goodreads IDs we already know about; meant for frontier dedup.
+
+Goodreads IDs are integers, so we can keep every known book/author/user ID (plus the IDs
+in error_id) in compressed (roaring) bitmaps. The known bitmaps are built once from the db, persisted
+to disk, and updated as rows are inserted (and re-synced on load, if other scripts inserted rows since);
+the failed bitmaps are rebuilt from error_id on every load,
+since retry_after times pass. Frontier candidates can then be checked in memory,
+instead of through a DISTINCT UNNEST + LEFT JOIN + NOT EXISTS query on every run.
+'''
+
+import os
+import json
+from typing import (Dict,
+                    Iterable,
+                    List,
+                    Optional)
+
+import psycopg
+from pyroaring import BitMap
+
+
+ITEM_TYPES = ('book', 'author', 'user')
+
+_KNOWN_ID_QUERIES = {
+    'book': 'SELECT book_id FROM alexandria',
+    'author': 'SELECT author_id FROM pound',
+    'user': 'SELECT user_id FROM false_dmitry'
+}
+
+# failed IDs past their retry_after time aren't excluded anymore; see failures.py
+_FAILED_ID_QUERY = 'SELECT item_id, item_type FROM error_id WHERE retry_after > NOW()'
+
+_MAX_ID = 2 ** 32   # roaring bitmaps hold 32-bit unsigned ints; goodreads IDs are well under this
+
+
+def _as_int(id_: Optional[str]) -> Optional[int]:
+    '''returns ID string as int, or None if it can't be stored in the ledger
+
+    :param id_: a Goodreads item ID string
+    '''
+    try:
+        int_id = int(id_)
+    except (TypeError, ValueError):
+        return None
+    return int_id if 0 <= int_id < _MAX_ID else None
+
+
+class IDLedger:
+    '''compressed bitmaps of known (in db) and failed (in error_id) Goodreads IDs'''
+    def __init__(self,
+                 path: Optional[str] = None):
+        '''keep track of known/failed Goodreads item IDs.
+
+        :param path: directory where the bitmaps are persisted; see "save" and "load"
+        '''
+        self.path = path
+        self.known: Dict[str,BitMap] = {t: BitMap() for t in ITEM_TYPES}
+        self.failed: Dict[str,BitMap] = {t: BitMap() for t in ITEM_TYPES}
+        # row count - bitmap size, per type, as of the last sync; the db also holds IDs the ledger can't
+        # (malformed ones), so this is the expected gap while nothing else inserts rows
+        self.count_gaps: Dict[str,int] = {}
+
+
+    @classmethod
+    def from_db(cls,
+                conn: psycopg.Connection,
+                path: Optional[str] = None,
+                fetch_size: int = 100_000) -> 'IDLedger':
+        '''build the ledger from the db; streams IDs with a server-side cursor.
+
+        :param conn: a psycopg Connection object
+        :param path: directory where the bitmaps will be persisted
+        :param fetch_size: number of rows fetched per round trip
+        '''
+        ledger = cls(path=path)
+        for item_type in ITEM_TYPES:
+            ledger._sync_known(conn=conn, item_type=item_type, fetch_size=fetch_size)
+        ledger.refresh_failed(conn=conn, fetch_size=fetch_size)
+        return ledger
+
+
+    @classmethod
+    def load(cls,
+             path: str) -> 'IDLedger':
+        '''load a persisted ledger from disk.
+
+        :param path: directory the ledger was saved to
+        '''
+        ledger = cls(path=path)
+        for kind in ['known', 'failed']:
+            for item_type in ITEM_TYPES:
+                f_path = os.path.join(path, f'{kind}_{item_type}.roar')
+                if not os.path.exists(f_path):
+                    continue
+                with open(f_path, 'rb') as bm_file:
+                    getattr(ledger, kind)[item_type] = BitMap.deserialize(bm_file.read())
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as meta_file:
+                ledger.count_gaps = json.load(meta_file).get('count_gaps', {})
+        return ledger
+
+
+    @classmethod
+    def load_or_build(cls,
+                      conn: psycopg.Connection,
+                      path: str) -> 'IDLedger':
+        '''load the ledger from disk if it was persisted before; otherwise, build from db and save.
+
+        :param conn: a psycopg Connection object
+        :param path: directory where the bitmaps are persisted
+        '''
+        if os.path.isdir(path) and os.listdir(path):
+            ledger = cls.load(path)
+            if ledger.sync(conn=conn):
+                ledger.save()
+            ledger.refresh_failed(conn=conn)   # retry_after times pass between runs
+            return ledger
+        ledger = cls.from_db(conn=conn, path=path)
+        ledger.save()
+        return ledger
+
+
+    def _sync_known(self,
+                    conn: psycopg.Connection,
+                    item_type: str,
+                    fetch_size: int = 100_000) -> None:
+        '''stream every ID of the type's table into the known bitmap, then record the count gap'''
+        with conn.transaction():
+            with conn.cursor(name=f'ledger_{item_type}') as ss_cur:
+                ss_cur.execute(_KNOWN_ID_QUERIES[item_type])
+                num_rows = 0
+                while rows := ss_cur.fetchmany(fetch_size):
+                    num_rows += len(rows)
+                    self.add_known(item_type, (r[0] for r in rows))
+        self.count_gaps[item_type] = num_rows - len(self.known[item_type])
+
+
+    def sync(self,
+             conn: psycopg.Connection,
+             fetch_size: int = 100_000) -> List[str]:
+        '''re-sync the known bitmaps of item types whose tables got rows the ledger didn't see (e.g., inserted
+        by scripts without a ledger); returns the item types re-synced.
+
+        the check is one COUNT(*) per table: rows inserted through the ledger grow the count and the bitmap alike,
+        so the gap between them only changes when something else inserted (or deleted) rows.
+
+        :param conn: a psycopg Connection object
+        :param fetch_size: number of rows fetched per round trip, when re-syncing
+        '''
+        resynced = []
+        with conn.cursor() as cur:
+            for item_type, query in _KNOWN_ID_QUERIES.items():
+                cur.execute(f'SELECT COUNT(*) FROM ({query}) AS ids')
+                gap = cur.fetchone()[0] - len(self.known[item_type])
+                if gap != self.count_gaps.get(item_type):
+                    self._sync_known(conn=conn, item_type=item_type, fetch_size=fetch_size)
+                    resynced.append(item_type)
+        return resynced
+
+
+    def refresh_failed(self,
+                       conn: psycopg.Connection,
+                       fetch_size: int = 100_000) -> None:
+        '''rebuild the failed bitmaps from error_id, so IDs past their retry_after time are no longer excluded.
+
+        error_id only holds failed IDs, so this is cheap next to building the known bitmaps.
+
+        :param conn: a psycopg Connection object
+        :param fetch_size: number of rows fetched per round trip
+        '''
+        self.failed = {t: BitMap() for t in ITEM_TYPES}
+        with conn.transaction():
+            with conn.cursor(name='ledger_failed') as ss_cur:
+                ss_cur.execute(_FAILED_ID_QUERY)
+                while rows := ss_cur.fetchmany(fetch_size):
+                    for item_id, item_type in rows:
+                        self.add_failed(item_type, (item_id,))
+
+
+    def save(self,
+             path: Optional[str] = None) -> None:
+        '''persist the ledger to disk; each bitmap is written to a temp file first, then swapped in.
+
+        :param path: directory to save to; defaults to the path given at init
+        '''
+        path = path or self.path
+        if not path:
+            raise ValueError('IDLedger requires a path to save to')
+        os.makedirs(path, exist_ok=True)
+        for kind in ['known', 'failed']:
+            for item_type, bm in getattr(self, kind).items():
+                f_path = os.path.join(path, f'{kind}_{item_type}.roar')
+                tmp_path = f'{f_path}.tmp'
+                with open(tmp_path, 'wb') as bm_file:
+                    bm_file.write(bm.serialize())
+                os.replace(tmp_path, f_path)    # never leave a half-written bitmap behind
+        with open(os.path.join(path, 'meta.json'), 'w') as meta_file:
+            json.dump({'count_gaps': self.count_gaps}, meta_file)
+
+
+    def add_known(self,
+                  item_type: str,
+                  ids: Iterable[str]) -> None:
+        '''mark IDs as known (e.g., inserted into the db)
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param ids: an iterable of Goodreads item IDs
+        '''
+        self.known[item_type].update(i for i in map(_as_int, ids) if i is not None)
+
+
+    def add_failed(self,
+                   item_type: str,
+                   ids: Iterable[str]) -> None:
+        '''mark IDs as failed (e.g., inserted into error_id)
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param ids: an iterable of Goodreads item IDs
+        '''
+        if item_type not in self.failed:
+            return None
+        self.failed[item_type].update(i for i in map(_as_int, ids) if i is not None)
+
+
+    def is_new(self,
+               item_type: str,
+               item_id: str) -> bool:
+        '''returns True if the ID is neither known nor failed; malformed IDs are never new
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param item_id: a Goodreads item ID
+        '''
+        int_id = _as_int(item_id)
+        if int_id is None:
+            return False
+        return int_id not in self.known[item_type] and int_id not in self.failed[item_type]
+
+
+    def filter_new(self,
+                   item_type: str,
+                   ids: Iterable[str]) -> List[str]:
+        '''returns the IDs that are neither known nor failed; drops duplicates, keeps order
+
+        :param item_type: Goodreads item type (book|author|user)
+        :param ids: an iterable of candidate Goodreads item IDs
+        '''
+        known, failed = self.known[item_type], self.failed[item_type]
+        seen = BitMap()
+        new_ids = []
+        for id_ in ids:
+            int_id = _as_int(id_)
+            if int_id is None or int_id in seen:
+                continue
+            seen.add(int_id)
+            if int_id not in known and int_id not in failed:
+                new_ids.append(id_)
+        return new_ids
+
+
+    def summary(self) -> Dict[str,int]:
+        '''returns counts of known/failed IDs per item type; handy for logging'''
+        counts = {}
+        for item_type in ITEM_TYPES:
+            counts[f'known_{item_type}'] = len(self.known[item_type])
+            counts[f'failed_{item_type}'] = len(self.failed[item_type])
+        return counts
@@ -0,0 +1,319 @@
+'''
+live crawl metrics, in the OpenMetrics text format.
+
+counters, gauges and histograms (with labels) in a process-wide registry; the batch pullers record into the
+metrics defined below, an aiohttp TraceConfig records per-request latency/bytes, and the orchestrator serves
+the registry at http://<host>:<port>/metrics (and/or dumps it to a file every few seconds), so a crawl can be
+watched while it runs instead of grepping SUMMARY lines after the fact. enable with the "metrics" config key:
+
+    "metrics": {"host": "127.0.0.1", "port": 9108, "dump_path": "logs/metrics.txt", "dump_interval": 15}
+
+no dependencies besides aiohttp; recording is a dict lookup and an add, on the event loop thread.
+'''
+
+import os
+import time
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import (Dict,
+                    Iterator,
+                    List,
+                    Optional,
+                    Sequence,
+                    Tuple)
+
+import aiohttp
+from aiohttp import web
+
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# seconds; requests and item loads take ~0.1-10s, parsing and DB writes are faster
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30.)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _fmt_labels(labelnames: Sequence[str],
+                values: Tuple[str, ...],
+                extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _fmt_num(v: float) -> str:
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric(ABC):
+    type_name = 'unknown'
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self,
+             labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[k]) for k in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        '''returns (sample name, formatted labels, value) for each exposed sample'''
+        pass
+
+    def expose(self) -> str:
+        lines = [f'# TYPE {self.name} {self.type_name}', f'# HELP {self.name} {_escape(self.documentation)}']
+        lines.extend(f'{name}{labels} {_fmt_num(v)}' for name, labels, v in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    '''monotonically increasing count; exposed as <name>_total'''
+    type_name = 'counter'
+
+    def inc(self,
+            amount: float = 1,
+            **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(f'{self.name}_total', _fmt_labels(self.labelnames, k), v) for k, v in items]
+
+
+class Gauge(_Metric):
+    '''value that goes up and down; e.g., in-flight requests'''
+    type_name = 'gauge'
+
+    def set(self,
+            value: float,
+            **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self,
+            amount: float = 1,
+            **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self,
+            amount: float = 1,
+            **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def track(self,
+              **labels: str) -> '_GaugeTracker':
+        '''+1 for the duration of a (async) with block; e.g., "async with semaphore, IN_FLIGHT.track(...)"'''
+        return _GaugeTracker(self, labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _fmt_labels(self.labelnames, k), v) for k, v in items]
+
+
+class _GaugeTracker:
+    def __init__(self,
+                 gauge: Gauge,
+                 labels: Dict[str, str]):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self) -> None:
+        self.gauge.inc(**self.labels)
+
+    def __exit__(self, *exc) -> None:
+        self.gauge.dec(**self.labels)
+
+    async def __aenter__(self) -> None:
+        self.__enter__()
+
+    async def __aexit__(self, *exc) -> None:
+        self.__exit__(*exc)
+
+
+class Histogram(_Metric):
+    '''distribution of observed values (e.g., latencies) over fixed buckets'''
+    type_name = 'histogram'
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self,
+                value: float,
+                **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            if (state := self._values.get(key)) is None:
+                # [per-bucket counts (+ overflow), sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self,
+             **labels: str) -> Iterator[None]:
+        '''observe the wall time of a with block'''
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t_start, **labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._values.items()]
+        out = []
+        for k, (counts, total, n) in items:
+            cum = 0
+            for le, c in zip(self.buckets + (float('inf'),), counts):
+                cum += c
+                out.append((f'{self.name}_bucket', _fmt_labels(self.labelnames, k, ('le', _fmt_num(le))), cum))
+            out.append((f'{self.name}_sum', _fmt_labels(self.labelnames, k), total))
+            out.append((f'{self.name}_count', _fmt_labels(self.labelnames, k), n))
+        return out
+
+
+class Registry:
+    '''a set of metrics, exposed together'''
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self,
+                 metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f'metric {metric.name} already registered')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self) -> str:
+        '''returns every metric in the OpenMetrics text format'''
+        return '\n'.join(m.expose() for m in self._metrics.values()) + '\n# EOF\n'
+
+    def dump(self,
+             path: str) -> None:
+        '''write the exposition to path (atomically, so a reader never sees half a file)'''
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.expose())
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+
+# recorded by batchpullers.py
+ITEMS = REGISTRY.counter('g2k_items', 'items pulled, by outcome', ('item_type', 'status'))
+ITEM_ERRORS = REGISTRY.counter('g2k_item_errors', 'failed item attempts, by error class (see failures.py)',
+                               ('item_type', 'error_class'))
+STAGE_SECONDS = REGISTRY.histogram('g2k_stage_seconds',
+                                   'time per pipeline stage: fetch (request + soup), parse (field extraction), '
+                                   'sim (similar items page), db_write, frontier_push',
+                                   ('item_type', 'stage'))
+# summed over every batch of the item type running at the time (e.g., several orchestrator jobs),
+# so batches only add and subtract their own share
+QUEUE_DEPTH = REGISTRY.gauge('g2k_queue_depth', 'items of the running batches not yet done', ('item_type',))
+IN_FLIGHT = REGISTRY.gauge('g2k_in_flight', 'items currently being pulled (holding the semaphore)', ('item_type',))
+CONCURRENCY_LIMIT = REGISTRY.gauge('g2k_concurrency_limit', 'semaphore counts of the running batches, summed',
+                                   ('item_type',))
+
+# recorded by "trace_config"
+HTTP_SECONDS = REGISTRY.histogram('g2k_http_request_seconds', 'HTTP request latency, until the response headers',
+                                  ('host', 'status'))
+HTTP_BYTES = REGISTRY.counter('g2k_http_response_bytes', 'HTTP response body bytes received', ('host',))
+HTTP_ERRORS = REGISTRY.counter('g2k_http_errors', 'HTTP requests that raised, by exception class',
+                               ('host', 'error_class'))
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    '''returns an aiohttp TraceConfig recording request latency, response bytes and request errors'''
+    async def _on_start(session, ctx, params):
+        ctx.t_start = asyncio.get_running_loop().time()
+
+    async def _on_end(session, ctx, params):
+        HTTP_SECONDS.observe(asyncio.get_running_loop().time() - ctx.t_start,
+                             host=params.url.host or '', status=str(params.response.status))
+
+    async def _on_exception(session, ctx, params):
+        HTTP_ERRORS.inc(host=params.url.host or '', error_class=type(params.exception).__name__)
+
+    async def _on_chunk(session, ctx, params):
+        HTTP_BYTES.inc(len(params.chunk), host=params.url.host or '')
+
+    tc = aiohttp.TraceConfig()
+    tc.on_request_start.append(_on_start)
+    tc.on_request_end.append(_on_end)
+    tc.on_request_exception.append(_on_exception)
+    tc.on_response_chunk_received.append(_on_chunk)
+    return tc
+
+
+async def start_server(host: str = '127.0.0.1',
+                       port: int = 9108,
+                       registry: Registry = REGISTRY) -> web.AppRunner:
+    '''serve the registry at http://host:port/metrics; call .cleanup() on the returned runner to stop
+
+    :param host: interface to bind; keep it local
+    :param port: port to bind
+    :param registry: the registry to serve
+    '''
+    async def _metrics(request: web.Request) -> web.Response:
+        return web.Response(body=registry.expose().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get('/metrics', _metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def dump_forever(path: str,
+                       interval: float = 15.0,
+                       registry: Registry = REGISTRY) -> None:
+    '''write the registry to path every interval seconds, until cancelled
+
+    :param path: output file; e.g., for node_exporter's textfile collector, or just to tail
+    :param interval: seconds between dumps
+    :param registry: the registry to dump
+    '''
+    while True:
+        registry.dump(path)
+        await asyncio.sleep(interval)
@@ -0,0 +1,513 @@
+'''
+declarative crawl orchestrator; runs several crawl jobs in one process, over a shared HTTP session and a pool of DB
+connections (one per job; DB calls run in worker threads, so they don't stall the other jobs' HTTP traffic).
+
+each job declares its source of IDs, item type, rate budget and sinks in a JSON config file; i.e., what the
+main-pipeline scripts used to hard-code. See scripts/main-pipeline/orchestrator_config.json for an example,
+and run with:
+
+    python -m guide2kulchur.engineer run path/to/config.json
+
+job config keys:
+- name (str): job name; also the name of its log directory and run ID
+- item_type (str): book|author|user
+- source (dict): where the IDs come from; "kind" is one of:
+    - frontier: pop from the shared frontier (see frontier.py)
+    - table_column: seed the frontier by unnesting "column" of "table" if it has no IDs of this type, then pop from it;
+      seeded IDs are scored like frontier pushes, by in-degree and the popularity of the referencing rows
+      ("popularity" column; default rating_count|follower_count for alexandria/pound|false_dmitry)
+    - sitemap: a text file of IDs, one per line, at "path"; e.g., data/sitemap-dat/final_authorIDs_from_sitemap.txt;
+      pushed into the frontier (once per run) at a priority of zero, then popped from it
+    - json_ids: a JSON file at "path", with lists of IDs under "key" (e.g., {"results": {"genre": [...]}})
+    - missing_sim: items with a NULL sim_books|sim_authors column; pulls similar items only (book|author)
+- sinks (list): any of db (insert items and failed IDs) and frontier (push outbound IDs); default both
+- batch_size (int), iter_count (int): max number of items pulled := batch_size * iter_count
+- chain_similar (bool): pull similar items page with each book/author (see batchpullers.py)
+- rate (dict): sem_count, sub_batch_delay, sub_batch_size, num_attempts, inter_batch_sleep, and controller
+  (the cfg of recruits.update_sem_and_delay; merged key by key with the default)
+- log_abbr (str), max_bytes_per_log (int), max_backups (int), json_logs (bool; default true), and
+  item_log_sample_rate (float; fraction of per-item RETRY/T.E. lines kept, default 1.0): see recruits.gen_logger
+
+top-level keys, besides "jobs": pg_string_env, ledger_path, http, rank_boost_dir (optional; a directory of
+saved sim graphs with metrics, e.g. data/simgraph, used to scale frontier priorities by PageRank; see
+curator/graphmetrics.py), and genre_taxonomy (optional bool; classify new genres of inserted books/authors
+into the genre_taxonomy table; see genres.py), and metrics (optional dict: host, port, dump_path, dump_interval;
+serve live OpenMetrics at http://host:port/metrics and/or dump them to dump_path; see metrics.py), and tracing
+(optional dict: path, sample_rate; append per-batch stage spans to path, summarize them with
+"python -m guide2kulchur.engineer trace path"; see tracing.py)
+'''
+
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import (Dict,
+                    List,
+                    Optional,
+                    Any)
+
+import aiohttp
+import psycopg
+from psycopg_pool import ConnectionPool
+
+from guide2kulchur.engineer.batchpullers import (BatchBookPuller,
+                                                 BatchAuthorPuller,
+                                                 BatchUserPuller)
+from guide2kulchur.engineer.simpullers import SimBooksPuller, SimAuthorsPuller
+from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.ledger import IDLedger
+from guide2kulchur.engineer.frontier import Frontier
+from guide2kulchur.engineer.genres import GenreTaxonomy, GenreDictionary
+from guide2kulchur.engineer.runstate import RunState, gen_run_id
+from guide2kulchur.engineer import metrics, tracing
+
+
+SOURCE_KINDS = ('frontier', 'table_column', 'sitemap', 'json_ids', 'missing_sim')
+FRONTIER_KINDS = ('frontier', 'table_column', 'sitemap')   # popped (leased) from the frontier
+SINKS = ('db', 'frontier')
+
+_PULLERS = {
+    'book': (BatchBookPuller, 'book_ids'),
+    'author': (BatchAuthorPuller, 'author_ids'),
+    'user': (BatchUserPuller, 'user_ids')
+}
+
+_SIM_PULLERS = {
+    'book': (SimBooksPuller, 'sim_book_ids', 'SELECT sim_books_url_id FROM alexandria WHERE sim_books IS NULL LIMIT %s'),
+    'author': (SimAuthorsPuller, 'sim_author_ids', 'SELECT author_id FROM pound WHERE sim_authors IS NULL LIMIT %s')
+}
+
+DEFAULT_RATE = {
+    'sem_count': 3,
+    'sub_batch_delay': 2,
+    'sub_batch_size': 10,
+    'num_attempts': 3,
+    'inter_batch_sleep': 10,
+    'controller': {
+        'MIN_SEM': 2,
+        'MAX_SEM': 10,
+        'MIN_DELAY': .2,
+        'MAX_DELAY': 5,
+        'RATIO_THRESHOLD': .05,
+        'DELAY_DELTA': .1
+    }
+}
+
+# popularity of the referencing rows, for table_column seeds; see frontier.referrer_weight
+_SEED_POPULARITY = {
+    'alexandria': 'rating_count',
+    'pound': 'rating_count',
+    'false_dmitry': 'follower_count'
+}
+
+DEFAULT_HTTP = {
+    'timeout_total': 12,
+    'timeout_connect': 10,
+    'limit': 30,
+    'limit_per_host': 30,
+    'keepalive_timeout': 120
+}
+
+
+def load_config(path: str) -> Dict[str,Any]:
+    '''loads and validates an orchestrator config file
+
+    :param path: path to the JSON config file
+    '''
+    with open(path, 'r') as cfg_f:
+        cfg = json.load(cfg_f)
+
+    if not cfg.get('jobs'):
+        raise ValueError('orchestrator config requires at least one job under "jobs"')
+    names = set()
+    for job in cfg['jobs']:
+        if job.get('name') in names or not job.get('name'):
+            raise ValueError(f'each job requires a unique name; got {job.get("name")!r}')
+        names.add(job['name'])
+        if job.get('item_type') not in _PULLERS:
+            raise ValueError(f"job {job['name']}: item_type must be in ['book', 'author', 'user']")
+        if job.get('source', {}).get('kind') not in SOURCE_KINDS:
+            raise ValueError(f'job {job["name"]}: source kind must be in {list(SOURCE_KINDS)}')
+        if job['source']['kind'] == 'missing_sim' and job['item_type'] not in _SIM_PULLERS:
+            raise ValueError(f"job {job['name']}: missing_sim source only available for item_type in ['book', 'author']")
+        if bad_sinks := set(job.get('sinks', SINKS)) - set(SINKS):
+            raise ValueError(f'job {job["name"]}: unknown sinks {sorted(bad_sinks)}')
+    return cfg
+
+
+class CrawlJob:
+    '''one crawl job: a source of IDs, an item type, a rate budget and sinks'''
+    def __init__(self,
+                 cfg: Dict[str,Any],
+                 cursor: psycopg.Cursor,
+                 id_ledger: IDLedger,
+                 frontier: Frontier,
+                 genre_taxonomy: Optional[GenreTaxonomy] = None,
+                 genre_dictionary: Optional[GenreDictionary] = None,
+                 shared_lock: Optional[threading.Lock] = None):
+        '''set up a crawl job from its config.
+
+        :param cfg: the job's config; see module docstring
+        :param cursor: a psycopg Cursor object, over the job's own connection
+        :param id_ledger: the shared IDLedger object
+        :param frontier: the job's Frontier object (over the job's cursor; the frontier table itself is shared)
+        :param genre_taxonomy: the shared GenreTaxonomy object, if any
+        :param genre_dictionary: the shared GenreDictionary object (genre_dict IDs); if None, each batch uses a fresh one
+        :param shared_lock: held while a batch is committed, since the ledger, taxonomy and genre dictionary are shared
+        across jobs (and batches are committed in worker threads); if None, the job gets its own
+        '''
+        self.cfg = cfg
+        self.name = cfg['name']
+        self.item_type = cfg['item_type']
+        self.source = cfg['source']
+        self.sinks = set(cfg.get('sinks', SINKS))
+        self.batch_size = cfg.get('batch_size', 300)
+        self.iter_count = cfg.get('iter_count', 500)
+        self.chain_similar = cfg.get('chain_similar', False)
+        rate = cfg.get('rate', {})
+        self.rate = {**DEFAULT_RATE, **rate,
+                     'controller': {**DEFAULT_RATE['controller'], **rate.get('controller', {})}}
+
+        self.cursor = cursor
+        self.id_ledger = id_ledger
+        self.frontier = frontier
+        self.genre_taxonomy = genre_taxonomy
+        self.genre_dictionary = genre_dictionary
+        self.shared_lock = shared_lock or threading.Lock()
+        self.logger = gen_logger(name=self.name,
+                                 name_abbr=cfg.get('log_abbr', self.name[:4]),
+                                 max_bytes_per_log=cfg.get('max_bytes_per_log', 5_000_000),
+                                 max_backups=cfg.get('max_backups', 10),
+                                 json_lines=cfg.get('json_logs', True),
+                                 item_sample_rate=cfg.get('item_log_sample_rate', 1.0))
+
+        self.file_batches: Optional[List[List[str]]] = None   # only for json_ids sources
+        self.run_state: Optional[RunState] = None
+
+
+    def _read_source_file(self) -> List[str]:
+        '''returns sorted, deduplicated IDs from a sitemap|json_ids source file'''
+        ids = set()
+        if self.source['kind'] == 'sitemap':
+            with open(self.source['path'], 'r') as id_file:
+                for id_ in id_file:
+                    id_ = id_.strip()
+                    if id_ and id_.isdigit():    # some error lines, just skip here
+                        ids.add(id_)
+        else:
+            with open(self.source['path'], 'r') as id_file:
+                dat = json.load(id_file)
+            blocks = dat.get(self.source.get('key', 'results'), dat) if isinstance(dat, dict) else dat
+            for id_block in (blocks.values() if isinstance(blocks, dict) else [blocks]):
+                ids.update(id_block)
+        return sorted(ids)   # sorted, so batch IDs stay the same across restarts
+
+
+    def prepare(self) -> None:
+        '''load the job's source, and resume its last unfinished run (if any)'''
+        kind = self.source['kind']
+        run_id = self.name
+        ids = None
+
+        if kind in ('sitemap', 'json_ids'):
+            ids = self._read_source_file()
+            run_id = gen_run_id(self.name, ids)
+            self.logger.info('SOURCE %s: %s IDs', kind.upper(), len(ids))
+        if kind == 'json_ids':
+            # batches over the full file, so batch IDs (and the run ID) don't shift as IDs get pulled;
+            # already known IDs are dropped per batch, see "_next_ids"
+            self.file_batches = [ids[i:i+self.batch_size] for i in range(0, len(ids), self.batch_size)]
+            self.logger.info('SOURCE %s: %s BATCHES', kind.upper(), len(self.file_batches))
+
+        elif kind == 'table_column' and not self.frontier.size(self.item_type):
+            # scored the same way the frontier scores pushes: (ID, in-degree, SUM(1 + ln(1 + referrer popularity)))
+            table, column = self.source['table'], self.source['column']
+            popularity = self.source.get('popularity', _SEED_POPULARITY.get(table))
+            weight = f'1 + LN(1 + GREATEST(COALESCE(t.{popularity}, 0), 0))' if popularity else '1'
+            seed_query = f'''
+                            SELECT
+                                s_id, COUNT(*)::int, SUM({weight})::real
+                            FROM
+                                {table} t, UNNEST(t.{column}) AS s_id
+                            WHERE
+                                t.{column}[1] IS NOT NULL
+                            GROUP BY s_id
+                          '''
+            self.cursor.execute(seed_query)
+            self.frontier.stage_scored(self.item_type, self.cursor.fetchall())
+            self.logger.info('SEEDED FRONTIER %s: %s', self.item_type, self.frontier.flush())
+
+        self.run_state = RunState.load_or_start(cursor=self.cursor,
+                                                run_id=run_id,
+                                                controller={'sem_count': self.rate['sem_count'],
+                                                            'sub_batch_delay': self.rate['sub_batch_delay']})
+        if self.run_state.resumed:
+            self.logger.info('RESUMING run %s: %s batches done :: CFG: %s',
+                             self.run_state.run_id, len(self.run_state.completed_batches), self.run_state.controller)
+
+        if kind == 'sitemap' and not self.run_state.is_done('sitemap2frontier'):
+            # sitemap IDs have no referrer, so they go into the frontier with a priority of zero;
+            # i.e., they're only pulled once nothing pointed to by another item is left (see frontier.py)
+            for i in range(0, len(ids), 10_000):
+                self.frontier.stage(self.item_type, ids[i:i+10_000], weight=0, edges=0)
+                self.frontier.flush()
+            self.run_state.complete_batch('sitemap2frontier')
+            self.logger.info('SITEMAP PUSHED INTO FRONTIER %s: %s IDs', self.item_type, len(ids))
+
+        if kind in FRONTIER_KINDS:
+            self.logger.info('RETRY-DUE FAILED IDs PUSHED: %s', self.frontier.push_retry_due(self.item_type))
+
+
+    def _first_batch_id(self) -> int:
+        '''returns the ID of the first batch to run; file sources start over (done batches are skipped),
+        the others keep counting up from the resumed run'''
+        if self.file_batches is not None:
+            return 0
+        return max((int(b) + 1 for b in self.run_state.completed_batches if b.isdigit()), default=0)
+
+
+    def _next_ids(self,
+                  batch_id: int) -> Optional[List[str]]:
+        '''returns IDs for the batch; an empty list if none of a file batch's IDs are new, None if the source is exhausted'''
+        kind = self.source['kind']
+        if self.file_batches is not None:
+            if batch_id >= len(self.file_batches):
+                return None
+            return self.id_ledger.filter_new(self.item_type, self.file_batches[batch_id])
+
+        if self.run_state.in_flight:
+            # popped, but never committed, in the crashed run
+            in_flight, self.run_state.in_flight = self.run_state.in_flight, []
+            ids = in_flight if kind == 'missing_sim' else self.id_ledger.filter_new(self.item_type, in_flight)
+            if self._leased:
+                self.frontier.ack(self.item_type, set(in_flight) - set(ids))  # inserted before the crash
+            if ids:
+                return ids
+
+        if kind == 'missing_sim':
+            self.cursor.execute(_SIM_PULLERS[self.item_type][2], (self.batch_size,))
+            ids = [r[0] for r in self.cursor.fetchall()]
+        else:
+            ids = self.frontier.pop(self.item_type, self.batch_size)
+        return ids or None
+
+
+    @property
+    def _leased(self) -> bool:
+        '''whether the job's IDs are leased from the frontier (see Frontier.pop)'''
+        return self.source['kind'] in FRONTIER_KINDS
+
+
+    def _release(self,
+                 ids: List[str]) -> None:
+        '''give the IDs of a failed batch back to the frontier, if they came from it'''
+        if self._leased:
+            self.frontier.release(self.item_type, ids)
+
+
+    def _commit(self,
+                batch_id: int,
+                ids: List[str],
+                puller,
+                controller: Dict[str,Any]) -> bool:
+        '''write a pulled batch to the job's sinks, settle its frontier leases and mark it completed;
+        blocking, so run in a worker thread. Returns False (and releases the IDs) on a DB error'''
+        with self.shared_lock:
+            try:
+                if 'db' in self.sinks:
+                    if hasattr(puller, 'insert_failed_ids_into_db'):
+                        puller.insert_failed_ids_into_db()  # in case of failed IDs, to ignore in the future
+                    puller.insert_batch_into_db()
+                if 'frontier' in self.sinks and hasattr(puller, 'push_frontier_into_db'):
+                    puller.push_frontier_into_db()
+            except Exception as er:
+                self.logger.critical('DB ERR batch %s: %s', batch_id, er)
+                self._release(ids)
+                return False
+            if self._leased:
+                # pulled/failed IDs are done; timed-out ones go back, at a lower priority
+                self.frontier.settle(self.item_type, ids, retry_ids=puller.timeouts)
+            self.run_state.complete_batch(batch_id, controller)
+            self.id_ledger.save()
+        return True
+
+
+    def _make_puller(self,
+                     batch_id: int,
+                     ids: List[str],
+                     sem_count: int):
+        '''returns the batch puller for this job'''
+        if self.source['kind'] == 'missing_sim':
+            puller_cls, ids_kw, _ = _SIM_PULLERS[self.item_type]
+            return puller_cls(batch_id=batch_id,
+                              cursor=self.cursor,
+                              semaphore_count=sem_count,
+                              status_logger=self.logger,
+                              **{ids_kw: ids})
+
+        puller_cls, ids_kw = _PULLERS[self.item_type]
+        kwargs = {ids_kw: ids}
+        if self.item_type != 'user':
+            kwargs['chain_similar'] = self.chain_similar
+            kwargs['genre_taxonomy'] = self.genre_taxonomy
+        return puller_cls(batch_id=batch_id,
+                          cursor=self.cursor,
+                          semaphore_count=sem_count,
+                          status_logger=self.logger,
+                          id_ledger=self.id_ledger,
+                          frontier=self.frontier if 'frontier' in self.sinks else None,
+                          genre_dictionary=self.genre_dictionary,
+                          **kwargs)
+
+
+    async def run(self,
+                  session: aiohttp.ClientSession) -> None:
+        '''run the job's batch loop; meant to be gathered with other jobs over the same session
+
+        :param session: the shared aiohttp.ClientSession
+        '''
+        sem_count = self.run_state.controller['sem_count']
+        sub_batch_delay = self.run_state.controller['sub_batch_delay']
+        inter_batch_sleep = self.rate['inter_batch_sleep']
+
+        batch_id = self._first_batch_id()
+        num_run, slept_at = 0, 0
+        while num_run < self.iter_count:
+            if self.file_batches is not None and batch_id < len(self.file_batches) and self.run_state.is_done(batch_id):
+                batch_id += 1
+                continue    # already completed in the resumed run
+            if num_run > 0 and num_run % 4 == 0 and slept_at != num_run:
+                slept_at = num_run
+                await asyncio.sleep(inter_batch_sleep * (2 if num_run % 10 == 0 else 1))
+
+            starting_point_query_s = time.time()
+            ids = await asyncio.to_thread(self._next_ids, batch_id)
+            starting_point_query_e = time.time()
+            if ids is None:
+                self.logger.info('batch %s NO IDs LEFT', batch_id)
+                await asyncio.to_thread(self.run_state.finish)
+                return None
+            if not ids:
+                # every ID of the file batch was pulled elsewhere; nothing to run
+                await asyncio.to_thread(self.run_state.complete_batch, batch_id)
+                batch_id += 1
+                continue
+
+            self.logger.info('batch %s CFG: SEM-COUNT: %s & SUB-BATCH-DELAY: %s',
+                             batch_id, sem_count, sub_batch_delay)
+            self.logger.info('batch %s STARTING QUERY: %s sec.', batch_id, round(starting_point_query_e - starting_point_query_s, 3))
+            await asyncio.to_thread(self.run_state.start_batch, batch_id, ids)
+            num_run += 1
+
+            # one trace per batch; the item tasks inherit the batch span as their parent
+            with tracing.span('batch', job=self.name, item_type=self.item_type, batch_id=batch_id,
+                              num_ids=len(ids), sem_count=sem_count):
+                puller = self._make_puller(batch_id=batch_id, ids=ids, sem_count=sem_count)
+                load_kwargs = {} if self.source['kind'] == 'missing_sim' else {'see_progress': False}
+                try:
+                    await puller.load_the_batch(session=session,
+                                                num_attempts=self.rate['num_attempts'],
+                                                batch_delay=sub_batch_delay,
+                                                batch_size=self.rate['sub_batch_size'],
+                                                **load_kwargs)
+                except Exception as er:
+                    self.logger.critical('ERR batch %s: %s', batch_id, er)
+                    await asyncio.to_thread(self._release, ids)
+                    batch_id += 1
+                    continue
+
+                # new cfg for next batch
+                next_sem_count, next_sub_batch_delay = update_sem_and_delay(current_sem_count=sem_count,
+                                                                            current_sub_batch_delay=sub_batch_delay,
+                                                                            timeouts_per_batch_ratio=puller.metadat['timeouts_per_batch_ratio'],
+                                                                            cfg=self.rate['controller'])
+                committed = await asyncio.to_thread(self._commit, batch_id, ids, puller,
+                                                    {'sem_count': next_sem_count, 'sub_batch_delay': next_sub_batch_delay})
+            tracing.TRACER.flush()
+            batch_id += 1
+            if committed:
+                sem_count, sub_batch_delay = next_sem_count, next_sub_batch_delay
+
+
+async def run_jobs(cfg: Dict[str,Any],
+                   only: Optional[List[str]] = None) -> None:
+    '''run the configured jobs concurrently, over one HTTP session and a pool of DB connections (one per job)
+
+    :param cfg: orchestrator config; see "load_config"
+    :param only: names of the jobs to run; if None, runs all jobs
+    '''
+    pg_string = os.getenv(cfg.get('pg_string_env', 'PG_STRING'))
+    http_cfg = {**DEFAULT_HTTP, **cfg.get('http', {})}
+    ledger_path = cfg.get('ledger_path', os.path.join('data', 'ledger'))
+    job_cfgs = [j for j in cfg['jobs'] if not only or j['name'] in only]
+
+    timeout = aiohttp.ClientTimeout(total=http_cfg['timeout_total'],
+                                    connect=http_cfg['timeout_connect'])
+    connector = aiohttp.TCPConnector(limit=http_cfg['limit'],
+                                     limit_per_host=http_cfg['limit_per_host'],
+                                     keepalive_timeout=http_cfg['keepalive_timeout'],
+                                     enable_cleanup_closed=True)
+
+    # one connection per job (held for the whole run), plus one for the shared setup
+    with ConnectionPool(conninfo=pg_string, min_size=len(job_cfgs) + 1, max_size=len(job_cfgs) + 1,
+                        kwargs={'autocommit': True}) as pool, contextlib.ExitStack() as job_conns:
+        conn = job_conns.enter_context(pool.connection())
+        ledger = IDLedger.load_or_build(conn=conn, path=ledger_path)
+        rank_boost = None
+        if cfg.get('rank_boost_dir'):
+            # curator (numpy, networkx, ...) is only needed when the boost is configured
+            from guide2kulchur.curator.graphmetrics import RankBoost
+            rank_boost = RankBoost.load(cfg['rank_boost_dir'])
+        genre_taxonomy = GenreTaxonomy.load_or_build(conn) if cfg.get('genre_taxonomy') else None
+        genre_dictionary = GenreDictionary.from_db(conn)
+        shared_lock = threading.Lock()
+
+        jobs = []
+        for job_cfg in job_cfgs:
+            job_cur = job_conns.enter_context(pool.connection()).cursor()
+            jobs.append(CrawlJob(cfg=job_cfg, cursor=job_cur, id_ledger=ledger,
+                                 frontier=Frontier(cursor=job_cur, id_ledger=ledger, rank_boost=rank_boost),
+                                 genre_taxonomy=genre_taxonomy, genre_dictionary=genre_dictionary,
+                                 shared_lock=shared_lock))
+        for job in jobs:
+            job.prepare()
+
+        metrics_cfg = cfg.get('metrics')
+        metrics_runner, metrics_dump = None, None
+        if metrics_cfg:
+            if metrics_cfg.get('port'):
+                metrics_runner = await metrics.start_server(host=metrics_cfg.get('host', '127.0.0.1'),
+                                                            port=metrics_cfg['port'])
+            if metrics_cfg.get('dump_path'):
+                metrics_dump = asyncio.create_task(metrics.dump_forever(path=metrics_cfg['dump_path'],
+                                                                        interval=metrics_cfg.get('dump_interval', 15)))
+
+        tracing_cfg = cfg.get('tracing')
+        trace_configs = [metrics.trace_config()] if metrics_cfg else []
+        if tracing_cfg:
+            tracing.TRACER.configure(path=tracing_cfg['path'], sample_rate=tracing_cfg.get('sample_rate', 1.0))
+            trace_configs.append(tracing.trace_config())
+
+        try:
+            async with aiohttp.ClientSession(timeout=timeout,
+                                             connector=connector,
+                                             trace_configs=trace_configs or None) as sesh:
+                results = await asyncio.gather(*[job.run(session=sesh) for job in jobs],
+                                               return_exceptions=True)
+        finally:
+            if metrics_dump:
+                metrics_dump.cancel()
+                metrics.REGISTRY.dump(metrics_cfg['dump_path'])   # final numbers
+            if metrics_runner:
+                await metrics_runner.cleanup()
+            if tracing_cfg:
+                tracing.TRACER.flush()
+                tracing.TRACER.configure(path=None)
+
+        for job, res in zip(jobs, results):
+            if isinstance(res, Exception):
+                job.logger.critical('JOB %s FAILED: %s', job.name, res)
+        with shared_lock:
+            ledger.save()
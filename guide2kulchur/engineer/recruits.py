@@ -1,11 +1,17 @@
 import os
 import sys
+import json
+import queue
+import atexit
+import random
 import logging
 import re
 import asyncio
 import urllib.parse
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import (RotatingFileHandler,
+                              QueueHandler,
+                              QueueListener)
 from typing import (Tuple, 
                     Dict,
                     List, 
@@ -18,42 +24,100 @@ from psycopg.types.json import Jsonb
 from guide2kulchur.privateer.alexandria import Alexandria
 from guide2kulchur.privateer.pound import Pound
 from guide2kulchur.privateer.falsedmitry import FalseDmitry
+from guide2kulchur.engineer.gender import pronoun_counts, first_name
+
+
+# pass as "extra" on per-item log calls (RETRY, per-item T.E., ...); these are the ones sampled
+ITEM_LOG = {'item': True}
+
+_LOG_DATEFMT = '%m-%d-%Y %H:%M:%S'
+
+# logger name -> running QueueListener; see "gen_logger"
+_LISTENERS: Dict[str, QueueListener] = {}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    '''one JSON object per record: ts, level, logger, any structured extras, then msg (always last)'''
+    _EXTRAS = ('item',)
+
+    def format(self,
+               record: logging.LogRecord) -> str:
+        rec = {'ts': self.formatTime(record, self.datefmt),
+               'level': record.levelname,
+               'logger': record.name}
+        for k in self._EXTRAS:
+            if (v := getattr(record, k, None)) is not None:
+                rec[k] = v
+        if record.exc_info:
+            rec['exc'] = self.formatException(record.exc_info)
+        rec['msg'] = record.getMessage()
+        return json.dumps(rec, separators=(',', ':'), default=str)
+
+
+class ItemSampler(logging.Filter):
+    '''keep a fraction of per-item INFO/DEBUG records (those logged with extra=ITEM_LOG); everything else passes'''
+    def __init__(self,
+                 rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self,
+               record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno >= logging.WARNING or not getattr(record, 'item', False):
+            return True
+        return random.random() < self.rate
 
 
 def gen_logger(name: str,
                name_abbr: str,
                max_bytes_per_log: int,
-               max_backups: int) -> logging.Logger:
+               max_backups: int,
+               json_lines: bool = True,
+               item_sample_rate: float = 1.0,
+               to_stdout: bool = True) -> logging.Logger:
     '''set up logger object, return logger with separate progress/error tracking
     
     :param name: name of logger and of directory where logs will be stored
     :param name_abbr: name abbreviation, used for log file names
     :param max_bytes_per_log: max byte count per log file
     :param max_backups: max number of log files
+    :param json_lines: write the log files as JSON lines (stdout stays plain text)
+    :param item_sample_rate: fraction of per-item INFO records (extra=ITEM_LOG) to keep; summaries and errors are always kept
+    :param to_stdout: also stream to stdout
+
+    the logger itself only puts records on a queue; formatting and file/stdout I/O happen on a listener thread,
+    off the event loop. calling this again with the same name returns the same logger (only the sample rate
+    is updated), instead of adding another set of handlers.
     '''
     logger = logging.getLogger(name)
+    queue_handlers = [h for h in logger.handlers if isinstance(h, QueueHandler)]
+    if name in _LISTENERS:
+        for h in queue_handlers:
+            for f in h.filters:
+                if isinstance(f, ItemSampler):
+                    f.rate = item_sample_rate
+        return logger
+    # e.g., left over from a listener already stopped by "stop_loggers"
+    for h in queue_handlers:
+        logger.removeHandler(h)
     logger.setLevel(logging.DEBUG)
+    logger.propagate = False
 
     # make dirs
     os.makedirs('logs', exist_ok=True)
     os.makedirs(os.path.join('logs', name), exist_ok=True)
 
+    text_fmt = logging.Formatter(fmt='%(asctime)s %(levelname)s := %(message)s',
+                                 datefmt=_LOG_DATEFMT)
+    file_fmt = JsonLinesFormatter(datefmt=_LOG_DATEFMT) if json_lines else text_fmt
+
     # progress statements; e.g., time-to-complete batch #5
     PROG_PATH = os.path.join('logs', name, f'{name_abbr}_prog.log')
     prog_handler = RotatingFileHandler(filename=PROG_PATH,
                                        maxBytes=max_bytes_per_log,
                                        backupCount=max_backups)
     prog_handler.setLevel(logging.INFO)
-    prog_fmt = logging.Formatter(fmt='%(asctime)s %(levelname)s := %(message)s',
-                                 datefmt='%m-%d-%Y %H:%M:%S')
-    prog_handler.setFormatter(prog_fmt)
-
-    # stream to stdout
-    stream_handler = logging.StreamHandler(stream=sys.stdout)
-    stream_handler.setLevel(logging.INFO)
-    stream_fmt = logging.Formatter(fmt='%(asctime)s %(levelname)s := %(message)s',
-                                   datefmt='%m-%d-%Y %H:%M:%S')
-    stream_handler.setFormatter(stream_fmt)
+    prog_handler.setFormatter(file_fmt)
 
     # error statements; e.g., book ID 7777777 failed
     ERR_PATH = os.path.join('logs', name, f'{name_abbr}_err.log')
@@ -61,14 +125,38 @@ def gen_logger(name: str,
                                       maxBytes=max_bytes_per_log,
                                       backupCount=max_backups)
     err_handler.setLevel(logging.ERROR)
-    err_fmt = logging.Formatter(fmt='%(asctime)s %(levelname)s := %(message)s',
-                                datefmt='%m-%d-%Y %H:%M:%S')
-    err_handler.setFormatter(err_fmt)
+    err_handler.setFormatter(file_fmt)
 
-    logger.addHandler(prog_handler)
-    logger.addHandler(err_handler)
-    logger.addHandler(stream_handler)
+    handlers = [prog_handler, err_handler]
+    # stream to stdout
+    if to_stdout:
+        stream_handler = logging.StreamHandler(stream=sys.stdout)
+        stream_handler.setLevel(logging.INFO)
+        stream_handler.setFormatter(text_fmt)
+        handlers.append(stream_handler)
+
+    # records are sampled before they're queued, so dropped ones cost next to nothing
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(ItemSampler(item_sample_rate))
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _LISTENERS[name] = listener
     return logger
+
+
+def stop_loggers() -> None:
+    '''flush and stop every listener started by "gen_logger"; runs at exit'''
+    while _LISTENERS:
+        _, listener = _LISTENERS.popitem()
+        listener.stop()
+        for h in listener.handlers:
+            h.close()
+
+
+atexit.register(stop_loggers)
     
 
 def update_sem_and_delay(current_sem_count: int,
@@ -228,6 +316,9 @@ class Dante(Pound):
         athr_dict = {}
         for attr,fn in attr_fn_map.items():
             athr_dict[attr] = fn()
+        # gender prediction inputs (see gender.py); computed once here, instead of on every g_pound refresh
+        athr_dict['pronoun_count_male'], athr_dict['pronoun_count_female'] = pronoun_counts(athr_dict['description'])
+        athr_dict['first_name'] = first_name(athr_dict['author_name'])
         return athr_dict 
     
 
@@ -448,6 +539,7 @@ class FalseBardiya(FalseDmitry):
         usr_dict = {}
         for attr,fn in attr_fn_map.items():
             usr_dict[attr] = fn()
+        usr_dict['first_name'] = first_name(usr_dict['user_name'])   # see gender.py
         return usr_dict 
 
 
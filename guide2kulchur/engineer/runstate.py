@@ -0,0 +1,176 @@
+'''
+checkpointed run state for the batch scripts; lets a crashed run resume where it left off.
+
+a run is identified by a run ID (e.g., the script name plus a hash of its input IDs). After every committed
+batch, the completed batch IDs, the adaptive controller state (semaphore count, sub-batch delay) and the IDs
+still in flight are saved in the run_state table. On restart, completed batches are skipped, and the
+controller starts already warmed up, instead of creeping back up from its defaults.
+'''
+
+import hashlib
+from typing import (Dict,
+                    Iterable,
+                    List,
+                    Optional,
+                    Union,
+                    Any)
+
+import psycopg
+from psycopg.types.json import Jsonb
+
+
+def gen_run_id(name: str,
+               ids: Iterable[str]) -> str:
+    '''returns a run ID that stays the same as long as the input IDs do; e.g., "top_shelved-3f9a0c1b2d4e"
+
+    :param name: name of the run; e.g., the script's log directory name
+    :param ids: the run's input IDs; order doesn't matter
+    '''
+    digest = hashlib.sha1()
+    for id_ in sorted(ids):
+        digest.update(id_.encode())
+        digest.update(b',')
+    return f'{name}-{digest.hexdigest()[:12]}'
+
+
+class RunState:
+    '''run state of a batch script, persisted in the run_state table after every batch'''
+    def __init__(self,
+                 cursor: psycopg.Cursor,
+                 run_id: str,
+                 controller: Dict[str,Any],
+                 completed_batches: Optional[List[str]] = None,
+                 in_flight: Optional[List[str]] = None,
+                 resumed: bool = False):
+        '''keep track of a batch script's progress.
+
+        :param cursor: a psycopg Cursor object
+        :param run_id: run identifier; see "gen_run_id"
+        :param controller: adaptive controller state; e.g., {'sem_count': 3, 'sub_batch_delay': 2}
+        :param completed_batches: IDs of batches (or other steps) already completed
+        :param in_flight: item IDs of the batch that was running when the state was last saved
+        :param resumed: True if the state was loaded from a previous, unfinished run
+        '''
+        self.cursor = cursor
+        self.run_id = run_id
+        self.controller = controller
+        self.completed_batches = set(completed_batches or [])
+        self.in_flight = in_flight or []
+        self.resumed = resumed
+
+
+    @classmethod
+    def load_or_start(cls,
+                      cursor: psycopg.Cursor,
+                      run_id: str,
+                      controller: Dict[str,Any]) -> 'RunState':
+        '''resume the unfinished run with this run ID, if there is one; otherwise, start a new one.
+
+        :param cursor: a psycopg Cursor object
+        :param run_id: run identifier; see "gen_run_id"
+        :param controller: default controller state, used if the run is new
+        '''
+        load_query = '''
+                        SELECT
+                            completed_batches, controller, in_flight
+                        FROM
+                            run_state
+                        WHERE
+                            run_id = %s
+                        AND
+                            finished_at IS NULL
+                     '''
+        cursor.execute(load_query, (run_id,))
+        if row := cursor.fetchone():
+            completed_batches, saved_controller, in_flight = row
+            return cls(cursor=cursor,
+                       run_id=run_id,
+                       controller={**controller, **(saved_controller or {})},
+                       completed_batches=completed_batches,
+                       in_flight=in_flight,
+                       resumed=True)
+
+        state = cls(cursor=cursor, run_id=run_id, controller=controller)
+        start_query = '''
+                        INSERT INTO run_state
+                            (run_id, completed_batches, controller, in_flight, started_at, updated_at, finished_at)
+                        VALUES
+                            (%s, '{}', %s, '{}', NOW(), NOW(), NULL)
+                        ON CONFLICT (run_id) DO UPDATE  -- a finished run with the same ID; start over
+                        SET
+                            completed_batches = '{}',
+                            controller = EXCLUDED.controller,
+                            in_flight = '{}',
+                            started_at = NOW(),
+                            updated_at = NOW(),
+                            finished_at = NULL
+                      '''
+        cursor.execute(start_query, (run_id, Jsonb(controller)))
+        return state
+
+
+    def is_done(self,
+                batch_id: Union[int,str]) -> bool:
+        '''returns True if the batch (or step) was completed in this run
+
+        :param batch_id: batch identifier
+        '''
+        return str(batch_id) in self.completed_batches
+
+
+    def start_batch(self,
+                    batch_id: Union[int,str],
+                    ids: Iterable[str]) -> None:
+        '''save the IDs of the batch about to run, so they aren't lost if the run crashes mid-batch
+
+        :param batch_id: batch identifier
+        :param ids: the batch's item IDs
+        '''
+        self.in_flight = list(ids)
+        start_batch_query = '''
+                            UPDATE run_state
+                            SET
+                                in_flight = %s,
+                                updated_at = NOW()
+                            WHERE run_id = %s
+                            '''
+        self.cursor.execute(start_batch_query, (self.in_flight, self.run_id))
+
+
+    def complete_batch(self,
+                       batch_id: Union[int,str],
+                       controller: Optional[Dict[str,Any]] = None) -> None:
+        '''checkpoint a completed batch; call after the batch's data is committed
+
+        :param batch_id: batch identifier
+        :param controller: controller state for the next batch
+        '''
+        if controller:
+            self.controller.update(controller)
+        self.completed_batches.add(str(batch_id))
+        self.in_flight = []
+        complete_batch_query = '''
+                                UPDATE run_state
+                                SET
+                                    completed_batches = CASE
+                                                            WHEN %s = ANY(completed_batches) THEN completed_batches
+                                                            ELSE array_append(completed_batches, %s)
+                                                        END,
+                                    controller = %s,
+                                    in_flight = '{}',
+                                    updated_at = NOW()
+                                WHERE run_id = %s
+                               '''
+        self.cursor.execute(complete_batch_query, (str(batch_id), str(batch_id), Jsonb(self.controller), self.run_id))
+
+
+    def finish(self) -> None:
+        '''mark the run as finished; the next run with the same run ID starts over'''
+        finish_query = '''
+                        UPDATE run_state
+                        SET
+                            finished_at = NOW(),
+                            updated_at = NOW()
+                        WHERE run_id = %s
+                       '''
+        self.cursor.execute(finish_query, (self.run_id,))
@@ -7,6 +7,8 @@ from typing import (Optional,
                     Union, 
                     Iterable, 
                     Any,
+                    List,
+                    Tuple,
                     Set)
 
 import aiohttp
@@ -14,6 +16,7 @@ import psycopg
 from bs4 import BeautifulSoup
 
 from guide2kulchur.privateer.recruits import _rand_headers, _parse_id
+from guide2kulchur.engineer.recruits import ITEM_LOG
 
 
 def _parse_sim_books_page(txt: str) -> Union[Set[str], str]:
@@ -65,6 +68,66 @@ def _parse_sim_authors_page(txt: str) -> Union[Set[str], str]:
     return list(dat)
 
 
+SIM_PAGE_PARSERS = {
+    'book': _parse_sim_books_page,
+    'author': _parse_sim_authors_page
+}
+
+
+async def _fetch_sim_ids(session: aiohttp.ClientSession,
+                         sim_item_type: str,
+                         identifier: str) -> List[str]:
+    '''fetches a similar_books|similar_authors page, returns list of similar item ID strings
+    
+    :param session: an aiohttp.ClientSession
+    :param sim_item_type: Goodreads similar item type (book|author)
+    :param identifier: a sim_item ID; similar_books_id for books, author_id for authors
+    '''
+    sim_item_url = f'https://www.goodreads.com/{sim_item_type}/similar/{identifier}'
+    async with session.get(url=sim_item_url, headers=_rand_headers()) as resp:
+        txt = await resp.text()
+    return SIM_PAGE_PARSERS[sim_item_type](txt=txt)
+
+
+# table, column joined on sim_id, similar items column; per similar item type
+SIM_COL_TARGETS = {
+    'book': ('alexandria', 'sim_books_url_id', 'sim_books'),
+    'author': ('pound', 'author_id', 'sim_authors')
+}
+
+
+def _update_sim_col(cursor: psycopg.Cursor,
+                    sim_item_type: str,
+                    sim_pairs: Iterable[Tuple[str,Iterable[str]]]) -> int:
+    '''updates sim_books|sim_authors for a batch of (sim_id, similar IDs) pairs in one statement; returns number of rows updated
+    
+    the pairs are sent as two parallel text arrays and unnested server-side; the similar IDs are passed
+    comma-joined (Goodreads IDs are digits only), since postgres arrays can't be ragged. Only rows matching
+    a sim_id, with a different value than what's already there, are written.
+
+    :param cursor: a psycopg Cursor object
+    :param sim_item_type: Goodreads similar item type (book|author)
+    :param sim_pairs: an iterable of (sim_id, similar item IDs) pairs; an empty list of similar IDs is stored as an empty array
+    '''
+    sim_ids, sim_csvs = [], []
+    for sim_id, sim_item_ids in sim_pairs:
+        sim_ids.append(sim_id)
+        sim_csvs.append(','.join(i for i in sim_item_ids if i))
+    if not sim_ids:
+        return 0
+    
+    tbl, key_col, sim_col = SIM_COL_TARGETS[sim_item_type]
+    update_and_set_query = f'''
+                            UPDATE {tbl} t
+                            SET {sim_col} = string_to_array(s.sim_csv, ',')
+                            FROM unnest(%s::text[], %s::text[]) AS s (sim_id, sim_csv)
+                            WHERE t.{key_col} = s.sim_id
+                            AND t.{sim_col} IS DISTINCT FROM string_to_array(s.sim_csv, ',')
+                           '''
+    cursor.execute(update_and_set_query, (sim_ids, sim_csvs))
+    return cursor.rowcount
+
+
 class SimItemsPuller(ABC):
     '''Pull a batch of similar items (books | authors)'''
     def __init__(self,
@@ -102,11 +165,7 @@ class SimItemsPuller(ABC):
               'timeouts_per_batch_ratio': 0
           }
 
-          if sim_item_type.lower() == 'book':
-               self.sim_fn = _parse_sim_books_page
-          elif sim_item_type.lower() == 'author':
-               self.sim_fn = _parse_sim_authors_page
-          else:
+          if sim_item_type.lower() not in SIM_PAGE_PARSERS:
                raise ValueError("sim_item_type must be in ['book', 'author']")
 
 
@@ -129,12 +188,11 @@ class SimItemsPuller(ABC):
                     num_attempts = max(num_attempts, 1)
                     t_start = time.time()
                     
-                    sim_item_url = f'https://www.goodreads.com/{self.sim_item_type}/similar/{identifier}'
                     for attempt in range(num_attempts):
                         try:
-                            async with session.get(url=sim_item_url, headers=_rand_headers()) as resp:
-                                txt = await resp.text()
-                            item_dat = self.sim_fn(txt=txt)
+                            item_dat = await _fetch_sim_ids(session=session,
+                                                            sim_item_type=self.sim_item_type,
+                                                            identifier=identifier)
                             res = {'sim_id': identifier, 'data': item_dat, 'status': 'success'}
                             break
                         
@@ -147,7 +205,7 @@ class SimItemsPuller(ABC):
                             SLEEP_SCALAR = 1.5
                             sleep_time = (attempt + 1) ** SLEEP_SCALAR
                             await asyncio.sleep(sleep_time)
-                            self.stat_log.info('batch %s RETRY sim_id %s %s', self.batch_id, self.sim_item_type, identifier)  
+                            self.stat_log.info('batch %s RETRY sim_id %s %s', self.batch_id, self.sim_item_type, identifier, extra=ITEM_LOG)  
 
                         except Exception as er:
                             self.stat_log.error('batch %s ERR. sim_id %s %s: %s', self.batch_id, self.sim_item_type, identifier, er)
@@ -155,7 +213,7 @@ class SimItemsPuller(ABC):
                 
                 t_finished = time.time()
                 t_elapsed = round(t_finished - t_start,3)
-                self.stat_log.info('batch %s T.E. sim_id %s %s: %s sec.', self.batch_id, self.sim_item_type, identifier, t_elapsed)
+                self.stat_log.info('batch %s T.E. sim_id %s %s: %s sec.', self.batch_id, self.sim_item_type, identifier, t_elapsed, extra=ITEM_LOG)
 
                 return res     
     
@@ -177,7 +235,7 @@ class SimItemsPuller(ABC):
         async for task in asyncio.as_completed(tasks):
             if batch_delay and batch_size:
                 if completed > 0 and completed % batch_size == 0:
-                        time.sleep(batch_delay)
+                        await asyncio.sleep(batch_delay)    # don't block the event loop; other jobs may share it
             
             result = await task
 
@@ -251,47 +309,12 @@ class SimBooksPuller(SimItemsPuller):
     
 
     def insert_batch_into_db(self) -> None:
-        '''update sim_books column
-        
-        1. create table (if not exists) to insert the sim_id, and text array of similar book IDs
-        2. insert tuples. In case of NA values, an empty array is inserted
-        3. update main alexandria table and set sim_books column, join the newly created table and alexandria on sim_id
-        '''
-        dat2insert = []
-        for id_ in self.successes:
-            tpl2insert = (id_['sim_id'], id_['data'])
-            dat2insert.append(tpl2insert)
-        
-        create_table_query = '''
-                            CREATE TABLE IF NOT EXISTS sim_books
-                            (
-                                sim_id text PRIMARY KEY,
-                                sim_books text[]
-                            )
-                            '''
-        self.cursor.execute(create_table_query)
-
-        truncate_the_table_query = '''TRUNCATE TABLE sim_books'''
-        self.cursor.execute(truncate_the_table_query)
-
-        insert_into_sim_books_query = '''
-                                        INSERT INTO sim_books 
-                                            (sim_id,
-                                             sim_books)
-                                        VALUES
-                                            (%s,
-                                             %s)
-                                        ON CONFLICT DO NOTHING -- this shouldn't ever happen, but just in case
-                                      '''
-        self.cursor.executemany(insert_into_sim_books_query, dat2insert)
-
-        update_and_set_query = '''
-                                UPDATE alexandria alx
-                                SET sim_books = sb.sim_books
-                                FROM sim_books sb
-                                WHERE alx.sim_books_url_id = sb.sim_id
-                               '''
-        self.cursor.execute(update_and_set_query)
+        '''update sim_books column of the alexandria rows matching this batch's sim_ids; in case of NA values, an empty array is set'''
+        sim_pairs = [(id_['sim_id'], id_['data']) for id_ in self.successes]
+        t_start = time.time()
+        n_updated = _update_sim_col(cursor=self.cursor, sim_item_type='book', sim_pairs=sim_pairs)
+        t_end = time.time()
+        self.stat_log.info('batch %s DB UPDATE %s TUPLES (%s ROWS): %s sec', self.batch_id, len(sim_pairs), n_updated, round(t_end - t_start, 3))
 
 
 # used to pull sim_authors and update sim_authors col in pound
@@ -319,47 +342,9 @@ class SimAuthorsPuller(SimItemsPuller):
                          status_logger=status_logger)
     
     def insert_batch_into_db(self) -> None:
-        '''update sim_authors column
-        
-        1. create table (if not exists) to insert the sim_id, and text array of similar author IDs
-        2. insert tuples. In case of NA values, an empty array is inserted
-        3. update main pound table and set sim_authrs column, join the newly created table and pound on sim_id == author_id
-        '''
-        dat2insert = []
-        for id_ in self.successes:
-            tpl2insert = (id_['sim_id'], id_['data'])
-            dat2insert.append(tpl2insert)
-        
-        create_table_query = '''
-                            CREATE TABLE IF NOT EXISTS sim_authors
-                            (
-                                sim_id text PRIMARY KEY,
-                                sim_authors text[]
-                            )
-                            '''
-        self.cursor.execute(create_table_query)
-
-        truncate_the_table_query = '''TRUNCATE TABLE sim_authors'''
-        self.cursor.execute(truncate_the_table_query)
-
-        insert_into_sim_authors_query = '''
-                                        INSERT INTO sim_authors 
-                                            (sim_id,
-                                             sim_authors)
-                                        VALUES
-                                            (%s,
-                                             %s)
-                                        ON CONFLICT DO NOTHING -- this shouldn't ever happen, but just in case
-                                      '''
-        self.cursor.executemany(insert_into_sim_authors_query, dat2insert)
-
-        update_and_set_query = '''
-                                UPDATE pound pnd
-                                SET sim_authors = sa.sim_authors
-                                FROM sim_authors sa
-                                WHERE pnd.author_id = sa.sim_id
-                               '''
-        self.cursor.execute(update_and_set_query)
-        self.stat_log.info('batch %s DB INSERT %s TUPLES', self.batch_id, len(dat2insert))
-
-            
\ No newline at end of file
+        '''update sim_authors column of the pound rows matching this batch's sim_ids; in case of NA values, an empty array is set'''
+        sim_pairs = [(id_['sim_id'], id_['data']) for id_ in self.successes]
+        t_start = time.time()
+        n_updated = _update_sim_col(cursor=self.cursor, sim_item_type='author', sim_pairs=sim_pairs)
+        t_end = time.time()
+        self.stat_log.info('batch %s DB UPDATE %s TUPLES (%s ROWS): %s sec', self.batch_id, len(sim_pairs), n_updated, round(t_end - t_start, 3))
@@ -0,0 +1,462 @@
+'''
+per-item stage tracing; spans around each stage of the fetch/parse/write path, exported to a local file.
+
+a span is a named, timed block (e.g., "fetch", "parse", "db_write") with a parent; the current span lives in a
+contextvar, so spans opened in an asyncio task nest under whatever span was current when the task was created
+(one trace per batch: batch -> item -> semaphore_wait|fetch|parse|sim -> http -> connect|ttfb|body). the
+aiohttp TraceConfig below splits each request into pool wait, DNS, connect, TTFB and body read.
+
+finished spans are buffered in memory and written by "flush" (the orchestrator flushes after every batch) as
+JSON lines, each line an OTLP/JSON ExportTraceServiceRequest, i.e. what the OpenTelemetry Collector's file
+exporter writes; so the file can be replayed into Jaeger/Tempo/etc., or summarized with:
+
+    python -m guide2kulchur.engineer trace logs/spans.jsonl
+
+which prints the critical path of each batch. enable with the "tracing" config key:
+
+    "tracing": {"path": "logs/spans.jsonl", "sample_rate": 1.0}
+
+when not configured, "span" returns a shared no-op, so the instrumentation costs an attribute lookup.
+'''
+
+import os
+import json
+import time
+import random
+import asyncio
+from contextvars import ContextVar
+from collections import defaultdict
+from typing import (Any,
+                    Dict,
+                    List,
+                    Optional,
+                    Tuple,
+                    Union)
+
+import aiohttp
+
+
+SCOPE_NAME = 'guide2kulchur.engineer'
+
+# OTLP span kinds and status codes
+KIND_INTERNAL = 1
+KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    '''a named, timed block with attributes; times are unix nanoseconds'''
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'kind', 'start_ns', 'end_ns', 'attrs', 'status', 'message')
+
+    def __init__(self,
+                 name: str,
+                 trace_id: str,
+                 parent_id: Optional[str],
+                 kind: int = KIND_INTERNAL,
+                 start_ns: Optional[int] = None,
+                 attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attrs = attrs or {}
+        self.status = STATUS_OK
+        self.message = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def end(self,
+            error: Optional[BaseException] = None,
+            end_ns: Optional[int] = None) -> None:
+        '''close the span (once), marking it as failed if error is given'''
+        if self.end_ns is not None:
+            return None
+        self.end_ns = end_ns or time.time_ns()
+        if error is not None:
+            self.status = STATUS_ERROR
+            self.message = f'{type(error).__name__}: {error}'
+        TRACER._finished.append(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        out = {'traceId': self.trace_id,
+               'spanId': self.span_id,
+               'name': self.name,
+               'kind': self.kind,
+               'startTimeUnixNano': str(self.start_ns),
+               'endTimeUnixNano': str(self.end_ns),
+               'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in self.attrs.items() if v is not None],
+               'status': {'code': self.status}}
+        if self.parent_id:
+            out['parentSpanId'] = self.parent_id
+        if self.message:
+            out['status']['message'] = self.message
+        return out
+
+
+class _NoopSpan:
+    '''stands in for a span when tracing is off, or the trace wasn't sampled'''
+    span_id = None
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None, end_ns: Optional[int] = None) -> None:
+        pass
+
+
+NOOP = _NoopSpan()
+
+_CURRENT: ContextVar[Union[Span, _NoopSpan, None]] = ContextVar('g2k_current_span', default=None)
+_LAST_BODY: ContextVar[Optional[Span]] = ContextVar('g2k_last_body_span', default=None)
+
+
+def _otlp_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {'boolValue': v}
+    if isinstance(v, int):
+        return {'intValue': str(v)}     # int64 is a string in proto3 JSON
+    if isinstance(v, float):
+        return {'doubleValue': v}
+    return {'stringValue': str(v)}
+
+
+def _from_otlp_value(v: Dict[str, Any]) -> Any:
+    if 'intValue' in v:
+        return int(v['intValue'])
+    return next(iter(v.values()), None)
+
+
+class Tracer:
+    '''creates spans and buffers finished ones until "flush"; off until "configure" is called'''
+    def __init__(self):
+        self.path = None
+        self.sample_rate = 1.0
+        self.service_name = 'guide2kulchur'
+        self._finished: List[Span] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def configure(self,
+                  path: Optional[str],
+                  sample_rate: float = 1.0,
+                  service_name: str = 'guide2kulchur') -> None:
+        '''
+        start (or, with path=None, stop) recording spans.
+
+        :param path: JSON lines file the spans are appended to
+        :param sample_rate: fraction of traces (i.e., batches) recorded; decided at the root span
+        :param service_name: the OTLP service.name resource attribute
+        '''
+        self.path = path
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+
+    def start(self,
+              name: str,
+              parent: Union[Span, _NoopSpan, None] = None,
+              kind: int = KIND_INTERNAL,
+              start_ns: Optional[int] = None,
+              **attrs: Any) -> Union[Span, _NoopSpan]:
+        '''
+        open a span (without making it current); call .end() on it.
+
+        :param name: span name; i.e., the stage
+        :param parent: parent span; default is the current one
+        :param kind: KIND_INTERNAL|KIND_CLIENT
+        :param start_ns: start time (unix ns), if not now
+        :param attrs: span attributes
+        '''
+        if self.path is None:
+            return NOOP
+        parent = parent if parent is not None else _CURRENT.get()
+        if parent is NOOP:
+            return NOOP     # inside an unsampled trace
+        if parent is None:
+            if self.sample_rate < 1 and random.random() >= self.sample_rate:
+                return NOOP
+            return Span(name, f'{random.getrandbits(128):032x}', None, kind, start_ns, attrs)
+        return Span(name, parent.trace_id, parent.span_id, kind, start_ns, attrs)
+
+    def flush(self) -> int:
+        '''append the finished spans to the file, as one OTLP/JSON line; returns the number of spans written'''
+        spans, self._finished = self._finished, []
+        if not spans or self.path is None:
+            return 0
+        req = {'resourceSpans': [{'resource': {'attributes': [{'key': 'service.name',
+                                                               'value': {'stringValue': self.service_name}}]},
+                                  'scopeSpans': [{'scope': {'name': SCOPE_NAME},
+                                                  'spans': [s.to_otlp() for s in spans]}]}]}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(req, separators=(',', ':')) + '\n')
+        return len(spans)
+
+
+TRACER = Tracer()
+
+
+class _SpanScope:
+    '''(async) context manager; opens a span, makes it current, closes it on exit'''
+    __slots__ = ('name', 'attrs', 'span', '_token')
+
+    def __init__(self,
+                 name: str,
+                 attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> Union[Span, _NoopSpan]:
+        self.span = TRACER.start(self.name, **self.attrs)
+        self._token = _CURRENT.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _CURRENT.reset(self._token)
+        self.span.end(error=exc)
+
+    async def __aenter__(self) -> Union[Span, _NoopSpan]:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.__exit__(exc_type, exc, tb)
+
+
+class _NoopScope:
+    def __enter__(self) -> _NoopSpan:
+        return NOOP
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    async def __aenter__(self) -> _NoopSpan:
+        return NOOP
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+
+_NOOP_SCOPE = _NoopScope()
+
+
+def span(name: str,
+         **attrs: Any) -> Union[_SpanScope, _NoopScope]:
+    '''
+    trace a (async) with block as a span named name, a child of the current span; tasks created inside the
+    block inherit it as their parent. e.g., "async with tracing.span('fetch', attempt=1): ..."
+
+    :param name: span name; i.e., the stage
+    :param attrs: span attributes
+    '''
+    if TRACER.path is None:
+        return _NOOP_SCOPE
+    return _SpanScope(name, attrs)
+
+
+class acquire:
+    '''async with tracing.acquire(semaphore): ...; holds the semaphore, with the wait for it as a span'''
+    def __init__(self,
+                 semaphore: asyncio.Semaphore,
+                 name: str = 'semaphore_wait'):
+        self.semaphore = semaphore
+        self.name = name
+
+    async def __aenter__(self) -> None:
+        with span(self.name):
+            await self.semaphore.acquire()
+
+    async def __aexit__(self, *exc) -> None:
+        self.semaphore.release()
+
+
+def span_since_body(name: str = 'soup') -> None:
+    '''
+    record a span from the end of the last response body read (in this task) until now; e.g., the soup build,
+    which happens inside the privateer loaders, right after the body is read.
+
+    :param name: span name
+    '''
+    body = _LAST_BODY.get()
+    if TRACER.path is None or body is None:
+        return None
+    TRACER.start(name, start_ns=body.end_ns).end()
+    _LAST_BODY.set(None)
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    '''returns an aiohttp TraceConfig splitting each request into pool wait, DNS, connect, TTFB and body read spans'''
+    async def _on_start(session, ctx, params):
+        ctx.span = TRACER.start('http', kind=KIND_CLIENT, method=params.method,
+                                host=params.url.host, path=params.url.path)
+        ctx.open = {}
+
+    def _child(ctx, name, parent=None):
+        ctx.open[name] = TRACER.start(name, parent=parent or ctx.span)
+
+    def _close(ctx, name, error=None):
+        if (s := ctx.open.pop(name, None)) is not None:
+            s.end(error=error)
+
+    async def _on_queued_start(session, ctx, params):
+        _child(ctx, 'http.pool_wait')
+
+    async def _on_queued_end(session, ctx, params):
+        _close(ctx, 'http.pool_wait')
+
+    async def _on_create_start(session, ctx, params):
+        _child(ctx, 'http.connect')
+
+    async def _on_create_end(session, ctx, params):
+        _close(ctx, 'http.connect')
+
+    async def _on_dns_start(session, ctx, params):
+        _child(ctx, 'http.dns', parent=ctx.open.get('http.connect'))
+
+    async def _on_dns_end(session, ctx, params):
+        _close(ctx, 'http.dns')
+
+    async def _on_headers_sent(session, ctx, params):
+        _child(ctx, 'http.ttfb')
+
+    async def _on_end(session, ctx, params):
+        if 'http.ttfb' not in ctx.open:     # e.g., an older aiohttp without on_request_headers_sent
+            ctx.open['http.ttfb'] = TRACER.start('http.ttfb', parent=ctx.span, start_ns=getattr(ctx.span, 'start_ns', None))
+        _close(ctx, 'http.ttfb')
+        ctx.span.set(status=params.response.status)
+        # the body is read after this; its span (and the request's) are stretched to the last chunk
+        ctx.body = TRACER.start('http.body', parent=ctx.span)
+        ctx.body.end()
+        ctx.span.end()
+        if isinstance(ctx.body, Span):
+            _LAST_BODY.set(ctx.body)
+
+    async def _on_chunk(session, ctx, params):
+        if isinstance(body := getattr(ctx, 'body', None), Span):
+            body.end_ns = ctx.span.end_ns = time.time_ns()
+            body.attrs['bytes'] = body.attrs.get('bytes', 0) + len(params.chunk)
+
+    async def _on_exception(session, ctx, params):
+        for name in list(ctx.open):
+            _close(ctx, name, error=params.exception)
+        ctx.span.end(error=params.exception)
+
+    tc = aiohttp.TraceConfig()
+    tc.on_request_start.append(_on_start)
+    tc.on_connection_queued_start.append(_on_queued_start)
+    tc.on_connection_queued_end.append(_on_queued_end)
+    tc.on_connection_create_start.append(_on_create_start)
+    tc.on_connection_create_end.append(_on_create_end)
+    tc.on_dns_resolvehost_start.append(_on_dns_start)
+    tc.on_dns_resolvehost_end.append(_on_dns_end)
+    if hasattr(tc, 'on_request_headers_sent'):
+        tc.on_request_headers_sent.append(_on_headers_sent)
+    tc.on_request_end.append(_on_end)
+    tc.on_response_chunk_received.append(_on_chunk)
+    tc.on_request_exception.append(_on_exception)
+    return tc
+
+
+def load_spans(path: str) -> List[Dict[str, Any]]:
+    '''
+    read the spans of an OTLP/JSON lines file (as written by "flush") into flat dicts.
+
+    :param path: the span file
+    '''
+    spans = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for rs in json.loads(line).get('resourceSpans', []):
+                for ss in rs.get('scopeSpans', []):
+                    for s in ss.get('spans', []):
+                        spans.append({'trace_id': s['traceId'],
+                                      'span_id': s['spanId'],
+                                      'parent_id': s.get('parentSpanId'),
+                                      'name': s['name'],
+                                      'start': int(s['startTimeUnixNano']) / 1e9,
+                                      'end': int(s['endTimeUnixNano']) / 1e9,
+                                      'attrs': {a['key']: _from_otlp_value(a['value']) for a in s.get('attributes', [])},
+                                      'error': s.get('status', {}).get('code') == STATUS_ERROR})
+    return spans
+
+
+def critical_path(root: Dict[str, Any],
+                  children: Dict[str, List[Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any], float]]:
+    '''
+    the chain of spans that determined root's duration: walking back from root's end, the child that finished
+    last, then the child that finished last before that one started, etc., recursively.
+    returns (depth, span, self time on the path) tuples, in start order.
+
+    :param root: a span, as from "load_spans"
+    :param children: span ID -> child spans
+    '''
+    chosen, t = [], root['end']
+    for c in sorted(children.get(root['span_id'], []), key=lambda s: s['end'], reverse=True):
+        if c['end'] <= t:
+            chosen.append(c)
+            t = c['start']
+    chosen.reverse()
+    self_time = (root['end'] - root['start']) - sum(c['end'] - c['start'] for c in chosen)
+    out = [(0, root, self_time)]
+    for c in chosen:
+        out.extend((depth + 1, s, st) for depth, s, st in critical_path(c, children))
+    return out
+
+
+def summarize(path: str,
+              root_name: Optional[str] = None,
+              last: Optional[int] = None) -> str:
+    '''
+    per trace (i.e., batch): the critical path, critical-path time by stage, and total time by stage over all spans.
+
+    :param path: the span file
+    :param root_name: only summarize traces whose root span has this name; e.g., "batch"
+    :param last: only summarize the last N traces
+    '''
+    spans = load_spans(path)
+    ids = {s['span_id'] for s in spans}
+    children = defaultdict(list)
+    by_trace = defaultdict(list)
+    roots = []
+    for s in spans:
+        by_trace[s['trace_id']].append(s)
+        if s['parent_id'] and s['parent_id'] in ids:
+            children[s['parent_id']].append(s)
+        else:
+            roots.append(s)
+    roots = sorted((r for r in roots if not root_name or r['name'] == root_name), key=lambda r: r['start'])
+    if last:
+        roots = roots[-last:]
+
+    def _fmt_attrs(attrs):
+        return ' '.join(f'{k}={v}' for k, v in attrs.items())
+
+    lines = []
+    for root in roots:
+        dur = root['end'] - root['start']
+        trace_spans = by_trace[root['trace_id']]
+        lines.append(f'{root["name"]} {_fmt_attrs(root["attrs"])} :: {round(dur, 3)}s :: {len(trace_spans)} spans')
+        lines.append('  critical path (offset, duration, self):')
+        path_time = defaultdict(float)
+        for depth, s, self_time in critical_path(root, children):
+            path_time[s['name']] += self_time
+            lines.append(f'    {s["start"] - root["start"]:8.3f} {s["end"] - s["start"]:8.3f} {self_time:8.3f}  '
+                         f'{"  " * depth}{s["name"]}{" !" if s["error"] else ""} {_fmt_attrs(s["attrs"])}'.rstrip())
+        lines.append('  critical path by stage: ' + ', '.join(f'{k} {round(v, 3)}s ({round(100 * v / dur) if dur else 0}%)'
+                                                            for k, v in sorted(path_time.items(), key=lambda kv: -kv[1])))
+        totals, counts = defaultdict(float), defaultdict(int)
+        for s in trace_spans:
+            totals[s['name']] += s['end'] - s['start']
+            counts[s['name']] += 1
+        lines.append('  all spans by stage (total, count, mean): ' +
+                     ', '.join(f'{k} {round(v, 3)}s/{counts[k]}/{round(v / counts[k], 3)}s'
+                               for k, v in sorted(totals.items(), key=lambda kv: -kv[1]) if k != root['name']))
+        lines.append('')
+    return '\n'.join(lines)
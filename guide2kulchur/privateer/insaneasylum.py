@@ -7,7 +7,11 @@ from typing import (
     Optional, 
     Dict, 
     Union,
-    Any
+    Any,
+    Iterable,
+    Container,
+    AsyncIterator,
+    Tuple
 )
 
 import aiohttp
@@ -20,6 +24,7 @@ from guide2kulchur.privateer.recruits import (
     _TIMEOUT, 
     _AGENTS
 )
+from guide2kulchur.privateer.scribe import Scribe
 
 # "All America is an insane asylum" - E.P.
 
@@ -247,6 +252,181 @@ success rate: {success_rate}
     print(metadat)
 
     return bulk_data
+
+
+async def bulk_load_aiter(category: str,
+                          identifiers: Iterable[str],
+                          exclude_attrs: Optional[List[str]] = None,
+                          semaphore_count: int = 3,
+                          max_in_flight: int = 50,
+                          num_attempts: int = 1,
+                          batch_delay: Optional[int] = 1,
+                          batch_size: Optional[int] = 5,
+                          to_dict: bool = False,
+                          see_progress: bool = True,
+                          skip: Optional[Container[str]] = None) -> AsyncIterator[Tuple[str, Optional[Union[Dict[str, Any], SimpleNamespace]]]]:
+    '''
+    Collect multiple PUBLICLY AVAILABLE Goodreads units asynchronously, yielding each as it completes.
+
+    Unlike bulk_load_aio, nothing is held onto after it's yielded, and at most `max_in_flight`
+    tasks exist at once (identifiers can be a lazy iterable, e.g. lines of a file), so memory
+    stays flat regardless of how many items are pulled.
+    
+    :param category: category to pull from; options include ['book', 'user', 'author']
+    :param identifiers: unique item identifiers, or unique URLs
+    :param exclude_attrs: item attributes to exclude
+    :param semaphore_count: semaphore control; defaults to three requests
+    :param max_in_flight: max number of scheduled (running or waiting on the semaphore) pulls
+    :param num_attempts: number of attempts (including initial attempt)
+    :param batch_delay: determines number of seconds to sleep per completion of each batch
+    :param batch_size: determines batch size
+    :param to_dict: converts data to dict type; otherwise, stays SimpleNamespace
+    :param see_progress: view per-unit progress, such as notices of success/failure
+    :param skip: identifiers to skip, e.g. Scribe.done from a previous run
+
+    yields (identifier, data) tuples; data is None if the pull failed
+    '''
+    cat = category.lower()
+    if cat not in ['book', 'user', 'author']:
+         raise ValueError('category must be one of the three: ["book", "user", "author"]')
+    
+    cat_fn_map = {
+        'book': _load_one_book_aio,
+        'user': _load_one_user_aio,
+        'author': _load_one_author_aio
+    }
+    cat_fn = cat_fn_map[cat]
+    max_in_flight = max(max_in_flight, semaphore_count, 1)
+
+    async def _load_one(sesh: aiohttp.ClientSession,
+                        sem: asyncio.Semaphore,
+                        id_: str):
+        result = await cat_fn(session=sesh,
+                              semaphore=sem,
+                              identifer=id_,
+                              exclude_attrs=exclude_attrs,
+                              num_attempts=num_attempts,
+                              see_progress=see_progress,
+                              to_dict=to_dict)
+        # failed pulls come back as the identifier (or None, once attempts run out)
+        if result is None or isinstance(result, str):
+            return id_, None
+        return id_, result
+
+    id_iter = (id_ for id_ in identifiers if not (skip and id_ in skip))
+    sem = asyncio.Semaphore(semaphore_count)
+    pending = set()
+    async with aiohttp.ClientSession(headers=_rand_headers(_AGENTS),
+                                     timeout=_TIMEOUT) as sesh:
+        try:
+            for id_ in id_iter:
+                pending.add(asyncio.ensure_future(_load_one(sesh, sem, id_)))
+                if len(pending) >= max_in_flight:
+                    break
+            
+            completed = 0
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+                    completed += 1
+                    if batch_delay and batch_size and completed % batch_size == 0:
+                        await asyncio.sleep(batch_delay)
+                # top the window back up
+                for id_ in id_iter:
+                    pending.add(asyncio.ensure_future(_load_one(sesh, sem, id_)))
+                    if len(pending) >= max_in_flight:
+                        break
+        finally:
+            # consumer stopped early (or errored); don't leave pulls running on a closed session
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def bulk_load_to_jsonl(category: str,
+                             identifiers: Iterable[str],
+                             write_jsonl: str,
+                             exclude_attrs: Optional[List[str]] = None,
+                             semaphore_count: int = 3,
+                             max_in_flight: int = 50,
+                             num_attempts: int = 1,
+                             batch_delay: Optional[int] = 1,
+                             batch_size: Optional[int] = 5,
+                             see_progress: bool = True,
+                             fsync_every: int = 100,
+                             compress: Optional[bool] = None) -> Dict[str, Any]:
+    '''
+    Collect multiple PUBLICLY AVAILABLE Goodreads units asynchronously, appending each to a JSONL file.
+
+    Identifiers in the file's done index (write_jsonl + ".done") are skipped, so rerunning the
+    same call after a crash picks up where it left off.
+
+    :param category: category to pull from; options include ['book', 'user', 'author']
+    :param identifiers: unique item identifiers, or unique URLs
+    :param write_jsonl: file_name to append JSONL to; gzipped if it ends with ".gz"
+    :param exclude_attrs: item attributes to exclude
+    :param semaphore_count: semaphore control; defaults to three requests
+    :param max_in_flight: max number of scheduled (running or waiting on the semaphore) pulls
+    :param num_attempts: number of attempts (including initial attempt)
+    :param batch_delay: determines number of seconds to sleep per completion of each batch
+    :param batch_size: determines batch size
+    :param see_progress: view per-unit progress, such as notices of success/failure
+    :param fsync_every: number of records written between each flush + fsync
+    :param compress: gzip the output; defaults to True if write_jsonl ends with ".gz"
+
+    returns the run's metadata (the same fields bulk_load_aio writes, minus the results)
+    '''
+    cat = category.lower()
+    failed_items = []
+    with Scribe(write_jsonl, compress=compress, fsync_every=fsync_every) as scribe:
+        already_done = len(scribe.done)
+        time_start = time.ctime()
+        async for id_, result in bulk_load_aiter(category=cat,
+                                                 identifiers=identifiers,
+                                                 exclude_attrs=exclude_attrs,
+                                                 semaphore_count=semaphore_count,
+                                                 max_in_flight=max_in_flight,
+                                                 num_attempts=num_attempts,
+                                                 batch_delay=batch_delay,
+                                                 batch_size=batch_size,
+                                                 to_dict=True,
+                                                 see_progress=see_progress,
+                                                 skip=scribe.done):
+            if result is None:
+                failed_items.append(id_)
+            else:
+                scribe.write(id_, result)
+        time_end = time.ctime()
+        successes = scribe.written
+    
+    attempted = successes + len(failed_items)
+    metadat = {
+        'category': cat,
+        'query_start': time_start,
+        'query_end': time_end,
+        'previously_done': already_done,
+        'attempted': attempted,
+        'successes': successes,
+        'failures': len(failed_items),
+        f'{cat}s_failed': failed_items,
+        'success_rate': successes / attempted if attempted else None
+    }
+    print(f'''
+------------------------------------
+category: {cat}
+started at: {time_start}
+ended at: {time_end}
+previously done: {already_done}
+attempted: {attempted}
+successes: {successes}
+failures: {len(failed_items)}
+{cat}s failed: {failed_items}
+success rate: {metadat['success_rate']}
+------------------------------------
+''')
+    return metadat
                         
 
 async def bulk_books_aio(book_ids: List[str],
@@ -418,3 +598,90 @@ async def bulk_authors_aio(author_ids: List[str],
                                see_progress=see_progress,
                                write_json=write_json)
     
+
+
+async def bulk_books_aiter(book_ids: Iterable[str],
+                           exclude_attrs: Optional[List[str]] = None,
+                           semaphore_count: int = 3,
+                           max_in_flight: int = 50,
+                           num_attempts: int = 1,
+                           batch_delay: Optional[int] = None,
+                           batch_size: Optional[int] = None,
+                           to_dict: bool = False,
+                           see_progress: bool = True,
+                           skip: Optional[Container[str]] = None) -> AsyncIterator[Tuple[str, Optional[Union[Dict[str, Any], SimpleNamespace]]]]:
+    '''
+    Collect data on multiple PUBLICLY AVAILABLE Goodreads books asynchronously, yielding (identifier, data) as each completes.
+
+    See bulk_load_aiter for params and bulk_books_aio for the attributes returned.
+    '''
+    async for item in bulk_load_aiter(category='book',
+                                      identifiers=book_ids,
+                                      exclude_attrs=exclude_attrs,
+                                      semaphore_count=semaphore_count,
+                                      max_in_flight=max_in_flight,
+                                      num_attempts=num_attempts,
+                                      batch_delay=batch_delay,
+                                      batch_size=batch_size,
+                                      to_dict=to_dict,
+                                      see_progress=see_progress,
+                                      skip=skip):
+        yield item
+
+
+async def bulk_users_aiter(user_ids: Iterable[str],
+                           exclude_attrs: Optional[List[str]] = None,
+                           semaphore_count: int = 3,
+                           max_in_flight: int = 50,
+                           num_attempts: int = 1,
+                           batch_delay: Optional[int] = None,
+                           batch_size: Optional[int] = None,
+                           to_dict: bool = False,
+                           see_progress: bool = True,
+                           skip: Optional[Container[str]] = None) -> AsyncIterator[Tuple[str, Optional[Union[Dict[str, Any], SimpleNamespace]]]]:
+    '''
+    Collect data on multiple PUBLICLY AVAILABLE Goodreads users asynchronously, yielding (identifier, data) as each completes.
+
+    See bulk_load_aiter for params and bulk_users_aio for the attributes returned.
+    '''
+    async for item in bulk_load_aiter(category='user',
+                                      identifiers=user_ids,
+                                      exclude_attrs=exclude_attrs,
+                                      semaphore_count=semaphore_count,
+                                      max_in_flight=max_in_flight,
+                                      num_attempts=num_attempts,
+                                      batch_delay=batch_delay,
+                                      batch_size=batch_size,
+                                      to_dict=to_dict,
+                                      see_progress=see_progress,
+                                      skip=skip):
+        yield item
+
+
+async def bulk_authors_aiter(author_ids: Iterable[str],
+                             exclude_attrs: Optional[List[str]] = None,
+                             semaphore_count: int = 3,
+                             max_in_flight: int = 50,
+                             num_attempts: int = 1,
+                             batch_delay: Optional[int] = None,
+                             batch_size: Optional[int] = None,
+                             to_dict: bool = False,
+                             see_progress: bool = True,
+                             skip: Optional[Container[str]] = None) -> AsyncIterator[Tuple[str, Optional[Union[Dict[str, Any], SimpleNamespace]]]]:
+    '''
+    Collect data on multiple PUBLICLY AVAILABLE Goodreads authors asynchronously, yielding (identifier, data) as each completes.
+
+    See bulk_load_aiter for params and bulk_authors_aio for the attributes returned.
+    '''
+    async for item in bulk_load_aiter(category='author',
+                                      identifiers=author_ids,
+                                      exclude_attrs=exclude_attrs,
+                                      semaphore_count=semaphore_count,
+                                      max_in_flight=max_in_flight,
+                                      num_attempts=num_attempts,
+                                      batch_delay=batch_delay,
+                                      batch_size=batch_size,
+                                      to_dict=to_dict,
+                                      see_progress=see_progress,
+                                      skip=skip):
+        yield item
@@ -0,0 +1,332 @@
+import os
+import gzip
+import shutil
+import tempfile
+import zlib
+import json
+from types import SimpleNamespace
+from typing import (
+    Optional,
+    Dict,
+    List,
+    Tuple,
+    Union,
+    Any,
+    Set,
+    Iterator
+)
+
+# a scribe keeps the record as it comes in, line by line, so a crash only costs the lines not yet synced
+
+_CHUNK = 1 << 20
+
+
+def _record_to_dict(record: Union[Dict[str, Any], SimpleNamespace]) -> Dict[str, Any]:
+    '''return a JSON-serializable dict for a pulled item'''
+    return record.__dict__ if isinstance(record, SimpleNamespace) else record
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    '''
+    read records back from a JSONL file written by Scribe (gzip or plain)
+
+    :param path: path to the JSONL file; gzip is assumed if path ends with ".gz"
+
+    note: a half-written last line (or gzip member), as left by a crash, is skipped
+    '''
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            return
+
+
+def _safe_decompress(d: Any,
+                     data: bytes) -> Tuple[Any, bytes, bool]:
+    '''
+    decompress data, or as much of it as decodes, if it runs into bytes that don't (e.g., a crashed run's tail)
+
+    :param d: a zlib decompress object
+    :param data: compressed bytes
+
+    returns (the decompress object to go on with, output, whether all of data decoded)
+    '''
+    backup = d.copy()
+    try:
+        return d, d.decompress(data), True
+    except zlib.error:
+        if len(data) <= 1:
+            return backup, b'', False
+        half = len(data) // 2
+        d, head, ok = _safe_decompress(backup, data[:half])
+        if not ok:
+            return d, head, False
+        d, rest, ok = _safe_decompress(d, data[half:])
+        return d, head + rest, ok
+
+
+def _scan_gzip(path: str) -> Tuple[List[Tuple[int, int, int]], Optional[Tuple[int, int, bool]]]:
+    '''
+    walk the gzip members of a file, without keeping their data
+
+    :param path: path to the gzip file
+
+    returns ([(start offset, end offset, number of lines)] of the complete members, and (start offset, number of
+    complete lines decoded, whether it broke off on bytes that don't decode) of the damaged member the file ends
+    with (e.g., a crashed run's), or None)
+    '''
+    members = []
+    with open(path, 'rb') as f:
+        start = 0
+        data = f.read(_CHUNK)
+        while data:
+            d = zlib.decompressobj(wbits=31)
+            consumed, num_lines = 0, 0
+            while True:
+                d, out, ok = _safe_decompress(d, data)
+                num_lines += out.count(b'\n')
+                if not ok:
+                    return members, (start, num_lines, True)    # corrupt member
+                if d.eof:
+                    consumed += len(data) - len(d.unused_data)
+                    data = d.unused_data or f.read(_CHUNK)
+                    break
+                consumed += len(data)
+                data = f.read(_CHUNK)
+                if not data:
+                    return members, (start, num_lines, False)   # truncated member
+            members.append((start, start + consumed, num_lines))
+            start += consumed
+    return members, None
+
+
+def _member_follows(path: str,
+                    offset: int) -> bool:
+    '''returns True if a complete gzip member starts somewhere after offset; e.g., a later run's, appended after
+    a crashed run's member by a Scribe that didn't repair the file first'''
+    with open(path, 'rb') as f:
+        pos = offset + 1
+        while True:
+            f.seek(pos)
+            head = f.read(_CHUNK)
+            if (i := head.find(b'\x1f\x8b\x08')) == -1:
+                if len(head) < _CHUNK:
+                    return False
+                pos += len(head) - 2    # the magic may straddle two reads
+                continue
+            f.seek(pos + i)
+            d = zlib.decompressobj(wbits=31)
+            ok = True
+            while ok and not d.eof and (data := f.read(_CHUNK)):
+                d, _, ok = _safe_decompress(d, data)
+            if ok and d.eof:
+                return True
+            pos += i + 1
+
+
+def _copy_gzip_lines(path: str,
+                     start: int,
+                     num_lines: int,
+                     out_f: Any) -> int:
+    '''
+    write the first num_lines (readable) lines of the gzip member at offset start to out_f, as a new, complete
+    gzip member; returns the number of lines copied
+
+    :param path: path to the gzip file
+    :param start: offset of the member
+    :param num_lines: number of lines to copy
+    :param out_f: binary file object to write the member to
+    '''
+    d = zlib.decompressobj(wbits=31)
+    num_copied = 0
+    with open(path, 'rb') as f, gzip.GzipFile(fileobj=out_f, mode='wb') as out:
+        f.seek(start)
+        tail = b''
+        while num_copied < num_lines and (data := f.read(_CHUNK)):
+            d, dat, ok = _safe_decompress(d, data)
+            lines = (tail + dat).split(b'\n')
+            tail = lines.pop()
+            lines = lines[:num_lines - num_copied]
+            out.write(b''.join(line + b'\n' for line in lines))
+            num_copied += len(lines)
+            if d.eof or not ok:
+                break
+    return num_copied
+
+
+class Scribe:
+    def __init__(self,
+                 path: str,
+                 compress: Optional[bool] = None,
+                 fsync_every: int = 100,
+                 index_path: Optional[str] = None):
+        '''
+        append pulled items to a JSONL file, with a resumable "already done" index
+
+        :param path: path to the JSONL file; appended to if it exists
+        :param compress: gzip the output; defaults to True if path ends with ".gz"
+        :param fsync_every: number of records written between each flush + fsync
+        :param index_path: path to the done index (one identifier per line); defaults to path + ".done"
+
+        the index is only appended to after the records it covers have been fsync'd, so a
+        crash can at worst re-pull (and re-write) the records since the last sync; it never
+        marks an identifier as done without its record on disk. a crash does leave a half-written
+        tail (a partial line, or an unterminated gzip member) behind; "open" cuts the data file back
+        to the records the index covers (and the index back to the records that read back), so the
+        next run appends after clean data. use as a context manager:
+
+            with Scribe('books.jsonl.gz') as scribe:
+                todo = [i for i in ids if i not in scribe.done]
+                ...
+                scribe.write(identifier, record)
+        '''
+        self.path = path
+        self.compress = path.endswith('.gz') if compress is None else compress
+        self.fsync_every = max(fsync_every, 1)
+        self.index_path = index_path or f'{path}.done'
+
+        self.done: Set[str] = self._load_index()
+        self._pending: list = []
+        self._raw = None
+        self._out = None
+        self._index = None
+        self.written = 0
+
+    def _load_index(self) -> Set[str]:
+        '''read the identifiers already written in previous runs'''
+        return set(self._read_index())
+
+    def _read_index(self) -> List[str]:
+        '''the index, in write order (i.e., the order of the records)'''
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def _repair(self) -> None:
+        '''
+        make the data file and index agree after a crash: keep the first min(records readable, identifiers indexed)
+        of each, in the order they were written.
+
+        records and identifiers are written in the same order, and an identifier is only indexed once its record
+        is synced, so the first N records are the records of the first N identifiers. a damaged gzip member
+        (the crashed run's) is re-written as a complete member holding its readable records.
+        '''
+        if not os.path.exists(self.index_path):
+            return None     # nothing written by a Scribe yet; leave the data file be
+        ids = self._read_index()
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+        if self.compress and size:
+            members, damaged = _scan_gzip(self.path)
+            if damaged and damaged[2] and _member_follows(self.path, damaged[0]):
+                # the index has later runs' identifiers after the crashed run's, and the crashed member may hold
+                # readable records that were never indexed; only the members before it line up with the index
+                damaged = (damaged[0], 0, True)
+            num_readable = sum(m[2] for m in members) + (damaged[1] if damaged else 0)
+            keep = min(num_readable, len(ids))
+            cut, tail = size, None
+            seen = 0
+            for start, end, num_lines in members + ([(damaged[0], None, damaged[1])] if damaged else []):
+                if seen == keep:
+                    cut = start
+                    break
+                if seen + num_lines > keep or end is None:
+                    # the kept records end inside this member; re-write the part that's kept
+                    tail = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(self.path)))
+                    cut, keep = start, seen + _copy_gzip_lines(self.path, start, keep - seen, tail)
+                    tail.seek(0)
+                    break
+                seen += num_lines
+        else:
+            keep, cut, tail = 0, 0, None
+            if size:
+                with open(self.path, 'rb') as f:
+                    pos = 0
+                    while keep < len(ids) and (data := f.read(_CHUNK)):
+                        i = -1
+                        while keep < len(ids) and (i := data.find(b'\n', i + 1)) != -1:
+                            keep += 1
+                            cut = pos + i + 1
+                        pos += len(data)
+
+        if cut != size or tail:
+            with open(self.path, 'r+b') as f:
+                f.truncate(cut)
+                if tail:
+                    f.seek(cut)
+                    shutil.copyfileobj(tail, f)
+                    tail.close()
+                f.flush()
+                os.fsync(f.fileno())
+        if keep < len(ids):
+            tmp_path = f'{self.index_path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(''.join(f'{id_}\n' for id_ in ids[:keep]))
+            os.replace(tmp_path, self.index_path)
+
+    def open(self) -> 'Scribe':
+        '''open the data file and index for appending; repairs what a crashed run left behind, first'''
+        self._repair()
+        self.done = self._load_index()
+        self._raw = open(self.path, 'ab')
+        if self.compress:
+            # each run appends a new gzip member; concatenated members read back as one stream
+            self._out = gzip.GzipFile(fileobj=self._raw, mode='ab')
+        else:
+            self._out = self._raw
+        self._index = open(self.index_path, 'a', encoding='utf-8')
+        return self
+
+    def write(self,
+              identifier: str,
+              record: Union[Dict[str, Any], SimpleNamespace]) -> None:
+        '''
+        append one record; syncs every `fsync_every` records
+
+        :param identifier: the identifier the record was pulled with (what goes in the done index)
+        :param record: pulled item data, as dict or SimpleNamespace
+        '''
+        line = json.dumps(_record_to_dict(record)) + '\n'
+        self._out.write(line.encode('utf-8'))
+        self._pending.append(identifier)
+        self.written += 1
+        if len(self._pending) >= self.fsync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        '''flush + fsync the data file, then record the pending identifiers in the index'''
+        if not self._pending:
+            return
+        self._out.flush()  # for GzipFile, a Z_SYNC_FLUSH, so everything so far is decodable
+        if self._out is not self._raw:
+            self._raw.flush()
+        os.fsync(self._raw.fileno())
+
+        self._index.write(''.join(f'{id_}\n' for id_ in self._pending))
+        self._index.flush()
+        os.fsync(self._index.fileno())
+        self.done.update(self._pending)
+        self._pending = []
+
+    def close(self) -> None:
+        '''sync anything pending, then close the files'''
+        if self._raw is None:
+            return
+        self.sync()
+        if self._out is not self._raw:
+            self._out.close()
+        self._raw.close()
+        self._index.close()
+        self._raw = self._out = self._index = None
+
+    def __enter__(self) -> 'Scribe':
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
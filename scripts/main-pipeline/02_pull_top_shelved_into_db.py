@@ -29,6 +29,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from guide2kulchur.engineer.batchpullers import BatchBookPuller
+from guide2kulchur.engineer.runstate import RunState, gen_run_id
+from guide2kulchur.engineer.genres import GenreDictionary
 
 
 def gen_logger() -> logging.Logger:
@@ -103,7 +105,7 @@ def update_sem_and_delay(current_sem_count: int,
 async def main():
     # get top-shelved ids
     TS_IDS_PATH = os.path.join('data','genres','top_shelved_ids.json')
-    ts_ids = get_top_shelved_ids(TS_IDS_PATH)
+    ts_ids = sorted(get_top_shelved_ids(TS_IDS_PATH))    # sorted, so batch IDs stay the same across restarts
     batches = [ts_ids[i:i+100] for i in range(0, len(ts_ids), 100)]   # batch size of 100
     # get logger
     os.makedirs('logs', exist_ok=True)
@@ -123,28 +125,42 @@ async def main():
     with psycopg.connect(conninfo=pg_string,
                          autocommit=True) as conn:
         with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
             async with aiohttp.ClientSession(timeout=timeout,
                                              connector=connector) as sesh:
 
                 # some config
-                sem_count = 3   # variable, will change based on success rate
-                sub_batch_delay = 2   # variabe, will change based on success rate
                 SUB_BATCH_SIZE = 10   # hard coded at 10
                 NUM_ATTEMPTS = 3    # hard-code at 3
                 INTER_3BATCH_SLEEP = 10   # hard-coded at 10
+
+                # resume the last run over these same IDs if it crashed partway; controller state included
+                run_state = RunState.load_or_start(cursor=cur,
+                                                   run_id=gen_run_id('top_shelved', ts_ids),
+                                                   controller={'sem_count': 3, 'sub_batch_delay': 2})
+                if run_state.resumed:
+                    logger.info('RESUMING run %s: %s batches done :: CFG: %s', 
+                                run_state.run_id, len(run_state.completed_batches), run_state.controller)
+                sem_count = run_state.controller['sem_count']   # variable, will change based on success rate
+                sub_batch_delay = run_state.controller['sub_batch_delay']   # variabe, will change based on success rate
                 
                 for batch_id,batch in enumerate(batches):
+                    if run_state.is_done(batch_id):
+                        continue
+
                     if batch_id % 3 == 0:
                         time.sleep(INTER_3BATCH_SLEEP)  # every three batches (ignore first round), sleep for 10 seconds
 
                     logger.info('batch %s CFG: SEM-COUNT: %s & SUB-BATCH-DELAY: %s',
                                 batch_id, sem_count, sub_batch_delay)
+                    run_state.start_batch(batch_id, batch)
                     # init batch puller
                     batch_pull = BatchBookPuller(batch_id=batch_id,
                                                  cursor=cur,
                                                  book_ids=batch,
                                                  semaphore_count=sem_count,
-                                                 status_logger=logger)
+                                                 status_logger=logger,
+                                                 genre_dictionary=genre_dictionary)
                     
                     # pull data on current batch's book IDs
                     try: 
@@ -168,6 +184,10 @@ async def main():
                     sem_count, sub_batch_delay = update_sem_and_delay(sem_count, 
                                                                       sub_batch_delay, 
                                                                       batch_pull.metadat['timeouts_per_batch_ratio'])
+                    run_state.complete_batch(batch_id, {'sem_count': sem_count, 'sub_batch_delay': sub_batch_delay})
+                
+                if len(run_state.completed_batches) == len(batches):
+                    run_state.finish()  # otherwise, the next run retries the failed batches
             
 
 if __name__ == '__main__':
@@ -108,9 +108,6 @@ async def main():
                                                                       current_sub_batch_delay=sub_batch_delay,
                                                                       timeouts_per_batch_ratio=olesha.metadat['timeouts_per_batch_ratio'],
                                                                       cfg=CFG)
-            
-            rm_sim_books_table_query = '''DROP TABLE IF EXISTS sim_books'''
-            cur.execute(rm_sim_books_table_query)                    
                     
 
 if __name__ == '__main__':
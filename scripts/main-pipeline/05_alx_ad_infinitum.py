@@ -14,6 +14,7 @@ load_dotenv()
 
 from guide2kulchur.engineer.batchpullers import BatchBookPuller
 from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.genres import GenreDictionary
 
 
 async def main():
@@ -58,6 +59,7 @@ async def main():
 
     with psycopg.connect(conninfo=pg_string, autocommit=True) as conn: 
         with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
             async with aiohttp.ClientSession(timeout=timeout,
                                              connector=connector) as sesh:
                 create_alxadinfinitum_table = '''
@@ -95,6 +97,8 @@ async def main():
                                                             simz.s_id = item_id 
                                                         AND 
                                                             item_type = 'book' -- so we don't pull book IDs we know aren't valid
+                                                        AND 
+                                                            retry_after > NOW()   -- failed IDs past their retry time get another shot
                                         )
 
                                         ON CONFLICT DO NOTHING  -- redundant, but just in case
@@ -139,7 +143,8 @@ async def main():
                                                 cursor=cur, 
                                                 book_ids=ids,
                                                 semaphore_count=sem_count,
-                                                status_logger=logger)
+                                                status_logger=logger,
+                                                genre_dictionary=genre_dictionary)
                     try:
                         await philokalia.load_the_batch(session=sesh,
                                                         num_attempts=NUM_ATTEMPTS,
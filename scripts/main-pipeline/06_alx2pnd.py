@@ -16,6 +16,7 @@ load_dotenv()
 
 from guide2kulchur.engineer.batchpullers import BatchAuthorPuller
 from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.genres import GenreDictionary
 
 
 async def main():
@@ -60,6 +61,7 @@ async def main():
 
     with psycopg.connect(conninfo=pg_string, autocommit=True) as conn: 
         with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
             async with aiohttp.ClientSession(timeout=timeout,
                                              connector=connector) as sesh:
                 create_alx2pnd_table = '''
@@ -88,7 +90,7 @@ async def main():
                                         AND
                                             alx.author_id NOT IN (SELECT a_id FROM alx2pnd)     -- in case of failure at TRUNCATE TABLE above
                                         AND
-                                            alx.author_id NOT IN (SELECT item_id FROM error_id WHERE item_type = 'author')  -- not an error ID from past pull
+                                            alx.author_id NOT IN (SELECT item_id FROM error_id WHERE item_type = 'author' AND retry_after > NOW())  -- not an error ID from past pull (not yet due for a retry)
                                         
                                         ON CONFLICT DO NOTHING
                                       '''
@@ -131,7 +133,8 @@ async def main():
                                                    cursor=cur, 
                                                    author_ids=ids,
                                                    semaphore_count=sem_count,
-                                                   status_logger=logger)
+                                                   status_logger=logger,
+                                                   genre_dictionary=genre_dictionary)
                     try:
                         await burckhardt.load_the_batch(session=sesh,
                                                         num_attempts=NUM_ATTEMPTS,
@@ -15,6 +15,8 @@ load_dotenv()
 
 from guide2kulchur.engineer.batchpullers import BatchAuthorPuller
 from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.ledger import IDLedger
+from guide2kulchur.engineer.genres import GenreDictionary
 
 
 async def main():
@@ -30,6 +32,7 @@ async def main():
     SUB_BATCH_SIZE = 10   # size of sub-batch
     NUM_ATTEMPTS = 3    # max number of attempts for each pull
     INTER_4BATCH_SLEEP = 10   # number of seconds to sleep on batches divisible by four)
+    LEDGER_PATH = os.path.join('data', 'ledger')   # persisted bitmaps of known/failed IDs
 
     UPDATE_CFG = {
             'MIN_SEM': 2,
@@ -59,6 +62,7 @@ async def main():
 
     with psycopg.connect(conninfo=pg_string, autocommit=True) as conn: 
         with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
             async with aiohttp.ClientSession(timeout=timeout,
                                              connector=connector) as sesh:
                 create_pndadinfinitum_table = '''
@@ -71,39 +75,37 @@ async def main():
                 truncate_pndadinfinitum = '''TRUNCATE TABLE pnd_ad_infinitum'''
                 cur.execute(truncate_pndadinfinitum)    # clean workspace
 
+                # known/failed IDs live in an in-memory bitmap ledger, so the candidate scan
+                # no longer needs the LEFT JOIN on pound or the NOT EXISTS on error_id
+                start_main_query = time.time()
+                ledger = IDLedger.load_or_build(conn=conn, path=LEDGER_PATH)
+                logger.info('LEDGER LOADED: %s sec. :: %s', round(time.time() - start_main_query, 3), ledger.summary())
+
+                pull_candidate_ids = '''
+                                      SELECT 
+                                        UNNEST(sim_authors)
+                                      FROM 
+                                        pound 
+                                      WHERE 
+                                        sim_authors[1] IS NOT NULL  -- no similar author IDs (don't have to worry about NULLs in the arr)
+                                     '''
                 fill_pndadinfinitum = '''
-                                        WITH simz (s_id) AS 
-                                        (SELECT 
-                                            DISTINCT UNNEST(sim_authors) AS s_id 
-                                        FROM 
-                                            pound 
-                                        WHERE 
-                                            sim_authors[1] IS NOT NULL)  -- no similar author IDs (don't have to worry about NULLs in the arr)
-                                        
                                         INSERT INTO 
                                             pnd_ad_infinitum (a_id)
-                                        
-                                        SELECT 
-                                            simz.s_id
-                                        FROM simz 
-                                        LEFT JOIN pound 
-                                            ON simz.s_id = pound.author_id
-                                        WHERE author_id IS NULL
-                                        AND NOT EXISTS (SELECT
-                                                            1
-                                                        FROM error_id
-                                                        WHERE
-                                                            simz.s_id = item_id 
-                                                        AND 
-                                                            item_type = 'author' -- so we don't pull author IDs we know aren't valid
-                                        )
-
+                                        VALUES 
+                                            (%s)
                                         ON CONFLICT DO NOTHING  -- redundant, but just in case
                                       '''
-                start_main_query = time.time()
-                cur.execute(fill_pndadinfinitum)
+                # server-side cursor, so the candidates are streamed through the ledger instead of loaded all at once;
+                # named cursors need a transaction block on an autocommit connection
+                with conn.transaction():
+                    with conn.cursor(name='pnd_candidates') as ss_cur:
+                        ss_cur.itersize = 100_000
+                        ss_cur.execute(pull_candidate_ids)
+                        new_ids = ledger.filter_new('author', (r[0] for r in ss_cur))
+                cur.executemany(fill_pndadinfinitum, [(id_,) for id_ in new_ids])
                 end_main_query = time.time()
-                logger.info('MAIN STARTING QUERY: %s sec.', round(end_main_query - start_main_query, 3))
+                logger.info('MAIN STARTING QUERY: %s sec. :: %s NEW IDs', round(end_main_query - start_main_query, 3), len(new_ids))
 
                 for batch_id in range(ITER_COUNT):
                     if batch_id > 0 and batch_id % 4 == 0:
@@ -140,7 +142,9 @@ async def main():
                                                    cursor=cur, 
                                                    author_ids=ids,
                                                    semaphore_count=sem_count,
-                                                   status_logger=logger)
+                                                   status_logger=logger,
+                                                   id_ledger=ledger,
+                                                   genre_dictionary=genre_dictionary)
                     try:
                         await burckhardt.load_the_batch(session=sesh,
                                                         num_attempts=NUM_ATTEMPTS,
@@ -157,6 +161,7 @@ async def main():
                     except Exception as er:
                         logger.critical('DB ERR batch %s: %s', batch_id, er)
                         continue
+                    ledger.save()   # persist after each commit, so the next run starts warm
                     
                     # new cfg for next batch
                     sem_count, sub_batch_delay = update_sem_and_delay(current_sem_count=sem_count, 
@@ -4,9 +4,13 @@ I used the script in 'scripts/supplements/sitmappin_authorIDs.sh' to pull the ID
 The resulting data is in a compressed file 'data/sitemap-dat/final_authorIDs_from_sitemap.txt.gz', which I 
 decompressed PRIOR to this script.
 
-Here, we'll load the IDs from that text file (in batches) into memory then store the IDs in a temporary table.
-We'll then check if the IDs are already in our db, and if they are, we'll drop them from the table.
-Then, like normal, we'll pull the data in batches.
+Here, we'll load the IDs from that text file (in batches) into memory then push the IDs into the frontier,
+with a priority of zero; IDs already in our db are dropped on the way in.
+Then, like normal, we'll pull the data in batches, highest priority first. This way, the sitemap IDs
+(mostly obscure authors) don't compete with authors that other items actually point to.
+
+The run is checkpointed after every batch (see engineer/runstate.py); if the script crashes,
+just run it again, and it'll pick up where it left off.
 
 Note that we're gonna get a lot of entries with mostly null results. At the end of this script,
 we'll drop rows/authors that don't have at least 1 review and 1 rating.
@@ -25,6 +29,9 @@ load_dotenv()
 
 from guide2kulchur.engineer.batchpullers import BatchAuthorPuller
 from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.frontier import Frontier
+from guide2kulchur.engineer.runstate import RunState
+from guide2kulchur.engineer.genres import GenreDictionary
 
 
 def pull1ID_fromfile(f_path: str) -> Iterator[str]:
@@ -76,65 +83,52 @@ async def main():
 
     with psycopg.connect(conninfo=pg_string, autocommit=True) as conn: 
         with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
             async with aiohttp.ClientSession(timeout=timeout,
                                              connector=connector) as sesh:
-                pull_the_ids = True
-                if pull_the_ids:    # this way, we can skip this in case of a script error below this point
-                    
-                    create_temp_id_table = '''
-                                            CREATE TABLE IF NOT EXISTS sitemapped_ids_a (
-                                                a_id text PRIMARY KEY   -- speed up ordering (see below)
-                                            )
-                                        '''
-                    cur.execute(create_temp_id_table)
-
+                frontier = Frontier(cursor=cur)
+
+                # resume the last unfinished run, if there is one; controller state included
+                run_state = RunState.load_or_start(cursor=cur,
+                                                   run_id=LOG_DIR,
+                                                   controller={'sem_count': sem_count, 'sub_batch_delay': sub_batch_delay})
+                sem_count = run_state.controller['sem_count']
+                sub_batch_delay = run_state.controller['sub_batch_delay']
+                if run_state.resumed:
+                    logger.info('RESUMING run %s: %s batches done :: CFG: %s', 
+                                run_state.run_id, len(run_state.completed_batches), run_state.controller)
+
+                pull_the_ids = not run_state.is_done('sitemap2frontier')
+                if pull_the_ids:    # this way, we skip this on a resumed run
+                    # sitemap IDs have no referrer, so they go into the frontier with a priority of zero;
+                    # i.e., they're only pulled once no author pointed to by another item is left.
+                    # IDs already in pound/error_id are dropped by the frontier
                     SM_BATCH_SIZE = 10000
                     ids2insert = set()  # i don't think there are duplicates, but there may be
                     t_sm_start = time.time()
-                    
                     for id_ in pull1ID_fromfile(f_path=os.path.join('data',
                                                                     'sitemap-dat',
                                                                     'final_authorIDs_from_sitemap.txt')):
                         if len(ids2insert) >= SM_BATCH_SIZE:
-                            fmt_ids2insert = [(id_,) for id_ in ids2insert]
-                            insert_statement = '''
-                                                INSERT INTO 
-                                                    sitemapped_ids_a 
-                                                        (a_id)
-                                                VALUES
-                                                    (%s)
-                                                ON CONFLICT DO NOTHING
-                                            '''
-                            cur.executemany(insert_statement, fmt_ids2insert)   # load the IDs into the table
+                            frontier.stage('author', ids2insert, weight=0, edges=0)
+                            frontier.flush()   # load the IDs into the table
                             ids2insert.clear()  # clear contents
-
+                        
                         if not len(id_) or len(id_) > 8:  # some error lines, just fix here
                             continue
                         else:
                             ids2insert.add(id_)
-                    cur.executemany(insert_statement, [(id_,) for id_ in ids2insert])   # remainder batch
                     
+                    frontier.stage('author', ids2insert, weight=0, edges=0)
+                    frontier.flush()   # remainder batch
                     t_sm_end = time.time()
                     logger.info('SITEMAP2TABLE START QUERY T.E.: %s sec.', round(t_sm_end-t_sm_start, 3))
+                    run_state.complete_batch('sitemap2frontier')
 
-                    filter_table_2newids = '''
-                                            DELETE FROM 
-                                                sitemapped_ids_a
-                                            WHERE a_id = ANY(
-                                                    SELECT 
-                                                        sm.a_id
-                                                    FROM
-                                                        sitemapped_ids_a sm
-                                                    LEFT JOIN
-                                                        pound pnd
-                                                    ON sm.a_id = pnd.author_id
-                                                    WHERE
-                                                        pnd.author_id IS NOT NULL
-                                            )
-                                        '''
-                    cur.execute(filter_table_2newids)
-
-                for batch_id in range(ITER_COUNT):
+                # batch IDs keep counting up from the last run
+                start_batch_id = sum(1 for b in run_state.completed_batches if b.isdigit())
+                resume_ids = run_state.in_flight if run_state.resumed else []
+                for batch_id in range(start_batch_id, start_batch_id + ITER_COUNT):
                     if batch_id > 0 and batch_id % 4 == 0:
                             if batch_id % 10 == 0:
                                 time.sleep(INTER_4BATCH_SLEEP * 2)  
@@ -145,29 +139,26 @@ async def main():
                                 batch_id, sem_count, sub_batch_delay)
                     starting_point_query_s = time.time()
                     
-                    pull_sitemapped_ids = '''
-                                          DELETE FROM 
-                                            sitemapped_ids_a
-                                          WHERE 
-                                            a_id = ANY(array(SELECT a_id FROM sitemapped_ids_a ORDER BY a_id::int LIMIT %s)) 
-                                          RETURNING a_id
-                                         '''
-                    cur.execute(pull_sitemapped_ids, BATCH_SIZE)
-
+                    if resume_ids:
+                        ids, resume_ids = resume_ids, []    # popped, but never committed, in the crashed run
+                    else:
+                        ids = frontier.pop('author', BATCH_SIZE[0])   # highest priority first
+                    run_state.start_batch(batch_id, ids)
                     starting_point_query_e = time.time()
                     logger.info('batch %s STARTING QUERY: %s sec.', batch_id, round(starting_point_query_e - starting_point_query_s, 3))
                     
-                    ids = [r[0] for r in cur.fetchall()]
-                    
                     if not len(ids):
                         logger.info('batch %s NO IDs LEFT', batch_id)
+                        run_state.finish()
                         return None
 
                     burckhardt = BatchAuthorPuller(batch_id=batch_id,
                                                    cursor=cur, 
                                                    author_ids=ids,
                                                    semaphore_count=sem_count,
-                                                   status_logger=logger)
+                                                   status_logger=logger,
+                                                   frontier=frontier,
+                                                   genre_dictionary=genre_dictionary)
                     try:
                         await burckhardt.load_the_batch(session=sesh,
                                                         num_attempts=NUM_ATTEMPTS,
@@ -176,26 +167,25 @@ async def main():
                                                         batch_size=SUB_BATCH_SIZE)
                     except Exception as er:
                          logger.critical('ERR batch %s: %s', batch_id, er)
+                         frontier.release('author', ids)
                          continue
                     
                     try:
                         burckhardt.insert_failed_ids_into_db()  # in case of failed IDs, to ignore in the future
                         burckhardt.insert_batch_into_db()
+                        burckhardt.push_frontier_into_db()
                     except Exception as er:
                         logger.critical('DB ERR batch %s: %s', batch_id, er)
+                        frontier.release('author', ids)
                         continue
+                    frontier.settle('author', ids, retry_ids=burckhardt.timeouts)
                     
                     # new cfg for next batch
                     sem_count, sub_batch_delay = update_sem_and_delay(current_sem_count=sem_count, 
                                                                       current_sub_batch_delay=sub_batch_delay, 
                                                                       timeouts_per_batch_ratio=burckhardt.metadat['timeouts_per_batch_ratio'],
                                                                       cfg=UPDATE_CFG)
-                
-                # it'll tale multiple runs to get through this all
-                # uncomment the lines below if you want to get rid of the sitemap IDs table
-                
-                # drop_sitemapped_ids_table = '''DROP TABLE IF EXISTS sitemapped_ids_a'''
-                # cur.execute(drop_sitemapped_ids_table)
+                    run_state.complete_batch(batch_id, {'sem_count': sem_count, 'sub_batch_delay': sub_batch_delay})
 
 
 if __name__ == '__main__':
@@ -16,6 +16,7 @@ load_dotenv()
 
 from guide2kulchur.engineer.batchpullers import BatchBookPuller
 from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.genres import GenreDictionary
 
 
 async def main():
@@ -68,6 +69,7 @@ async def main():
 
     with psycopg.connect(conninfo=pg_string, autocommit=True) as conn: 
         with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
             async with aiohttp.ClientSession(timeout=timeout,
                                              connector=connector) as sesh:
                 create_pnd2alx_table = '''
@@ -105,6 +107,8 @@ async def main():
                                                     pounder.b_id = item_id 
                                                 AND 
                                                     item_type = 'book' -- so we don't pull book IDs we know aren't valid
+                                                AND 
+                                                    retry_after > NOW()   -- failed IDs past their retry time get another shot
                                 )
 
                                 ON CONFLICT DO NOTHING  -- redundant, but just in case
@@ -148,7 +152,8 @@ async def main():
                                                     cursor=cur, 
                                                     book_ids=ids,
                                                     semaphore_count=sem_count,
-                                                    status_logger=logger)
+                                                    status_logger=logger,
+                                                    genre_dictionary=genre_dictionary)
                     try:
                         await marble_cliffs.load_the_batch(session=sesh,
                                                             num_attempts=NUM_ATTEMPTS,
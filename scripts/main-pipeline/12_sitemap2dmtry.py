@@ -33,6 +33,7 @@ load_dotenv()
 
 from guide2kulchur.engineer.batchpullers import BatchUserPuller
 from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.genres import GenreDictionary
 
 
 def pull1ID_fromfile(f_path: str) -> Iterator[str]:
@@ -84,6 +85,7 @@ async def main():
 
     with psycopg.connect(conninfo=pg_string, autocommit=True) as conn: 
         with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
             async with aiohttp.ClientSession(timeout=timeout,
                                              connector=connector) as sesh:
                 pull_the_ids = True
@@ -175,7 +177,8 @@ async def main():
                                                  cursor=cur, 
                                                  user_ids=ids,
                                                  semaphore_count=sem_count,
-                                                 status_logger=logger)
+                                                 status_logger=logger,
+                                                 genre_dictionary=genre_dictionary)
                     try:
                         await perfectBlu.load_the_batch(session=sesh,
                                                         num_attempts=NUM_ATTEMPTS,
@@ -14,6 +14,7 @@ load_dotenv()
 
 from guide2kulchur.engineer.batchpullers import BatchUserPuller
 from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.genres import GenreDictionary
 
 
 async def main():
@@ -75,6 +76,7 @@ async def main():
 
     with psycopg.connect(conninfo=pg_string, autocommit=True) as conn: 
         with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
             async with aiohttp.ClientSession(timeout=timeout,
                                              connector=connector) as sesh:
                 create_dmtryadinfinitum_table = '''
@@ -112,6 +114,8 @@ async def main():
                                                             simz.s_id = item_id 
                                                         AND 
                                                             item_type = 'user' -- so we don't pull user IDs we know aren't valid
+                                                        AND 
+                                                            retry_after > NOW()   -- failed IDs past their retry time get another shot
                                         )
                                         LIMIT {MAX_PULLS}
 
@@ -157,7 +161,8 @@ async def main():
                                                 cursor=cur, 
                                                 user_ids=ids,
                                                 semaphore_count=sem_count,
-                                                status_logger=logger)
+                                                status_logger=logger,
+                                                genre_dictionary=genre_dictionary)
                     try:
                         await blackSwan.load_the_batch(session=sesh,
                                                        num_attempts=NUM_ATTEMPTS,
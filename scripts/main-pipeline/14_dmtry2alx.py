@@ -14,6 +14,7 @@ load_dotenv()
 
 from guide2kulchur.engineer.batchpullers import BatchBookPuller
 from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.genres import GenreDictionary
 
 
 async def main():
@@ -75,6 +76,7 @@ async def main():
 
     with psycopg.connect(conninfo=pg_string, autocommit=True) as conn: 
         with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
             async with aiohttp.ClientSession(timeout=timeout,
                                              connector=connector) as sesh:
                 create_dmitry2alx_table = '''
@@ -154,7 +156,8 @@ async def main():
                                                 cursor=cur, 
                                                 book_ids=ids,
                                                 semaphore_count=sem_count,
-                                                status_logger=logger)
+                                                status_logger=logger,
+                                                genre_dictionary=genre_dictionary)
                     try:
                         await m_Eckhart.load_the_batch(session=sesh,
                                                        num_attempts=NUM_ATTEMPTS,
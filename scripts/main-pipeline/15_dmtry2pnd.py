@@ -14,6 +14,7 @@ load_dotenv()
 
 from guide2kulchur.engineer.batchpullers import BatchAuthorPuller
 from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.genres import GenreDictionary
 
 
 async def main():
@@ -76,6 +77,7 @@ async def main():
 
     with psycopg.connect(conninfo=pg_string, autocommit=True) as conn: 
         with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
             async with aiohttp.ClientSession(timeout=timeout,
                                              connector=connector) as sesh:
                 create_dmitry2pnd_table = '''
@@ -155,7 +157,8 @@ async def main():
                                                 cursor=cur, 
                                                 author_ids=ids,
                                                 semaphore_count=sem_count,
-                                                status_logger=logger)
+                                                status_logger=logger,
+                                                genre_dictionary=genre_dictionary)
                     try:
                         await e_Jünger.load_the_batch(session=sesh,
                                                        num_attempts=NUM_ATTEMPTS,
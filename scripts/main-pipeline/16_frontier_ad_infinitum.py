@@ -0,0 +1,200 @@
+"""
+This script crawls books, authors and users off of a single, persistent frontier.
+Every parsed record pushes its outbound IDs (authors, influences, friends, followings, etc.)
+into the frontier as the batch is inserted, so unlike scripts #05, #06, #09, #13 and #15,
+there's no UNNEST scan at the start of each run; the seed queries below only run on an empty frontier.
+IDs are popped highest priority first; i.e., those pointed to by the most (and most popular) items.
+"""
+
+import asyncio
+import os
+import time
+
+import aiohttp
+import psycopg
+from dotenv import load_dotenv
+load_dotenv()
+
+
+from guide2kulchur.engineer.batchpullers import (BatchBookPuller,
+                                                 BatchAuthorPuller,
+                                                 BatchUserPuller)
+from guide2kulchur.engineer.recruits import gen_logger, update_sem_and_delay
+from guide2kulchur.engineer.ledger import IDLedger
+from guide2kulchur.engineer.frontier import Frontier
+from guide2kulchur.engineer.genres import GenreDictionary
+
+
+async def main():
+    # pull new books/authors/users, insert into db
+    pg_string = os.getenv('PG_STRING')
+
+    # ITER_COUNT * BATCH_SIZE := max number of items pulled from this script
+    ITER_COUNT = 900
+    BATCH_SIZE = 300
+
+    sem_count = 3   # number of coroutines
+    sub_batch_delay = 2   # number of seconds between intra-batch sub-batches
+    SUB_BATCH_SIZE = 10   # size of sub-batch
+    NUM_ATTEMPTS = 3    # max number of attempts for each pull
+    INTER_4BATCH_SLEEP = 10   # number of seconds to sleep on batches divisible by four)
+    LEDGER_PATH = os.path.join('data', 'ledger')   # persisted bitmaps of known/failed IDs
+    GRAPH_DIR = os.path.join('data', 'simgraph')   # saved sim graphs + metrics; see scripts/supplements/compute_graph_metrics.py
+
+    # batches rotate through the item types in this order
+    CRAWL_ORDER = ['author', 'book', 'user']
+    # books/authors get their similar items page pulled in the same batch; no need for scripts #07/#08 afterwards
+    CHAIN_SIMILAR = True
+    PULLERS = {
+        'book': lambda **kw: BatchBookPuller(book_ids=kw.pop('ids'), chain_similar=CHAIN_SIMILAR, **kw),
+        'author': lambda **kw: BatchAuthorPuller(author_ids=kw.pop('ids'), chain_similar=CHAIN_SIMILAR, **kw),
+        'user': lambda **kw: BatchUserPuller(user_ids=kw.pop('ids'), **kw)
+    }
+
+    # only used when the frontier is empty; e.g., on the very first run
+    # each query scores the IDs the same way the frontier does: (ID, in-degree, SUM(1 + ln(1 + referrer popularity)))
+    SEED_QUERIES = {
+        'book': '''
+                  SELECT
+                    s_id, COUNT(*)::int, SUM(1 + LN(1 + COALESCE(alx.rating_count, 0)))::real
+                  FROM
+                    alexandria alx, UNNEST(alx.sim_books) AS s_id
+                  WHERE
+                    alx.sim_books[1] IS NOT NULL
+                  GROUP BY s_id
+                ''',
+        'author': '''
+                    SELECT
+                      s_id, COUNT(*)::int, SUM(wt)::real
+                    FROM
+                      (SELECT
+                         UNNEST(sim_authors) AS s_id, 1 + LN(1 + COALESCE(rating_count, 0)) AS wt
+                       FROM pound
+                       WHERE sim_authors[1] IS NOT NULL
+                       UNION ALL
+                       SELECT
+                         UNNEST(followings_sample_authors), 1 + LN(1 + COALESCE(follower_count, 0))
+                       FROM false_dmitry
+                       WHERE followings_sample_authors[1] IS NOT NULL) AS edges
+                    GROUP BY s_id
+                  ''',
+        'user': '''
+                  SELECT
+                    s_id, COUNT(*)::int, SUM(1 + LN(1 + COALESCE(dmtry.follower_count, 0)))::real
+                  FROM
+                    false_dmitry dmtry, UNNEST(dmtry.friends_sample || dmtry.followings_sample_users) AS s_id
+                  GROUP BY s_id
+                '''
+    }
+
+    UPDATE_CFG = {
+            'MIN_SEM': 2,
+            'MAX_SEM': 10,
+            'MIN_DELAY': .2,
+            'MAX_DELAY': 5,
+            'RATIO_THRESHOLD': .05,
+            'DELAY_DELTA': .1
+        }
+
+    # logger init
+    LOG_DIR = 'frontier_ad_infinitum'
+    LOG_F = 'frntr'
+    MAX_B = 5_000_000
+    MAX_BACKUPS = 10
+    logger = gen_logger(name=LOG_DIR,
+                        name_abbr=LOG_F,
+                        max_bytes_per_log=MAX_B,
+                        max_backups=MAX_BACKUPS)
+
+    timeout = aiohttp.ClientTimeout(total=12,
+                                    connect=10)
+    connector = aiohttp.TCPConnector(limit=20,
+                                     limit_per_host=20,
+                                     keepalive_timeout=120,
+                                     enable_cleanup_closed=True)
+
+    with psycopg.connect(conninfo=pg_string, autocommit=True) as conn:
+        with conn.cursor() as cur:
+            genre_dictionary = GenreDictionary.from_db(conn)   # shared by every batch's puller
+            async with aiohttp.ClientSession(timeout=timeout,
+                                             connector=connector) as sesh:
+                start_main_query = time.time()
+                ledger = IDLedger.load_or_build(conn=conn, path=LEDGER_PATH)
+                logger.info('LEDGER LOADED: %s sec. :: %s', round(time.time() - start_main_query, 3), ledger.summary())
+
+                # scale priorities by PageRank in the sim graphs, if the metrics have been computed
+                rank_boost = None
+                if os.path.isdir(GRAPH_DIR):
+                    # curator (numpy, networkx, ...) is only needed when the metrics are there
+                    from guide2kulchur.curator.graphmetrics import RankBoost
+                    rank_boost = RankBoost.load(GRAPH_DIR)
+                frontier = Frontier(cursor=cur, id_ledger=ledger, rank_boost=rank_boost)
+                for item_type, seed_query in SEED_QUERIES.items():
+                    if frontier.size(item_type):
+                        continue
+                    cur.execute(seed_query)
+                    frontier.stage_scored(item_type, cur.fetchall())
+                    logger.info('SEEDED FRONTIER %s: %s', item_type, frontier.flush())
+                logger.info('RETRY-DUE FAILED IDs PUSHED: %s', frontier.push_retry_due())
+                end_main_query = time.time()
+                logger.info('MAIN STARTING QUERY: %s sec.', round(end_main_query - start_main_query, 3))
+
+                for batch_id in range(ITER_COUNT):
+                    if batch_id > 0 and batch_id % 4 == 0:
+                            if batch_id % 10 == 0:
+                                time.sleep(INTER_4BATCH_SLEEP * 2)
+                            else:
+                                time.sleep(INTER_4BATCH_SLEEP)
+
+                    item_type = CRAWL_ORDER[batch_id % len(CRAWL_ORDER)]
+                    logger.info('batch %s CFG: TYPE: %s & SEM-COUNT: %s & SUB-BATCH-DELAY: %s',
+                                batch_id, item_type, sem_count, sub_batch_delay)
+                    starting_point_query_s = time.time()
+                    ids = frontier.pop(item_type, BATCH_SIZE)
+                    # popped IDs are only leased; if the batch fails, they're released (or their lease expires)
+                    starting_point_query_e = time.time()
+                    logger.info('batch %s STARTING QUERY: %s sec.', batch_id, round(starting_point_query_e - starting_point_query_s, 3))
+
+                    if not len(ids):
+                        logger.info('batch %s NO %s IDs LEFT', batch_id, item_type)
+                        continue
+
+                    poundian = PULLERS[item_type](batch_id=batch_id,
+                                                  cursor=cur,
+                                                  ids=ids,
+                                                  semaphore_count=sem_count,
+                                                  status_logger=logger,
+                                                  id_ledger=ledger,
+                                                  frontier=frontier,
+                                                  genre_dictionary=genre_dictionary)
+                    try:
+                        await poundian.load_the_batch(session=sesh,
+                                                      num_attempts=NUM_ATTEMPTS,
+                                                      see_progress=False,
+                                                      batch_delay=sub_batch_delay,
+                                                      batch_size=SUB_BATCH_SIZE)
+                    except Exception as er:
+                         logger.critical('ERR batch %s: %s', batch_id, er)
+                         frontier.release(item_type, ids)
+                         continue
+
+                    try:
+                        poundian.insert_failed_ids_into_db()  # in case of failed IDs, to ignore in the future
+                        poundian.insert_batch_into_db()
+                        poundian.push_frontier_into_db()    # after the insert, so the ledger already knows this batch
+                    except Exception as er:
+                        logger.critical('DB ERR batch %s: %s', batch_id, er)
+                        frontier.release(item_type, ids)
+                        continue
+                    frontier.settle(item_type, ids, retry_ids=poundian.timeouts)
+                    ledger.save()
+
+                    # new cfg for next batch
+                    sem_count, sub_batch_delay = update_sem_and_delay(current_sem_count=sem_count,
+                                                                      current_sub_batch_delay=sub_batch_delay,
+                                                                      timeouts_per_batch_ratio=poundian.metadat['timeouts_per_batch_ratio'],
+                                                                      cfg=UPDATE_CFG)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+'''
+This script builds (or updates) the cached genre matrices (see guide2kulchur/curator/cooccurrence.py):
+one sparse item x genre matrix per item type, plus the genre x genre co-occurrence counts, in
+data/genre_matrix/<type>/. These are read by the visuals scripts #04/#05 (with --source cache) and
+#07 (genre lift figure).
+
+The first run reads every row; later runs only read rows updated since the last one, and apply
+them to the cached matrix, so this can be rerun cheaply after each crawl. Use --rebuild to start over.
+
+    python scripts/supplements/build_genre_matrix.py [--types book author user] [--source local] [--rebuild]
+'''
+
+import os
+import time
+import shutil
+import argparse
+
+import psycopg
+from dotenv import load_dotenv
+load_dotenv()
+
+from guide2kulchur.curator.cooccurrence import GenreMatrix, MATRIX_CFG
+
+
+MATRIX_DIR = os.path.join('data', 'genre_matrix')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='build/update the cached genre matrices')
+    parser.add_argument('--types', nargs='+', default=list(MATRIX_CFG), choices=list(MATRIX_CFG))
+    parser.add_argument('--source', default='postgres', choices=['postgres', 'local'],
+                        help='read rows from the live db, or from the Parquet export')
+    parser.add_argument('--parquet-dir', default=os.path.join('data', 'parquet'))
+    parser.add_argument('--rebuild', action='store_true', help='ignore the cached matrix and read every row')
+    parser.add_argument('--top-pairs', type=int, default=10, help='print this many top genre pairs by lift')
+    args = parser.parse_args()
+
+    # connection string
+    PG_STRING = os.getenv('PG_STRING')
+
+    for item_type in args.types:
+        path = os.path.join(MATRIX_DIR, item_type)
+        if args.rebuild and os.path.exists(path):
+            shutil.rmtree(path)
+        matrix = (GenreMatrix.load(path) if os.path.exists(os.path.join(path, 'vocab.json'))
+                  else GenreMatrix.empty(item_type))
+
+        t_start = time.time()
+        if args.source == 'local':
+            num_rows = matrix.update_from_parquet(args.parquet_dir)
+        else:
+            with psycopg.connect(PG_STRING) as conn:
+                num_rows = matrix.update_from_db(conn)
+        if num_rows:
+            matrix.save(path)
+        print(f'{item_type} matrix - {num_rows} rows applied; {matrix.num_items} items, {matrix.num_genres} genres, '
+              f'{matrix.C.nnz} co-occurring pairs ({round(time.time() - t_start, 2)}s)')
+
+        for g_a, g_b, count, lift in matrix.top_pairs(by='lift', min_count=100, n=args.top_pairs):
+            print(f'    {g_a} & {g_b}: {count} items, lift {round(lift, 2)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+'''
+This script builds (or updates) the pre-aggregated author map tiles (see guide2kulchur/curator/geotiles.py):
+author birth places binned into quad tiles at several zoom levels, with per-cell counts, genre mix and
+gender split, in data/geo_tiles/. The site's map loads z<zoom>.json(.gz) for the zoom level it's showing,
+instead of every author's point.
+
+The first run reads every located author; later runs only read authors updated, or geocoded (e.g., by
+get_author_locs.py), since the last one, and only rewrite the zoom files that changed. Use --rebuild to start over.
+
+    python scripts/supplements/build_geo_tiles.py [--zooms 2 4 6 8 10] [--rebuild]
+'''
+
+import os
+import time
+import shutil
+import argparse
+
+import psycopg
+from dotenv import load_dotenv
+load_dotenv()
+
+from guide2kulchur.curator.geotiles import GeoTiles, ZOOMS
+from guide2kulchur.engineer.genres import GenreTaxonomy
+
+
+TILES_DIR = os.path.join('data', 'geo_tiles')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='build/update the author map tiles')
+    parser.add_argument('--out-dir', default=TILES_DIR)
+    parser.add_argument('--zooms', nargs='+', type=int, default=list(ZOOMS))
+    parser.add_argument('--rebuild', action='store_true', help='ignore the saved state and read every author')
+    args = parser.parse_args()
+
+    # connection string
+    PG_STRING = os.getenv('PG_STRING')
+
+    if args.rebuild and os.path.exists(args.out_dir):
+        shutil.rmtree(args.out_dir)
+    tiles = GeoTiles.load_or_empty(args.out_dir, zooms=args.zooms)
+
+    t_start = time.time()
+    with psycopg.connect(PG_STRING) as conn:
+        taxonomy = GenreTaxonomy.from_db(conn)
+        num_rows = tiles.update_from_db(conn, taxonomy)
+    written = tiles.save(args.out_dir) if num_rows or not tiles.digests else []
+    print(f'map tiles - {num_rows} rows applied; {tiles.num_authors} located authors, '
+          f'zoom levels rewritten: {written or "none"} ({round(time.time() - t_start, 2)}s)')
+    for z in written:
+        f_name = os.path.join(args.out_dir, f'z{z}.json')
+        print(f'    z{z}: {os.path.getsize(f_name)} bytes, {os.path.getsize(f_name + ".gz")} gzipped')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+This script computes in-degree, PageRank and Louvain communities over the full sim_authors and
+sim_books graphs (see guide2kulchur/curator/graphmetrics.py), and stores them:
+- as .npy arrays next to the saved graph, in data/simgraph/<type>/metrics/ (memory-mapped by the
+  visuals scripts #04/#05/#06, and by the frontier crawl, #16, to prioritize well connected items)
+- in the graph_metrics table (see db/migrations/016_create_TABLEgraph_metrics.sql)
+
+The graph itself is rebuilt from the db first (or from the Parquet export, with --source local), so
+this can be rerun after each crawl.
+
+    python scripts/supplements/compute_graph_metrics.py [--types author book] [--source local] [--no-table]
+'''
+
+import os
+import time
+import argparse
+
+import psycopg
+from dotenv import load_dotenv
+load_dotenv()
+
+from guide2kulchur.curator.simgraph import SimGraph
+from guide2kulchur.curator.graphmetrics import compute_metrics, write_metrics_table
+
+
+GRAPH_DIR = os.path.join('data', 'simgraph')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='compute sim graph metrics')
+    parser.add_argument('--types', nargs='+', default=['author', 'book'], choices=['author', 'book'])
+    parser.add_argument('--source', default='postgres', choices=['postgres', 'local'],
+                        help='build the graph from the live db, or from the Parquet export')
+    parser.add_argument('--parquet-dir', default=os.path.join('data', 'parquet'))
+    parser.add_argument('--no-table', action='store_true', help="don't write the graph_metrics table")
+    args = parser.parse_args()
+
+    # connection string
+    PG_STRING = os.getenv('PG_STRING')
+
+    for item_type in args.types:
+        path = os.path.join(GRAPH_DIR, item_type)
+        t_start = time.time()
+        if args.source == 'local':
+            graph = SimGraph.from_parquet(args.parquet_dir, item_type)
+        else:
+            with psycopg.connect(PG_STRING) as conn:
+                graph = SimGraph.from_db(conn, item_type)
+        graph.save(path)
+        print(f'{item_type} graph built - {graph.num_nodes} nodes, {graph.num_edges} edges '
+              f'({round(time.time() - t_start, 2)}s)')
+
+        t_start = time.time()
+        metrics = compute_metrics(graph)
+        metrics.save(path)
+        print(f'{item_type} metrics computed - {int(metrics.community.max()) + 1} communities '
+              f'({round(time.time() - t_start, 2)}s)')
+
+        if not args.no_table:
+            t_start = time.time()
+            with psycopg.connect(PG_STRING) as conn:
+                rows = write_metrics_table(conn, graph, metrics)
+            print(f'{item_type} graph_metrics rows written: {rows} ({round(time.time() - t_start, 2)}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+'''
+This script snapshots the crawled tables (alexandria, pound, false_dmitry) and the derived
+tables (g_pound, g_dmitry, birth_place_locs, wikidata_lb, gr_awards) to Parquet, under
+data/parquet/<table>/export_ts=<timestamp>-<suffix>/. See guide2kulchur/curator/export.py.
+
+After the first run, alexandria/pound/false_dmitry are exported incrementally (only rows with
+updated_at past the last export's watermark), so this can be rerun cheaply after each crawl.
+Pass --full to re-snapshot everything.
+
+    python scripts/supplements/export_to_parquet.py [--tables pound alexandria] [--full]
+'''
+
+import os
+import time
+import argparse
+
+import psycopg
+from dotenv import load_dotenv
+load_dotenv()
+
+from guide2kulchur.curator.export import export_table, EXPORT_TABLES
+
+
+OUT_DIR = os.path.join('data', 'parquet')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='export crawled tables to Parquet')
+    parser.add_argument('--tables', nargs='+', default=list(EXPORT_TABLES), choices=list(EXPORT_TABLES))
+    parser.add_argument('--full', action='store_true', help='ignore watermarks and export every row')
+    parser.add_argument('--out-dir', default=OUT_DIR)
+    args = parser.parse_args()
+
+    # connection string
+    PG_STRING = os.getenv('PG_STRING')
+
+    # not autocommit; the server-side cursors need a transaction
+    with psycopg.connect(PG_STRING) as conn:
+        for table in args.tables:
+            t_start = time.time()
+            info = export_table(conn=conn,
+                                out_dir=args.out_dir,
+                                table=table,
+                                full=args.full)
+            print(f'{table}: {info['rows']} rows -> {info['partition']} '
+                  f'(watermark: {info['watermark']}) in {round(time.time() - t_start, 2)}s')
+
+
+if __name__ == '__main__':
+    main()
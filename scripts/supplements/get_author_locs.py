@@ -17,15 +17,18 @@ with the value. This is going to be very messy, but worth it for the broader ran
 This script batches database inserts after 100 pulls, which should take about ~200 seconds. With
 the way that the location strings are loaded in, if the script fails halfway through, you can restart
 the script and essentially pick up where you left off.
+UPDATE: every string is first resolved against a local GeoNames gazetteer (see guide2kulchur/curator/geocode.py),
+which takes seconds for all of them; only the strings it can't resolve are sent to Nominatim.
+UPDATE: strings are cleaned up front and grouped by cleaned query, so each query is geocoded once,
+and the result is inserted for every raw string in the group.
 '''
 
 import asyncio
-import re
 import os
-import json
 import time
 import logging
-from typing import Dict, Any
+import argparse
+from typing import Dict, Any, List, Optional, Tuple
 
 import psycopg
 from psycopg.rows import dict_row
@@ -36,75 +39,15 @@ from geopy.extra.rate_limiter import AsyncRateLimiter
 from dotenv import load_dotenv
 load_dotenv()
 
+from guide2kulchur.curator.geocode import (CountryIndex,
+                                           Gazetteer,
+                                           group_locations,
+                                           load_iso_country_codes)
 
-# iso 3166-1 alpha-2 codes
-# read more on it here: https://en.wikipedia.org/wiki/ISO_3166-1_alpha-2
-# json file taken from here: https://github.com/fannarsh/country-list
-ISO_PATH = os.path.join('data', 'iso', 'iso_codes.json')
-with open(ISO_PATH, 'r') as ip:
-    ISO_COUNTRY_CODE_MAP = json.load(ip)
-ISO_COUNTRY_CODE_MAP = {ic['name'].lower(): ic['code'].lower() for ic in ISO_COUNTRY_CODE_MAP}
 
-
-# for some of the larger countries (in share of GR authors), it's worth manually parsing
-# them. We'll use the dictionary above as last resort.
-COUNTRY_CFG = {
-    'us': {
-        'match_pat': r'(,? the)? united states( of america)?',
-        'country_code': 'us',
-        'replace_with': ''
-    },
-    'de': {
-        'match_pat': r', .*german.*$',
-        'country_code': 'de',
-        'replace_with': ', germany'
-    },
-    'gb': {
-        'match_pat': r'(,? the)? united kingdom| england',
-        'country_code': 'gb',
-        'replace_with': ''
-    },
-    'ru': {
-        'match_pat': r', (ussr|russian?).*$',
-        'country_code': 'ru',
-        'replace_with': ''
-    },
-    'ir': {
-        'match_pat': r',.*(iran|persia).*$',
-        'country_code': 'ir',
-        'replace_with': ''
-    },
-    'ps': {
-        'match_pat': r'palestinian territory, occupied',
-        'country_code': 'ps',
-        'replace_with': 'palestine'
-    },
-    'tr': {
-        'match_pat': r'(, ottoman empire,) turkey',
-        'country_code': 'tr',
-        'replace_with': ''
-    },
-    'dprk': {
-        'match_pat': r'^.*korea.*democratic people.s republic of.*$',
-        'country_code': 'kp',
-        'replace_with': 'pyongyang' # gotta pick something for this to work
-    },
-    'kr': {
-        'match_pat': r'(, )?(south|republic of) korea.*$',
-        'country_code': 'kr',
-        'replace_with': '' 
-    },
-    'va': {
-        'match_pat': r'^.*holy see.*vatican.*$',
-        'country_code': 'va',
-        'replace_with': 'vatican city'
-    },
-    'in': {
-        'match_pat': r'(, )?(british )?india.*$',
-        'country_code': 'in',
-        'replace_with': ', india'
-    }
-}
+# GeoNames dumps, from https://download.geonames.org/export/dump/ (cities500.zip, admin1CodesASCII.txt)
+GAZETTEER_PATH = os.path.join('data', 'geonames', 'cities500.txt')
+ADMIN1_PATH = os.path.join('data', 'geonames', 'admin1CodesASCII.txt')
 
 
 def new_logger(file_name: str) -> logging.Logger:
@@ -142,68 +85,29 @@ async def _send_req(fn: Nominatim.geocode,
     return data
     
 
-async def send_loc_req(loc_str: str, 
+async def send_loc_req(query: str,
+                       country_code: Optional[str],
+                       og_locs: List[str],
                        fn: Nominatim.geocode,
                        logger: logging.Logger) -> Dict[str, Any]:
     
-    # clean location string, send geocode request
+    # send geocode request for one cleaned query; the result goes to every raw string that cleaned to it
     dat = {
-        'og_loc': loc_str,
-        'submitted_string': loc_str,
-        'country_code': None,
+        'og_locs': og_locs,
+        'submitted_string': query,
+        'country_code': country_code,
         'addr': None,
         'lat': None,
         'lon': None
     }
-    geocode_kwargs = {'query': loc_str}
-
-    # delete all parantheses from strings
-    dat['submitted_string'] = re.sub(r'\([\w\s]+\)', '', dat['submitted_string'])
-
-    # some strings have XXXX, XXXX, republic of
-    # this messes up searches; let's fix it
-    rep_of_match_pat = r'(.*,) (.*,) (.*republic of ?t?h?e?)$'
-    if (rep_match := re.match(rep_of_match_pat, dat['submitted_string'])):
-        # flip group 2 and 3
-        subbed_str = f'{rep_match.group(1).replace(r',', '')}, {rep_match.group(3)} {rep_match.group(2).replace(r',', '')}'
-        dat['submitted_string'] = subbed_str
-        geocode_kwargs['query'] = subbed_str
-    
-    # some strings have dates in them, due to parsing errors earlier on
-    date_match_pat = r'\d{2,4}[\/-]\d{2}[\/-]\d{2,4}|\d{4}'
-    if re.search(date_match_pat, dat['submitted_string']):
-        subbed_str = re.sub(date_match_pat, '', dat['submitted_string'])
-        dat['submitted_string'] = subbed_str
-        geocode_kwargs['query'] = subbed_str
-
-    # check manual configuration first
-    for country, cfg in COUNTRY_CFG.items():
-        if re.search(cfg['match_pat'], dat['submitted_string']):
-            subbed_str = re.sub(cfg['match_pat'], cfg['replace_with'], dat['submitted_string'])
-            dat['submitted_string'] = subbed_str
-            geocode_kwargs['query'] = subbed_str
-            geocode_kwargs['country_codes'] = cfg['country_code']
-            dat['country_code'] = cfg['country_code']
-            break
-
-    # now use the iso dictionary as last resort
-    if not dat['country_code']:
-        comma_pat = r'^(.*, )?(.*), (.*)$'
-        if comma_pat_match := re.match(comma_pat, dat['submitted_string']):
-            for name, code in ISO_COUNTRY_CODE_MAP.items():
-                if comma_pat_match.group(3) in name:
-                    # select 2nd group, assuming its broader, e.g., more likely to get a match
-                    subbed_str = comma_pat_match.group(2)
-                    dat['submitted_string'] = subbed_str
-                    geocode_kwargs['query'] = subbed_str
-                    geocode_kwargs['country_codes'] = code
-                    dat['country_code'] = code
-                    break
+    geocode_kwargs = {'query': query}
+    if country_code:
+        geocode_kwargs['country_codes'] = country_code
 
     resp = await _send_req(fn=fn, 
                            geocode_kwargs=geocode_kwargs)
     if resp['err']:
-        logger.error('ERR FOR %s: %s', dat['submitted_string'], dat['err'])
+        logger.error('ERR FOR %s: %s', dat['submitted_string'], resp['err'])
         return dat
     
     if resp['res']:
@@ -214,10 +118,46 @@ async def send_loc_req(loc_str: str,
     return dat
 
     
+def resolve_offline(groups: Dict[Tuple[str, Optional[str]], List[str]],
+                    gazetteer: Optional[Gazetteer],
+                    logger: logging.Logger) -> Tuple[List[Tuple], Dict[Tuple[str, Optional[str]], List[str]]]:
+    # resolve what we can against the local gazetteer; returns (rows to insert, groups left for Nominatim)
+    if gazetteer is None:
+        return [], groups
+    resolved, unresolved = [], {}
+    for (query, country_code), og_locs in groups.items():
+        if (match := gazetteer.resolve_cleaned(query, country_code)):
+            resolved.extend((og_loc, match.addr, match.lat, match.lon) for og_loc in og_locs)
+        else:
+            unresolved[(query, country_code)] = og_locs
+    logger.info('GAZETTEER RESOLVED %s/%s QUERIES (%s STRINGS), %s LEFT FOR NOMINATIM',
+                len(groups) - len(unresolved), len(groups), len(resolved), len(unresolved))
+    return resolved, unresolved
+
+    
 async def main():
+    parser = argparse.ArgumentParser(description='geocode pound.birth_place values into birth_place_locs')
+    parser.add_argument('--gazetteer', default=GAZETTEER_PATH,
+                        help='GeoNames place file to resolve against first; skipped if missing')
+    parser.add_argument('--admin1', default=ADMIN1_PATH,
+                        help='GeoNames admin1 codes file, for "city, region" matching')
+    parser.add_argument('--offline-only', action='store_true',
+                        help="don't send anything to Nominatim")
+    args = parser.parse_args()
+
     # logger
     LOG_F_NAME = "get_birth_locs.log"
     logger = new_logger(LOG_F_NAME)
+    iso_country_codes = load_iso_country_codes()
+    country_index = CountryIndex(iso_country_codes)
+    gazetteer = None
+    if os.path.exists(args.gazetteer):
+        gazetteer = Gazetteer.from_geonames(args.gazetteer,
+                                            admin1_path=args.admin1 if os.path.exists(args.admin1) else None,
+                                            iso_country_codes=iso_country_codes)
+        logger.info('LOADED GAZETTEER OF %s PLACES FROM %s', len(gazetteer.places), args.gazetteer)
+    else:
+        logger.info('NO GAZETTEER AT %s, EVERYTHING GOES TO NOMINATIM', args.gazetteer)
     # conn string
     PG_STRING: str = os.getenv("PG_STRING")
     # location group size cutoff
@@ -268,6 +208,24 @@ async def main():
 
             # get location strings
             cur.execute(loc_query, LOC_GRP_SIZE_CUTOFF)
+            insert_statement = '''
+                                INSERT INTO 
+                                    birth_place_locs(og_loc, addr, lat, lon)
+                                VALUES
+                                    (%s,%s,%s,%s)
+                               '''
+
+            # clean everything up front; raw strings that clean to the same query are geocoded once
+            loc_strs = [loc['bp'] for loc in cur.fetchall()]
+            groups = group_locations(loc_strs, country_index)
+            logger.info('%s DISTINCT STRINGS CLEAN TO %s QUERIES', len(loc_strs), len(groups))
+
+            # offline first; no network, no rate limit
+            resolved, unresolved = resolve_offline(groups, gazetteer, logger)
+            cur.executemany(insert_statement, resolved)
+            if args.offline_only or not unresolved:
+                return
+
             # async geolocator
             # cfg
             SEC_DELAY_BETWEEN_REQ = 1
@@ -281,26 +239,21 @@ async def main():
                 # built in rate limit
                 geocode_fn = AsyncRateLimiter(locator.geocode, min_delay_seconds=SEC_DELAY_BETWEEN_REQ)
                 tasks = [
-                    send_loc_req(loc_str=loc['bp'], fn=geocode_fn, logger=logger)
-                    for loc
-                    in cur.fetchall()
+                    send_loc_req(query=query, country_code=country_code, og_locs=og_locs, fn=geocode_fn, logger=logger)
+                    for (query, country_code), og_locs
+                    in unresolved.items()
                 ]
 
                 MAX_BATCH_SIZE = 100
                 batch = []
                 tot_tasks = len(tasks)
                 on_task = 1
-                insert_statement = '''
-                                    INSERT INTO 
-                                        birth_place_locs(og_loc, addr, lat, lon)
-                                    VALUES
-                                        (%s,%s,%s,%s)
-                                   '''
                 n_successes, n_fails = 0, 0
+                n_batch_pulls = 0
                 time_start_batch = time.time()
                 async for task in asyncio.as_completed(tasks):
                     res = await task
-                    resTuple = (res['og_loc'], res['addr'], res['lat'], res['lon'])
+                    resTuples = [(og_loc, res['addr'], res['lat'], res['lon']) for og_loc in res['og_locs']]
                     if not res['addr']:
                         # log fails
                         logger.info('FAIL ON %s FOR SUBSTR:%s AND CC: %s', 
@@ -310,14 +263,16 @@ async def main():
                         n_successes += 1
                     
                     # insert batch
-                    if len(batch) >= MAX_BATCH_SIZE:
+                    if n_batch_pulls >= MAX_BATCH_SIZE:
                         time_end_batch = time.time()
-                        pull_rate = MAX_BATCH_SIZE / (time_end_batch - time_start_batch)
+                        pull_rate = n_batch_pulls / (time_end_batch - time_start_batch)
                         logger.info('BATCH PULL RATE OF %.2f PULLS/SEC', pull_rate)
                         cur.executemany(insert_statement, batch)
                         batch.clear()
+                        n_batch_pulls = 0
                         time_start_batch = time.time() # reset timer
-                    batch.append(resTuple)
+                    batch.extend(resTuples)
+                    n_batch_pulls += 1
                     
                     # every ten pulls, print progress
                     if (on_task % 10 == 0) or (on_task == tot_tasks):
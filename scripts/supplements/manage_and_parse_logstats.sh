@@ -68,7 +68,10 @@ for topic in $(ls $LOGP); do
 						key_term="db insert"
 						;;
 				esac
-				grep -i "$key_term" "${full_p}/${prog_f}" >> $subj_f	# filter lines for each subject statistic
+				# filter lines for each subject statistic
+				# JSON-lines logs (see recruits.gen_logger) are turned back into "DATE TIME LEVEL := MSG" lines
+				grep -i "$key_term" "${full_p}/${prog_f}" \
+					| sed -e 's/^{"ts":"\([^"]*\)","level":"\([^"]*\)".*,"msg":"\(.*\)"}$/\1 \2 := \3/' >> $subj_f
 			fi
 		done
 
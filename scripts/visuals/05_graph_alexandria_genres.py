@@ -13,13 +13,20 @@ Graphs will be made for the following genres:
 '''
 
 import os
+import argparse
+from contextlib import nullcontext
 
-import psycopg
 import networkx as nx
 from ipysigma import Sigma
 from dotenv import load_dotenv
 load_dotenv()
 
+from guide2kulchur.curator.analytics import open_analytics, SOURCES
+from guide2kulchur.curator.simgraph import SimGraph
+from guide2kulchur.curator.graphmetrics import GraphMetrics
+from guide2kulchur.curator.render import apply_node_metrics
+from guide2kulchur.curator.cooccurrence import GenreMatrix, genre_graph
+
 
 STYLING = '''
 <style>
@@ -127,133 +134,90 @@ GENRE_CFG = {
 }
 
 
-GET_EDGES_QUERY = '''
-                    WITH edges_q(b_id, b_rc, s_id) AS (
-                        SELECT
-                            book_id,
-                            rating_count,
-                            unnest(sim_books)
-                        FROM
-                            alexandria
-                        WHERE
-                            rating_count >= %s
-                        AND
-                            lower(top_genres[1]) ~ %s
-                        AND
-                            lang = 'English'
-                    )
-                    SELECT
-                        b_id,
-                        s_id
-                    FROM 
-                        edges_q
-                    INNER JOIN
-                        alexandria ON edges_q.s_id = alexandria.book_id
-                    WHERE
-                        alexandria.rating_count >= %s -- both the source and target must have rating count >= CUTOFF
-                  '''
-
-
-GET_NODES_QUERY = '''
-                    WITH edges_q(b_id, b_rc, s_id) AS (
-                        SELECT
-                            book_id,
-                            rating_count,
-                            unnest(sim_books)
-                        FROM
-                            alexandria
-                        WHERE
-                            rating_count >= %s
-                        AND
-                            lower(top_genres[1]) ~ %s
-                        AND
-                            lang = 'English'
-                    ),
-                    edges_q_filtered(b_id, s_id) AS (
-                        SELECT
-                            b_id,
-                            s_id
-                        FROM 
-                            edges_q
-                        INNER JOIN
-                            alexandria ON edges_q.s_id = alexandria.book_id
-                        WHERE
-                            alexandria.rating_count >= %s 
-                    ),
-                    all_nodes(b_id) AS (
-                        (SELECT DISTINCT b_id FROM edges_q_filtered)
-                        UNION
-                        (SELECT  DISTINCT s_id FROM edges_q_filtered)
-                    )
-                    
-                    SELECT
-                        book_id,
-                        title
-                    FROM
-                        alexandria
-                    INNER JOIN
-                        all_nodes ON alexandria.book_id = all_nodes.b_id
-                  '''
+# GET_EDGES/GET_NODES queries now live in guide2kulchur/curator/analytics.py,
+# so they can run against the Parquet export as well as the live db;
+# with --source cache, the same graphs come from the cached genre matrix + sim graph instead
 
 
 def main():
-    # connection string
-    PG_STRING = os.getenv("PG_STRING")
-
-    with psycopg.connect(PG_STRING) as conn:
-        with conn.cursor() as cur:
-            for name, g in GENRE_CFG.items():
-                gr = nx.Graph()
-                # get edges 
-                cur.execute(GET_EDGES_QUERY, g['query_params'])
-                while True:
-                    r_edges = cur.fetchone()
-                    if not r_edges:
-                        break
-                    gr.add_edge(r_edges[0], r_edges[1])
-                
-                # get nodes
-                cur.execute(GET_NODES_QUERY, g['query_params'])
-                while True:
-                    r_nodes = cur.fetchone()
-                    if not r_nodes:
-                        break
-                    gr.add_node(r_nodes[0], label=r_nodes[1])
-
-                out_file = os.path.join('visualizations', 'graphs', f'alx_genre_{g['out_suffix']}.html')
-                Sigma.write_html(
-                    graph=gr, 
-                    path=out_file, 
-                    fullscreen=True,
-                    start_layout=30,
-                    node_metrics={"similarity": "louvain"}, 
-                    node_color="similarity",
-                    node_color_palette='Pastel1',
-                    node_size_range=(3, 21),
-                    max_categorical_colors=30,
-                    default_edge_type='curve',
-                    label_font="cursive",
-                    default_edge_color="#E8E6E6FF",
-                    node_border_color_from='node',
-                    node_label_size=gr.degree,
-                    node_label_size_range=(10,30),
-                    default_node_label_color="#000000",
-                    node_size=gr.degree,
-                    hide_edges_on_move=True,
-                    hide_info_panel=True
-                )
-                
-                # add styling
-                rw_html = ''
-                with open(out_file, 'r') as o_f:
-                    for line in o_f:
-                        if '<title>IPyWidget export</title>' in line:
-                            line = f'<title>Books by Genre ({g['out_suffix']})</title>\n{STYLING}\n'
-                        rw_html += line
-                with open(out_file, 'w') as o_f:
-                    o_f.write(rw_html)
-
-                print(f'{name} completed - {gr.number_of_nodes()} nodes, {gr.number_of_edges()} edges.')
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', default='postgres', choices=SOURCES + ('cache',),
+                        help='"postgres" for the live db, "local" for the Parquet export (see scripts/supplements/export_to_parquet.py), '
+                             '"cache" for the cached genre matrix (see scripts/supplements/build_genre_matrix.py)')
+    parser.add_argument('--parquet-dir', default=os.path.join('data', 'parquet'))
+    args = parser.parse_args()
+
+    # precomputed communities, if available (see scripts/supplements/compute_graph_metrics.py);
+    # otherwise louvain is run in the browser for each graph
+    graph_path = os.path.join('data', 'simgraph', 'book')
+    sim_graph, metrics = None, None
+    if GraphMetrics.exists(graph_path):
+        sim_graph = SimGraph.load(graph_path)
+        metrics = GraphMetrics.load_for(graph_path, sim_graph)     # None if the graph was rebuilt since
+
+    matrix = None
+    if args.source == 'cache':
+        matrix = GenreMatrix.load(os.path.join('data', 'genre_matrix', 'book'))
+        if sim_graph is None:
+            sim_graph = SimGraph.load(graph_path)
+
+    with nullcontext() if matrix is not None else open_analytics(args.source, parquet_dir=args.parquet_dir) as an:
+        for name, g in GENRE_CFG.items():
+            if matrix is not None:
+                rc, pat, sim_rc = g['query_params']
+                nodes, edges = genre_graph(matrix, sim_graph, pat,
+                                           min_rating_count=rc, min_sim_rating_count=sim_rc,
+                                           lowercase=True, lang='English')
+            else:
+                edges = an.book_genre_edges(*g['query_params'])
+                nodes = an.book_genre_nodes(*g['query_params'])
+
+            gr = nx.Graph()
+            # get edges 
+            gr.add_edges_from(edges)
+            
+            # get nodes
+            for node_id, node_label in nodes:
+                gr.add_node(node_id, label=node_label)
+
+            metric_kwargs = {'node_metrics': {"similarity": "louvain"}}
+            if metrics is not None:
+                metric_kwargs = apply_node_metrics(gr, sim_graph, metrics)
+
+            out_file = os.path.join('visualizations', 'graphs', f'alx_genre_{g['out_suffix']}.html')
+            Sigma.write_html(
+                graph=gr, 
+                path=out_file, 
+                fullscreen=True,
+                start_layout=30,
+                **metric_kwargs,
+                node_color="similarity",
+                node_color_palette='Pastel1',
+                node_size_range=(3, 21),
+                max_categorical_colors=30,
+                default_edge_type='curve',
+                label_font="cursive",
+                default_edge_color="#E8E6E6FF",
+                node_border_color_from='node',
+                node_label_size=gr.degree,
+                node_label_size_range=(10,30),
+                default_node_label_color="#000000",
+                node_size=gr.degree,
+                hide_edges_on_move=True,
+                hide_info_panel=True
+            )
+            
+            # add styling
+            rw_html = ''
+            with open(out_file, 'r') as o_f:
+                for line in o_f:
+                    if '<title>IPyWidget export</title>' in line:
+                        line = f'<title>Books by Genre ({g['out_suffix']})</title>\n{STYLING}\n'
+                    rw_html += line
+            with open(out_file, 'w') as o_f:
+                o_f.write(rw_html)
+
+            print(f'{name} completed - {gr.number_of_nodes()} nodes, {gr.number_of_edges()} edges.')
 
 
 if __name__ == '__main__':
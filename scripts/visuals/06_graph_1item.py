@@ -5,24 +5,38 @@ This script generates network graphs for authors using...
 
 Only authors/books with at least 1000 ratings are shown. In order to get an author's/book's
 network, we do the following (using "item_id" as the Goodreads ID of a book/author):
-1. find all items (unnest first) with "item_id" in their similar_items array column, as well as "item_id"'s array column contents
+1. find all items with "item_id" in their similar_items array column, as well as "item_id"'s array column contents
 2. filter the items above to those with at least 1000 ratings
 3. find all connections between the items included
 
+The sim_books/sim_authors graph is loaded once into CSR arrays (see guide2kulchur/curator/simgraph.py),
+cached under data/simgraph/, and memory-mapped on later runs; each network is then just a few array
+slices. Pages are rendered in a process pool (see guide2kulchur/curator/render.py), so many items,
+or every page on the site, can be regenerated in one job:
+    $ python3 scripts/visuals/06_graph_1item.py a879 a3137322 b2767052
+    $ python3 scripts/visuals/06_graph_1item.py --type author --ids-file data/site/author_ids.txt
+    $ python3 scripts/visuals/06_graph_1item.py --type book --query "SELECT book_id FROM alexandria WHERE rating_count >= 100000"
+    $ python3 scripts/visuals/06_graph_1item.py --type author --min-item-ratings 50000
+Pass --rebuild to reload the graph from the db (e.g. after new crawls).
+
 This way, for example, we can see that both Thucydides and Homer have connections to Plato, and that Thucydides and Homer have a 
 connection to each other. Essentially, we are taking a pool of authors/books that have a similarity to a specific item, then seeing
 if any of those similar items have similarities to each other.
 '''
 
 import os
-import sys
+import re
+import time
+import argparse
 
 import psycopg
-import networkx as nx
-from ipysigma import Sigma
+import numpy as np
 from dotenv import load_dotenv
 load_dotenv()
 
+from guide2kulchur.curator.simgraph import SimGraph
+from guide2kulchur.curator.render import render_ego_networks
+
 
 STYLING = '''
 <style>
@@ -103,187 +117,100 @@ STYLING = '''
 '''
 
 
-def main():
-    # pass the book/author ID as the only argument, with an 'a' or 'b' as the prefix
-    # for example (find all authors similar to Plato):
-        # $ python3 scripts/visuals/06_graph_1item.py a879
-    if len(sys.argv) > 2 or len(sys.argv) < 2:
-        print('error: only provide one argument of the form [ba]\\d+')
-        exit(1)
-    if not sys.argv[1].startswith('a') and not sys.argv[1].startswith('b'):
-        print('error: author (a) or book (b) ID must start with the letter identifier:e.g., [ba]\\d+')
-        exit(1)
+GRAPH_DIR = os.path.join('data', 'simgraph')
+
+OUT_DIR = os.path.join('visualizations', 'graphs')
 
-    TABLE_CFG = {
-        'a': {
-            'table_name': 'pound',
-            'prefix': 'author',
-            'table_name_short': 'pnd'
-        },
-        'b': {
-            'table_name': 'alexandria',
-            'prefix': 'book',
-            'table_name_short': 'alx'
-        }
+# only authors/books with at least this many ratings are shown
+MIN_RATING_COUNT = 1000
+
+TABLE_CFG = {
+    'author': {
+        'table_name_short': 'pnd'
+    },
+    'book': {
+        'table_name_short': 'alx'
     }
-    if sys.argv[1].startswith('a'):
-        item_type = 'a'
-    else:
-        item_type = 'b'
-    t_name = TABLE_CFG[item_type]['table_name']
-    prefix = TABLE_CFG[item_type]['prefix']
-    t_name_short = TABLE_CFG[item_type]['table_name_short']
-    item_id = sys.argv[1][1:]
-    name_var = 'title' if item_type == 'b' else 'author_name'
+}
 
-    get_edges_query = f'''
-                    WITH all_conns(i_id, s_id) AS (
-                        SELECT
-                            {prefix}_id,
-                            unnest(sim_{prefix}s)
-                        FROM
-                            {t_name}
-                        WHERE
-                            rating_count >= 1000
-                        AND (
-                                '{item_id}' = ANY(sim_{prefix}s)
-                            OR
-                                {prefix}_id = '{item_id}'
-                            )
-                        ),
-                    relevant_conns(i_id, s_id) AS (
-                        SELECT
-                            i_id,
-                            s_id
-                        FROM 
-                            all_conns
-                        WHERE 
-                            i_id = '{item_id}'
-                        OR
-                            s_id = '{item_id}'
-                    ),
-                    relevant_nodes(i_id) AS (
-                        (SELECT DISTINCT i_id FROM relevant_conns)
-                        UNION
-                        (SELECT DISTINCT s_id FROM relevant_conns)
-                    )
-                    SELECT 
-                        i_id,
-                        s_id
-                    FROM 
-                        all_conns
-                    WHERE
-                        i_id IN (SELECT i_id FROM relevant_nodes)
-                    AND
-                        s_id IN (SELECT i_id FROM relevant_nodes)
-                  '''
-    
-    get_nodes_query = f'''
-                    WITH all_conns(i_id, s_id) AS (
-                        SELECT
-                            {prefix}_id,
-                            unnest(sim_{prefix}s)
-                        FROM
-                            {t_name}
-                        WHERE
-                            rating_count >= 1000
-                        AND (
-                                '{item_id}' = ANY(sim_{prefix}s)
-                            OR
-                                {prefix}_id = '{item_id}'
-                            )
-                        ),
-                    relevant_conns(i_id, s_id) AS (
-                        SELECT
-                            i_id,
-                            s_id
-                        FROM 
-                            all_conns
-                        WHERE 
-                            i_id = '{item_id}'
-                        OR
-                            s_id = '{item_id}'
-                    ),
-                    relevant_nodes(i_id) AS (
-                        (SELECT DISTINCT i_id FROM relevant_conns)
-                        UNION
-                        (SELECT DISTINCT s_id FROM relevant_conns)
-                    )
-                    
-                    SELECT
-                        {prefix}_id,
-                        {name_var}
-                    FROM
-                        {t_name}
-                    INNER JOIN
-                        relevant_nodes ON {t_name}.{prefix}_id = relevant_nodes.i_id
-                  '''
-    
-    gr = nx.Graph()
 
-    # connection string
+def load_graph(item_type: str, 
+               rebuild: bool = False) -> str:
+    # returns the path of the saved graph for 'book'/'author', building it from the db first if needed
+    path = os.path.join(GRAPH_DIR, item_type)
+    if not rebuild and os.path.exists(os.path.join(path, 'meta.json')):
+        return path
+    
     PG_STRING = os.getenv("PG_STRING")
     with psycopg.connect(PG_STRING) as conn:
-        with conn.cursor() as cur:
-
-            # get book/author name
-            get_name_query = f"SELECT {name_var} FROM {t_name} WHERE {prefix}_id = '{item_id}'"
-            cur.execute(get_name_query)
-            item_name = cur.fetchone()
-            if not item_name:
-                print(f'error: {prefix} {item_id} not in database.')
-                exit(1)
-            item_name = item_name[0]
+        graph = SimGraph.from_db(conn, item_type)
+    graph.save(path)
+    print(f'{item_type} graph built - {graph.num_nodes} nodes, {graph.num_edges} edges.')
+    return path
 
-            # get edges 
-            cur.execute(get_edges_query)
-            while True:
-                r_edges = cur.fetchone()
-                if not r_edges:
-                    break
-                gr.add_edge(r_edges[0], r_edges[1])
-            
-            # get nodes
-            cur.execute(get_nodes_query)
-            while True:
-                r_nodes = cur.fetchone()
-                if not r_nodes:
-                    break
-                gr.add_node(r_nodes[0], label=r_nodes[1])
 
-            out_file = os.path.join('visualizations', 'graphs', f'{t_name_short}_1item_{item_name.replace(' ', '-').lower()}.html')
-            Sigma.write_html(
-                graph=gr, 
-                path=out_file, 
-                fullscreen=True,
-                start_layout=30,
-                node_metrics={"similarity": "louvain"}, 
-                node_color="similarity",
-                node_color_palette='Pastel1',
-                node_size_range=(5, 25),
-                max_categorical_colors=30,
-                default_edge_type='curve',
-                label_font="cursive",
-                default_edge_color="#E8E6E6FF",
-                node_border_color_from='node',
-                node_label_size=gr.degree,
-                node_label_size_range=(15,35),
-                default_node_label_color="#000000",
-                node_size=gr.degree,
-                hide_edges_on_move=True,
-                hide_info_panel=True
-            )
+def main():
+    # pass one or more book/author IDs, with an 'a' or 'b' as the prefix
+    # for example (find all authors similar to Plato):
+        # $ python3 scripts/visuals/06_graph_1item.py a879
+    # or a list/query of IDs of one type (see docstring)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('items', nargs='*', help='book/author IDs of the form [ba]\\d+')
+    parser.add_argument('--type', choices=['author', 'book'], help='item type of --ids-file/--query/--min-item-ratings IDs')
+    parser.add_argument('--ids-file', help='file with one ID per line')
+    parser.add_argument('--query', help='SQL query returning IDs in its first column')
+    parser.add_argument('--min-item-ratings', type=int, help='render every item in the graph with at least this many ratings')
+    parser.add_argument('--hops', type=int, default=1, help='number of hops out from the item')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes; defaults to the number of CPUs')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the cached graph from the db')
+    args = parser.parse_args()
+
+    todo = {'author': [], 'book': []}
+    for item in args.items:
+        if not re.fullmatch(r'[ba]\d+', item):
+            print(f'error: {item}: author (a) or book (b) ID must start with the letter identifier:e.g., [ba]\\d+')
+            exit(1)
+        todo['author' if item.startswith('a') else 'book'].append(item[1:])
+    
+    if args.ids_file or args.query or args.min_item_ratings is not None:
+        if not args.type:
+            print('error: --type is required with --ids-file, --query or --min-item-ratings')
+            exit(1)
+        if args.ids_file:
+            with open(args.ids_file, 'r') as f:
+                todo[args.type].extend(line.strip() for line in f if line.strip())
+        if args.query:
+            with psycopg.connect(os.getenv("PG_STRING")) as conn:
+                todo[args.type].extend(str(r[0]) for r in conn.execute(args.query))
+        if args.min_item_ratings is not None:
+            graph = SimGraph.load(load_graph(args.type, rebuild=args.rebuild))
+            todo[args.type].extend(str(i) for i in graph.ids[np.asarray(graph.rating_count) >= args.min_item_ratings])
+            args.rebuild = False
+    
+    if not todo['author'] and not todo['book']:
+        print('error: no items given')
+        exit(1)
 
-            # add styling
-            rw_html = ''
-            with open(out_file, 'r') as o_f:
-                for line in o_f:
-                    if '<title>IPyWidget export</title>' in line:
-                        line = f'<title>Network of {item_name}</title>\n{STYLING}\n'
-                    rw_html += line
-            with open(out_file, 'w') as o_f:
-                o_f.write(rw_html)
-            print(f'{prefix} {item_id} ({item_name}) NETWORK WRITTEN TO:\n{out_file}')
+    for item_type, item_ids in todo.items():
+        if not item_ids:
+            continue
+        t_start = time.time()
+        results = render_ego_networks(graph_path=load_graph(item_type, rebuild=args.rebuild),
+                                      item_ids=item_ids,
+                                      out_dir=OUT_DIR,
+                                      file_prefix=TABLE_CFG[item_type]['table_name_short'],
+                                      styling=STYLING,
+                                      title_fmt='Network of {name}',
+                                      hops=args.hops,
+                                      min_rating_count=MIN_RATING_COUNT,
+                                      max_workers=args.workers)
+        failed = [r for r in results if r['error']]
+        for r in results:
+            if r['error']:
+                print(f'error: {item_type} {r['item_id']}: {r['error']}')
+            elif len(results) <= 10:
+                print(f'{item_type} {r['item_id']} NETWORK WRITTEN TO:\n{r['out_file']}')
+        print(f'{item_type}s: {len(results) - len(failed)} of {len(results)} networks written in {round(time.time() - t_start, 2)}s')
 
 
 if __name__ == '__main__':
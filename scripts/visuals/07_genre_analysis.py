@@ -1,7 +1,7 @@
 import os
-import re
+import argparse
 
-import psycopg
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 load_dotenv()
@@ -10,6 +10,10 @@ import plotly.io as pio
 from plotly.subplots import make_subplots
 pio.templates.default = 'plotly_dark'
 
+from guide2kulchur.curator.analytics import open_analytics, SOURCES
+from guide2kulchur.curator.cooccurrence import GenreMatrix
+from guide2kulchur.engineer.genres import GenreTaxonomy
+
 
 GENRE_COLORS = {
     'Sci-Fi/Fantasy': "#daeaf6",
@@ -43,154 +47,18 @@ GENRE_COLORS = {
 }
 
 
-def broad_genre(genre: str) -> str:
-    # returns the broader genre group for a given genre
-    # returns "Other" if genre not applicable
-    # all patterns
-    patterns = {
-        r'sci(ence)?[-\s]fi(ction)|fantasy': 'Sci-Fi/Fantasy',
-        r'philosop|poli(tic|cy)|econom': 'Philosophy/Politics/Economics',
-        r'non-?fiction': 'Nonfiction',
-        r'manga|comic|graphic[-\s]novel': 'Manga/Comics',
-        r'food|cook|kitchen|recipe': 'Cooking',
-        r'music': 'Music',
-        r'humor|comedy': 'Humor',
-        r'horror': 'Horror',
-        r'myster|crim(e|inal)|thriller': 'Mystery/Crime',
-        r'roman[tc]|erotic': 'Romance/Erotica',
-        r'^y\.?a\.?$|young[\s-]adult': 'Young Adult',
-        r'children': 'Children',
-        r'gay|queer|lgbt|lesbian': 'Queer',
-        r'poet': 'Poetry',
-        r'^(?!science)[\s-]?fiction': 'Fiction',
-        r'horror|suspense': 'Horror/Suspence',
-        r'classics': 'Classics',
-        r'history': 'History',
-        r'psych|sociol': 'Psychology/Sociology',
-        r'theology|christian|catholi|islam|judai|jewis|religio|spirit|pagan': 'Religion/Spirituality',
-        r'sports|athlet': 'Sports',
-        r'business|financ': 'Business',
-        r'computer|tech|^science$|math': 'STEM',
-        r'art|craft|photo|film': 'Art/Photography',
-        r'self[-\s]?help': 'Self Help',
-        r'biograph|memoir': 'Biography/Memoir',
-        r'contemporary|modern': 'Contemporary',
-        r'chick[\s-]lit': 'Chick-Lit'
-    }
-    for pat, lab in patterns.items():
-        if re.search(pat, genre):
-            return lab
-    return 'Other'
-        
-    
-
-
-
-# each author needs at least 100 user ratings, and each genre needs at least
-# 100 authors in it.
-AUTHOR_GENRE_GENDER_SPLIT_QUERY = '''   
-                                    WITH unnested_authors(genre, g_comp) AS (
-                                        SELECT
-                                            unnest(top_genres),
-                                            g_comp
-                                        FROM
-                                            pound
-                                        INNER JOIN
-                                            g_pound ON pound.author_id = g_pound.author_id
-                                        WHERE
-                                            (g_comp = 'M' OR g_comp = 'F')
-                                        AND
-                                            top_genres[1] IS NOT NULL
-                                        AND
-                                            rating_count >= 100
-                                        AND
-                                            descr IS NOT NULL
-                                    )
-                                    SELECT 
-                                        -- genre
-                                        replace(lower(genre), ' and ', ' & '),
-                                        -- male count
-                                        SUM(CASE WHEN g_comp = 'M' THEN 1 ELSE 0 END) * 1.0,
-                                        -- female count
-                                        SUM(CASE WHEN g_comp = 'F' THEN 1 ELSE 0 END) * 1.0
-                                    FROM
-                                        unnested_authors
-                                    GROUP BY 
-                                        replace(lower(genre), ' and ', ' & ')
-                                    HAVING
-                                        -- at least 100 authors in sample   
-                                        SUM(CASE WHEN g_comp = 'M' OR g_comp = 'F' THEN 1 ELSE 0 END) >= 100
-                                  '''
-
-
-# for users, also have the cutoff be at at least 100 users in a genre
-USER_GENRE_GENDER_SPLIT_QUERY = '''
-                                    WITH unnested_users(genre, g_nxg) AS (
-                                        SELECT
-                                            unnest(favorite_genres),
-                                            g_nxg
-                                        FROM
-                                            false_dmitry
-                                        INNER JOIN
-                                            g_dmitry ON false_dmitry.user_id = g_dmitry.user_id
-                                        WHERE
-                                            (g_nxg = 'M' OR g_nxg = 'F')
-                                        AND
-                                            favorite_genres[1] IS NOT NULL
-                                    )
-                                    SELECT
-                                        -- genre
-                                        replace(lower(genre), ' ', '-'),
-                                        -- male count
-                                        SUM(CASE WHEN g_nxg = 'M' THEN 1 ELSE 0 END),
-                                        -- female count
-                                        SUM(CASE WHEN g_nxg = 'F' THEN 1 ELSE 0 END)
-                                    FROM
-                                        unnested_users
-                                    GROUP BY
-                                        replace(lower(genre), ' ', '-')
-                                    HAVING
-                                        SUM(CASE WHEN g_nxg = 'M' OR g_nxg = 'F' THEN 1 ELSE 0 END) >= 1000
-                                '''
+# broad genre groups (and their patterns) live in guide2kulchur/engineer/genres.py; each distinct
+# genre is classified once, instead of running every pattern on every row
 
 
-# given that there may be more female than male users, we'll need a baseline 
-# to compare our results to.
-USER_GENDER_SPLIT_BASELINE_QUERY = '''
-                                    SELECT
-                                        -- male count
-                                        SUM(CASE WHEN g_nxg = 'M' THEN 1 ELSE 0 END),
-                                        -- female count
-                                        SUM(CASE WHEN g_nxg = 'F' THEN 1 ELSE 0 END)
-                                    FROM
-                                        false_dmitry
-                                    INNER JOIN
-                                        g_dmitry ON false_dmitry.user_id = g_dmitry.user_id
-                                    WHERE
-                                        favorite_genres[1] IS NOT NULL
-                             '''
+# the genre gender split / baseline queries live in guide2kulchur/curator/analytics.py, so they
+# can run against the Parquet export as well as the live db. each author needs at least 100 user
+# ratings, and each genre needs at least 100 authors (1000 users) in it.
 
-
-# also get baseline for authors
-AUTHOR_GENDER_SPLIT_BASELINE_QUERY = '''
-                                        SELECT 
-                                            -- male count
-                                            SUM(CASE WHEN g_comp = 'M' THEN 1 ELSE 0 END) * 1.0,
-                                            -- female count
-                                            SUM(CASE WHEN g_comp = 'F' THEN 1 ELSE 0 END) * 1.0
-                                        FROM
-                                            pound
-                                        INNER JOIN
-                                            g_pound ON pound.author_id = g_pound.author_id
-                                        WHERE 
-                                            -- more confident gender prediction
-                                            descr IS NOT NULL
-                                        AND
-                                            -- individual author has at least 100 ratings from Goodreads users
-                                            rating_count >= 100
-                                        AND
-                                            top_genres[1] IS NOT NULL
-                                     '''
+# genre co-occurrence (lift) comes from the cached genre matrices (see
+# scripts/supplements/build_genre_matrix.py); that figure is skipped for a group with no cache.
+GENRE_MATRIX_DIR = os.path.join('data', 'genre_matrix')
+LIFT_TOP_GENRES = 30
 
 
 def main():
@@ -199,42 +67,41 @@ def main():
         'user': pd.DataFrame() 
     }
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', default='postgres', choices=SOURCES,
+                        help='"postgres" for the live db, "local" for the Parquet export (see scripts/supplements/export_to_parquet.py)')
+    parser.add_argument('--parquet-dir', default=os.path.join('data', 'parquet'))
+    args = parser.parse_args()
+
     # GET DATA
-    PG_STRING = os.getenv('PG_STRING')
-    with psycopg.connect(conninfo=PG_STRING,
-                         autocommit=True) as conn:
-        with conn.cursor() as cur:
-            for grp in ['author', 'user']:
-                q_split = AUTHOR_GENRE_GENDER_SPLIT_QUERY if grp == 'author' else USER_GENRE_GENDER_SPLIT_QUERY
-                q_baseline = AUTHOR_GENDER_SPLIT_BASELINE_QUERY if grp == 'author' else USER_GENDER_SPLIT_BASELINE_QUERY
-                # get genre gender splits
-                cur.execute(q_split)
-                genre_splits = [
-                    {
-                        'genre': r[0],
-                        'num_men': r[1],
-                        'num_women': r[2],
-                        'sample_size': r[1] + r[2],
-                        'share_men': r[1] / (r[1] + r[2]) * 100,
-                        'share_women': r[2] / (r[1] + r[2]) * 100
-                    } for r in cur.fetchall()
-                ]
-                # get baseline gender splits
-                cur.execute(q_baseline)
-                r = cur.fetchone()
-                baseline_dat = {
-                    'genre': 'OVERALL POPULATION',
-                    'num_men': r[0],
-                    'num_women': r[1],
-                    'sample_size': r[0] + r[1],
-                    'share_men': r[0] / (r[0] + r[1]) * 100,
-                    'share_women': r[1] / (r[0] + r[1]) * 100
-                }
-                genre_splits.append(baseline_dat)
-                # get into df
-                df = pd.DataFrame(data=genre_splits)
-                df = df.sort_values(by='share_men')
-                data[grp] = df
+    with open_analytics(args.source, parquet_dir=args.parquet_dir) as an:
+        for grp in ['author', 'user']:
+            # get genre gender splits
+            genre_splits = [
+                {
+                    'genre': r[0],
+                    'num_men': r[1],
+                    'num_women': r[2],
+                    'sample_size': r[1] + r[2],
+                    'share_men': r[1] / (r[1] + r[2]) * 100,
+                    'share_women': r[2] / (r[1] + r[2]) * 100
+                } for r in an.genre_gender_split(grp)
+            ]
+            # get baseline gender splits
+            r = an.gender_baseline(grp)
+            baseline_dat = {
+                'genre': 'OVERALL POPULATION',
+                'num_men': r[0],
+                'num_women': r[1],
+                'sample_size': r[0] + r[1],
+                'share_men': r[0] / (r[0] + r[1]) * 100,
+                'share_women': r[1] / (r[0] + r[1]) * 100
+            }
+            genre_splits.append(baseline_dat)
+            # get into df
+            df = pd.DataFrame(data=genre_splits)
+            df = df.sort_values(by='share_men')
+            data[grp] = df
     
     # GENERATE FIGURES
     # first, gender splits
@@ -295,9 +162,10 @@ def main():
         fig.write_html(file=os.path.join('visualizations', 'figures', f'gsplit_{grp}.html'))
     
     # second, within-gender composition
+    taxonomy = GenreTaxonomy()
     for grp, df in data.items():
         df_within = df.loc[df['genre'] != 'OVERALL POPULATION'].copy()
-        df_within['genre_broad'] = df_within['genre'].apply(broad_genre)
+        df_within['genre_broad'] = taxonomy.classify_series(df_within['genre'])
         male_comp = df_within.groupby('genre_broad')['num_men'].sum().reset_index().sort_values(by='genre_broad')
         female_comp = df_within.groupby('genre_broad')['num_women'].sum().reset_index().sort_values(by='genre_broad')
 
@@ -326,6 +194,34 @@ def main():
         fig.update_layout(title_text=f'<b>Goodreads {grp.title()} Genre Gender Composition</b>')
         
         fig.write_html(file=os.path.join('visualizations', 'figures', f'gcomp_{grp}.html'))
+    
+    # third, genre co-occurrence lift among the most common genres
+    for grp in data:
+        matrix_path = os.path.join(GENRE_MATRIX_DIR, grp)
+        if not os.path.exists(os.path.join(matrix_path, 'vocab.json')):
+            print(f'no genre matrix for {grp}; skipping lift figure')
+            continue
+        matrix = GenreMatrix.load(matrix_path)
+        codes = np.argsort(-matrix.C.diagonal(), kind='stable')[:LIFT_TOP_GENRES]
+        genres = ['<b>' + matrix.vocab[c] + '</b>' for c in codes]
+        lift = matrix.lift()[codes][:, codes].toarray()
+        np.fill_diagonal(lift, np.nan)
+
+        fig = go.Figure(
+            data=go.Heatmap(
+                z=np.log2(np.where(lift > 0, lift, np.nan)),
+                x=genres,
+                y=genres,
+                customdata=lift,
+                colorscale='RdBu_r',
+                zmid=0,
+                colorbar={'title': 'log2(lift)'},
+                hovertemplate='%{y} & %{x}<br><b>Lift</b>: %{customdata:.2f}<extra></extra>'
+            )
+        )
+        fig.update_layout(title_text=f'<b>Goodreads {grp.title()} Genre Co-occurrence (Lift)</b>')
+        
+        fig.write_html(file=os.path.join('visualizations', 'figures', f'glift_{grp}.html'))
         
 
 if __name__ == '__main__':
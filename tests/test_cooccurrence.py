@@ -0,0 +1,41 @@
+import datetime
+
+import numpy as np
+
+from guide2kulchur.curator.cooccurrence import GenreMatrix, LOOKBACK, _rows_query
+
+
+T0 = datetime.datetime(2026, 10, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+def _at(minutes):
+    return T0 + datetime.timedelta(minutes=minutes)
+
+
+def test_incremental_reads_go_back_behind_the_watermark():
+    query, params = _rows_query('book', watermark=T0)
+    assert 'WHERE updated_at > %s' in query
+    assert params == [T0 - LOOKBACK]
+    query, params = _rows_query('book', watermark=None)
+    assert 'WHERE' not in query and params == []
+
+
+def test_rows_read_again_within_the_lookback_replace_themselves():
+    first = [('1', 10, ['fantasy', 'fiction'], 'en', _at(0)),
+             ('2', 5, ['fiction'], 'en', _at(1))]
+    # the next read overlaps the last one: '2' again (unchanged), plus a late commit and an update
+    second = [('2', 5, ['fiction'], 'en', _at(1)),
+              ('3', 7, ['fantasy'], None, _at(-2)),
+              ('1', 11, ['history'], 'en', _at(3))]
+    matrix = GenreMatrix.build('book', first)
+    matrix.update(second)
+    assert matrix.watermark == _at(3)
+
+    fresh = GenreMatrix.build('book', second)
+    assert matrix.num_items == fresh.num_items == 3
+    for g_a in ['fantasy', 'fiction', 'history']:
+        for g_b in ['fantasy', 'fiction', 'history']:
+            a, b = matrix.vocab.index(g_a), matrix.vocab.index(g_b)
+            fa, fb = fresh.vocab.index(g_a), fresh.vocab.index(g_b)
+            assert matrix.C[a, b] == fresh.C[fa, fb], (g_a, g_b)
+    assert sorted(np.asarray(matrix.item_ids).tolist()) == [1, 2, 3]
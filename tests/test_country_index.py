@@ -0,0 +1,80 @@
+from guide2kulchur.curator.geocode import (CountryIndex,
+                                           clean_location,
+                                           load_iso_country_codes)
+
+
+# birth_place strings as they show up in pound, incl. the odd ones
+SAMPLE_LOCATIONS = [
+    'paris, france',
+    'Paris , France (1900)',
+    'lyon, fran',
+    'tokyo, japan',
+    'tokyo, japan 1990',
+    'london, uk',
+    'kyiv, ukraine',
+    'sydney, new south wales, australia',
+    'vienna, us',
+    'boston, massachusetts, the united states',
+    'kinshasa, congo, the democratic republic of the',
+    'seoul, korea, republic of',
+    'cairo, egypt, 12/03/1901',
+    'somewhere, atlantis',
+    'springfield',
+    'lagos, nigeria',
+    'bogotá, colombia',
+    'guinea-bissau, guinea-bissau',
+    'havana, cuba, ',
+]
+
+
+def _old_match(iso_country_codes, suffix):
+    # the linear scan CountryIndex replaced
+    for name, code in iso_country_codes.items():
+        if suffix in name:
+            return code
+    return None
+
+
+def test_country_index_matches_old_scan():
+    iso_country_codes = load_iso_country_codes()
+    index = CountryIndex(iso_country_codes, aliases={})
+    suffixes = ['us', 'uk', 'fran', 'japan', 'japan ', 'ia', 'republic of', 'the', 'guinea-bissau', '', ' ', 'xyz']
+    suffixes += list(iso_country_codes)
+    for suffix in suffixes:
+        assert index.match(suffix) == _old_match(iso_country_codes, suffix), suffix
+
+
+def test_partial_words_still_match():
+    index = CountryIndex(load_iso_country_codes())
+    assert index.match('fran') == 'fr'
+    assert index.match('stan') == 'af'
+    assert index.match('japan ') is None
+
+
+def test_aliases_win_over_substrings():
+    index = CountryIndex(load_iso_country_codes())
+    assert index.match('us') == 'us'
+    assert index.match('usa') == 'us'
+    assert index.match('uk') == 'gb'
+    assert index.match('scotland') == 'gb'
+    assert index.match('ukraine') == 'ua'
+    assert index.match('austria') == 'at'
+
+
+def test_clean_location_samples():
+    index = CountryIndex(load_iso_country_codes())
+    cleaned = {loc: clean_location(loc, index) for loc in SAMPLE_LOCATIONS}
+    assert cleaned['paris, france'] == {'submitted_string': 'paris', 'country_code': 'fr'}
+    assert cleaned['Paris , France (1900)'] == cleaned['paris, france']
+    assert cleaned['lyon, fran'] == {'submitted_string': 'lyon', 'country_code': 'fr'}
+    assert cleaned['tokyo, japan'] == {'submitted_string': 'tokyo', 'country_code': 'jp'}
+    assert cleaned['london, uk'] == {'submitted_string': 'london', 'country_code': 'gb'}
+    assert cleaned['vienna, us'] == {'submitted_string': 'vienna', 'country_code': 'us'}
+    assert cleaned['boston, massachusetts, the united states'] == {'submitted_string': 'boston, massachusetts',
+                                                                  'country_code': 'us'}
+    assert cleaned['somewhere, atlantis'] == {'submitted_string': 'somewhere, atlantis', 'country_code': None}
+    assert cleaned['springfield'] == {'submitted_string': 'springfield', 'country_code': None}
+    # dates and parentheses are dropped before the tidy-up, so no stray space is left on the suffix
+    assert cleaned['tokyo, japan 1990'] == cleaned['tokyo, japan']
+    assert cleaned['cairo, egypt, 12/03/1901'] == {'submitted_string': 'cairo', 'country_code': 'eg'}
+    assert cleaned['havana, cuba, '] == {'submitted_string': 'havana', 'country_code': 'cu'}
@@ -0,0 +1,46 @@
+import os
+import decimal
+from types import SimpleNamespace
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from guide2kulchur.curator import export
+
+
+def test_numeric_columns():
+    constrained = SimpleNamespace(type_code=1700, precision=6, scale=2)
+    unconstrained = SimpleNamespace(type_code=1700, precision=None, scale=None)
+    schema = pa.schema([pa.field('a', export._arrow_type(constrained)),
+                        pa.field('b', export._arrow_type(unconstrained))])
+    assert schema.field('a').type == pa.decimal128(6, 2)
+
+    rows = [(decimal.Decimal('1.25'), decimal.Decimal('3.14159')), (None, None)]
+    batch = export._rows_to_batch(rows, schema, [False, False])
+    assert batch.column(0).to_pylist() == [decimal.Decimal('1.25'), None]
+    assert batch.column(1).to_pylist() == [3.14159, None]
+
+
+def test_partition_names_are_unique_and_ordered():
+    names = [export._new_partition() for _ in range(50)]
+    assert len(set(names)) == len(names)
+    assert sorted(names) == names
+    assert names[0] > 'export_ts=20000101T000000'   # still sorts after the old second-resolution names
+
+
+def test_latest_rows_drop_deleted_keys(tmp_path):
+    out_dir = str(tmp_path)
+    table_dir = os.path.join(out_dir, 'pound')
+    for partition, rows in [('export_ts=20261019T000000', {'author_id': ['1', '2', '3'], 'name': ['a', 'b', 'c']}),
+                            (export._new_partition(), {'author_id': ['2'], 'name': ['b2']})]:
+        os.makedirs(os.path.join(table_dir, partition))
+        pq.write_table(pa.table(rows), os.path.join(table_dir, partition, 'part-00000.parquet'))
+
+    query = f'SELECT author_id, name FROM ({export.latest_rows_sql(out_dir, "pound")}) ORDER BY author_id'
+    assert duckdb.sql(query).fetchall() == [('1', 'a'), ('2', 'b2'), ('3', 'c')]
+
+    # "3" got deleted from the table since
+    pq.write_table(pa.table({'author_id': ['1', '2']}), os.path.join(table_dir, export.LIVE_KEYS_FILE))
+    query = f'SELECT author_id, name FROM ({export.latest_rows_sql(out_dir, "pound")}) ORDER BY author_id'
+    assert duckdb.sql(query).fetchall() == [('1', 'a'), ('2', 'b2')]
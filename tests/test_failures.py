@@ -0,0 +1,72 @@
+import asyncio
+import logging
+
+import aiohttp
+import pytest
+
+from guide2kulchur.engineer.batchpullers import BatchBookPuller
+from guide2kulchur.engineer.failures import ERROR_POLICIES, classify_error
+from guide2kulchur.engineer.ledger import IDLedger
+
+
+def _wrapped(msg, cause=None):
+    # the privateer loaders wrap whatever went wrong in a generic Exception
+    try:
+        try:
+            raise cause or Exception(msg)
+        except Exception as er:
+            raise Exception(f'Unexpected Error for 123: {er}') from er
+    except Exception as er:
+        return er
+
+
+@pytest.mark.parametrize('status, error_class', [
+    (404, 'not_found'),
+    (410, 'not_found'),
+    (403, 'throttled'),
+    (429, 'throttled'),
+    (500, 'network'),
+    (503, 'network'),
+])
+def test_classify_error_by_status(status, error_class):
+    er = _wrapped(f'Improper request respose: {status} recieved for book 123')
+    assert classify_error(er) == error_class
+
+
+def test_classify_error_without_status():
+    assert classify_error(_wrapped('private profile')) == 'private'
+    assert classify_error(_wrapped('', cause=aiohttp.ClientConnectionError('reset'))) == 'network'
+    assert classify_error(_wrapped('', cause=asyncio.TimeoutError())) == 'network'
+    assert classify_error(_wrapped("'NoneType' object has no attribute 'text'")) == 'parse_error'
+
+
+def test_every_class_has_a_policy():
+    assert set(ERROR_POLICIES) == {'not_found', 'private', 'throttled', 'network', 'parse_error'}
+
+
+class _RecordingCursor:
+    def __init__(self):
+        self.calls = []
+
+    def executemany(self, query, params):
+        self.calls.append((query, list(params)))
+
+
+def test_failed_ids_get_their_class_policy():
+    cur, ledger = _RecordingCursor(), IDLedger()
+    puller = BatchBookPuller(batch_id=0, cursor=cur, book_ids=['1', '2', '3'], semaphore_count=1,
+                             status_logger=logging.getLogger('test_failures'), id_ledger=ledger)
+    puller.fails = ['1', '2', '3']
+    puller.fail_classes = {'1': 'not_found', '2': 'throttled'}   # '3': no class recorded
+    puller.insert_failed_ids_into_db()
+
+    (query, rows), = cur.calls
+    by_id = {r['item_id']: r for r in rows}
+    assert [by_id[i]['error_class'] for i in '123'] == ['not_found', 'throttled', 'parse_error']
+    for row in rows:
+        assert (row['base'], row['cap']) == (ERROR_POLICIES[row['error_class']]['base'],
+                                             ERROR_POLICIES[row['error_class']]['cap'])
+    # first failure waits the base interval; each further one doubles it, up to the cap
+    assert 'NOW() + %(base)s::interval)' in query
+    assert 'LEAST(%(base)s::interval * POWER(2, error_id.attempts)' in query
+    assert ledger.filter_new('book', ['1', '2', '3', '4']) == ['4']
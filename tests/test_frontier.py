@@ -0,0 +1,82 @@
+import math
+
+import pytest
+
+from guide2kulchur.engineer.frontier import Frontier, referrer_weight
+from guide2kulchur.engineer.ledger import IDLedger
+
+
+class _RecordingCursor:
+    def __init__(self, fetched=()):
+        self.calls = []
+        self.fetched = list(fetched)
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.calls.append((' '.join(query.split()), params))
+        self.rowcount = len(params['ids']) if isinstance(params, dict) and 'ids' in params else len(self.fetched)
+
+    def fetchall(self):
+        return self.fetched
+
+
+@pytest.mark.parametrize('item_type, record, weight', [
+    ('book', {'rating_count': 0}, 1),
+    ('book', {'rating_count': math.e - 1}, 2),
+    ('author', {'rating_count': 1_000}, 1 + math.log(1_001)),
+    ('user', {'follower_count': 10, 'rating_count': 10_000}, 1 + math.log(11)),
+    ('book', {}, 1),
+    ('book', {'rating_count': None}, 1),
+    ('book', {'rating_count': '12'}, 1),
+    ('book', {'rating_count': -5}, 1),
+])
+def test_referrer_weight(item_type, record, weight):
+    assert referrer_weight(item_type, record) == pytest.approx(weight)
+
+
+def test_flush_adds_up_edges_and_skips_known_ids():
+    ledger = IDLedger()
+    ledger.add_known('book', ['3'])
+    cur = _RecordingCursor()
+    frontier = Frontier(cursor=cur, id_ledger=ledger)
+    frontier.stage_record('author', {'rating_count': 0, 'book_sample': ['1', '2', '3', '1']})
+    frontier.stage_record('author', {'rating_count': math.e - 1, 'book_sample': ['1']})
+
+    assert frontier.flush() == {'book': 2}
+    (_, params), = cur.calls
+    scores = dict(zip(params['ids'], zip(params['in_degrees'], params['priorities'])))
+    assert scores['1'] == (2, pytest.approx(3))   # one edge per referrer, even if it lists an ID twice
+    assert scores['2'] == (1, pytest.approx(1))
+    assert frontier.staged['book'] == {}
+
+
+def test_pop_leases_instead_of_deleting():
+    cur = _RecordingCursor(fetched=[('1',), ('2',)])
+    frontier = Frontier(cursor=cur, lease='30 minutes')
+    assert frontier.pop('book', 2) == ['1', '2']
+    (query, params), = cur.calls
+    assert query.startswith('UPDATE frontier SET leased_until = NOW() + %s::interval')
+    assert 'FOR UPDATE SKIP LOCKED' in query
+    assert params == ('30 minutes', 'book', 'book', 2)
+
+
+def test_settle_acks_done_ids_and_releases_retries_at_a_penalty():
+    cur = _RecordingCursor()
+    frontier = Frontier(cursor=cur, retry_penalty=.25)
+    frontier.settle('book', ['1', '2', '3'], retry_ids=['2'])
+
+    (ack_query, ack_params), (release_query, release_params) = cur.calls
+    assert ack_query.startswith('DELETE FROM frontier')
+    assert ack_params == ('book', ['1', '3'])
+    assert release_query.startswith('UPDATE frontier SET leased_until = NULL, priority = priority * %s')
+    assert release_params == (.25, 'book', ['2'])
+
+
+def test_release_and_ack_skip_empty_batches():
+    cur = _RecordingCursor()
+    frontier = Frontier(cursor=cur)
+    assert frontier.settle('book', ['1'], retry_ids=['1']) == (0, 0)
+    (query, params), = cur.calls    # nothing to ack; only the release
+    assert params == (frontier.retry_penalty, 'book', ['1'])
+    assert frontier.release('book', []) == 0
+    assert len(cur.calls) == 1
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from guide2kulchur.curator.geocode import Gazetteer
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+ISO_CODES = {
+    'united states of america (the)': 'us',
+    'france': 'fr',
+    'germany': 'de',
+    'russian federation (the)': 'ru',
+    'greece': 'gr',
+}
+
+
+@pytest.fixture(scope='module')
+def gaz():
+    return Gazetteer.from_geonames(os.path.join(FIXTURES, 'geonames_mini.txt'),
+                                   os.path.join(FIXTURES, 'geonames_admin1_mini.txt'),
+                                   iso_country_codes=ISO_CODES)
+
+
+def test_exact_name(gaz):
+    match = gaz.resolve('Paris, France')
+    assert match.geoname_id == 2988507
+    assert match.country_code == 'fr'
+    assert match.addr == 'Paris, Île-de-France, France'
+
+
+def test_most_populous_without_context(gaz):
+    assert gaz.resolve('paris').geoname_id == 2988507
+    assert gaz.resolve('springfield').geoname_id == 4409896     # MO outnumbers IL
+
+
+def test_alternate_names(gaz):
+    assert gaz.resolve('Leningrad, USSR').geoname_id == 498817
+    assert gaz.resolve('munich, germany').geoname_id == 2867714     # alternate name
+    assert gaz.resolve('Muenchen').geoname_id == 2867714            # ascii name
+    assert gaz.resolve('münchen, bavaria, germany').geoname_id == 2867714
+
+
+def test_admin1_disambiguation(gaz):
+    assert gaz.resolve('springfield, illinois, the united states').geoname_id == 4250542
+    assert gaz.resolve('springfield, missouri, the united states').geoname_id == 4409896
+    assert gaz.resolve('paris, texas, the united states').geoname_id == 4717560
+    assert gaz.resolve('paris, texas, the united states').addr == 'Paris, Texas, United States Of America'
+
+
+def test_country_code_filters_candidates(gaz):
+    # only a US Paris; the French one is ruled out by the country
+    assert gaz.resolve('paris, the united states').geoname_id == 4717560
+
+
+def test_miss(gaz):
+    assert gaz.resolve('atlantis, greece') is None
+    assert gaz.resolve('munich, greece') is None    # the only Munich is in Germany
+    assert gaz.resolve('') is None
@@ -0,0 +1,58 @@
+import os
+import shutil
+
+import pytest
+
+from guide2kulchur.curator.simgraph import SimGraph
+from guide2kulchur.curator.graphmetrics import GraphMetrics, RankBoost, compute_metrics
+
+
+ROWS = [('1', 10, 'a', ['2', '3']),
+        ('2', 20, 'b', ['3']),
+        ('3', 30, 'c', ['1'])]
+
+
+def _build(graph_dir, rows):
+    path = os.path.join(graph_dir, 'author')
+    graph = SimGraph.from_rows(rows, item_type='author')
+    graph.save(path)
+    return path, graph
+
+
+def test_metrics_load_for_their_graph(tmp_path):
+    path, graph = _build(str(tmp_path), ROWS)
+    compute_metrics(graph).save(path)
+
+    loaded = SimGraph.load(path)
+    assert loaded.fingerprint() == graph.fingerprint()
+    assert GraphMetrics.load_for(path, loaded) is not None
+    assert RankBoost.load(str(tmp_path)).factors('author', ['1', '9'])[1] == 1.0
+
+
+def test_rebuilt_graph_drops_stale_metrics(tmp_path):
+    path, graph = _build(str(tmp_path), ROWS)
+    compute_metrics(graph).save(path)
+    shutil.copytree(os.path.join(path, 'metrics'), str(tmp_path / 'old_metrics'))
+
+    # a new node ('0') sorts first, so every old metric would be off by one
+    path, graph = _build(str(tmp_path), [('0', 5, 'z', ['1'])] + ROWS)
+    assert not GraphMetrics.exists(path)
+
+    # even if old metrics are put back (or were saved by hand), they're not used
+    shutil.copytree(str(tmp_path / 'old_metrics'), os.path.join(path, 'metrics'))
+    loaded = SimGraph.load(path)
+    assert GraphMetrics.load_for(path, loaded) is None
+    with pytest.raises(ValueError):
+        GraphMetrics.load(path, graph=loaded)
+    boost = RankBoost.load(str(tmp_path))
+    assert boost.factors('author', ['0', '1', '2', '3']) == [1.0] * 4
+
+
+def test_same_shape_different_graph(tmp_path):
+    path, graph = _build(str(tmp_path), ROWS)
+    compute_metrics(graph).save(path)
+    # same node and edge counts, different edges
+    other = SimGraph.from_rows([('1', 10, 'a', ['2']), ('2', 20, 'b', ['1', '3']), ('3', 30, 'c', ['2'])],
+                               item_type='author')
+    assert (other.num_nodes, other.num_edges) == (graph.num_nodes, graph.num_edges)
+    assert GraphMetrics.load_for(path, other) is None
@@ -0,0 +1,105 @@
+import contextlib
+
+from guide2kulchur.engineer.ledger import IDLedger, _FAILED_ID_QUERY, _KNOWN_ID_QUERIES
+
+
+class _FakeCursor:
+    '''answers the ledger's queries from in-memory rows'''
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.db.queries.append(query)
+        if query == _FAILED_ID_QUERY:
+            self.rows = [(id_, t) for t, ids in self.db.failed.items() for id_ in ids]
+            return
+        for item_type, known_query in _KNOWN_ID_QUERIES.items():
+            if query == known_query:
+                self.rows = [(id_,) for id_ in self.db.known[item_type]]
+                return
+            if query == f'SELECT COUNT(*) FROM ({known_query}) AS ids':
+                self.rows = [(len(self.db.known[item_type]),)]
+                return
+        raise AssertionError(f'unexpected query: {query}')
+
+    def fetchone(self):
+        return self.rows.pop(0)
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+class _FakeConn:
+    def __init__(self, known, failed=None):
+        self.known = {'book': [], 'author': [], 'user': [], **known}
+        self.failed = failed or {}
+        self.queries = []
+
+    def cursor(self, name=None):
+        return _FakeCursor(self)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        yield
+
+
+def _full_syncs(conn):
+    return [q for q in conn.queries if q in _KNOWN_ID_QUERIES.values()]
+
+
+def test_build_save_load_round_trip(tmp_path):
+    # 'bad' and the out-of-range ID can't go in a bitmap; they only show up in the count gap
+    conn = _FakeConn(known={'book': ['1', '2', 'bad', str(2 ** 40)], 'author': ['7']},
+                     failed={'user': ['5']})
+    ledger = IDLedger.load_or_build(conn=conn, path=str(tmp_path))
+    assert ledger.summary() == IDLedger.load(str(tmp_path)).summary()
+    assert ledger.count_gaps == {'book': 2, 'author': 0, 'user': 0}
+
+    loaded = IDLedger.load(str(tmp_path))
+    assert loaded.count_gaps == ledger.count_gaps
+    assert loaded.filter_new('book', ['1', '2', '3']) == ['3']
+    assert loaded.filter_new('user', ['5', '6']) == ['6']
+
+
+def test_load_skips_resync_while_counts_line_up(tmp_path):
+    conn = _FakeConn(known={'book': ['1', '2', 'bad'], 'author': ['7']})
+    ledger = IDLedger.load_or_build(conn=conn, path=str(tmp_path))
+
+    # rows inserted through the ledger grow the count and the bitmap alike
+    conn.known['book'].append('3')
+    ledger.add_known('book', ['3'])
+    ledger.save()
+    conn.queries.clear()
+    reloaded = IDLedger.load_or_build(conn=conn, path=str(tmp_path))
+    assert _full_syncs(conn) == []
+    assert not reloaded.is_new('book', '3')
+
+
+def test_load_resyncs_tables_with_rows_it_did_not_see(tmp_path):
+    conn = _FakeConn(known={'book': ['1', '2'], 'author': ['7']})
+    IDLedger.load_or_build(conn=conn, path=str(tmp_path))
+
+    conn.known['author'].append('8')   # e.g., inserted by a script without a ledger
+    conn.queries.clear()
+    ledger = IDLedger.load_or_build(conn=conn, path=str(tmp_path))
+    assert _full_syncs(conn) == [_KNOWN_ID_QUERIES['author']]
+    assert ledger.filter_new('author', ['7', '8', '9']) == ['9']
+    # and the re-synced ledger was saved
+    assert IDLedger.load(str(tmp_path)).filter_new('author', ['8', '9']) == ['9']
+
+
+def test_failed_ids_are_refreshed_on_load(tmp_path):
+    conn = _FakeConn(known={'book': ['1']}, failed={'book': ['2']})
+    IDLedger.load_or_build(conn=conn, path=str(tmp_path))
+
+    conn.failed = {}   # past its retry_after time
+    ledger = IDLedger.load_or_build(conn=conn, path=str(tmp_path))
+    assert ledger.filter_new('book', ['1', '2']) == ['2']
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+
+import pytest
+
+from guide2kulchur.engineer import metrics
+from guide2kulchur.engineer.metrics import _Metric
+from guide2kulchur.engineer import batchpullers
+from guide2kulchur.engineer.batchpullers import BatchAuthorPuller
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric('g2k_x', 'x')
+
+
+class _SlowPuller(BatchAuthorPuller):
+    '''skips the network; each item takes a little while, or blows up'''
+    async def _load_one_item(self, session, semaphore, identifier, num_attempts=1, see_progress=True):
+        async with semaphore:
+            await asyncio.sleep(.01)
+            if identifier == 'boom':
+                raise RuntimeError('boom')
+            return {'status': 'success', 'data': {'author_id': identifier}}
+
+
+def _gauge(gauge):
+    return dict(((labels, v) for _, labels, v in gauge.samples())).get('{item_type="author"}', 0)
+
+
+def test_gauges_of_concurrent_batches_add_up():
+    logger = logging.getLogger('test_metrics')
+    seen = []
+
+    async def watch():
+        for _ in range(20):
+            seen.append((_gauge(metrics.QUEUE_DEPTH), _gauge(metrics.CONCURRENCY_LIMIT)))
+            await asyncio.sleep(.002)
+
+    async def main():
+        base = (_gauge(metrics.QUEUE_DEPTH), _gauge(metrics.CONCURRENCY_LIMIT))
+        a = _SlowPuller(batch_id=0, cursor=None, author_ids=[str(i) for i in range(6)],
+                        semaphore_count=2, status_logger=logger)
+        b = _SlowPuller(batch_id=1, cursor=None, author_ids=[str(i) for i in range(3)] + ['boom'],
+                        semaphore_count=3, status_logger=logger)
+        results = await asyncio.gather(a.load_the_batch(session=None, batch_delay=0),
+                                       b.load_the_batch(session=None, batch_delay=0),
+                                       watch(),
+                                       return_exceptions=True)
+        assert isinstance(results[1], RuntimeError)
+        return base
+
+    base_depth, base_limit = asyncio.run(main())
+    # both batches' shares at once, never below where it started, and all taken back at the end
+    assert max(limit for _, limit in seen) == base_limit + 5
+    assert max(depth for depth, _ in seen) <= base_depth + 10
+    assert min(depth for depth, _ in seen) >= base_depth
+    assert (_gauge(metrics.QUEUE_DEPTH), _gauge(metrics.CONCURRENCY_LIMIT)) == (base_depth, base_limit)
+
+
+def test_sim_page_timeouts_do_not_count_as_item_timeouts(monkeypatch):
+    async def timing_out(**kwargs):
+        raise asyncio.TimeoutError()
+    monkeypatch.setattr(batchpullers, '_fetch_sim_ids', timing_out)
+
+    puller = BatchAuthorPuller(batch_id=0, cursor=None, author_ids=['1'], semaphore_count=1,
+                               status_logger=logging.getLogger('test_metrics'), chain_similar=True)
+    item_dat = {'author_id': '1'}
+    asyncio.run(puller._load_sim_ids(session=None, item_dat=item_dat, num_attempts=1))
+    assert item_dat['sim_authors'] is None
+    assert (puller.metadat['sim_timeouts'], puller.metadat['timeouts']) == (1, 0)
@@ -0,0 +1,78 @@
+import asyncio
+
+from guide2kulchur.engineer import orchestrator
+from guide2kulchur.engineer.orchestrator import CrawlJob
+
+
+class _FakeLedger:
+    def filter_new(self, item_type, ids):
+        return [i for i in ids if not i.startswith('known')]
+
+    def save(self):
+        pass
+
+
+class _FakeRunState:
+    def __init__(self, completed):
+        self.completed_batches = set(completed)
+        self.controller = {'sem_count': 3, 'sub_batch_delay': 0}
+        self.in_flight = []
+        self.started = []
+
+    def is_done(self, batch_id):
+        return str(batch_id) in self.completed_batches
+
+    def start_batch(self, batch_id, ids):
+        self.started.append(batch_id)
+
+    def complete_batch(self, batch_id, controller=None):
+        self.completed_batches.add(str(batch_id))
+
+    def finish(self):
+        pass
+
+
+class _FakePuller:
+    timeouts = []
+    metadat = {'timeouts_per_batch_ratio': 0}
+
+    async def load_the_batch(self, **kwargs):
+        pass
+
+    def insert_batch_into_db(self):
+        pass
+
+
+def _job(tmp_path, monkeypatch, completed, batches, iter_count):
+    monkeypatch.chdir(tmp_path)   # gen_logger writes into ./<name>
+    job = CrawlJob(cfg={'name': 'test_resume', 'item_type': 'book', 'sinks': ['db'], 'iter_count': iter_count,
+                        'source': {'kind': 'json_ids', 'path': 'unused.json'}},
+                   cursor=None, id_ledger=_FakeLedger(), frontier=None)
+    job.file_batches = batches
+    job.run_state = _FakeRunState(completed)
+    monkeypatch.setattr(job, '_make_puller', lambda **kwargs: _FakePuller())
+    return job
+
+
+def test_resumed_file_job_skips_done_batches_without_sleeping(tmp_path, monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(secs):
+        sleeps.append(secs)
+    monkeypatch.setattr(orchestrator.asyncio, 'sleep', fake_sleep)
+
+    batches = [[str(b)] for b in range(10)]
+    job = _job(tmp_path, monkeypatch, completed=[str(b) for b in range(6)], batches=batches, iter_count=3)
+    asyncio.run(job.run(session=None))
+    # done batches neither sleep nor take up iter_count slots
+    assert job.run_state.started == [6, 7, 8]
+    assert sleeps == []
+
+
+def test_file_batch_with_nothing_new_is_completed_not_counted(tmp_path, monkeypatch):
+    batches = [['known-1'], ['a'], ['known-2'], ['b'], ['c']]
+    job = _job(tmp_path, monkeypatch, completed=[], batches=batches, iter_count=2)
+    job.rate['inter_batch_sleep'] = 0
+    asyncio.run(job.run(session=None))
+    assert job.run_state.started == [1, 3]
+    assert job.run_state.completed_batches == {'0', '1', '2', '3'}
@@ -0,0 +1,67 @@
+from guide2kulchur.engineer.runstate import RunState, gen_run_id
+
+
+class _FakeRunStateTable:
+    '''a run_state table of one row, answering the queries RunState makes'''
+    def __init__(self):
+        self.row = None     # [completed_batches, controller, in_flight, finished]
+
+    def execute(self, query, params=None):
+        query = ' '.join(query.split())
+        self.last = None
+        if query.startswith('SELECT'):
+            self.last = self.row[:3] if self.row and not self.row[3] else None
+        elif query.startswith('INSERT INTO run_state'):
+            self.row = [[], params[1].obj, [], False]
+        elif 'in_flight = %s' in query:
+            self.row[2] = params[0]
+        elif 'completed_batches = CASE' in query:
+            batch_id, _, controller, _ = params
+            if batch_id not in self.row[0]:
+                self.row[0] = self.row[0] + [batch_id]
+            self.row[1], self.row[2] = controller.obj, []
+        elif 'finished_at = NOW()' in query:
+            self.row[3] = True
+
+    def fetchone(self):
+        return self.last
+
+
+def test_gen_run_id_ignores_order():
+    assert gen_run_id('top', ['2', '1']) == gen_run_id('top', ['1', '2'])
+    assert gen_run_id('top', ['1', '2']) != gen_run_id('top', ['1', '3'])
+    assert gen_run_id('top', ['1']).startswith('top-')
+
+
+def test_complete_batch_is_idempotent():
+    cur = _FakeRunStateTable()
+    state = RunState.load_or_start(cursor=cur, run_id='r', controller={'sem_count': 3})
+    state.complete_batch(0)
+    state.complete_batch(0, {'sem_count': 5})
+    assert state.completed_batches == {'0'}
+    assert cur.row[0] == ['0']
+    assert cur.row[1] == {'sem_count': 5}
+
+
+def test_crashed_run_resumes_with_its_batches_and_in_flight_ids():
+    cur = _FakeRunStateTable()
+    state = RunState.load_or_start(cursor=cur, run_id='r', controller={'sem_count': 3, 'sub_batch_delay': 2})
+    state.complete_batch(0, {'sem_count': 6})
+    state.start_batch(1, ['a', 'b'])
+    # crash; the next run picks up where it left off, with the warmed-up controller
+    resumed = RunState.load_or_start(cursor=cur, run_id='r', controller={'sem_count': 3, 'sub_batch_delay': 2})
+    assert resumed.resumed
+    assert resumed.is_done(0) and not resumed.is_done(1)
+    assert resumed.in_flight == ['a', 'b']
+    assert resumed.controller == {'sem_count': 6, 'sub_batch_delay': 2}
+
+
+def test_finished_run_starts_over():
+    cur = _FakeRunStateTable()
+    state = RunState.load_or_start(cursor=cur, run_id='r', controller={'sem_count': 3})
+    state.complete_batch(0)
+    state.finish()
+    fresh = RunState.load_or_start(cursor=cur, run_id='r', controller={'sem_count': 3})
+    assert not fresh.resumed
+    assert not fresh.is_done(0)
+    assert cur.row[0] == []
@@ -0,0 +1,92 @@
+import os
+import gzip
+import shutil
+
+import pytest
+
+from guide2kulchur.privateer.scribe import Scribe, read_jsonl
+
+
+def _crash(path, crash_dir, unsynced=1, garbage=b''):
+    '''write 4 synced records (+ unsynced ones), then copy the files as they are on disk, as if the process died'''
+    scribe = Scribe(path, fsync_every=2).open()
+    for i in range(4 + unsynced):
+        scribe.write(str(i), {'id': i})
+    scribe._out.flush()     # e.g., the compressor's buffer got out, but the index didn't
+    scribe._raw.flush()
+    os.makedirs(crash_dir)
+    for f_path in (path, f'{path}.done'):
+        shutil.copy(f_path, crash_dir)
+    with open(os.path.join(crash_dir, os.path.basename(path)), 'ab') as f:
+        f.write(garbage)
+    scribe.close()
+    return os.path.join(crash_dir, os.path.basename(path))
+
+
+@pytest.mark.parametrize('f_name', ['items.jsonl.gz', 'items.jsonl'])
+def test_resume_after_crash_keeps_later_runs(tmp_path, f_name):
+    path = _crash(str(tmp_path / f_name), str(tmp_path / 'crashed'), garbage=b'\x00\x17{"id": ')
+
+    with Scribe(path) as scribe:
+        assert scribe.done == {'0', '1', '2', '3'}
+        scribe.write('4', {'id': 4})
+        scribe.write('5', {'id': 5})
+    with Scribe(path) as scribe:    # a later run, after a clean one
+        scribe.write('6', {'id': 6})
+
+    assert [r['id'] for r in read_jsonl(path)] == [0, 1, 2, 3, 4, 5, 6]
+    assert Scribe(path)._read_index() == ['0', '1', '2', '3', '4', '5', '6']
+
+
+def test_resume_after_crash_mid_member(tmp_path):
+    # the crashed member is cut off in the middle of the deflate stream
+    path = str(tmp_path / 'items.jsonl.gz')
+    scribe = Scribe(path, fsync_every=2).open()
+    for i in range(3):
+        scribe.write(str(i), {'id': i})
+    scribe.close()
+    scribe = Scribe(path, fsync_every=2).open()
+    for i in range(3, 8):
+        scribe.write(str(i), {'id': i})
+    scribe.sync()
+    size = os.path.getsize(path)
+    scribe.close()
+    with open(path, 'r+b') as f:
+        f.truncate(size - 3)
+
+    with Scribe(path) as scribe:
+        done = set(scribe.done)
+        scribe.write('8', {'id': 8})
+
+    ids = [r['id'] for r in read_jsonl(path)]
+    assert ids[-1] == 8
+    assert sorted(map(str, ids)) == sorted(Scribe(path)._read_index())
+    assert {str(i) for i in ids[:-1]} == done
+
+
+def test_clean_file_is_left_alone(tmp_path):
+    path = str(tmp_path / 'items.jsonl.gz')
+    with Scribe(path) as scribe:
+        for i in range(3):
+            scribe.write(str(i), {'id': i})
+    with open(path, 'rb') as f:
+        dat = f.read()
+    with Scribe(path) as scribe:
+        assert scribe.done == {'0', '1', '2'}
+    with open(path, 'rb') as f:
+        assert f.read().startswith(dat)   # only appended to (an empty member, for a run with no writes)
+    assert [r['id'] for r in read_jsonl(path)] == [0, 1, 2]
+
+
+def test_already_broken_file_is_reindexed(tmp_path):
+    # written before "open" repaired anything: a later run's member after the crashed one, unreadable
+    path = _crash(str(tmp_path / 'items.jsonl.gz'), str(tmp_path / 'crashed'))
+    with open(path, 'ab') as f:
+        f.write(gzip.compress(b'{"id": 9}\n'))
+    with open(f'{path}.done', 'a') as f:
+        f.write('9\n')
+
+    with Scribe(path) as scribe:
+        readable = {str(r['id']) for r in read_jsonl(path)}
+        assert scribe.done == readable  # "9" gets pulled again
+        assert '9' not in scribe.done
@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import asyncio
+
+import pytest
+
+from guide2kulchur.curator.wikidata import (run_author_queries,
+                                            run_queries,
+                                            date_range_queries,
+                                            split_bindings)
+
+
+with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'wikidata_recorded.json'), 'r') as f:
+    RECORDED = json.load(f)     # target label -> bindings, as the endpoint returned them
+
+
+class RecordedEndpoint:
+    '''stands in for the SPARQL endpoint: answers VALUES block queries from the recorded bindings'''
+    def __init__(self):
+        self.queries = []
+
+    async def __call__(self, query):
+        self.queries.append(query)
+        if (ids := re.findall(r'wd:(Q\d+) ', query.split('VALUES ?occupation')[0])):
+            bindings = [b for bs in RECORDED.values() for b in bs
+                        if b['author']['value'].rsplit('/', 1)[-1] in ids]
+            bindings = [{k: v for k, v in b.items() if k != 'targetLabel'} for b in bindings]
+        else:
+            labels = re.findall(r'"([^"]+)"@en', query)
+            bindings = [b for label in labels for b in RECORDED.get(label, [])]
+        return {'head': {'vars': []}, 'results': {'bindings': bindings}}
+
+    def targets_sent(self):
+        return [sorted(re.findall(r'"([^"]+)"@en', q)) for q in self.queries]
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_rows_from_recorded_responses(tmp_path):
+    endpoint = RecordedEndpoint()
+    rows = _run(run_author_queries(['Plato', 'Sappho', 'Nobody'], chunk_size=2,
+                                   cache_dir=str(tmp_path), min_interval=0, fetch=endpoint))
+    by_code = {r[0].rsplit('/', 1)[-1]: r for r in rows}
+    assert set(by_code) == {'Q859', 'Q17892'}
+    assert by_code['Q859'][1:] == ('Plato', 'Πλάτων', 'philosopher', '0427-01-01T00:00:00Z BC',
+                                   '0347-01-01T00:00:00Z BC', 'http://www.wikidata.org/entity/Q1524', 'Athens')
+    assert by_code['Q17892'][5] is None     # no date of death
+    assert endpoint.targets_sent() == [['Nobody', 'Plato'], ['Sappho']]
+
+
+def test_rerun_with_shifted_targets_hits_the_cache(tmp_path):
+    cache_dir = str(tmp_path)
+    _run(run_author_queries(['Plato', 'Sappho', 'Nobody'], chunk_size=2,
+                            cache_dir=cache_dir, min_interval=0, fetch=RecordedEndpoint()))
+
+    # Plato got inserted since, so he isn't a target anymore; every chunk boundary shifts
+    endpoint = RecordedEndpoint()
+    rows = _run(run_author_queries(['Sappho', 'Nobody', 'Homer', 'Hypatia'], chunk_size=2,
+                                   cache_dir=cache_dir, min_interval=0, fetch=endpoint))
+    assert endpoint.targets_sent() == [['Homer', 'Hypatia']]     # only the authors not seen before
+    assert {r[1] for r in rows} == {'Sappho', 'Homer', 'Hypatia'}
+
+    # and nothing at all the third time ("Nobody" had no results, which is cached too)
+    endpoint = RecordedEndpoint()
+    _run(run_author_queries(['Sappho', 'Nobody', 'Homer', 'Hypatia'], chunk_size=3,
+                            cache_dir=cache_dir, min_interval=0, fetch=endpoint))
+    assert endpoint.queries == []
+
+
+def test_cache_only(tmp_path):
+    cache_dir = str(tmp_path)
+    _run(run_author_queries(['Plato'], cache_dir=cache_dir, min_interval=0, fetch=RecordedEndpoint()))
+    endpoint = RecordedEndpoint()
+    rows = _run(run_author_queries(['Plato', 'Sappho'], cache_dir=cache_dir, cache_only=True,
+                                   min_interval=0, fetch=endpoint))
+    assert [r[1] for r in rows] == ['Plato']
+    assert endpoint.queries == []
+
+
+def test_one_row_per_author(tmp_path):
+    rows = _run(run_author_queries(['Hypatia'], min_interval=0, fetch=RecordedEndpoint()))
+    assert len(rows) == 1
+    assert rows[0][3] == 'mathematician'    # first row wins
+
+
+def test_failed_queries_are_not_cached(tmp_path):
+    async def down(query):
+        raise ConnectionError('endpoint down')
+
+    cache_dir = str(tmp_path)
+    rows = _run(run_author_queries(['Plato'], cache_dir=cache_dir, min_interval=0, num_attempts=1, fetch=down))
+    assert rows == []
+    endpoint = RecordedEndpoint()
+    rows = _run(run_author_queries(['Plato'], cache_dir=cache_dir, min_interval=0, fetch=endpoint))
+    assert len(endpoint.queries) == 1 and len(rows) == 1
+
+
+def test_by_id(tmp_path):
+    endpoint = RecordedEndpoint()
+    targets = ['Q859', 'http://www.wikidata.org/entity/Q6691', 'Q1']
+    rows = _run(run_author_queries(targets, by='id', cache_dir=str(tmp_path), min_interval=0, fetch=endpoint))
+    assert {r[1] for r in rows} == {'Plato', 'Homer'}
+    endpoint = RecordedEndpoint()
+    _run(run_author_queries(['Q6691'], by='id', cache_dir=str(tmp_path), min_interval=0, fetch=endpoint))
+    assert endpoint.queries == []
+
+
+def test_split_bindings():
+    res = {'results': {'bindings': RECORDED['Plato'] + RECORDED['Homer']}}
+    split = split_bindings(res, ['Homer', 'Plato', 'Sappho'])
+    assert [len(split[t]['results']['bindings']) for t in ('Homer', 'Plato', 'Sappho')] == [1, 1, 0]
+    with pytest.raises(ValueError):
+        split_bindings(res, ['Homer'], by='name')
+
+
+def test_run_queries_caches_per_query(tmp_path):
+    endpoint = RecordedEndpoint()
+    queries = date_range_queries()[:2]
+    _run(run_queries(queries, cache_dir=str(tmp_path), min_interval=0, fetch=endpoint))
+    _run(run_queries(queries, cache_dir=str(tmp_path), min_interval=0, fetch=endpoint))
+    assert len(endpoint.queries) == 2